@@ -1,7 +1,13 @@
 ﻿import re, math, os, logging
 import builtins as py_builtins
+import traceback
 from typing import Dict, Any, List, Optional
 from templates import CodeTemplates
+import mesh_ops
+import builders
+from export_stage import quality_scope, capture_shapes
+import shape_store
+import scheduler
 
 log = logging.getLogger("cadamx.agents")
 
@@ -106,6 +112,9 @@ class AnalystAgent:
             'n_cols': int(self._find_number(prompt, r'(\d+)\s*columns?', 18)),
             'n_rows': int(self._find_number(prompt, r'(\d+)\s*rows?', 14)),
             'twist': self._find_number(prompt, r'twist\s*:?\s*(\d+(?:\.\d+)?)', 0.5),
+            # Maillage: segments par cellule Miura, STL binaire sauf demande explicite
+            'subdiv': max(1, int(self._find_number(prompt, r'(\d+)\s*(?:subdivisions?|segments?\s+per\s+cell)', 2))),
+            'stl_format': 'ascii' if re.search(r'\bascii\b', prompt, re.I) else 'binary',
         }
         
         log.info(f"✅ ORIGAMI: diameter={params['outer_diameter']}mm, height={params['height']}mm")
@@ -142,6 +151,7 @@ class AnalystAgent:
             'strut_radius': self._find_number(prompt, r'strut\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.2),
             'node_radius_factor': self._find_number(prompt, r'node\s*factor\s*:?\s*(\d+(?:\.\d+)?)', 1.55),
         }
+        params.update(self._extract_lattice_engine(prompt, params['strut_radius']))
         
         log.info(f"✅ LATTICE SC: {params['block_x']}×{params['block_y']}×{params['block_z']}mm")
         
@@ -161,6 +171,7 @@ class AnalystAgent:
             'strut_radius': self._find_number(prompt, r'strut\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.2),
             'node_radius': self._find_number(prompt, r'node\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.86),
         }
+        params.update(self._extract_lattice_engine(prompt, params['strut_radius']))
         
         log.info(f"✅ LATTICE BCC: {params['block_x']}×{params['block_y']}×{params['block_z']}mm")
         
@@ -180,6 +191,7 @@ class AnalystAgent:
             'strut_radius': self._find_number(prompt, r'strut\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.2),
             'node_radius': self._find_number(prompt, r'node\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.86),
         }
+        params.update(self._extract_lattice_engine(prompt, params['strut_radius']))
         
         log.info(f"✅ LATTICE FCC: {params['block_x']}×{params['block_y']}×{params['block_z']}mm")
         
@@ -199,6 +211,7 @@ class AnalystAgent:
             'strut_radius': self._find_number(prompt, r'strut\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.2),
             'node_radius': self._find_number(prompt, r'node\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.86),
         }
+        params.update(self._extract_lattice_engine(prompt, params['strut_radius']))
         
         log.info(f"✅ LATTICE DIAMOND: {params['block_x']}×{params['block_y']}×{params['block_z']}mm")
         
@@ -218,6 +231,7 @@ class AnalystAgent:
             'strut_radius': self._find_number(prompt, r'strut\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.2),
             'node_radius': self._find_number(prompt, r'node\s*radius\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 1.86),
         }
+        params.update(self._extract_lattice_engine(prompt, params['strut_radius']))
         
         log.info(f"✅ LATTICE OCTET: {params['block_x']}×{params['block_y']}×{params['block_z']}mm")
         
@@ -227,6 +241,17 @@ class AnalystAgent:
             "raw_prompt": prompt
         }
     
+    def _extract_lattice_engine(self, prompt: str, strut_radius: float) -> Dict[str, Any]:
+        """Geometry engine for lattices: 'brep' (CadQuery solids) or 'implicit' (SDF + marching cubes)"""
+        p = prompt.lower()
+        implicit = bool(re.search(r'\b(implicit|sdf|marching cubes|watertight|single mesh)\b', p))
+
+        return {
+            'mode': 'implicit' if implicit else 'brep',
+            'voxel_size': self._find_number(prompt, r'voxel(?:\s*size)?\s*:?\s*(\d+(?:\.\d+)?)\s*mm', strut_radius / 3.0),
+            'blend_radius': self._find_number(prompt, r'(?:blend|fillet)\s*(?:radius)?\s*:?\s*(\d+(?:\.\d+)?)\s*mm', 0.0),
+        }
+
     def _detect_application_type(self, prompt: str) -> str:
         """Detects application type based on keywords with stricter detection"""
         scores = {app: 0 for app in self.APPLICATION_KEYWORDS}
@@ -670,6 +695,9 @@ class GeneratorAgent:
         elif app_type == 'facade_pyramid':
             code = self.templates.generate_facade_pyramid(analysis)
             file_type = 'facade'
+        elif app_type == 'facade_parametric':
+            code = self.templates.generate_facade_parametric(analysis)
+            file_type = 'facade'
         elif app_type == 'honeycomb':  # 🔥 NOUVEAU
             code = self.templates.generate_honeycomb(analysis)
             file_type = 'facade'
@@ -735,15 +763,18 @@ class ValidatorAgent:
         ]
         return {k: getattr(py_builtins, k) for k in allowed}
 
-    async def validate_and_execute(self, code: str, app_type: str = "model") -> Dict[str, Any]:
+    async def validate_and_execute(self, code: str, app_type: str = "model",
+                                   quality: Optional[str] = None,
+                                   job_id: Optional[str] = None) -> Dict[str, Any]:
         try:
             compile(code, "<cad>", "exec")
         except SyntaxError as e:
-            return {"success": False, "errors": [f"Syntax: {e.msg}"]}
+            return {"success": False, "errors": [f"Syntax: {e.msg} (line {e.lineno})"]}
 
         import numpy as np
         from pathlib import Path
-        import time
+
+        run_dir = shape_store.run_dir(job_id)
 
         # No-op function for show_object (used by CQ-Editor)
         def show_object(obj, name=None, options=None):
@@ -756,42 +787,127 @@ class ValidatorAgent:
             "np": np,
             "numpy": np,
             "struct": __import__('struct'),
+            "mesh_ops": mesh_ops,
             "Path": Path,
             "show_object": show_object,
-            "__file__": str(Path(__file__).parent / "temp_exec.py"),
+            # Path(__file__).parent / "output" → répertoire d'exécution privé (jamais partagé entre jobs)
+            "__file__": str(run_dir / "temp_exec.py"),
         }
 
         try:
-            exec(compile(code, "<cad>", "exec"), ns)
+            # Qualité de tessellation lue par export_stage.export_stl(); les formes
+            # exportées sont capturées pour le stockage BRep du job
+            async with scheduler.slot("geometry"):
+                with quality_scope(quality), capture_shapes() as shapes:
+                    exec(compile(code, "<cad>", "exec"), ns)
 
-            backend_dir = Path(__file__).parent
-            output_dir = backend_dir / "output"
+            # Seuls les fichiers écrits par CETTE exécution sont dans son répertoire
+            stl_path = self._run_output(run_dir, "stl")
+            step_path = self._run_output(run_dir, "step")
 
-            time.sleep(0.1)
-
-            # ALWAYS search for the most recent .stl file (not just generated_*.stl)
-            # This fixes the bug where an old file was returned instead of the new one
-            stl_files = sorted(output_dir.glob("*.stl"), key=lambda p: p.stat().st_mtime, reverse=True)
-            stl_path = str(stl_files[0].absolute()) if stl_files else None
-            
         except Exception as e:
             log.error(f"Execution failed: {e}", exc_info=True)
             # Include exception type in error message so ErrorHandlerAgent can categorize it
             error_type = type(e).__name__
-            return {"success": False, "errors": [f"Execution: {error_type}: {e}"]}
+            # Ligne du script généré (dernière frame "<cad>") pour le healing localisé
+            lines = [f.lineno for f in traceback.extract_tb(e.__traceback__) if f.filename == "<cad>"]
+            where = f" (line {lines[-1]})" if lines else ""
+            return {"success": False, "errors": [f"Execution: {error_type}: {e}{where}"]}
+
+        if stl_path and os.path.exists(stl_path):
+            mesh = self._create_mesh_from_stl(stl_path)
+        else:
+            mesh = self._create_mesh()
+
+        job_id = self._store_final_shape(shapes, ns, job_id)
+
+        return {
+            "success": True,
+            "mesh": mesh,
+            "analysis": {"dimensions": {}, "features": {}, "validation": {}},
+            "stl_path": stl_path,
+            "step_path": step_path,
+            "job_id": job_id,
+            "export_formats": list(shape_store.EXPORT_FORMATS) if job_id else [],
+        }
+
+    async def build_direct(self, app_type: str, analysis: Dict[str, Any],
+                           quality: Optional[str] = None,
+                           job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Chemin rapide des templates: appel direct du builder importable
+        (builders.py, process worker) au lieu de compile/exec du script généré.
+        Même format de retour que validate_and_execute().
+        """
+        if self.cq_ok:
+            job_id = job_id or shape_store.new_job_id()
+        else:
+            job_id = None
+        try:
+            async with scheduler.slot("geometry"):
+                out = await builders.run(app_type, analysis, quality, job_id, str(shape_store.run_dir(job_id)))
+        except builders.WORKER_ERRORS as e:
+            # Pool de workers indisponible (process tué, arguments non picklables): "infrastructure"
+            # → l'orchestrateur se replie sur l'exec du script
+            log.error(f"Builder worker failed for '{app_type}': {e}")
+            return {"success": False, "infrastructure": True,
+                    "errors": [f"Builder worker: {type(e).__name__}: {e}"]}
+        except Exception as e:
+            log.error(f"Builder '{app_type}' failed: {e}", exc_info=True)
+            return {"success": False, "errors": [f"Builder: {type(e).__name__}: {e}"]}
 
+        stl_path = out.get("stl_path")
         if stl_path and os.path.exists(stl_path):
             mesh = self._create_mesh_from_stl(stl_path)
         else:
             mesh = self._create_mesh()
 
+        cache = out.get("shape_cache") or {}
+        if cache:
+            log.info(f"♻️ Shape cache (builder worker): {cache['hits']} hits / {cache['misses']} misses, "
+                     f"{cache['entries']} entries")
+
+        job_id = out.get("job_id")
         return {
             "success": True,
             "mesh": mesh,
             "analysis": {"dimensions": {}, "features": {}, "validation": {}},
             "stl_path": stl_path,
             "step_path": None,
-        }
+            "job_id": job_id,
+            "export_formats": list(shape_store.EXPORT_FORMATS) if job_id else [],
+            "shape_cache": cache,
+        }
+
+    @staticmethod
+    def _run_output(run_dir, ext: str) -> Optional[str]:
+        """Fichier .ext écrit par le script dans <run_dir>/output/ (generated_* en priorité)"""
+        files = sorted((run_dir / "output").glob(f"*.{ext}"), key=lambda p: (p.name.startswith("generated_"), p.name))
+        return str(files[-1].absolute()) if files else None
+
+    def _store_final_shape(self, shapes: List[Any], ns: Dict[str, Any],
+                           job_id: Optional[str] = None) -> Optional[str]:
+        """
+        Sérialise la forme finale en BRep (dernière forme passée à export_stl,
+        sinon la variable `result` du code CoT). Les templates purement maillage
+        n'ont pas de BRep: pas de job_id, seul le STL est disponible.
+        """
+        if not self.cq_ok:
+            return None
+
+        import cadquery as cq
+
+        shape = shapes[-1] if shapes else ns.get("result")
+        if not isinstance(shape, (cq.Workplane, cq.Shape)):
+            return None
+
+        job_id = job_id or shape_store.new_job_id()
+        try:
+            shape_store.save_shape(job_id, shape)
+        except Exception as e:
+            log.warning(f"⚠️ Could not store BRep for re-export: {e}")
+            return None
+        return job_id
 
     def _create_mesh_from_stl(self, stl_path: str) -> Dict[str, Any]:
         try:
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+artifacts.py — Registre des artefacts par job (index SQLite: job id + hash)
+Chaque fichier produit pour un job (STL, STEP, 3MF, export Grasshopper) est
+rangé dans le workspace du job et indexé par (job_id, format) avec son SHA-256.
+L'API le sert sous /api/artifacts/{id}.{fmt}, où id est l'id du job ou le hash
+du contenu; le hash sert d'ETag (cache client / proxy, requêtes Range).
+
+Tout l'état est dans SQLite (WAL) et le système de fichiers: plusieurs workers
+uvicorn partagent le même registre, sans variable globale "dernier modèle".
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import shape_store
+
+log = logging.getLogger("cadamx.artifacts")
+
+DB_PATH = shape_store.STORE_ROOT / "jobs.db"
+
+# Formats servis: extension du fichier + media type
+ARTIFACT_FORMATS: Dict[str, Dict[str, str]] = {
+    **shape_store.EXPORT_FORMATS,
+    "grasshopper": {"ext": "json", "media_type": "application/json"},
+}
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_CHUNK = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id      TEXT NOT NULL,
+    fmt         TEXT NOT NULL,
+    sha256      TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    PRIMARY KEY (job_id, fmt)
+);
+CREATE INDEX IF NOT EXISTS artifacts_sha256 ON artifacts (sha256, fmt);
+"""
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    En-tête Range "bytes=a-b" / "bytes=a-" / "bytes=-n" → (début, fin incluse).
+    None si absent ou multi-plages (on sert alors le fichier entier);
+    ValueError si la plage n'est pas satisfiable (→ 416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[6:].strip().partition("-")
+    try:
+        if start_s == "":
+            n = int(end_s)
+            if n <= 0:
+                raise ValueError
+            start, end = max(0, size - n), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+    end = min(end, size - 1)
+    if start < 0 or start > end:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+
+def write_grasshopper(stl_path: str, target: Path, app_type: str = "model") -> None:
+    """STL binaire → JSON par tranches de 10 mm en Z (format Grasshopper), écriture atomique"""
+    z_sections: Dict[int, list] = {}
+    with open(stl_path, 'rb') as f:
+        f.read(80)  # header
+        num_triangles = struct.unpack('<I', f.read(4))[0]
+
+        for _ in range(num_triangles):
+            # STL binary format: normal (12 bytes), then 3 vertices (36 bytes), then attribute (2 bytes)
+            normal = struct.unpack('<3f', f.read(12))
+            v1 = struct.unpack('<3f', f.read(12))
+            v2 = struct.unpack('<3f', f.read(12))
+            v3 = struct.unpack('<3f', f.read(12))
+            f.read(2)  # attribute bytes
+
+            avg_z = (v1[2] + v2[2] + v3[2]) / 3
+            section_key = int(avg_z / 10) * 10  # 10mm sections
+            z_sections.setdefault(section_key, []).append({
+                "vertices": [list(v1), list(v2), list(v3)],
+                "normal": list(normal)
+            })
+
+    gh_data = {
+        "type": app_type or "model",
+        "sections": [
+            {"z_position": z, "triangles": tris[:1000]}  # Limit for performance
+            for z, tris in sorted(z_sections.items())
+        ],
+        "metadata": {
+            "total_triangles": num_triangles,
+            "section_height": 10.0
+        }
+    }
+
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(gh_data, indent=2), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+class ArtifactRegistry:
+    """Index (job_id, format) → fichier + SHA-256, partagé entre workers via SQLite"""
+
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def register(self, job_id: str, fmt: str, path: str) -> Dict[str, Any]:
+        """Indexe un fichier déjà présent dans le workspace du job"""
+        if fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unsupported artifact format: {fmt}")
+        size = os.path.getsize(path)
+        digest = file_sha256(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (job_id, fmt, sha256, path, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, fmt, digest, str(path), size, time.time()),
+            )
+        log.info(f"🗂️ Artifact {fmt} registered for job {job_id} ({size} bytes, sha256 {digest[:12]})")
+        return self.describe(job_id, fmt, digest, size)
+
+    @staticmethod
+    def describe(job_id: str, fmt: str, digest: str, size: int) -> Dict[str, Any]:
+        """Entrée publique (sans chemin serveur) renvoyée aux clients"""
+        return {"url": f"/api/artifacts/{job_id}.{fmt}", "sha256": digest, "size": size}
+
+    def lookup(self, artifact_id: str, fmt: str) -> Optional[Dict[str, Any]]:
+        """Par id de job ou par hash de contenu; None si inconnu ou fichier disparu"""
+        column = "sha256" if _HASH_RE.match(artifact_id or "") else "job_id"
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM artifacts WHERE {column} = ? AND fmt = ? ORDER BY created_at DESC LIMIT 1",
+                (artifact_id, fmt),
+            ).fetchone()
+        if row is None or not os.path.exists(row["path"]):
+            return None
+        return dict(row)
+
+    def list(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM artifacts WHERE job_id = ?", (job_id,)).fetchall()
+        return {r["fmt"]: self.describe(r["job_id"], r["fmt"], r["sha256"], r["size"]) for r in rows}
+
+    async def resolve(self, artifact_id: str, fmt: str, app_type: str = "model") -> Optional[Dict[str, Any]]:
+        """
+        Artefact indexé, sinon produit à la demande pour un id de job: STEP/STL/3MF
+        depuis le BRep stocké, Grasshopper depuis le STL du job.
+        """
+        fmt = fmt.lower()
+        if fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unsupported artifact format: {fmt}")
+        row = self.lookup(artifact_id, fmt)
+        if row is not None or _HASH_RE.match(artifact_id or ""):
+            return row
+
+        job_id = artifact_id
+        if fmt == "grasshopper":
+            stl = self.lookup(job_id, "stl")
+            if stl is None:
+                return None
+            target = shape_store.workspace(job_id) / "result_grasshopper.json"
+            import asyncio
+            await asyncio.get_running_loop().run_in_executor(
+                None, write_grasshopper, stl["path"], target, app_type
+            )
+            path = str(target)
+        elif shape_store.has_shape(job_id):
+            path = await shape_store.export(job_id, fmt)
+        else:
+            return None
+
+        self.register(job_id, fmt, path)
+        return self.lookup(job_id, fmt)
+
+
+__all__ = [
+    "ARTIFACT_FORMATS", "ArtifactRegistry", "file_sha256", "parse_range", "write_grasshopper",
+]
@@ -0,0 +1,1061 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+builders.py — Builders paramétriques importables (chemin rapide des templates)
+Chaque template de templates.py a ici son équivalent direct build_<type>(analysis):
+même paramètres, mêmes valeurs par défaut, même géométrie, mais sans rendu
+f-string ni compile/exec du script à chaque requête.
+- builders CadQuery: retournent une cq.Shape (export STL via export_stage, BRep stocké)
+- builders maillage: retournent une soupe de triangles (N, 3, 3) float32 (mesh_ops)
+
+Source unique de la géométrie: le script affiché des templates est dérivé d'ici
+par script() (en-tête de paramètres + source du builder), il n'existe pas de
+seconde copie à maintenir. run_builder() est le point d'entrée exécuté dans un
+process worker par le ValidatorAgent. Les workers sont
+persistants: les primitives répétées (struts, nœuds, cellules, lames...) passent
+par shape_cache et restent en cache d'une requête à l'autre.
+"""
+
+import inspect
+import logging
+import math
+import os
+import pickle
+import pprint
+import threading
+import types
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import mesh_ops as mo
+import shape_cache as sc
+
+log = logging.getLogger("cadamx.builders")
+
+Edge = Tuple[Tuple[float, float, float], Tuple[float, float, float]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Erreurs du pool de workers (et non du builder): l'appelant peut se replier sur l'exec
+WORKER_ERRORS = (BrokenExecutor, pickle.PicklingError)
+
+
+# ========== SPLINT ==========
+
+def build_splint(analysis: Dict[str, Any]) -> np.ndarray:
+    """Orthèse: coque paramétrique (u, v) + passants de sangle (maillage)"""
+    sections = analysis.get('sections', []) or [{
+        'name': 'main', 'length': 270.0, 'width_start': 70.0, 'width_end': 60.0, 'angle': 0.0
+    }]
+    features = analysis.get('features', {})
+    curvatures = analysis.get('curvatures', {})
+    thickness = analysis.get('thickness', 3.5)
+
+    total_length = analysis.get('total_length_explicit')
+    if total_length is None:
+        total_length = sum(s.get('length', 100) for s in sections)
+
+    v_start, v_end, r_start, r_end, curve = [], [], [], [], []
+    cumulative = 0.0
+    for idx, s in enumerate(sections):
+        length = s.get('length', 100.0)
+        name = s.get('name', f'section{idx}')
+        v_start.append(cumulative / total_length)
+        v_end.append((cumulative + length) / total_length)
+        r_start.append(s.get('width_start', s.get('width', 70.0)) / 2)
+        r_end.append(s.get('width_end', s.get('width', 70.0)) / 2)
+        curve.append(curvatures.get(name, 5.0 if name == 'forearm' else 8.0 if name == 'palm' else 3.0))
+        cumulative += length
+    v_start, v_end = np.array(v_start), np.array(v_end)
+    r_start, r_end, curve = np.array(r_start), np.array(r_end), np.array(curve)
+
+    slots = features.get('slots')
+    if slots:
+        strap_pos = [p / total_length for p in slots.get('positions', [50, 150, 220])]
+        strap_width = slots.get('width', 25.0)
+        strap_length = slots.get('length', 20.0)
+    else:
+        strap_pos, strap_width, strap_length = [0.18, 0.55, 0.82], 25.0, 20.0
+    strap_height = 8.0
+
+    arc_rad = np.deg2rad(220.0)
+    nu, nv = 120, 180
+    u_values = np.linspace(-arc_rad/2, arc_rad/2, nu+1)
+    v = np.linspace(0.0, 1.0, nv+1)[:, None]
+    u_norm = (2.0 * u_values / arc_rad)[None, :]
+
+    # Profil de rayon: section contenant v (searchsorted), sinon la dernière
+    idx = np.searchsorted(v_end, v, side="left")
+    k = np.minimum(idx, len(sections) - 1)
+    inside = (idx < len(sections)) & (v_start[k] <= v)
+    v_local = (v - v_start[k]) / np.maximum(v_end[k] - v_start[k], 0.001)
+    r = np.where(inside, (1.0 - v_local) * r_start[k] + v_local * r_end[k], r_end[-1])
+    c = np.where(inside, curve[k], curve[-1])
+    r_in = np.broadcast_to(r, np.broadcast(v, u_norm).shape).copy()
+    active = (c > 0) & (np.abs(u_norm) > 0.01)
+    r_in -= np.where(active & (u_norm < 0), c * np.maximum(-u_norm, 0.0) ** 1.5 * (1 - v * 0.3), 0.0)
+    r_in += np.where(active & (u_norm > 0), c * 0.15 * u_norm ** 2, 0.0)
+    r_out = r_in + thickness
+
+    cos_u, sin_u = np.cos(u_values)[None, :], np.sin(u_values)[None, :]
+    z = np.broadcast_to(v * total_length, r_in.shape)
+    inner = np.stack([r_in * cos_u, r_in * sin_u, z], axis=-1)
+    outer = np.stack([r_out * cos_u, r_out * sin_u, z], axis=-1)
+
+    # Coque: faces intérieure / extérieure, bords latéraux, bouchons
+    n = (nv+1) * (nu+1)
+    verts = np.concatenate([inner.reshape(-1, 3), outer.reshape(-1, 3)])
+    idx_in = np.arange(n).reshape(nv+1, nu+1)
+    idx_out = idx_in + n
+    faces = [mo.grid_faces(nv, nu), mo.grid_faces(nv, nu, offset=n)]
+    for j in (0, nu):
+        faces.append(mo.quad_faces(idx_in[:-1, j], idx_out[:-1, j], idx_out[1:, j], idx_in[1:, j]))
+    for i in (0, nv):
+        faces.append(mo.quad_faces(idx_in[i, :-1], idx_in[i, 1:], idx_out[i, 1:], idx_out[i, :-1]))
+    shell = verts[np.concatenate(faces)].astype(np.float32)
+
+    centers, frames = [], []
+    for v_pos in strap_pos:
+        i = min(int(v_pos * nv), nv - 1)
+        for j in (0, nu):
+            p_in, p_out = inner[i, j], outer[i, j]
+            tangent = inner[min(i+1, nv), j] - inner[max(i-1, 0), j]
+            tangent = tangent / (np.linalg.norm(tangent) + 1e-6)
+            normal = (p_out - p_in) / (np.linalg.norm(p_out - p_in) + 1e-6)
+            perp = np.cross(tangent, normal)
+            perp = perp / (np.linalg.norm(perp) + 1e-6)
+            centers.append((p_in + p_out) / 2)
+            frames.append(np.stack([tangent, perp, normal]))
+    if not centers:
+        return shell
+    straps = mo.oriented_boxes(centers, frames, (strap_length/2, strap_width/2, strap_height/2))
+    return mo.concat(shell, straps)
+
+
+# ========== ORIGAMI ==========
+
+def build_origami(analysis: Dict[str, Any]) -> np.ndarray:
+    """Cylindre Miura: champ de hauteur sur la grille (u, v) + bouchons en éventail"""
+    params = analysis.get('parameters', {})
+    r0 = params.get('outer_diameter', 40.0) / 2.0
+    height = params.get('height', 100.0)
+    relief = params.get('relief', 1.8)
+    n_cols = params.get('n_cols', 18)
+    n_rows = params.get('n_rows', 14)
+    twist = params.get('twist', 0.5)
+    subdiv = params.get('subdiv', 2)
+    seg_u, seg_v = n_cols * subdiv, n_rows * subdiv
+
+    # arange/SEG et non linspace: les plis tombent exactement sur les nœuds
+    u = (np.arange(seg_u + 1) / seg_u)[None, :]
+    v = (np.arange(seg_v + 1) / seg_v)[:, None]
+    cu = u * n_cols - (np.floor(v * n_rows).astype(int) % 2) * twist
+    cv = v * n_rows
+    iu = np.floor(cu).astype(int) % n_cols
+    iv = np.floor(cv).astype(int)
+    s = (cu - np.floor(cu)) + (cv - np.floor(cv))
+    h = (np.where(s < 1.0, s, 2.0 - s) - 0.5) * 2.0
+    h = np.where((iu + iv) % 2 == 0, 1.0, -1.0) * h
+
+    theta = 2.0 * math.pi * u
+    r = r0 + h * relief
+    z = np.broadcast_to(height * v, r.shape)
+    outer = np.stack([r * np.cos(theta), r * np.sin(theta), z], -1)
+
+    g = np.arange((seg_v + 1) * (seg_u + 1)).reshape(seg_v + 1, seg_u + 1)
+    c_bottom, c_top = g.size, g.size + 1
+    verts = np.concatenate([outer.reshape(-1, 3), [(0.0, 0.0, 0.0), (0.0, 0.0, height)]])
+    faces = np.concatenate([
+        mo.quad_faces(g[:-1, :-1], g[1:, :-1], g[1:, 1:], g[:-1, 1:]),
+        np.stack([g[0, 1:], g[0, :-1], np.full(seg_u, c_bottom)], -1),
+        np.stack([g[-1, :-1], g[-1, 1:], np.full(seg_u, c_top)], -1),
+    ])
+    return verts[faces].astype(np.float32)
+
+
+# ========== LION ==========
+
+# Gaussiennes fixes (cx, cy, cz, sx, sy, sz, w) en unités SCALE=1, dans l'ordre du template
+_LION_BLOBS = [
+    # TORSO
+    (35, 0, 42, 26, 14, 13, 0.58), (5, 0, 44, 31, 15, 14, 0.60), (-30, 0, 44, 28, 14, 15, 0.58),
+    (-55, 0, 44, 22, 13, 14, 0.54), (20, 0, 43, 21, 13, 12, 0.22), (-15, 0, 44, 24, 14, 13, 0.22),
+    (5, 0, 30, 46, 19, 10, -0.20),
+    # NECK
+    (55, 0, 48, 15, 10, 12, 0.50), (42, 0, 46, 16, 11, 14, 0.55),
+    # HEAD
+    (66, 0, 58, 16, 12, 14, 1.02), (68, 10, 55, 10, 7, 10, 0.52), (68, -10, 55, 10, 7, 10, 0.52),
+    (76, 0, 63, 10, 7, 6, 0.22),
+    # SNOUT
+    (80, 0, 53, 13, 8.5, 9.0, 0.86), (90, 0, 50, 9, 5.8, 6.5, 0.74), (96, 0, 49, 6.8, 4.6, 5.4, 0.50),
+    (90, 8.0, 50, 10, 4.0, 7.0, -0.16), (90, -8.0, 50, 10, 4.0, 7.0, -0.16),
+    (95, 0, 54, 7.0, 4.5, 3.2, -0.18),
+    # NOSE
+    (95, 0, 52.5, 4.8, 3.2, 3.0, 0.26), (98, 2.2, 50.8, 2.2, 1.2, 1.2, -0.16),
+    (98, -2.2, 50.8, 2.2, 1.2, 1.2, -0.16),
+    # JAW
+    (84, 0, 43.5, 14, 7.5, 5.2, 0.54), (78, 0, 42.5, 15, 9.0, 6.0, 0.30), (92, 0, 46.0, 7.0, 2.4, 1.8, -0.22),
+    # EARS
+    (68, 11.5, 70, 5.5, 3.8, 6.5, 0.42), (68, -11.5, 70, 5.5, 3.8, 6.5, 0.42),
+    (66, 12.5, 75, 3.8, 2.8, 4.8, 0.24), (66, -12.5, 75, 3.8, 2.8, 4.8, 0.24),
+    # EYE SOCKETS
+    (82, 8.0, 58, 2.9, 2.0, 2.0, -0.25), (82, -8.0, 58, 2.9, 2.0, 2.0, -0.25),
+]
+
+
+def _lion_blobs(rng: np.random.Generator) -> List[Tuple[float, ...]]:
+    """Liste complète des gaussiennes (fixes + pattes, queue, crinière procédurales)"""
+    blobs = list(_LION_BLOBS)
+
+    # LEGS
+    for cx, cy in [(40, 13), (40, -13), (-38, 13), (-38, -13)]:
+        sgn = 1 if cx > 0 else -1
+        blobs += [(cx, cy, 40, 9.5, 6.8, 14, 0.54), (cx + 2*sgn, cy, 30, 8.5, 6.2, 11, 0.58),
+                  (cx + 4*sgn, cy, 22, 7.8, 6.0, 8, 0.60), (cx + 6*sgn, cy, 16, 7.0, 6.5, 3.5, 0.64)]
+    blobs += [(40, 0, 26, 10, 6, 13, -0.16), (-38, 0, 26, 11, 6, 14, -0.16)]
+
+    # TAIL
+    tail_segments = [(-68, 0, 48), (-82, 0, 52), (-95, 0, 60), (-105, 0, 70), (-110, 0, 80), (-108, 0, 88)]
+    tail_sizes = [(9.0, 5.8, 5.8), (8.5, 5.5, 5.5), (8.0, 5.2, 5.2), (7.5, 4.9, 4.9), (7.0, 4.6, 4.6),
+                  (6.5, 4.4, 4.4)]
+    blobs += [c + s + (0.36,) for c, s in zip(tail_segments, tail_sizes)]
+    blobs += [(-62, 0, 46, 11, 8.2, 8.2, 0.18), (-106, 0, 91, 7.2, 6.2, 6.2, 0.33),
+              (-102, 0, 89, 5.8, 5.0, 5.0, 0.18)]
+
+    # MANE
+    blobs += [(77, 0, 56, 22, 20, 20, 0.26), (68, 0, 58, 26, 22, 18, 0.23), (87, 0, 54, 18, 18, 16, 0.24)]
+    blobs += [(90 - 40*t, 0, 80 - 12*t, 11, 4.8, 6.8, 0.09) for t in np.linspace(0, 1, 14)]
+    blobs += [(82, 0, 70, 18, 16, 14, 0.20), (75, 0, 74, 16, 14, 12, 0.17),
+              (85, 9, 68, 13, 9, 11, 0.15), (85, -9, 68, 13, 9, 11, 0.15)]
+
+    # Mane strands (même séquence aléatoire que le template)
+    strand_base = np.array([84.0, 0.0, 64.0], dtype=np.float32)
+    for _ in range(360):
+        xx = -(10.0 + 46.0 * rng.random())
+        yy = (36.0 * (2*rng.random() - 1)) * 0.72
+        zz_base = -(5.0 + 24.0 * rng.random())
+        zz = abs(zz_base) * 0.6 if rng.random() < 0.32 else zz_base
+        p = strand_base + np.array([xx, yy, zz], dtype=np.float32)
+        if not (34.0 < p[2] < 94.0) or p[0] > 100.0:
+            continue
+        side_mult = 1.0 + (0.35 if p[1] > 0 else 0.0)
+        sx = 15.5 + 6.0 * rng.random()
+        sy = 3.5 + 1.2 * rng.random()
+        sz = 6.0 + 1.9 * rng.random()
+        blobs.append((float(p[0]), float(p[1]), float(p[2]), sx, sy, sz, 0.11 * side_mult))
+    return blobs
+
+
+def build_lion(analysis: Dict[str, Any]) -> np.ndarray:
+    """Lion procédural: somme de gaussiennes + marching cubes, plus grande composante"""
+    import trimesh
+    import implicit_geometry as ig
+
+    params = analysis.get('parameters', {})
+    scale = params.get('scale', 1.0)
+    n = params.get('quality', 200)
+    iso = params.get('iso_level', 0.36)
+
+    xmin, xmax = -120*scale, 150*scale
+    ymin, ymax = -85*scale, 85*scale
+    zmin, zmax = 0, 120*scale
+    xs = np.linspace(xmin, xmax, n, dtype=np.float32)
+    ys = np.linspace(ymin, ymax, n, dtype=np.float32)
+    zs = np.linspace(zmin, zmax, n, dtype=np.float32)
+    F = np.zeros((n, n, n), dtype=np.float32)
+
+    def window(axis, c, s):
+        i0 = int(np.searchsorted(axis, c - 3.0*s, side="left"))
+        i1 = int(np.searchsorted(axis, c + 3.0*s, side="right"))
+        d = (axis[i0:i1] - c) / s
+        return i0, i1, np.exp(-d*d)
+
+    for cx, cy, cz, sx, sy, sz, w in _lion_blobs(np.random.default_rng(808)):
+        i0, i1, ex = window(xs, cx*scale, sx*scale)
+        j0, j1, ey = window(ys, cy*scale, sy*scale)
+        k0, k1, ez = window(zs, cz*scale, sz*scale)
+        if i0 >= i1 or j0 >= j1 or k0 >= k1:
+            continue
+        F[i0:i1, j0:j1, k0:k1] += (w * ex)[:, None, None] * (ey[:, None] * ez[None, :])[None, :, :]
+
+    verts, faces = ig.polygonize(F, (xmin, ymin, zmin), (xs[1]-xs[0], ys[1]-ys[0], zs[1]-zs[0]), level=iso)
+    mesh = trimesh.Trimesh(vertices=verts, faces=faces, process=True)
+    # API trimesh ≥ 4 (update_faces) avec repli sur les anciennes méthodes
+    if hasattr(mesh, "nondegenerate_faces"):
+        mesh.update_faces(mesh.nondegenerate_faces())
+        mesh.update_faces(mesh.unique_faces())
+    else:
+        mesh.remove_degenerate_faces()
+        mesh.remove_duplicate_faces()
+    mesh.remove_unreferenced_vertices()
+    mesh.process(validate=True)
+    mesh.apply_translation([0, 0, -mesh.bounds[0][2]])
+
+    parts = list(mesh.split(only_watertight=False))
+    if len(parts) > 1:
+        def score(m):
+            v = float(m.volume)
+            return v if np.isfinite(v) and v > 0 else float(len(m.faces))
+        mesh = max(parts, key=score)
+    return mesh.triangles.astype(np.float32)
+
+
+# ========== GRIPPER / FACADES (maillage) ==========
+
+def build_gripper(analysis: Dict[str, Any]) -> np.ndarray:
+    """Gripper: moyeu cylindrique + N bras instanciés par rotation autour de z"""
+    params = analysis.get('parameters', {})
+    arm_l = params.get('arm_length', 25.0)
+    arm_w = params.get('arm_width', 8.0)
+    center_d = params.get('center_diameter', 6.0)
+    thick = params.get('thickness', 1.5)
+    n_arms = params.get('n_arms', 4)
+
+    hub = mo.cylinders([(0, 0, 0)], center_d/2, thick, segments=16)
+    arm = mo.boxes([(center_d/2 + arm_l/2, 0, thick/2)], (arm_l, arm_w, thick))
+    arms = mo.instances(arm, mo.rotation_z(np.arange(n_arms) * 360.0 / n_arms))
+    return mo.concat(hub, arms)
+
+
+def build_facade_pyramid(analysis: Dict[str, Any]) -> np.ndarray:
+    """Façade hexagonale: cadre, 6 triangles inclinés, 6 barres radiales"""
+    params = analysis.get('parameters', {})
+    hex_radius = params.get('hex_radius', 60.0)
+    w_frame = params.get('w_frame', 8.0)
+    h_frame = params.get('h_frame', 10.0)
+    tri_height = params.get('tri_height', 55.0)
+    tri_t = params.get('tri_thickness', 2.4)
+    w_bar = params.get('w_bar', 8.0)
+    h_bar = 10.0
+
+    frame = mo.concat(
+        mo.extrude_polygon(mo.regular_polygon(hex_radius, 6), h_frame, caps=False),
+        mo.extrude_polygon(mo.regular_polygon(hex_radius - w_frame, 6), h_frame, caps=False),
+    )
+
+    ri = hex_radius - w_frame
+    base = 2 * ri * math.sin(math.pi / 6)
+    tri = mo.extrude([(base/2, 0, 0), (-base/2, 0, 0), (0, 0, tri_height)], (0, tri_t, 0))
+    angles = np.arange(6) * 60.0 + 30.0
+    offsets = np.stack([
+        (ri - tri_t/2) * np.cos(np.radians(angles)),
+        (ri - tri_t/2) * np.sin(np.radians(angles)),
+        np.full(6, h_frame),
+    ], -1)
+    triangles = mo.instances(tri, mo.rotation_z(angles - 90), offsets)
+
+    bar = mo.boxes([(ri/2, 0, h_bar/2)], (ri, w_bar, h_bar))
+    bars = mo.instances(bar, mo.rotation_z(np.arange(6) * 60.0))
+    return mo.concat(frame, triangles, bars)
+
+
+def build_facade_parametric(analysis: Dict[str, Any]) -> np.ndarray:
+    """Façade paramétrique: un panneau ondulé instancié sur toute la grille"""
+    params = analysis.get('parameters', {})
+    width = params.get('width', 20000.0)
+    height = params.get('height', 10000.0)
+    depth = params.get('depth', 500.0)
+    size = params.get('element_size', 200.0)
+    seg = 10
+
+    j = np.arange(seg + 1)
+    X = np.broadcast_to(j * size / seg, (seg + 1, seg + 1))
+    Y = np.broadcast_to((j * size / seg)[:, None], (seg + 1, seg + 1))
+    Z = np.broadcast_to(depth * np.sin(3 * math.pi * j / seg), (seg + 1, seg + 1))
+    panel = mo.grid_surface(np.stack([X, Y, Z], -1))
+
+    nx = max(1, int(width / size))
+    ny = max(1, int(height / size))
+    gy, gx = np.mgrid[0:ny, 0:nx]
+    offsets = np.stack([gx.ravel() * size, gy.ravel() * size, np.zeros(gx.size)], -1)
+    return mo.instances(panel, np.eye(3)[None], offsets)
+
+
+# ========== STENT (CadQuery) ==========
+
+def build_stent(analysis: Dict[str, Any]):
+    """Stent à cellules diamant: anneaux en zigzag + ponts alternés"""
+    import cadquery as cq
+
+    params = analysis.get('parameters', {})
+    R = params.get('outer_radius', 8.0)
+    n_peaks = params.get('n_peaks', 8)
+    n_rings = params.get('n_rings', 6)
+    amplitude = params.get('amplitude', 3.0)
+    ring_spacing = params.get('ring_spacing', 6.0)
+    width = params.get('strut_width', 0.6)
+    depth = params.get('strut_depth', 0.4)
+
+    def strut(p1, p2):
+        dx, dy, dz = p2[0] - p1[0], p2[1] - p1[1], p2[2] - p1[2]
+        length = math.sqrt(dx*dx + dy*dy + dz*dz)
+        if length < 0.001:
+            return None
+        angle_z = math.degrees(math.atan2(dy, dx))
+        angle_y = math.degrees(math.atan2(dz, math.sqrt(dx*dx + dy*dy)))
+        # Tous les struts d'un anneau (et tous les ponts) ont la même longueur
+        box = sc.placed(
+            "stent_strut", (length, width, depth),
+            lambda: cq.Workplane("XY").rect(length, width).extrude(depth).val(),
+            sc.location(((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2, (p1[2] + p2[2]) / 2),
+                        [((0, 1, 0), -angle_y), ((0, 0, 1), angle_z)]),
+        )
+        return cq.Workplane("XY").add(box)
+
+    def union(acc, s):
+        if s is None:
+            return acc
+        return s if acc is None else acc.union(s)
+
+    step = 360.0 / n_peaks
+    z_start = -(n_rings - 1) * ring_spacing / 2
+    stent, rings = None, []
+    for ring_idx in range(n_rings):
+        z = z_start + ring_idx * ring_spacing
+        phase = 0 if ring_idx % 2 == 0 else step / 2
+        peaks, valleys = [], []
+        for i in range(n_peaks):
+            a_peak = i * step + phase
+            a_valley = a_peak + step / 2
+            peaks.append((R * math.cos(math.radians(a_peak)), R * math.sin(math.radians(a_peak)),
+                          z + amplitude / 2))
+            valleys.append((R * math.cos(math.radians(a_valley)), R * math.sin(math.radians(a_valley)),
+                            z - amplitude / 2))
+        rings.append((peaks, valleys))
+
+        ring = None
+        for i in range(n_peaks):
+            ring = union(ring, strut(peaks[i], valleys[i]))
+            ring = union(ring, strut(valleys[i], peaks[(i + 1) % n_peaks]))
+        stent = union(stent, ring)
+
+    bridges = None
+    for ring_idx in range(n_rings - 1):
+        (peaks1, valleys1), (peaks2, valleys2) = rings[ring_idx], rings[ring_idx + 1]
+        for i in range(n_peaks):
+            if ring_idx % 2 == 0:
+                bridges = union(bridges, strut(peaks1[i], valleys2[i]))
+            else:
+                bridges = union(bridges, strut(valleys1[i], peaks2[i]))
+    stent = union(stent, bridges)
+    return stent.val()
+
+
+# ========== HEATSINK (CadQuery) ==========
+
+def _taper_bar(W, H, T, Tb, Lb, Ang, ov, inset, taper_start, tip_ratio, tip_min, side=+1):
+    import cadquery as cq
+
+    y_bar = side*(W/2 - Tb/2) - side*inset
+    x0 = T - ov
+    L_const = taper_start if taper_start is not None else 0.0
+    L_const = max(0.0, min(L_const, Lb-0.1))
+    tip_t = max(tip_min, Tb*max(0.05, tip_ratio))
+
+    def make():
+        bar = (cq.Workplane("YZ")
+               .workplane(offset=x0).center(y_bar, 0).rect(Tb, H+10)
+               .workplane(offset=L_const).center(0, 0).rect(Tb, H+10)
+               .workplane(offset=Lb).center(0, 0).rect(tip_t, H+10)
+               .loft(combine=True, ruled=True))
+        return bar.rotate((x0, y_bar, 0), (x0, y_bar, 1), -side*abs(Ang)).val()
+
+    # Loft déjà en place: la clé porte toute la pose, le hit est une copie identité
+    bar = sc.placed("taper_bar", (x0, y_bar, Tb, H, L_const, Lb, tip_t, side*abs(Ang)), make)
+    return cq.Workplane("YZ").add(bar), y_bar, x0
+
+
+def build_heatsink(analysis: Dict[str, Any]):
+    """Dissipateur: plaque percée, tuyau rectangulaire rogné, deux barres effilées, morsures"""
+    import cadquery as cq
+
+    params = analysis.get('parameters', {})
+    W, H, T = params.get('plate_w', 40.0), params.get('plate_h', 40.0), params.get('plate_t', 3.0)
+    R, D0 = 2.0, 34.0
+    P, Dh = params.get('hole_pitch', 32.0), params.get('hole_d', 3.3)
+    Do, Lt = params.get('tube_od', 42.0), params.get('tube_len', 10.0)
+    Lb, Ang = params.get('bar_len', 22.0), params.get('bar_angle', 20.0)
+    ov, clip_extra, inset = 0.4, 4.0, 0.0
+    tip_ratio, tip_min = 0.15, 0.2
+    cut_h_bot, cut_h_top, clr = 6.0, 6.0, 0.05
+
+    Tb = 0.5*(Do - D0)
+
+    plate = cq.Workplane("YZ").rect(W, H).extrude(T)
+    if R > 0:
+        plate = plate.edges("|X").fillet(R)
+    plate = plate.cut(cq.Workplane("YZ").circle(D0/2).extrude(T))
+    pts = [(+P/2, +P/2), (+P/2, -P/2), (-P/2, +P/2), (-P/2, -P/2)]
+    plate = plate.faces(">X").workplane().pushPoints(pts).hole(Dh)
+
+    tube_outer = cq.Workplane("YZ").workplane(offset=T-ov).rect(W + 2.0, Do).extrude(Lt+ov)
+    tube_inner = cq.Workplane("YZ").workplane(offset=T-ov).circle(D0/2).extrude(Lt+ov)
+    tube = tube_outer.cut(tube_inner)
+
+    barR, yR, x0R = _taper_bar(W, H, T, Tb, Lb, Ang, ov, inset, Lt, tip_ratio, tip_min, +1)
+    barL, yL, x0L = _taper_bar(W, H, T, Tb, Lb, Ang, ov, inset, Lt, tip_ratio, tip_min, -1)
+
+    Wcut, Hcut = 2*W, H+20
+    Lcut = max(Lt, Lb)+ov+2
+    cutR = (cq.Workplane("YZ").workplane(offset=x0R)
+            .center(yR + Tb/2 + Wcut/2, 0).rect(Wcut, Hcut).extrude(Lcut)
+            .rotate((x0R, yR, 0), (x0R, yR, 1), -abs(Ang)))
+    cutL = (cq.Workplane("YZ").workplane(offset=x0L)
+            .center(yL - Tb/2 - Wcut/2, 0).rect(Wcut, Hcut).extrude(Lcut)
+            .rotate((x0L, yL, 0), (x0L, yL, 1), +abs(Ang)))
+    tube = tube.cut(cutR).cut(cutL)
+
+    clip_len = max(Lt, Lb)+ov+clip_extra
+    clip = cq.Workplane("YZ").workplane(offset=T-ov).rect(W, H).extrude(clip_len)
+    if R > 0:
+        clip = clip.edges("|X").fillet(R)
+    asm = plate.union(tube.intersect(clip)).union(barR.intersect(clip)).union(barL.intersect(clip))
+
+    x_start = T - ov
+    cut_len = clip_len + 2.0
+    for cut_h, zc, yc in ((cut_h_bot, -H/2 + cut_h_bot/2, -P/2), (cut_h_top, +H/2 - cut_h_top/2, +P/2)):
+        if cut_h <= 0:
+            continue
+        band = (cq.Workplane("YZ").workplane(offset=x_start)
+                .center(0, zc).rect(W+20, cut_h).extrude(cut_len))
+        for y in (+P/2, -P/2):
+            cyl = (cq.Workplane("YZ").workplane(offset=x_start)
+                   .center(y, yc).circle(Dh/2 + clr).extrude(cut_len))
+            asm = asm.cut(cyl.intersect(band))
+    return asm.val()
+
+
+# ========== FACADES CadQuery ==========
+
+def _louver_field(W, H, angle_deg, pitch, slat_w, slat_d, end_r, z0):
+    import cadquery as cq
+
+    theta = math.radians(angle_deg)
+    L = math.hypot(W, H) * 2.1
+    nx, ny = math.cos(theta + math.pi/2.0), math.sin(theta + math.pi/2.0)
+    n_slats = int(math.ceil((W + H) / pitch)) + 4
+
+    if end_r > 0:
+        slot_w = min(2.0*end_r, slat_w)
+        key = ("slot", max(L, slot_w + 1.0), slot_w, slat_d)
+        make = lambda: cq.Workplane("XY").slot2D(key[1], slot_w).extrude(slat_d).val()
+    else:
+        key = ("rect", L, slat_w, slat_d)
+        make = lambda: cq.Workplane("XY").rect(L, slat_w).extrude(slat_d).val()
+
+    # Lames centrées sur le centre du triangle: une lame en cache, placée n_slats fois
+    field = None
+    start = -(n_slats // 2)
+    for i in range(start, start + n_slats):
+        d = i * pitch
+        loc = sc.location((W / 3.0 + d*nx, H / 3.0 + d*ny, z0), [((0, 0, 1), math.degrees(theta))])
+        slat = cq.Workplane("XY").add(sc.placed("louver_slat", key, make, loc))
+        field = slat if field is None else field.union(slat)
+    return field
+
+
+def build_louvre_wall(analysis: Dict[str, Any]):
+    """Mur à lames: un ou deux champs de lames inclinées, intersectés par le prisme triangulaire"""
+    import cadquery as cq
+
+    params = analysis.get('parameters', {})
+    W, H, T = params.get('width', 280.0), params.get('height', 260.0), params.get('thickness', 40.0)
+    rf = params.get('corner_fillet', 3.0)
+    pitch = params.get('pitch', 12.0)
+    sw, sd, er = params.get('slat_width', 8.0), params.get('slat_depth', 12.0), params.get('end_radius', 3.0)
+    layer2 = params.get('layer2_enabled', True)
+
+    tri = cq.Workplane("XY").polyline([(0, 0), (0, H), (W, 0)]).close().extrude(T)
+    if rf and rf > 0:
+        tri = tri.edges("|Z").fillet(rf)
+
+    if params.get('full_depth', False):
+        sd1 = sd2 = T
+        z1 = z2 = 0.0
+    else:
+        sd1 = sd2 = sd
+        z1 = params.get('layer1_z', 6.0)
+        z2 = z1 if params.get('same_layer', False) else params.get('layer2_z_offset', 0.0)
+
+    f1 = _louver_field(W, H, params.get('angle_deg', 35.0), pitch, sw, sd1, er, z1)
+    if layer2:
+        f2 = _louver_field(W, H, params.get('layer2_angle', 55.0), pitch, sw, sd2, er, z2)
+        if params.get('boolean_mode', 'union') == 'union':
+            model = f1.union(f2).intersect(tri)
+        else:
+            model = f1.intersect(f2).intersect(tri)
+    else:
+        model = f1.intersect(tri)
+    return model.val()
+
+
+def build_honeycomb(analysis: Dict[str, Any]):
+    """Panneau alvéolaire: cellules hexagonales (anneaux) en quinconce, intersectées par le panneau"""
+    import cadquery as cq
+
+    params = analysis.get('parameters', {})
+    W, H, T = params.get('panel_width', 300.0), params.get('panel_height', 380.0), params.get('panel_thickness', 40.0)
+    a = params.get('cell_size', 12.0)
+    wall = params.get('wall_thickness', 2.2)
+    corner_fillet = params.get('corner_fillet', 0.0)
+    depth = T if params.get('full_depth', False) else params.get('cell_depth', 40.0)
+
+    def make_cell():
+        s = (math.sqrt(3)/2.0) * a
+        outer = (cq.Workplane("XY")
+                 .polyline([(a, 0.0), (a/2.0, s), (-a/2.0, s), (-a, 0.0), (-a/2.0, -s), (a/2.0, -s)]).close())
+        inner = outer.offset2D(-wall)
+        return (outer.toPending().consolidateWires().add(inner.wires()).toPending().consolidateWires()
+                .extrude(depth).val())
+
+    dx, dy = 1.5 * a, math.sqrt(3.0) * a
+    half_w, half_h = a, dy/2.0
+    nx = int(math.ceil((W + 2*half_w) / dx)) + 2
+    ny = int(math.ceil((H + 2*half_h) / dy)) + 2
+
+    honey = None
+    for i in range(nx):
+        cx = i*dx
+        col_off = (dy/2.0) if (i % 2) else 0.0
+        for j in range(ny):
+            cy = j*dy + col_off
+            if not (half_w <= cx <= (W - half_w) and half_h <= cy <= (H - half_h)):
+                continue
+            c = cq.Workplane("XY").add(sc.placed("hex_cell", (a, wall, depth), make_cell, sc.location((cx, cy, 0.0))))
+            honey = c if honey is None else honey.union(c)
+    if honey is None:
+        honey = cq.Workplane("XY")
+
+    panel = cq.Workplane("XY").rect(W, H, centered=False).extrude(T)
+    if corner_fillet > 0:
+        panel = panel.edges("|Z").fillet(corner_fillet)
+    return honey.intersect(panel).val()
+
+
+def build_sine_wave_fins(analysis: Dict[str, Any]):
+    """Façade à ailettes: ailettes lissées (loft) suivant une sinusoïde, sur une semelle"""
+    import cadquery as cq
+
+    params = analysis.get('parameters', {})
+    L, H = params.get('panel_length', 420.0), params.get('panel_height', 180.0)
+    depth = params.get('depth', 140.0)
+    n_fins = params.get('n_fins', 34)
+    fin_t = params.get('fin_thickness', 3.0)
+    amp = params.get('amplitude', 40.0)
+    period_ratio = params.get('period_ratio', 0.9)
+    base_thick = params.get('base_thickness', 6.0)
+
+    base = cq.Workplane("XY").rect(L, H).extrude(base_thick)
+    freq = 2.0 * math.pi / (L * period_ratio)
+
+    ribs = cq.Workplane("XY")
+    for i in range(n_fins):
+        x = -L/2 + i*(L/(n_fins-1))
+        off0 = amp * math.sin(freq*x)
+        off1 = amp * math.sin(freq*(x + 0.25*L))
+        fin = (cq.Workplane("XY")
+               .center(x, off0).rect(fin_t, H)
+               .workplane(offset=depth).center(0, off1-off0).rect(fin_t, H)
+               .loft(ruled=True, combine=True))
+        ribs = ribs.union(fin)
+
+    clip = cq.Workplane("XY").rect(L, H).extrude(depth + base_thick + 6.0)
+    return base.union(ribs.intersect(clip)).val()
+
+
+# ========== LATTICES ==========
+
+_EPS = 1e-6
+_SCALE_KEY = 1_000_000
+
+
+def _pkey(p) -> Tuple[int, int, int]:
+    return (int(round(p[0] * _SCALE_KEY)), int(round(p[1] * _SCALE_KEY)), int(round(p[2] * _SCALE_KEY)))
+
+
+class _EdgeSet:
+    """Arêtes dédupliquées (clés entières), restreintes au bloc [0, B]³"""
+
+    def __init__(self, block: Tuple[float, float, float]):
+        self.block = block
+        self.keys = set()
+
+    def inside(self, p) -> bool:
+        bx, by, bz = self.block
+        return (-_EPS <= p[0] <= bx + _EPS) and (-_EPS <= p[1] <= by + _EPS) and (-_EPS <= p[2] <= bz + _EPS)
+
+    def add(self, p, q):
+        a, b = _pkey(p), _pkey(q)
+        self.keys.add((a, b) if a <= b else (b, a))
+
+    def edges(self) -> List[Edge]:
+        s = _SCALE_KEY
+        return [((a[0]/s, a[1]/s, a[2]/s), (b[0]/s, b[1]/s, b[2]/s)) for a, b in self.keys]
+
+
+def _cell_face_map(ox, oy, oz, A):
+    """Centres des 6 faces d'une cellule et leurs 4 coins"""
+    c000 = (ox, oy, oz); c100 = (ox+A, oy, oz); c010 = (ox, oy+A, oz); c110 = (ox+A, oy+A, oz)
+    c001 = (ox, oy, oz+A); c101 = (ox+A, oy, oz+A); c011 = (ox, oy+A, oz+A); c111 = (ox+A, oy+A, oz+A)
+    return [
+        ((ox, oy+A/2, oz+A/2), [c000, c010, c001, c011]), ((ox+A, oy+A/2, oz+A/2), [c100, c110, c101, c111]),
+        ((ox+A/2, oy, oz+A/2), [c000, c100, c001, c101]), ((ox+A/2, oy+A, oz+A/2), [c010, c110, c011, c111]),
+        ((ox+A/2, oy+A/2, oz), [c000, c100, c010, c110]), ((ox+A/2, oy+A/2, oz+A), [c001, c101, c011, c111]),
+    ]
+
+
+def _cells(es: _EdgeSet, A: float, extra: int = 0):
+    n = [int(b / A) + extra for b in es.block]
+    for i in range(n[0]):
+        for j in range(n[1]):
+            for k in range(n[2]):
+                yield i*A, j*A, k*A
+
+
+def lattice_edges_sc(block, A) -> List[Edge]:
+    es = _EdgeSet(block)
+    for ox, oy, oz in _cells(es, A, extra=1):
+        p = (ox, oy, oz)
+        for q in ((ox+A, oy, oz), (ox, oy+A, oz), (ox, oy, oz+A)):
+            if es.inside(p) and es.inside(q):
+                es.add(p, q)
+    return es.edges()
+
+
+def lattice_edges_bcc(block, A) -> List[Edge]:
+    es = _EdgeSet(block)
+    for ox, oy, oz in _cells(es, A):
+        c = (ox + A/2, oy + A/2, oz + A/2)
+        if not es.inside(c):
+            continue
+        for p in [(ox+dx, oy+dy, oz+dz) for dz in (0, A) for dy in (0, A) for dx in (0, A)]:
+            if es.inside(p):
+                es.add(p, c)
+    return es.edges()
+
+
+def _add_fcc(es: _EdgeSet, A: float):
+    for ox, oy, oz in _cells(es, A):
+        for fc, corners in _cell_face_map(ox, oy, oz, A):
+            if not es.inside(fc):
+                continue
+            for p in corners:
+                if es.inside(p):
+                    es.add(fc, p)
+
+
+def lattice_edges_fcc(block, A) -> List[Edge]:
+    es = _EdgeSet(block)
+    _add_fcc(es, A)
+    return es.edges()
+
+
+def lattice_edges_diamond(block, A) -> List[Edge]:
+    es = _EdgeSet(block)
+    basis_fcc = [(0.0, 0.0, 0.0), (0.0, 0.5, 0.5), (0.5, 0.0, 0.5), (0.5, 0.5, 0.0)]
+    nn = [(0.25, 0.25, 0.25), (0.25, -0.25, -0.25), (-0.25, 0.25, -0.25), (-0.25, -0.25, 0.25)]
+    for ox, oy, oz in _cells(es, A, extra=1):
+        for bx, by, bz in basis_fcc:
+            p = (ox+bx*A, oy+by*A, oz+bz*A)
+            if not es.inside(p):
+                continue
+            for dx, dy, dz in nn:
+                q = (p[0]+dx*A, p[1]+dy*A, p[2]+dz*A)
+                if es.inside(q):
+                    es.add(p, q)
+    return es.edges()
+
+
+def lattice_edges_octet(block, A) -> List[Edge]:
+    es = _EdgeSet(block)
+    _add_fcc(es, A)
+    # Partie BCC: centre de cellule ↔ centres de faces
+    for ox, oy, oz in _cells(es, A):
+        c = (ox + A/2, oy + A/2, oz + A/2)
+        if not es.inside(c):
+            continue
+        for fc, _ in _cell_face_map(ox, oy, oz, A):
+            if es.inside(fc):
+                es.add(fc, c)
+    return es.edges()
+
+
+LATTICE_EDGES: Dict[str, Callable[..., List[Edge]]] = {
+    "sc": lattice_edges_sc,
+    "bcc": lattice_edges_bcc,
+    "fcc": lattice_edges_fcc,
+    "diamond": lattice_edges_diamond,
+    "octet": lattice_edges_octet,
+}
+
+
+def lattice_compound(edges: List[Edge], R: float, node_r: float, overlap: float):
+    """
+    Mode brep: un cylindre par strut (prolongé de overlap) + une sphère par nœud.
+    Un lattice n'a que quelques longueurs de strut distinctes: chaque cylindre et
+    chaque sphère est une copie placée d'une primitive du shape_cache.
+    """
+    import cadquery as cq
+
+    solids, nodes = [], set()
+    for p1, p2 in edges:
+        nodes.add(_pkey(p1))
+        nodes.add(_pkey(p2))
+        v = np.subtract(p2, p1)
+        L = float(np.linalg.norm(v))
+        if L < 1e-9:
+            continue
+        u = v / L
+        h = L + 2 * overlap
+        solids.append(sc.placed("strut_cylinder", (R, h), lambda: cq.Solid.makeCylinder(R, h),
+                                sc.frame(np.asarray(p1) - u * overlap, u)))
+    for nk in nodes:
+        solids.append(sc.placed("node_sphere", (node_r,), lambda: cq.Solid.makeSphere(node_r),
+                                sc.location([c / _SCALE_KEY for c in nk])))
+    return cq.Compound.makeCompound(solids)
+
+
+def _build_lattice(kind: str, analysis: Dict[str, Any]):
+    params = analysis.get('parameters', {})
+    block = (params.get('block_x', 30.0), params.get('block_y', 30.0), params.get('block_z', 30.0))
+    A = params.get('cell_size', 15.0)
+    R = params.get('strut_radius', 1.2)
+    if kind == "sc":
+        node_r = params.get('node_radius_factor', 1.55) * R
+    else:
+        node_r = params.get('node_radius', 1.86)
+
+    edges = LATTICE_EDGES[kind](block, A)
+    if params.get('mode', 'brep') == 'implicit':
+        import implicit_geometry as ig
+        verts, faces = ig.lattice_mesh(edges, R, node_radius=node_r,
+                                       voxel=params.get('voxel_size') or R / 3.0,
+                                       blend=params.get('blend_radius', 0.0))
+        return verts[faces]
+    return lattice_compound(edges, R, node_r, overlap=0.9 * R)
+
+
+def build_lattice_sc(analysis: Dict[str, Any]):
+    """Lattice cubique simple: struts sur les arêtes des cellules"""
+    return _build_lattice("sc", analysis)
+
+
+def build_lattice_bcc(analysis: Dict[str, Any]):
+    """Lattice BCC: coins de chaque cellule reliés à son centre"""
+    return _build_lattice("bcc", analysis)
+
+
+def build_lattice_fcc(analysis: Dict[str, Any]):
+    """Lattice FCC: centres des faces reliés aux coins de chaque face"""
+    return _build_lattice("fcc", analysis)
+
+
+def build_lattice_diamond(analysis: Dict[str, Any]):
+    """Lattice diamant: liaisons tétraédriques de la maille diamant"""
+    return _build_lattice("diamond", analysis)
+
+
+def build_lattice_octet(analysis: Dict[str, Any]):
+    """Lattice octet: FCC + liaisons centre de cellule ↔ centres des faces"""
+    return _build_lattice("octet", analysis)
+
+
+# ========== REGISTRY ==========
+
+# type d'application → (builder, nom du STL, en-tête STL binaire des builders maillage)
+BUILDERS: Dict[str, Tuple[Callable[[Dict[str, Any]], Any], str, bytes]] = {
+    "splint": (build_splint, "generated_splint.stl", b"Generated Splint"),
+    "stent": (build_stent, "generated_stent.stl", b""),
+    "facade_pyramid": (build_facade_pyramid, "generated_facade.stl", b"Generated Facade"),
+    "facade_parametric": (build_facade_parametric, "generated_facade.stl", b"Facade WAVY"),
+    "honeycomb": (build_honeycomb, "generated_facade.stl", b""),
+    "louvre_wall": (build_louvre_wall, "generated_facade.stl", b""),
+    "sine_wave_fins": (build_sine_wave_fins, "generated_facade.stl", b""),
+    "gripper": (build_gripper, "generated_gripper.stl", b"Gripper"),
+    "heatsink": (build_heatsink, "generated_heatsink.stl", b""),
+    "origami": (build_origami, "generated_origami.stl", b"miura_solid_cylinder"),
+    "lion": (build_lion, "generated_lion.stl", b"Generated Lion"),
+    "lattice_sc": (build_lattice_sc, "generated_lattice_sc.stl", b"Implicit lattice SC"),
+    "lattice_bcc": (build_lattice_bcc, "generated_lattice_bcc.stl", b"Implicit lattice BCC"),
+    "lattice_fcc": (build_lattice_fcc, "generated_lattice_fcc.stl", b"Implicit lattice FCC"),
+    "lattice_diamond": (build_lattice_diamond, "generated_lattice_diamond.stl", b"Implicit lattice DIAMOND"),
+    "lattice_octet": (build_lattice_octet, "generated_lattice_octet.stl", b"Implicit lattice OCTET"),
+}
+
+
+def has_builder(app_type: str) -> bool:
+    return app_type in BUILDERS
+
+
+def build(app_type: str, analysis: Dict[str, Any]):
+    """Construit la géométrie d'un type connu (cq.Shape ou soupe de triangles)"""
+    if app_type not in BUILDERS:
+        raise KeyError(f"No builder for type '{app_type}'")
+    return BUILDERS[app_type][0](analysis)
+
+
+def write_output(app_type: str, result: Any, analysis: Dict[str, Any], out_dir,
+                 quality: Optional[str] = None) -> Path:
+    """Écrit le résultat d'un builder dans out_dir (nom et en-tête STL du registre)"""
+    _, stl_name, header = BUILDERS[app_type]
+    target = Path(out_dir)
+    target.mkdir(parents=True, exist_ok=True)
+    stl_path = target / stl_name
+
+    if isinstance(result, np.ndarray):
+        tris = result.astype(np.float32)
+        if analysis.get('parameters', {}).get('stl_format') == 'ascii':
+            mo.write_stl_ascii(str(stl_path), tris, name=header.decode('ascii') or "mesh")
+        else:
+            mo.write_stl(str(stl_path), tris, header=header)
+    else:
+        from export_stage import export_stl
+
+        export_stl(result, str(stl_path), quality=quality)
+    return stl_path
+
+
+def run_builder(app_type: str, analysis: Dict[str, Any], quality: Optional[str] = None,
+                job_id: Optional[str] = None, out_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Exécuté dans un process worker: construit puis écrit le STL dans out_dir
+    (répertoire d'exécution privé du job, shape_store.run_dir() par défaut).
+    Pour une forme BRep, le BRep est stocké sous job_id (re-exports sans reconstruction).
+    """
+    import time
+    import shape_store
+
+    t0 = time.perf_counter()
+    result = build(app_type, analysis)
+    stl_path = write_output(app_type, result, analysis, out_dir or shape_store.run_dir(job_id), quality)
+
+    if isinstance(result, np.ndarray):
+        job_id = None
+    elif job_id:
+        try:
+            shape_store.save_shape(job_id, result)
+        except Exception as e:
+            log.warning(f"⚠️ Could not store BRep for re-export: {e}")
+            job_id = None
+
+    cache = sc.stats()
+    log.info(f"🏗️ Builder '{app_type}' → {stl_path.name} in {time.perf_counter() - t0:.2f}s "
+             f"(shape cache: {cache['hits']} hits / {cache['misses']} misses)")
+    return {"stl_path": str(stl_path.absolute()), "job_id": job_id, "shape_cache": cache}
+
+
+# ========== SCRIPT DU TEMPLATE ==========
+
+def _global_names(fn: Callable) -> List[str]:
+    """Globales du module lues par fn (lambdas, fonctions imbriquées et compréhensions comprises)"""
+    names: List[str] = []
+    stack = [fn.__code__]
+    while stack:
+        code = stack.pop()
+        names.extend(n for n in code.co_names if n not in names)
+        stack.extend(c for c in code.co_consts if inspect.iscode(c))
+    return [n for n in names if n in globals()]
+
+
+def _inlined(fn: Callable) -> List[Callable]:
+    """fn et les helpers privés (_xxx) dont il dépend, dans l'ordre du fichier"""
+    found, todo = [], [fn]
+    while todo:
+        f = todo.pop()
+        if f in found:
+            continue
+        found.append(f)
+        todo.extend(globals()[n] for n in _global_names(f)
+                    if n.startswith("_") and isinstance(globals()[n], types.FunctionType))
+    return sorted(found, key=lambda f: f.__code__.co_firstlineno)
+
+
+def script(app_type: str, analysis: Dict[str, Any]) -> str:
+    """
+    Script affiché (et exécuté en repli) pour un type template: paramètres de
+    l'analyse, source du builder et de ses helpers privés (inspect.getsource),
+    puis write_output() dans Path(__file__).parent / "output".
+    """
+    builder = BUILDERS[app_type][0]
+    functions = _inlined(builder)
+    defined = {f.__name__ for f in functions}
+
+    modules, shared = [], []
+    for f in functions:
+        for name in _global_names(f):
+            value = globals()[name]
+            if name in defined:
+                continue
+            if isinstance(value, types.ModuleType):
+                line = f"import {value.__name__}" + (f" as {name}" if name != value.__name__ else "")
+                if line not in modules:
+                    modules.append(line)
+            elif name not in shared:
+                shared.append(name)
+
+    header = [
+        "#!/usr/bin/env python3",
+        f'"""{app_type} — {inspect.getdoc(builder) or builder.__name__}',
+        f'Généré depuis builders.{builder.__name__}() (même code que le chemin rapide)"""',
+        "",
+        "from pathlib import Path",
+        "from typing import Any, Dict, List, Optional, Tuple",
+        "",
+        "import builders",
+        *sorted(modules),
+    ]
+    if shared:
+        header.append(f"from builders import {', '.join(shared)}")
+
+    parts = ["\n".join(header), f"ANALYSIS = {pprint.pformat(analysis, sort_dicts=False)}"]
+    parts += [inspect.getsource(f).rstrip() for f in functions]
+    parts.append(
+        f"result = {builder.__name__}(ANALYSIS)\n"
+        f"stl_path = builders.write_output({app_type!r}, result, ANALYSIS, Path(__file__).parent / \"output\")\n"
+        "print(f\"✅ STL: {stl_path}\")"
+    )
+    return "\n\n\n".join(parts) + "\n"
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv("BUILD_WORKERS", "1"))
+            _executor = ProcessPoolExecutor(max_workers=max(1, workers))
+            log.info(f"🏭 Builder worker pool started ({workers} workers)")
+        return _executor
+
+
+async def run(app_type: str, analysis: Dict[str, Any], quality: Optional[str] = None,
+              job_id: Optional[str] = None, out_dir: Optional[str] = None) -> Dict[str, Any]:
+    """run_builder() dans le pool de workers persistants (la boucle asyncio reste libre)"""
+    import asyncio
+
+    global _executor
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    try:
+        return await loop.run_in_executor(executor, run_builder, app_type, analysis, quality, job_id, out_dir)
+    except BrokenExecutor:
+        # Worker tué (OOM, signal): pool neuf pour les requêtes suivantes
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        executor.shutdown(wait=False)
+        raise
+
+
+__all__ = [
+    "BUILDERS", "LATTICE_EDGES", "WORKER_ERRORS", "has_builder", "build", "write_output", "run_builder", "run", "script",
+    "build_splint", "build_origami", "build_lion", "build_gripper",
+    "build_facade_pyramid", "build_facade_parametric",
+    "build_stent", "build_heatsink", "build_louvre_wall", "build_honeycomb", "build_sine_wave_fins",
+    "build_lattice_sc", "build_lattice_bcc", "build_lattice_fcc", "build_lattice_diamond",
+    "build_lattice_octet", "lattice_edges_sc", "lattice_edges_bcc", "lattice_edges_fcc",
+    "lattice_edges_diamond", "lattice_edges_octet", "lattice_compound",
+]
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+code_facts.py — Table de faits extraite du code CadQuery généré (une passe AST)
+Le CriticAgent, le SyntaxValidatorAgent et le nettoyage des imports hallucinés
+cherchaient chacun des sous-chaînes (".circle(", "extrude(-", "import utils")
+dans le texte, y compris dans les commentaires et les chaînes. Ici le code est
+parsé une fois; les vérifications deviennent des requêtes sur:
+  - calls: appels dans l'ordre du source (nom, cible pointée, arguments
+    littéraux, mots-clés), reliés en chaînes Workplane (circle → extrude → ...)
+  - imports, noms assignés, noms lus, attributs pointés, constantes numériques
+  - divisions par une constante nulle, erreur de syntaxe
+Code non parsable: faits approchés par regex (noms de méthodes appelées) pour
+que les requêtes restent utilisables. Résultat mis en cache par texte de code:
+validateur, Critic et nettoyage analysent le même programme.
+"""
+
+import ast
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Valeur d'un argument qui n'est pas un littéral (variable, expression)
+UNKNOWN = object()
+
+_TEXT_CALL = re.compile(r"(?:\b([A-Za-z_][\w.]*)\.)?([A-Za-z_]\w*)\s*\(")
+
+
+@dataclass
+class Call:
+    name: str  # méthode ou fonction appelée: "circle", "makeHelix", "Workplane"
+    target: str  # chemin pointé si la cible est un nom ("cq.Wire.makeHelix"), sinon le nom seul
+    line: int
+    col: int  # position du nom de la méthode (ordre du source)
+    args: Tuple[Any, ...] = ()  # valeurs littérales (UNKNOWN sinon)
+    arg_src: Tuple[str, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    kwarg_src: Dict[str, str] = field(default_factory=dict)
+    receiver: Optional["Call"] = field(default=None, repr=False)  # appel précédent de la chaîne
+
+    def number(self, i: int) -> Optional[float]:
+        """i-ème argument positionnel s'il est numérique littéral"""
+        if i < len(self.args) and isinstance(self.args[i], (int, float)) and not isinstance(self.args[i], bool):
+            return float(self.args[i])
+        return None
+
+    def negative_arg(self) -> bool:
+        """Premier argument négatif: littéral < 0 ou expression -(...)"""
+        if not self.arg_src:
+            return False
+        value = self.args[0]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value < 0
+        return self.arg_src[0].lstrip().startswith("-")
+
+
+@dataclass
+class Import:
+    modules: Tuple[str, ...]  # modules importés ("utils", "cadquery.helpers" pour from cadquery import helpers)
+    names: Tuple[str, ...]  # noms liés dans le module
+    line: int
+    end_line: int
+    node: Optional[ast.stmt] = field(default=None, repr=False)
+
+
+@dataclass
+class CodeFacts:
+    code: str
+    parsed: bool = False
+    syntax_error: Optional[SyntaxError] = None
+    calls: List[Call] = field(default_factory=list)
+    imports: List[Import] = field(default_factory=list)
+    assigned: Set[str] = field(default_factory=set)
+    names: Set[str] = field(default_factory=set)
+    attributes: Set[str] = field(default_factory=set)  # chemins pointés lus ("cq.Wire.makeHelix")
+    numbers: List[float] = field(default_factory=list)
+    zero_divisions: List[int] = field(default_factory=list)  # lignes de x / 0
+    _by_name: Dict[str, List[Call]] = field(default_factory=dict, repr=False)
+
+    # ----- requêtes -----
+
+    def calls_of(self, *names: str) -> List[Call]:
+        if len(names) == 1:
+            return self._by_name.get(names[0], [])
+        return sorted((c for n in names for c in self._by_name.get(n, [])), key=lambda c: (c.line, c.col))
+
+    def has(self, *names: str) -> bool:
+        return any(n in self._by_name for n in names)
+
+    def count(self, name: str) -> int:
+        return len(self._by_name.get(name, []))
+
+    def first(self, name: str) -> Optional[Call]:
+        calls = self._by_name.get(name)
+        return calls[0] if calls else None
+
+    def before(self, a: str, b: str) -> bool:
+        """Premier appel de a avant le premier appel de b (les deux présents)"""
+        ca, cb = self.first(a), self.first(b)
+        return ca is not None and cb is not None and (ca.line, ca.col) < (cb.line, cb.col)
+
+    def follows(self, *names: str) -> bool:
+        """Les appels apparaissent dans cet ordre dans le source (pas forcément consécutifs)"""
+        i = 0
+        for call in self.calls:
+            if call.name == names[i]:
+                i += 1
+                if i == len(names):
+                    return True
+        return False
+
+    def has_kwarg(self, name: str) -> bool:
+        return any(name in c.kwargs for c in self.calls)
+
+    def references(self, dotted: str) -> bool:
+        """Chemin pointé présent ("Wire.makeHelix" trouve aussi cq.Wire.makeHelix)"""
+        return any(a == dotted or a.endswith("." + dotted) for a in self.attributes)
+
+    def chain(self, call: Call) -> List[Call]:
+        """Chaîne d'appels qui mène à call (du premier au dernier)"""
+        out = []
+        while call is not None:
+            out.append(call)
+            call = call.receiver
+        return out[::-1]
+
+    def workplanes(self) -> List[str]:
+        """Plans littéraux passés à Workplane(...)"""
+        return [c.args[0] for c in self.calls_of("Workplane") if c.args and isinstance(c.args[0], str)]
+
+    def imported(self, module: str) -> bool:
+        return any(m == module or m.startswith(module + ".") for imp in self.imports for m in imp.modules)
+
+
+def _dotted(node: ast.AST) -> Optional[str]:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def _literal(node: ast.AST) -> Any:
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return UNKNOWN
+
+
+class _Collector(ast.NodeVisitor):
+    def __init__(self, facts: CodeFacts):
+        self.facts = facts
+        self._calls: Dict[int, Call] = {}
+
+    def _source(self, node: ast.AST) -> str:
+        return ast.get_source_segment(self.facts.code, node) or ""
+
+    def visit_Call(self, node: ast.Call):
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            name, pos = func.attr, (func.end_lineno, func.end_col_offset - len(func.attr))
+            target = _dotted(func) or name
+        elif isinstance(func, ast.Name):
+            name, pos, target = func.id, (func.lineno, func.col_offset), func.id
+        else:
+            name = None
+        if name is not None:
+            call = Call(
+                name=name, target=target, line=pos[0], col=pos[1],
+                args=tuple(_literal(a) for a in node.args),
+                arg_src=tuple(self._source(a) for a in node.args),
+                kwargs={k.arg: _literal(k.value) for k in node.keywords if k.arg},
+                kwarg_src={k.arg: self._source(k.value) for k in node.keywords if k.arg},
+            )
+            self._calls[id(node)] = call
+            self.facts.calls.append(call)
+        self.generic_visit(node)
+        # Receveur visité pendant generic_visit: on le relie après coup
+        if name is not None and isinstance(func, ast.Attribute) and isinstance(func.value, ast.Call):
+            self._calls[id(node)].receiver = self._calls.get(id(func.value))
+
+    def visit_Attribute(self, node: ast.Attribute):
+        dotted = _dotted(node)
+        if dotted:
+            self.facts.attributes.add(dotted)
+            self.facts.names.add(dotted.split(".", 1)[0])
+            return
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Store):
+            self.facts.assigned.add(node.id)
+        else:
+            self.facts.names.add(node.id)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.facts.assigned.add(node.name)
+        self.facts.assigned.update(a.arg for a in node.args.args + node.args.kwonlyargs)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Import(self, node: ast.Import):
+        self.facts.imports.append(Import(
+            modules=tuple(a.name for a in node.names),
+            names=tuple(a.asname or a.name.split(".")[0] for a in node.names),
+            line=node.lineno, end_line=node.end_lineno, node=node,
+        ))
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = node.module or ""
+        self.facts.imports.append(Import(
+            modules=(module,) + tuple(f"{module}.{a.name}" for a in node.names if a.name != "*"),
+            names=tuple(a.asname or a.name for a in node.names),
+            line=node.lineno, end_line=node.end_lineno, node=node,
+        ))
+
+    def visit_Constant(self, node: ast.Constant):
+        if isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            self.facts.numbers.append(float(node.value))
+
+    def visit_BinOp(self, node: ast.BinOp):
+        if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) and isinstance(node.right, ast.Constant) \
+                and node.right.value == 0 and not isinstance(node.right.value, bool):
+            self.facts.zero_divisions.append(node.lineno)
+        self.generic_visit(node)
+
+
+def _index(facts: CodeFacts) -> CodeFacts:
+    facts.calls.sort(key=lambda c: (c.line, c.col))
+    for call in facts.calls:
+        facts._by_name.setdefault(call.name, []).append(call)
+    return facts
+
+
+def _text_facts(facts: CodeFacts) -> CodeFacts:
+    """Code non parsable: appels repérés par regex (sans arguments)"""
+    starts = [0] + [m.end() for m in re.finditer("\n", facts.code)]
+    line = 0
+    for m in _TEXT_CALL.finditer(facts.code):
+        while line + 1 < len(starts) and starts[line + 1] <= m.start(2):
+            line += 1
+        target = f"{m.group(1)}.{m.group(2)}" if m.group(1) else m.group(2)
+        facts.calls.append(Call(name=m.group(2), target=target, line=line + 1, col=m.start(2) - starts[line]))
+        if m.group(1):
+            facts.attributes.add(target)
+    return _index(facts)
+
+
+@lru_cache(maxsize=64)
+def analyze(code: str) -> CodeFacts:
+    """Faits du programme (partagés: ne pas modifier l'objet renvoyé)"""
+    facts = CodeFacts(code=code)
+    try:
+        tree = ast.parse(code)
+        # compile() voit aussi ce que le parseur laisse passer (return hors fonction, ...)
+        compile(tree, "<generated>", "exec")
+    except SyntaxError as e:
+        facts.syntax_error = e
+        return _text_facts(facts)
+    except (ValueError, RecursionError, MemoryError) as e:
+        facts.syntax_error = SyntaxError(str(e))
+        return _text_facts(facts)
+    facts.parsed = True
+    _Collector(facts).visit(tree)
+    return _index(facts)
+
+
+def without_imports(code: str, modules: Iterable[str]) -> Tuple[str, List[str]]:
+    """
+    Retire les imports des modules donnés (et de leurs sous-modules); un import
+    multiple garde ses autres noms. Renvoie (code, lignes retirées).
+    Code non parsable: renvoyé tel quel (l'appelant garde son repli texte).
+    """
+    facts = analyze(code)
+    if not facts.parsed:
+        return code, []
+    banned = tuple(modules)
+
+    def is_banned(module: str) -> bool:
+        return any(module == m or module.startswith(m + ".") for m in banned)
+
+    lines = code.split("\n")
+    removed = []
+    for imp in sorted(facts.imports, key=lambda i: i.line, reverse=True):
+        node = imp.node
+        if isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if is_banned(module):
+                keep = []
+            else:
+                keep = [a for a in node.names if not is_banned(f"{module}.{a.name}")]
+        else:
+            keep = [a for a in node.names if not is_banned(a.name)]
+        if len(keep) == len(node.names):
+            continue
+        original = "\n".join(lines[imp.line - 1:imp.end_line])
+        indent = original[:len(original) - len(original.lstrip())]
+        replacement = []
+        if keep:
+            node = ast.ImportFrom(module=node.module, names=keep, level=node.level) \
+                if isinstance(node, ast.ImportFrom) else ast.Import(names=keep)
+            replacement = [indent + ast.unparse(node)]
+        # Une instruction seule dans un bloc doit être remplacée, pas supprimée
+        elif indent:
+            replacement = [indent + "pass"]
+        lines[imp.line - 1:imp.end_line] = replacement
+        removed.append(original.strip())
+    return "\n".join(lines), removed[::-1]
+
+
+__all__ = [
+    "UNKNOWN", "Call", "Import", "CodeFacts", "analyze", "without_imports",
+]
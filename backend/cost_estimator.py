@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cost_estimator.py — Estimation du coût d'un job géométrique AVANT exécution
+À partir des paramètres de l'AnalystAgent: nombre de struts / nœuds / cellules
+(lattices), de voxels (lion, lattices implicites), d'unions booléennes (stent,
+honeycomb, louvre, ailettes) ou de triangles (templates maillage), puis temps et
+mémoire prédits par un modèle de coût calibré par template.
+
+L'orchestrateur s'en sert pour:
+- choisir le moteur (BRep vs implicite pour les lattices)
+- sous-échantillonner (résolution du lion, voxel, subdivisions) ou rejeter
+  un job hors budget avant qu'il n'occupe un cœur pendant des minutes
+- envoyer un ETA au client (événement SSE "estimate")
+
+Calibration: mesures sur un cœur (builders.run_builder, qualité production).
+"""
+
+import copy
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+log = logging.getLogger("cadamx.cost")
+
+# Budget par job: au-delà, sous-échantillonnage si possible, sinon rejet
+MAX_SECONDS = float(os.getenv("COST_MAX_SECONDS", "900"))
+MAX_MEMORY_MB = float(os.getenv("COST_MAX_MEMORY_MB", "4096"))
+
+# Modèles de coût: t = base_s + k_s · n^exp, mem = base_mb + mb · n
+# (n = unité de travail dominante: struts + nœuds, voxels, unions booléennes ou triangles)
+COST_MODELS: Dict[str, Dict[str, float]] = {
+    "lattice_brep":     {"base_s": 1.0, "k_s": 1.6e-4, "exp": 1.0, "base_mb": 150, "mb": 0.03},
+    "lattice_implicit": {"base_s": 0.3, "k_s": 3.5e-6, "exp": 1.0, "base_mb": 150, "mb": 6e-5},
+    "lion":             {"base_s": 0.5, "k_s": 2.0e-7, "exp": 1.0, "base_mb": 200, "mb": 1.6e-5},
+    "stent":            {"base_s": 0.5, "k_s": 0.0233, "exp": 1.3, "base_mb": 150, "mb": 1.0},
+    "honeycomb":        {"base_s": 0.5, "k_s": 0.245, "exp": 1.3, "base_mb": 150, "mb": 1.0},
+    "louvre_wall":      {"base_s": 0.5, "k_s": 0.111, "exp": 1.3, "base_mb": 150, "mb": 1.0},
+    "sine_wave_fins":   {"base_s": 0.5, "k_s": 0.072, "exp": 1.3, "base_mb": 150, "mb": 1.0},
+    "heatsink":         {"base_s": 1.2, "k_s": 0.0, "exp": 1.0, "base_mb": 150, "mb": 0.0},
+    # Templates maillage: n = triangles
+    "mesh":             {"base_s": 0.05, "k_s": 3.0e-7, "exp": 1.0, "base_mb": 100, "mb": 4.0e-4},
+}
+
+# Struts / nœuds par cellule unité (arêtes partagées entre cellules comptées une fois)
+LATTICE_PER_CELL: Dict[str, Dict[str, float]] = {
+    "sc": {"struts": 3, "nodes": 1},
+    "bcc": {"struts": 8, "nodes": 2},
+    "fcc": {"struts": 12, "nodes": 4},
+    "diamond": {"struts": 16, "nodes": 8},
+    "octet": {"struts": 18, "nodes": 5},
+}
+
+# Bornes des sous-échantillonnages (en deçà: rejet plutôt qu'un modèle dégradé)
+MIN_LION_QUALITY = 60
+MAX_VOXEL_PER_RADIUS = 1.0 / 1.5
+
+
+@dataclass
+class CostEstimate:
+    """Prédiction pour un job: moteur retenu, temps, mémoire, décision"""
+    app_type: str
+    engine: str
+    seconds: float
+    memory_mb: float
+    counts: Dict[str, float] = field(default_factory=dict)
+    action: str = "accept"          # accept | downsample | reject
+    adjustments: Dict[str, Any] = field(default_factory=dict)
+    reason: str = ""
+
+    def to_event(self) -> Dict[str, Any]:
+        """Payload de l'événement SSE "estimate" """
+        msg = f"⏱️ Estimated ~{self.seconds:.0f}s, ~{self.memory_mb:.0f} MB ({self.engine})"
+        if self.action == "downsample":
+            msg += f" — downsampled: {self.reason}"
+        elif self.action == "reject":
+            msg = f"⛔ Job rejected: {self.reason}"
+        return {
+            "app_type": self.app_type,
+            "engine": self.engine,
+            "eta_s": round(self.seconds, 1),
+            "memory_mb": round(self.memory_mb),
+            "counts": {k: int(v) for k, v in self.counts.items()},
+            "action": self.action,
+            "adjustments": self.adjustments,
+            "message": msg,
+        }
+
+
+def _predict(model: str, n: float):
+    m = COST_MODELS[model]
+    seconds = m["base_s"] + m["k_s"] * max(n, 0.0) ** m["exp"]
+    return seconds, m["base_mb"] + m["mb"] * n
+
+
+def _fits(seconds: float, memory_mb: float) -> bool:
+    return seconds <= MAX_SECONDS and memory_mb <= MAX_MEMORY_MB
+
+
+# ========== COMPTAGES ==========
+
+def _lattice_counts(params: Dict[str, Any], kind: str) -> Dict[str, float]:
+    bx, by, bz = params.get('block_x', 30.0), params.get('block_y', 30.0), params.get('block_z', 30.0)
+    a = max(params.get('cell_size', 15.0), 1e-3)
+    cells = max(int(bx / a), 1) * max(int(by / a), 1) * max(int(bz / a), 1)
+    per = LATTICE_PER_CELL[kind]
+    return {"cells": cells, "struts": cells * per["struts"], "nodes": cells * per["nodes"]}
+
+
+def _implicit_voxels(params: Dict[str, Any], voxel: float) -> float:
+    """Voxels de la grille SDF: bloc + marge (rayon de nœud + 2 voxels) de chaque côté"""
+    r = params.get('strut_radius', 1.2)
+    pad = 2 * (max(r, params.get('node_radius', 1.86)) + 2 * voxel)
+    return math.prod((params.get(k, 30.0) + pad) / voxel for k in ('block_x', 'block_y', 'block_z'))
+
+
+def _honeycomb_cells(params: Dict[str, Any]) -> int:
+    W, H = params.get('panel_width', 300.0), params.get('panel_height', 380.0)
+    a = max(params.get('cell_size', 12.0), 1e-3)
+    dx, dy = 1.5 * a, math.sqrt(3.0) * a
+    nx = int(math.ceil((W + 2*a) / dx)) + 2
+    ny = int(math.ceil((H + dy) / dy)) + 2
+    n = 0
+    for i in range(nx):
+        cx = i*dx
+        if not a <= cx <= W - a:
+            continue
+        off = dy/2.0 if i % 2 else 0.0
+        n += sum(1 for j in range(ny) if dy/2 <= j*dy + off <= H - dy/2)
+    return n
+
+
+def _mesh_triangles(app_type: str, analysis: Dict[str, Any]) -> float:
+    params = analysis.get('parameters', {})
+    if app_type == 'splint':
+        return 2 * 120 * 180 * 2 + 2000
+    if app_type == 'origami':
+        su = params.get('n_cols', 18) * params.get('subdiv', 2)
+        sv = params.get('n_rows', 14) * params.get('subdiv', 2)
+        return 2 * su * sv + 2 * su
+    if app_type == 'facade_parametric':
+        size = max(params.get('element_size', 200.0), 1e-3)
+        nx = max(1, int(params.get('width', 20000.0) / size))
+        ny = max(1, int(params.get('height', 10000.0) / size))
+        return nx * ny * 200
+    return 1000
+
+
+# ========== ESTIMATION ==========
+
+def _estimate_lattice(app_type: str, analysis: Dict[str, Any]) -> CostEstimate:
+    params = analysis.get('parameters', {})
+    kind = app_type.split('_', 1)[1]
+    counts = _lattice_counts(params, kind)
+    r = params.get('strut_radius', 1.2)
+    voxel = params.get('voxel_size') or r / 3.0
+
+    brep = _predict("lattice_brep", counts["struts"] + counts["nodes"])
+    voxels = _implicit_voxels(params, voxel)
+    implicit = _predict("lattice_implicit", voxels)
+
+    mode = params.get('mode', 'brep')
+    est = CostEstimate(app_type, mode, *(implicit if mode == 'implicit' else brep),
+                       counts=dict(counts, voxels=voxels))
+    if _fits(est.seconds, est.memory_mb):
+        return est
+
+    # BRep hors budget: le moteur implicite (sans booléen, un seul maillage) s'il tient
+    if mode == 'brep' and _fits(*implicit):
+        est.engine, (est.seconds, est.memory_mb) = "implicit", implicit
+        est.action, est.adjustments = "downsample", {"mode": "implicit"}
+        est.reason = f"{int(counts['struts'])} struts too heavy for BRep, switched to implicit engine"
+        return est
+
+    # Implicite hors budget: voxel plus grossier, borné par la fidélité au rayon de strut
+    budget_voxels = min(
+        (MAX_SECONDS - COST_MODELS["lattice_implicit"]["base_s"]) / COST_MODELS["lattice_implicit"]["k_s"],
+        (MAX_MEMORY_MB - COST_MODELS["lattice_implicit"]["base_mb"]) / COST_MODELS["lattice_implicit"]["mb"],
+    )
+    coarse = voxel * (voxels / max(budget_voxels, 1.0)) ** (1.0 / 3.0) * 1.05
+    if coarse <= r * MAX_VOXEL_PER_RADIUS:
+        voxels = _implicit_voxels(params, coarse)
+        est.engine, (est.seconds, est.memory_mb) = "implicit", _predict("lattice_implicit", voxels)
+        est.counts["voxels"] = voxels
+        est.action, est.adjustments = "downsample", {"mode": "implicit", "voxel_size": round(coarse, 4)}
+        est.reason = f"voxel size raised to {coarse:.3f} mm to fit the budget"
+        return est
+
+    est.action = "reject"
+    est.reason = (f"{int(counts['cells'])} cells / {int(counts['struts'])} struts exceed the budget "
+                  f"(~{est.seconds:.0f}s, ~{est.memory_mb:.0f} MB) even on the implicit engine")
+    return est
+
+
+def _estimate_lion(analysis: Dict[str, Any]) -> CostEstimate:
+    n = analysis.get('parameters', {}).get('quality', 200)
+    est = CostEstimate("lion", "implicit", *_predict("lion", n ** 3), counts={"voxels": n ** 3})
+    if _fits(est.seconds, est.memory_mb):
+        return est
+
+    m = COST_MODELS["lion"]
+    budget = min((MAX_SECONDS - m["base_s"]) / m["k_s"], (MAX_MEMORY_MB - m["base_mb"]) / m["mb"])
+    q = int(budget ** (1.0 / 3.0))
+    if q >= MIN_LION_QUALITY:
+        est.seconds, est.memory_mb = _predict("lion", q ** 3)
+        est.counts["voxels"] = q ** 3
+        est.action, est.adjustments = "downsample", {"quality": q}
+        est.reason = f"grid resolution lowered from {n} to {q}"
+    else:
+        est.action, est.reason = "reject", f"no grid resolution ≥ {MIN_LION_QUALITY} fits the budget"
+    return est
+
+
+def estimate(analysis: Dict[str, Any]) -> Optional[CostEstimate]:
+    """Estimation pour un type template connu (None pour les types libres / CoT)"""
+    app_type = analysis.get('type', 'unknown')
+    params = analysis.get('parameters', {})
+
+    if app_type.startswith('lattice_') and app_type.split('_', 1)[1] in LATTICE_PER_CELL:
+        est = _estimate_lattice(app_type, analysis)
+    elif app_type == 'lion':
+        est = _estimate_lion(analysis)
+    elif app_type in ('stent', 'honeycomb', 'louvre_wall', 'sine_wave_fins', 'heatsink'):
+        if app_type == 'stent':
+            rings, peaks = params.get('n_rings', 6), params.get('n_peaks', 8)
+            n = rings * 2 * peaks + (rings - 1) * peaks
+        elif app_type == 'honeycomb':
+            n = _honeycomb_cells(params)
+        elif app_type == 'louvre_wall':
+            slats = int(math.ceil((params.get('width', 280.0) + params.get('height', 260.0))
+                                  / max(params.get('pitch', 12.0), 1e-3))) + 4
+            n = slats * (2 if params.get('layer2_enabled', True) else 1)
+        elif app_type == 'sine_wave_fins':
+            n = params.get('n_fins', 34)
+        else:
+            n = 0
+        est = CostEstimate(app_type, "brep", *_predict(app_type, n), counts={"unions": n})
+        if not _fits(est.seconds, est.memory_mb):
+            # Pas de sous-échantillonnage qui préserve le design: rejet
+            est.action = "reject"
+            est.reason = f"{n} boolean unions (~{est.seconds:.0f}s) exceed the {MAX_SECONDS:.0f}s budget"
+    elif app_type in ('splint', 'origami', 'gripper', 'facade_pyramid', 'facade_parametric'):
+        tris = _mesh_triangles(app_type, analysis)
+        est = CostEstimate(app_type, "mesh", *_predict("mesh", tris), counts={"triangles": tris})
+        if not _fits(est.seconds, est.memory_mb) and app_type == 'facade_parametric':
+            # Panneaux plus grands: triangles ∝ 1 / element_size²
+            m = COST_MODELS["mesh"]
+            budget = min((MAX_SECONDS - m["base_s"]) / m["k_s"], (MAX_MEMORY_MB - m["base_mb"]) / m["mb"])
+            size = params.get('element_size', 200.0) * math.sqrt(tris / budget) * 1.05
+            adjusted = dict(analysis, parameters=dict(params, element_size=size))
+            tris = _mesh_triangles(app_type, adjusted)
+            est.seconds, est.memory_mb = _predict("mesh", tris)
+            est.counts["triangles"] = tris
+            est.action, est.adjustments = "downsample", {"element_size": round(size, 1)}
+            est.reason = f"element size raised to {size:.0f} mm"
+        elif not _fits(est.seconds, est.memory_mb):
+            est.action = "reject"
+            est.reason = f"{int(tris):,} triangles exceed the memory budget"
+    else:
+        return None
+
+    log.info(f"💰 Cost estimate {app_type}: engine={est.engine}, ~{est.seconds:.1f}s, "
+             f"~{est.memory_mb:.0f} MB, action={est.action} {est.adjustments or ''}")
+    return est
+
+
+def apply(analysis: Dict[str, Any], est: CostEstimate) -> Dict[str, Any]:
+    """Copie de l'analyse avec les ajustements (moteur, résolution) appliqués aux paramètres"""
+    if not est.adjustments:
+        return analysis
+    out = copy.deepcopy(analysis)
+    out.setdefault('parameters', {}).update(est.adjustments)
+    return out
+
+
+__all__ = [
+    "MAX_SECONDS", "MAX_MEMORY_MB", "COST_MODELS", "LATTICE_PER_CELL",
+    "CostEstimate", "estimate", "apply",
+]
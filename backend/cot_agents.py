@@ -10,7 +10,7 @@ import os
 import json
 import re
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 
 # Import improved system prompts
@@ -18,11 +18,32 @@ from cot_prompts import (
     ARCHITECT_SYSTEM_PROMPT,
     PLANNER_SYSTEM_PROMPT,
     SYNTHESIZER_SYSTEM_PROMPT,
-    FEW_SHOT_EXAMPLES
+    FUSED_SYSTEM_PROMPT,
 )
+from example_index import BUILTIN_SOURCES, examples
+from model_manager import model_manager
+from prompt_assembly import PromptAssembler, Section, count_tokens, few_shot_section, reference_for
+from prompt_assembly import metrics as prompt_metrics
+import scheduler
+from structured_output import conform, dataclass_schema, parse_object
 
 log = logging.getLogger("cadamx.cot_agents")
 
+# Sortie structurée Ollama (option `format` = JSON schema); OLLAMA_STRUCTURED_OUTPUT=0 pour désactiver
+STRUCTURED_OUTPUT = os.getenv("OLLAMA_STRUCTURED_OUTPUT", "1") != "0"
+
+# Mode CoT: "staged" = Architect → Planner → Synthesizer (3 appels, 3 modèles),
+# "fused" = un seul appel, un seul modèle (analyse + plan + code dans une réponse)
+COT_MODES = ("staged", "fused")
+COT_MODE = os.getenv("COT_MODE", "staged").strip().lower()
+
+
+def normalize_cot_mode(mode: Optional[str]) -> str:
+    m = (mode or COT_MODE).strip().lower()
+    if m not in COT_MODES:
+        raise ValueError(f"Unknown CoT mode: {mode!r} (expected one of {', '.join(COT_MODES)})")
+    return m
+
 
 # Classes de données pour structurer les résultats entre agents
 @dataclass
@@ -45,6 +66,164 @@ class ConstructionPlan:
     estimated_complexity: int
 
 
+# JSON schemas (format Ollama) dérivés des dataclasses échangées entre agents
+DESIGN_ANALYSIS_SCHEMA = dataclass_schema(DesignAnalysis, {
+    "complexity": {"enum": ["simple", "medium", "complex"]},
+})
+CONSTRUCTION_PLAN_SCHEMA = dataclass_schema(ConstructionPlan, {
+    "steps": {"items": {
+        "type": "object",
+        "properties": {
+            "op": {"type": "string"},
+            "args": {"type": "object"},
+            "comment": {"type": "string"},
+        },
+        "required": ["op", "args"],
+    }},
+})
+
+
+def analysis_from_dict(data: Dict[str, Any]) -> DesignAnalysis:
+    """JSON de l'Architect → DesignAnalysis (anciennes clés object / params / operations acceptées)"""
+    data = conform(data, DESIGN_ANALYSIS_SCHEMA)
+    return DesignAnalysis(
+        description=data.get("description") or data.get("object") or "Unknown shape",
+        primitives_needed=data.get("primitives_needed", []),
+        operations_sequence=data.get("operations_sequence") or data.get("operations") or [],
+        parameters=data.get("parameters") or data.get("params") or {},
+        complexity=data.get("complexity", "medium"),
+        reasoning=data.get("reasoning", "")
+    )
+
+
+def plan_from_dict(data: Dict[str, Any]) -> ConstructionPlan:
+    """JSON du Planner → ConstructionPlan"""
+    data = conform(data, CONSTRUCTION_PLAN_SCHEMA)
+    return ConstructionPlan(
+        steps=data.get("steps", []),
+        variables=data.get("variables", {}),
+        constraints=data.get("constraints", []),
+        estimated_complexity=data.get("estimated_complexity", 5)
+    )
+
+
+# Caractères Unicode que les modèles glissent dans le code (fullwidth + block drawing + autres)
+UNICODE_REPLACEMENTS = {
+    # Fullwidth characters (U+FF00 block)
+    '｜': '|',  # Fullwidth vertical line
+    '（': '(',  # Fullwidth left parenthesis
+    '）': ')',  # Fullwidth right parenthesis
+    '［': '[',  # Fullwidth left bracket
+    '］': ']',  # Fullwidth right bracket
+    '｛': '{',  # Fullwidth left brace
+    '｝': '}',  # Fullwidth right brace
+    '，': ',',  # Fullwidth comma
+    '．': '.',  # Fullwidth period
+    '：': ':',  # Fullwidth colon
+    '；': ';',  # Fullwidth semicolon
+    '＝': '=',  # Fullwidth equals
+    '＋': '+',  # Fullwidth plus
+    '－': '-',  # Fullwidth minus
+    '＊': '*',  # Fullwidth asterisk
+    '／': '/',  # Fullwidth slash
+    '＜': '<',  # Fullwidth less than
+    '＞': '>',  # Fullwidth greater than
+    '＂': '"',  # Fullwidth quotation mark
+    '＇': "'",  # Fullwidth apostrophe
+    # Block drawing / box drawing characters
+    '▁': '_',   # Lower one eighth block (U+2581)
+    '▂': '_',   # Lower one quarter block (U+2582)
+    '▃': '_',   # Lower three eighths block (U+2583)
+    '▄': '_',   # Lower half block (U+2584)
+    '▅': '_',   # Lower five eighths block (U+2585)
+    '▆': '_',   # Lower three quarters block (U+2586)
+    '▇': '_',   # Lower seven eighths block (U+2587)
+    '█': '_',   # Full block (U+2588)
+    '▉': '_',   # Left seven eighths block (U+2589)
+    '▊': '_',   # Left three quarters block (U+258A)
+    '▋': '_',   # Left five eighths block (U+258B)
+    '▌': '_',   # Left half block (U+258C)
+    '▍': '_',   # Left three eighths block (U+258D)
+    '▎': '_',   # Left one quarter block (U+258E)
+    '▏': '_',   # Left one eighth block (U+258F)
+}
+
+
+def clean_unicode(text: str) -> str:
+    for unicode_char, ascii_char in UNICODE_REPLACEMENTS.items():
+        text = text.replace(unicode_char, ascii_char)
+    return text
+
+
+def finalize_code(response: str) -> str:
+    """
+    Réponse LLM → script exécutable: extraction du bloc ```python```, nettoyage
+    Unicode, import cadquery, variable `result` et export STL garantis.
+    """
+    # Extraire le code Python
+    code = response
+    if "```python" in response:
+        code = response.split("```python")[1].split("```")[0].strip()
+    elif "```" in response:
+        code = response.split("```")[1].split("```")[0].strip()
+
+    # Nettoyer les caractères Unicode problématiques (fullwidth + block drawing + autres)
+    code = clean_unicode(code)
+
+    # Vérifier que le code contient les imports nécessaires
+    if "import cadquery" not in code:
+        code = "import cadquery as cq\n\n" + code
+
+    # Vérifier que le code définit bien la variable 'result'
+    # Chercher une assignation à 'result'
+    if "result =" not in code and "result=" not in code:
+        # Le code n'assigne pas à 'result' - trouver la dernière variable assignée
+        import re
+        # Chercher la dernière assignation de variable (ex: table = ..., final = ..., etc.)
+        last_assignment = None
+        for match in re.finditer(r'^(\w+)\s*=\s*', code, re.MULTILINE):
+            var_name = match.group(1)
+            # Ignorer les imports et variables internes
+            if var_name not in ['output_dir', 'output_path', 'cq', 'Path']:
+                last_assignment = var_name
+
+        if last_assignment:
+            # Ajouter un alias 'result = last_var' avant l'export
+            code += f"\n\n# Final result (alias for validation)\nresult = {last_assignment}\n"
+            log.info(f"⚙️ Added result alias: result = {last_assignment}")
+        else:
+            # Pas de variable trouvée - ajouter un placeholder
+            log.warning("⚠️ No variable assignment found in generated code")
+            code += "\n\n# Final result (placeholder - code may need fixing)\nresult = None\n"
+
+    # Ajouter automatiquement l'export STL
+    if "cq.exporters.export" not in code and ".exportStl" not in code:
+        export_code = """
+
+# Export to STL
+from pathlib import Path
+output_dir = Path(__file__).parent / "output"
+output_dir.mkdir(exist_ok=True)
+output_path = output_dir / "generated_cot_generated.stl"
+cq.exporters.export(result, str(output_path))
+print(f"✅ STL exported to: {output_path}")
+"""
+        code += export_code
+
+    return code
+
+FUSED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        # Ordre = ordre de génération: le code vient après l'analyse et le plan
+        "analysis": DESIGN_ANALYSIS_SCHEMA,
+        "plan": CONSTRUCTION_PLAN_SCHEMA,
+        "code": {"type": "string"},
+    },
+    "required": ["analysis", "plan", "code"],
+}
+
+
 @dataclass
 class GeneratedCode:
     """Code Python/CadQuery final avec quelques infos"""
@@ -52,6 +231,12 @@ class GeneratedCode:
     language: str
     primitives_used: List[str]
     confidence: float
+    # Code heuristique (_fallback_generate / repli), pas une réponse du modèle
+    fallback: bool = False
+
+
+class ModelCallError(RuntimeError):
+    """Appel Ollama en échec (modèle absent, timeout...) quand le repli heuristique est refusé"""
 
 
 class OllamaCoTClient:
@@ -60,8 +245,9 @@ class OllamaCoTClient:
     On utilise Ollama plutôt qu'une API payante pour rester 100% local et gratuit.
     """
 
-    def __init__(self, model: str, base_url: Optional[str] = None):
+    def __init__(self, model: str, base_url: Optional[str] = None, agent: str = "cot"):
         self.model = model
+        self.agent = agent
         self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self.use_fallback = False
 
@@ -76,25 +262,49 @@ class OllamaCoTClient:
             log.warning(f"⚠️ Ollama connection failed: {e}, using fallback mode")
             self.use_fallback = True
 
-    async def generate(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 2000) -> str:
-        """Génère une réponse via Ollama (format chat compatible OpenAI)"""
+    # Passe à False si le serveur refuse un schema dans `format` (Ollama < 0.5): on garde "json"
+    schema_format = True
+
+    def routed(self, model: Optional[str]) -> bool:
+        """Modèle choisi par model_router, différent du modèle configuré de l'agent"""
+        return model is not None and model != self.model
+
+    async def generate(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 2000,
+                       schema: Optional[Dict[str, Any]] = None, model: Optional[str] = None,
+                       fallback: Optional[bool] = None) -> str:
+        """
+        Génère une réponse via Ollama (format chat compatible OpenAI)
+        schema: JSON schema imposé à la sortie (structured output), None = texte libre
+        model: modèle de cet appel (routage par complexité), défaut = self.model
+        fallback: heuristiques si l'appel échoue; False = ModelCallError. Par défaut
+        refusé pour un modèle routé: l'échelle doit passer au modèle suivant.
+        """
 
         if self.use_fallback:
             return await self._fallback_generate(messages)
 
+        if fallback is None:
+            fallback = not self.routed(model)
+
+        fmt = None
+        if schema is not None and STRUCTURED_OUTPUT:
+            fmt = schema if OllamaCoTClient.schema_format else "json"
+
         try:
             import ollama
 
-            # Ollama supporte le format messages (chat)
-            response = await self.client.chat(
-                model=self.model,
-                messages=messages,
-                options={
-                    "num_predict": max_tokens,
-                    "temperature": temperature,
-                    "top_p": 0.9,
-                }
-            )
+            try:
+                response = await self._chat(messages, temperature, max_tokens, fmt, model)
+            except ollama.ResponseError as e:
+                # Seul un refus du schema (Ollama < 0.5) désactive le format pour le process;
+                # modèle absent, timeout, coupure: erreur de cet appel uniquement
+                if not isinstance(fmt, dict) or e.status_code == 404 or "format" not in str(getattr(e, "error", e)).lower():
+                    raise
+                log.warning(f"⚠️ Ollama rejected the JSON schema format ({e}), using format='json'")
+                OllamaCoTClient.schema_format = False
+                response = await self._chat(messages, temperature, max_tokens, "json", model)
+
+            prompt_metrics.record_eval(self.agent, sum(count_tokens(m["content"]) for m in messages), response)
 
             # Ollama retourne un dict avec 'message' -> 'content'
             if isinstance(response, dict) and "message" in response:
@@ -103,10 +313,31 @@ class OllamaCoTClient:
             return str(response).strip()
 
         except Exception as e:
-            log.error(f"Ollama CoT API call failed: {e}")
+            log.error(f"Ollama CoT API call failed ({model or self.model}): {e}")
+            if not fallback:
+                raise ModelCallError(f"{model or self.model}: {e}") from e
             log.warning("Falling back to heuristic mode")
             return await self._fallback_generate(messages)
 
+    async def _chat(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int, fmt: Any,
+                    model: Optional[str] = None):
+        kwargs = {"format": fmt} if fmt is not None else {}
+        # Ollama supporte le format messages (chat); slot LLM de la classe du job
+        async with scheduler.slot("llm"):
+            keep_alive = await model_manager.acquire(model or self.model)
+            if keep_alive is not None:
+                kwargs["keep_alive"] = keep_alive
+            return await self.client.chat(
+                model=model or self.model,
+                messages=messages,
+                options={
+                    "num_predict": max_tokens,
+                    "temperature": temperature,
+                    "top_p": 0.9,
+                },
+                **kwargs
+            )
+
     async def _fallback_generate(self, messages: List[Dict[str, str]]) -> str:
         """Fallback basique si Ollama non disponible"""
         # Extraire le message système et utilisateur
@@ -330,7 +561,9 @@ class ArchitectAgent:
 
     def __init__(self):
         model = os.getenv("COT_ARCHITECT_MODEL", "qwen2.5:14b")
-        self.client = OllamaCoTClient(model=model)
+        self.client = OllamaCoTClient(model=model, agent="architect")
+        # Préfixe système identique à chaque appel (cache KV d'Ollama)
+        self.prompts = PromptAssembler("architect", ARCHITECT_SYSTEM_PROMPT)
         log.info("🏗️ ArchitectAgent initialized")
 
     async def analyze_design(self, prompt: str) -> DesignAnalysis:
@@ -338,60 +571,20 @@ class ArchitectAgent:
 
         log.info(f"🏗️ Analyzing: {prompt[:100]}...")
 
-        # Use improved system prompt from cot_prompts.py
-        system_prompt = ARCHITECT_SYSTEM_PROMPT
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Analyze this CAD request: {prompt}"}
-        ]
+        messages = self.prompts.messages([Section("request", f"Analyze this CAD request: {prompt}")])
 
         try:
-            response = await self.client.generate(messages, temperature=0.7, max_tokens=1000)
-
-            # Parser la réponse JSON
-            # Extraire JSON de la réponse (peut être entouré de markdown)
-            json_str = response
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-
-            # Nettoyer les patterns JSON invalides courants
-            # Pattern 1: Remplacer ": value" par ": 50" (valeur par défaut)
-            json_str = re.sub(r':\s*value\b', ': 50', json_str, flags=re.IGNORECASE)
-
-            # Pattern 2: Évaluer les expressions mathématiques simples (e.g., "45 * 30" → 1350)
-            def eval_math(match):
-                try:
-                    expr = match.group(1)
-                    # Sécurité: seulement autoriser nombres et opérateurs de base
-                    if re.match(r'^[\d\s\+\-\*\/\(\)\.]+$', expr):
-                        result = eval(expr)
-                        return f": {result}"  # IMPORTANT: Remettre le ':' !
-                except:
-                    pass
-                return match.group(0)
-
-            json_str = re.sub(r':\s*([0-9\s\+\-\*\/\(\)\.]+)(?=\s*[,}\]])', eval_math, json_str)
-
+            # Sortie contrainte par le schema: plus de JSON libre à réparer
+            response = await self.client.generate(messages, temperature=0.7, max_tokens=600,
+                                                  schema=DESIGN_ANALYSIS_SCHEMA)
             try:
-                data = json.loads(json_str)
-            except json.JSONDecodeError as je:
+                data = parse_object(response)
+            except ValueError as je:
                 log.error(f"❌ Architect JSON parsing failed: {je}")
                 log.error(f"📝 LLM full response (first 800 chars):\n{response[:800]}")
-                log.error(f"📝 Extracted JSON string (first 500 chars):\n{json_str[:500]}")
-                # Si le JSON est invalide, utiliser le fallback
-                raise je
+                raise
 
-            return DesignAnalysis(
-                description=data.get("description", "Unknown shape"),
-                primitives_needed=data.get("primitives_needed", []),
-                operations_sequence=data.get("operations_sequence", []),
-                parameters=data.get("parameters", {}),
-                complexity=data.get("complexity", "medium"),
-                reasoning=data.get("reasoning", "")
-            )
+            return analysis_from_dict(data)
 
         except Exception as e:
             log.warning(f"Architect using fallback analysis: {e}")
@@ -470,107 +663,41 @@ class PlannerAgent:
 
     def __init__(self):
         model = os.getenv("COT_PLANNER_MODEL", "qwen2.5-coder:14b")
-        self.client = OllamaCoTClient(model=model)
+        self.client = OllamaCoTClient(model=model, agent="planner")
+        self.prompts = PromptAssembler("planner", PLANNER_SYSTEM_PROMPT)
         log.info("📐 PlannerAgent initialized")
 
-    async def create_plan(self, analysis: DesignAnalysis, prompt: str) -> ConstructionPlan:
-        """Transforme l'analyse en plan concret avec des étapes CadQuery"""
-
-        log.info(f"📐 Planning: {analysis.description}")
+    async def create_plan(self, analysis: DesignAnalysis, prompt: str, model: Optional[str] = None) -> ConstructionPlan:
+        """
+        Transforme l'analyse en plan concret avec des étapes CadQuery
+        model: modèle choisi par model_router (défaut: COT_PLANNER_MODEL)
+        """
 
-        # Use improved system prompt from cot_prompts.py
-        system_prompt = PLANNER_SYSTEM_PROMPT
+        log.info(f"📐 Planning: {analysis.description} ({model or self.client.model})")
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"""Create a construction plan for:
+        messages = self.prompts.messages([Section("request", f"""Create a construction plan for:
 Description: {analysis.description}
 Primitives needed: {', '.join(analysis.primitives_needed)}
 Operations: {', '.join(analysis.operations_sequence)}
 Parameters: {json.dumps(analysis.parameters)}
 Original prompt: {prompt}
-"""}
-        ]
+""")])
 
         try:
-            response = await self.client.generate(messages, temperature=0.5, max_tokens=1500)
-
-            # Parser JSON
-            json_str = response
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-
-            # ============================================================
-            # CRITICAL JSON FIXES - Ollama génère souvent du JSON invalide
-            # ============================================================
-
-            # 1. Nettoyer les commentaires JavaScript (// et /* */)
-            json_str = re.sub(r'//.*$', '', json_str, flags=re.MULTILINE)
-            json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
-
-            # 2. Nettoyer les virgules finales avant } ou ]
-            json_str = re.sub(r',\s*([}\]])', r'\1', json_str)
-
-            # 3. FIX CRITIQUE : "y:60" → "y": 60 (manque espace après :)
-            # Pattern: "key:value" where value is a number
-            json_str = re.sub(r'"(\w+):(\s*[-+]?\d+(?:\.\d+)?)"', r'"\1": \2', json_str)
-
-            # 4. FIX : "key:value" (pas de guillemets autour de la valeur)
-            # Pattern: "key: value" → "key": value (ajout du guillemet manquant avant :)
-            json_str = re.sub(r'"(\w+):\s*([^",}\]]+?)\s*([,}\]])', r'"\1": \2\3', json_str)
-
-            # 5. Nettoyer les patterns JSON invalides
-            json_str = re.sub(r':\s*value\b', ': 50', json_str, flags=re.IGNORECASE)
-
-            # 6. Évaluer les expressions mathématiques
-            def eval_math(match):
-                try:
-                    expr = match.group(1)
-                    if re.match(r'^[\d\s\+\-\*\/\(\)\.]+$', expr):
-                        result = eval(expr)
-                        return f": {result}"  # IMPORTANT: Remettre le ':' !
-                except:
-                    pass
-                return match.group(0)
-
-            json_str = re.sub(r':\s*([0-9\s\+\-\*\/\(\)\.]+)(?=\s*[,}\]])', eval_math, json_str)
-
-            # 7. FIX : {"x":0,"y:60} → {"x":0,"y":60} (detect missing quote before colon in object values)
-            # This handles cases like {"p1":{"x":0,"y:60},"p2":...}
-            json_str = re.sub(r',\s*"(\w+):([^"]*?)([,}])', r',"\1":\2\3', json_str)
-
-            # 8. FIX CRITIQUE : Convert tuples to objects (0, 60) → {"x": 0, "y": 60}
-            # This fixes the Bowl JSON parse error where LLM generates (x, y) instead of {"x":x, "y":y}
-            def tuple_to_object(match):
-                """Convert (x, y) tuples to {"x": x, "y": y} objects in JSON"""
-                try:
-                    x = match.group(1).strip()
-                    y = match.group(2).strip()
-                    # Return object format
-                    return f'{{"x": {x}, "y": {y}}}'
-                except:
-                    return match.group(0)  # Return original if conversion fails
-
-            # Pattern: (number, number) where numbers can be int or float
-            json_str = re.sub(r'\((\s*[-+]?\d+(?:\.\d+)?)\s*,\s*([-+]?\d+(?:\.\d+)?)\s*\)', tuple_to_object, json_str)
-
+            response = await self.client.generate(messages, temperature=0.5, max_tokens=1000,
+                                                  schema=CONSTRUCTION_PLAN_SCHEMA, model=model)
             try:
-                data = json.loads(json_str)
-            except json.JSONDecodeError as je:
+                data = parse_object(response)
+            except ValueError as je:
                 log.error(f"❌ Planner JSON parsing failed: {je}")
                 log.error(f"📝 LLM full response (first 800 chars):\n{response[:800]}")
-                log.error(f"📝 Extracted JSON string (first 500 chars):\n{json_str[:500]}")
-                raise je
+                raise
 
-            return ConstructionPlan(
-                steps=data.get("steps", []),
-                variables=data.get("variables", {}),
-                constraints=data.get("constraints", []),
-                estimated_complexity=data.get("estimated_complexity", 5)
-            )
+            return plan_from_dict(data)
 
+        except ModelCallError:
+            # Modèle routé indisponible: l'orchestrateur passe au modèle suivant
+            raise
         except Exception as e:
             log.warning(f"Planner using fallback plan: {e}")
 
@@ -625,45 +752,30 @@ class CodeSynthesizerAgent:
 
     def __init__(self):
         model = os.getenv("COT_SYNTHESIZER_MODEL", "deepseek-coder:33b")
-        self.client = OllamaCoTClient(model=model)
+        self.client = OllamaCoTClient(model=model, agent="synthesizer")
+        self.prompts = PromptAssembler("synthesizer", SYNTHESIZER_SYSTEM_PROMPT)
         log.info("💻 CodeSynthesizerAgent initialized")
 
-    async def generate_code(self, plan: ConstructionPlan, analysis: DesignAnalysis) -> GeneratedCode:
-        """Génère le vrai code CadQuery exécutable"""
-
-        log.info(f"💻 Generating code: {analysis.description}")
+    async def generate_code(self, plan: ConstructionPlan, analysis: DesignAnalysis,
+                            model: Optional[str] = None, history: bool = True) -> GeneratedCode:
+        """
+        Génère le vrai code CadQuery exécutable
+        model: modèle choisi par model_router (défaut: COT_SYNTHESIZER_MODEL)
+        history: False = exemples few-shot sans les générations passées (benchmarks)
+        """
 
-        # FAST-PATH DÉSACTIVÉ : Forcer l'utilisation des LLMs pour tout
-        # if (analysis.complexity == "simple" and
-        #     len(analysis.primitives_needed) == 1 and
-        #     analysis.primitives_needed[0] in ["cylinder", "sphere", "cone", "torus", "box"]):
-        #
-        #     primitive = analysis.primitives_needed[0]
-        #     params = analysis.parameters
-        #     log.info(f"🚀 Fast-path for simple shape: {primitive}")
-        #
-        #     # Générer directement le code validé
-        #     return self._generate_simple_shape_code(primitive, params)
+        log.info(f"💻 Generating code: {analysis.description} ({model or self.client.model})")
 
-        log.info(f"🧠 Using full LLM pipeline (Fast-path disabled)")
+        # Les formes simples (prompts à cotes explicites) sont compilées sans LLM
+        # en amont par primitive_compiler (orchestrateur); ici: CoT complet.
+        log.info(f"🧠 Using full LLM pipeline")
 
-        # Use improved system prompt from cot_prompts.py
-        system_prompt = SYNTHESIZER_SYSTEM_PROMPT
-
-        # Add few-shot example if relevant object type detected
-        few_shot_hint = ""
-        object_type = analysis.description.lower()
-        for key in FEW_SHOT_EXAMPLES.keys():
-            if key in object_type:
-                few_shot_hint = f"\n\nREFERENCE PATTERN FOR {key.upper()}:\n```python\n{FEW_SHOT_EXAMPLES[key]}\n```\n"
-                log.info(f"📚 Using few-shot example for: {key}")
-                break
-
-        system_prompt_with_examples = system_prompt + few_shot_hint
-
-        # ==================================================================
-        # Old huge system prompt removed - now using improved version from cot_prompts.py
-        # ==================================================================
+        # Few-shot: exemples les plus proches (index BM25), dans le message utilisateur;
+        # le message système reste identique d'un appel à l'autre (cache KV)
+        hits = examples.search(f"{analysis.description} {' '.join(analysis.primitives_needed)}",
+                               sources=None if history else BUILTIN_SOURCES)
+        if hits:
+            log.info(f"📚 Using few-shot examples: {', '.join(f'{d.title} ({s})' for d, s in hits)}")
 
         plan_text = json.dumps({
             "steps": plan.steps,
@@ -671,9 +783,12 @@ class CodeSynthesizerAgent:
             "constraints": plan.constraints
         }, indent=2)
 
-        messages = [
-            {"role": "system", "content": system_prompt_with_examples},
-            {"role": "user", "content": f"""Generate CadQuery code for:
+        messages = self.prompts.messages([
+            few_shot_section((d.title, d.code) for d, _ in hits),
+            # Référence API limitée aux méthodes du plan
+            Section("reference", reference_for([plan_text, " ".join(analysis.primitives_needed)]),
+                    required=False, priority=2),
+            Section("request", f"""Generate CadQuery code for:
 Description: {analysis.description}
 Primitives: {', '.join(analysis.primitives_needed)}
 
@@ -681,110 +796,34 @@ Construction Plan:
 {plan_text}
 
 Generate the complete working CadQuery code.
-"""}
-        ]
+"""),
+        ])
 
         try:
-            response = await self.client.generate(messages, temperature=0.3, max_tokens=2000)
-
-            # Extraire le code Python
-            code = response
-            if "```python" in response:
-                code = response.split("```python")[1].split("```")[0].strip()
-            elif "```" in response:
-                code = response.split("```")[1].split("```")[0].strip()
-
-            # Nettoyer les caractères Unicode problématiques (fullwidth + block drawing + autres)
-            unicode_replacements = {
-                # Fullwidth characters (U+FF00 block)
-                '｜': '|',  # Fullwidth vertical line
-                '（': '(',  # Fullwidth left parenthesis
-                '）': ')',  # Fullwidth right parenthesis
-                '［': '[',  # Fullwidth left bracket
-                '］': ']',  # Fullwidth right bracket
-                '｛': '{',  # Fullwidth left brace
-                '｝': '}',  # Fullwidth right brace
-                '，': ',',  # Fullwidth comma
-                '．': '.',  # Fullwidth period
-                '：': ':',  # Fullwidth colon
-                '；': ';',  # Fullwidth semicolon
-                '＝': '=',  # Fullwidth equals
-                '＋': '+',  # Fullwidth plus
-                '－': '-',  # Fullwidth minus
-                '＊': '*',  # Fullwidth asterisk
-                '／': '/',  # Fullwidth slash
-                '＜': '<',  # Fullwidth less than
-                '＞': '>',  # Fullwidth greater than
-                '＂': '"',  # Fullwidth quotation mark
-                '＇': "'",  # Fullwidth apostrophe
-                # Block drawing / box drawing characters
-                '▁': '_',   # Lower one eighth block (U+2581)
-                '▂': '_',   # Lower one quarter block (U+2582)
-                '▃': '_',   # Lower three eighths block (U+2583)
-                '▄': '_',   # Lower half block (U+2584)
-                '▅': '_',   # Lower five eighths block (U+2585)
-                '▆': '_',   # Lower three quarters block (U+2586)
-                '▇': '_',   # Lower seven eighths block (U+2587)
-                '█': '_',   # Full block (U+2588)
-                '▉': '_',   # Left seven eighths block (U+2589)
-                '▊': '_',   # Left three quarters block (U+258A)
-                '▋': '_',   # Left five eighths block (U+258B)
-                '▌': '_',   # Left half block (U+258C)
-                '▍': '_',   # Left three eighths block (U+258D)
-                '▎': '_',   # Left one quarter block (U+258E)
-                '▏': '_',   # Left one eighth block (U+258F)
-            }
-
-            for unicode_char, ascii_char in unicode_replacements.items():
-                code = code.replace(unicode_char, ascii_char)
-
-            # Vérifier que le code contient les imports nécessaires
-            if "import cadquery" not in code:
-                code = "import cadquery as cq\n\n" + code
-
-            # Vérifier que le code définit bien la variable 'result'
-            # Chercher une assignation à 'result'
-            if "result =" not in code and "result=" not in code:
-                # Le code n'assigne pas à 'result' - trouver la dernière variable assignée
-                import re
-                # Chercher la dernière assignation de variable (ex: table = ..., final = ..., etc.)
-                last_assignment = None
-                for match in re.finditer(r'^(\w+)\s*=\s*', code, re.MULTILINE):
-                    var_name = match.group(1)
-                    # Ignorer les imports et variables internes
-                    if var_name not in ['output_dir', 'output_path', 'cq', 'Path']:
-                        last_assignment = var_name
-
-                if last_assignment:
-                    # Ajouter un alias 'result = last_var' avant l'export
-                    code += f"\n\n# Final result (alias for validation)\nresult = {last_assignment}\n"
-                    log.info(f"⚙️ Added result alias: result = {last_assignment}")
-                else:
-                    # Pas de variable trouvée - ajouter un placeholder
-                    log.warning("⚠️ No variable assignment found in generated code")
-                    code += "\n\n# Final result (placeholder - code may need fixing)\nresult = None\n"
-
-            # Ajouter automatiquement l'export STL
-            if "cq.exporters.export" not in code and ".exportStl" not in code:
-                export_code = """
-
-# Export to STL
-from pathlib import Path
-output_dir = Path(__file__).parent / "output"
-output_dir.mkdir(exist_ok=True)
-output_path = output_dir / "generated_cot_generated.stl"
-cq.exporters.export(result, str(output_path))
-print(f"✅ STL exported to: {output_path}")
-"""
-                code += export_code
+            heuristic = self.client.use_fallback
+            try:
+                response = await self.client.generate(messages, temperature=0.3, max_tokens=2000,
+                                                      model=model, fallback=False)
+            except ModelCallError:
+                if self.client.routed(model):
+                    raise
+                # Modèle configuré indisponible: heuristiques, marquées comme repli
+                log.warning("Falling back to heuristic mode")
+                response = await self.client._fallback_generate(messages)
+                heuristic = True
+
+            code = finalize_code(response)
 
             return GeneratedCode(
                 code=code,
                 language="python",
                 primitives_used=analysis.primitives_needed,
-                confidence=0.8 if not self.client.use_fallback else 0.5
+                confidence=0.5 if heuristic else 0.8,
+                fallback=heuristic
             )
 
+        except ModelCallError:
+            raise
         except Exception as e:
             log.warning(f"Code synthesis using fallback: {e}")
 
@@ -842,7 +881,8 @@ print(f"✅ STL exported to: {{output_path}}")
                 code=fallback_code,
                 language="python",
                 primitives_used=[primitive],
-                confidence=0.5
+                confidence=0.5,
+                fallback=True
             )
 
     def _generate_simple_shape_code(self, primitive: str, params: Dict[str, Any]) -> GeneratedCode:
@@ -908,13 +948,78 @@ print(f"✅ STL exported to: {{output_path}}")
         )
 
 
+class FusedCoTAgent:
+    """
+    Mode CoT fusionné: un seul modèle produit analyse, plan et code dans une
+    seule réponse structurée (FUSED_SCHEMA). Un seul prompt système envoyé, pas
+    de changement de modèle sur l'hôte Ollama entre Architect / Planner / Synthesizer.
+    DesignAnalysis et ConstructionPlan sont reconstruits depuis les sections.
+    """
+
+    def __init__(self):
+        model = os.getenv("COT_FUSED_MODEL", os.getenv("COT_SYNTHESIZER_MODEL", "deepseek-coder:33b"))
+        self.client = OllamaCoTClient(model=model, agent="fused")
+        self.prompts = PromptAssembler("fused", FUSED_SYSTEM_PROMPT)
+        log.info("🧠 FusedCoTAgent initialized")
+
+    async def run(self, prompt: str, model: Optional[str] = None,
+                  history: bool = True) -> Tuple[DesignAnalysis, ConstructionPlan, GeneratedCode]:
+        """
+        Analyse + plan + code en un appel; lève une exception si la réponse est inutilisable
+        model: modèle de l'appel (routage / benchmark), défaut: COT_FUSED_MODEL
+        history: False = exemples few-shot sans les générations passées (benchmarks)
+        """
+        if self.client.use_fallback:
+            # Les heuristiques hors-ligne sont celles du mode staged
+            raise RuntimeError("Ollama unavailable")
+
+        log.info(f"🧠 Fused CoT ({model or self.client.model}): {prompt[:100]}...")
+
+        # Exemples choisis sur le prompt (pas encore de description d'objet)
+        hits = examples.search(prompt, sources=None if history else BUILTIN_SOURCES)
+        if hits:
+            log.info(f"📚 Using few-shot examples: {', '.join(f'{d.title} ({s})' for d, s in hits)}")
+
+        messages = self.prompts.messages([
+            few_shot_section((d.title, d.code) for d, _ in hits),
+            Section("request", f"CAD request: {prompt}"),
+        ])
+
+        # Pas d'heuristiques ici: un échec fait monter l'échelle ou repasse en mode staged
+        response = await self.client.generate(messages, temperature=0.3, max_tokens=2500,
+                                              schema=FUSED_SCHEMA, model=model, fallback=False)
+        data = parse_object(response)
+
+        code = data.get("code")
+        if not isinstance(code, str) or "cq." not in code:
+            raise ValueError("fused response has no CadQuery code")
+
+        analysis = analysis_from_dict(data.get("analysis") if isinstance(data.get("analysis"), dict) else {})
+        plan = plan_from_dict(data.get("plan") if isinstance(data.get("plan"), dict) else {})
+        generated = GeneratedCode(
+            code=finalize_code(code),
+            language="python",
+            primitives_used=analysis.primitives_needed,
+            confidence=0.8
+        )
+        log.info(f"🧠 Fused CoT: {analysis.description} ({len(plan.steps)} steps, complexity: {analysis.complexity})")
+        return analysis, plan, generated
+
+
 # ========== EXPORTS ==========
 
 __all__ = [
     "ArchitectAgent",
     "PlannerAgent",
     "CodeSynthesizerAgent",
+    "FusedCoTAgent",
+    "COT_MODES",
+    "normalize_cot_mode",
+    "finalize_code",
+    "UNICODE_REPLACEMENTS",
+    "clean_unicode",
     "DesignAnalysis",
     "ConstructionPlan",
-    "GeneratedCode"
+    "GeneratedCode",
+    "ModelCallError"
 ]
@@ -18,23 +18,24 @@ CRITICAL RULES:
 
 Output only a compact JSON with:
 {
-  "object": "short name (e.g., table, vase, glass, spring, pipe, bowl, screw, bunny)",
-  "params": {"key1": value_in_mm, "key2": value_in_degrees, ...},
-  "operations": ["box", "circle", "extrude", "loft", "shell", "union", "cut", ...],
+  "description": "short name (e.g., table, vase, glass, spring, pipe, bowl, screw, bunny)",
+  "primitives_needed": ["box", "cylinder", "sphere", ...],
+  "operations_sequence": ["box", "circle", "extrude", "loft", "shell", "union", "cut", ...],
+  "parameters": {"key1": value_in_mm, "key2": value_in_degrees, ...},
   "complexity": "simple|medium|complex",
   "reasoning": "Brief explanation of your analysis"
 }
 
 SHAPE IDENTIFICATION EXAMPLES:
-- "table with legs" → object: "table", operations: ["box", "circle", "extrude", "translate", "union"]
-- "vase by lofting circles" → object: "vase", operations: ["circle", "workplane", "loft", "shell"]
-- "drinking glass" → object: "glass", operations: ["circle", "extrude", "cut", "fillet"]
-- "helical spring" → object: "spring", operations: ["helix_path", "sweep"]
-- "pipe" → object: "pipe", operations: ["circle", "extrude", "cut", "chamfer"]
-- "hemispherical bowl" → object: "bowl", operations: ["sphere", "split", "shell", "fillet"]
-- "screw without threads" → object: "screw", operations: ["circle", "extrude", "polygon", "union", "chamfer"]
-- "cone" → object: "cone", operations: ["circle", "extrude_with_taper"]
-- "torus" → object: "torus", operations: ["moveTo", "circle", "revolve"]
+- "table with legs" → description: "table", operations_sequence: ["box", "circle", "extrude", "translate", "union"]
+- "vase by lofting circles" → description: "vase", operations_sequence: ["circle", "workplane", "loft", "shell"]
+- "drinking glass" → description: "glass", operations_sequence: ["circle", "extrude", "cut", "fillet"]
+- "helical spring" → description: "spring", operations_sequence: ["helix_path", "sweep"]
+- "pipe" → description: "pipe", operations_sequence: ["circle", "extrude", "cut", "chamfer"]
+- "hemispherical bowl" → description: "bowl", operations_sequence: ["sphere", "split", "shell", "fillet"]
+- "screw without threads" → description: "screw", operations_sequence: ["circle", "extrude", "polygon", "union", "chamfer"]
+- "cone" → description: "cone", operations_sequence: ["circle", "extrude_with_taper"]
+- "torus" → description: "torus", operations_sequence: ["moveTo", "circle", "revolve"]
 
 IMPORTANT CONSTRAINTS:
 - For HOLLOW objects (pipe, tube, glass, vase, bowl): operations MUST include "cut" or "shell"
@@ -462,6 +463,44 @@ CRITICAL SUCCESS RULES:
 Output ONLY the complete Python code.
 """
 
+# ========== FUSED COT PROMPT (Architect + Planner + Synthesizer en un seul appel) ==========
+
+FUSED_SYSTEM_PROMPT = """You are a CAD engineer. Analyze the request, plan the construction and write the CadQuery code in ONE response.
+
+Return ONE JSON object with three sections, in this order:
+{
+  "analysis": {
+    "description": "short name (e.g., table, vase, glass, spring, pipe, bowl, screw)",
+    "primitives_needed": ["box", "cylinder", ...],
+    "operations_sequence": ["circle", "extrude", "cut", ...],
+    "parameters": {"key": value_in_mm, ...},
+    "complexity": "simple|medium|complex",
+    "reasoning": "brief explanation"
+  },
+  "plan": {
+    "steps": [{"op": "<operation>", "args": {...}, "comment": "why this step"}],
+    "variables": {},
+    "constraints": [],
+    "estimated_complexity": <number>
+  },
+  "code": "the complete Python script, as one JSON string"
+}
+
+ANALYSIS RULES:
+- Extract ONLY what is explicitly mentioned, ALL numeric values exactly as given (mm if no unit)
+- Radii at several heights (vase) → loft, NOT revolve
+- Hollow objects (pipe, tube, glass, vase, bowl) → operations include "cut" or "shell"
+
+PLAN RULES:
+- Minimal sequence of valid CadQuery operations, in execution order
+- Table legs at the CORNERS (inset from the edges), computed from the top dimensions
+
+CODE RULES (the code section follows this reference):
+
+""" + SYNTHESIZER_SYSTEM_PROMPT.replace("Output ONLY the complete Python code.\n", "") + """
+Output ONLY the JSON object; the code goes in the "code" string.
+"""
+
 # ========== CRITIC AGENT RULES ==========
 
 CRITIC_RULES = {
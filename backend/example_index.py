@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+example_index.py — Index BM25 des exemples CadQuery pour le few-shot
+Remplace le choix par "clé contenue dans la description" (FEW_SHOT_EXAMPLES)
+et les exemples figés du benchmark: un index lexical précalculé sur
+  - FEW_SHOT_EXAMPLES (cot_prompts)
+  - WORKING_PATTERNS (cadquery_reference)
+  - les scripts de backend/exemples/ (sans le main / argparse)
+  - les générations CoT réussies (jobs.db au chargement, puis au fil de l'eau)
+renvoie les k exemples les plus proches de la requête qui tiennent dans un
+budget de tokens. ~50 documents: une recherche prend quelques dizaines de µs.
+"""
+
+import ast
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cadquery_reference import WORKING_PATTERNS
+from cot_prompts import FEW_SHOT_EXAMPLES
+from prompt_assembly import count_tokens
+
+log = logging.getLogger("cadamx.example_index")
+
+EXAMPLES_DIR = Path(__file__).parent / "exemples"
+
+# Exemples par prompt et budget de tokens associé
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "2"))
+FEW_SHOT_TOKEN_BUDGET = int(os.getenv("FEW_SHOT_TOKEN_BUDGET", "1200"))
+# Générations passées gardées dans l'index (les plus récentes)
+MAX_HISTORY = int(os.getenv("EXAMPLE_HISTORY", "200"))
+# Score minimal: en dessous, l'exemple n'a rien à voir avec la requête
+MIN_SCORE = float(os.getenv("FEW_SHOT_MIN_SCORE", "3.0"))
+# Sources hors historique (requêtes qui n'utilisent pas les générations passées: benchmarks)
+BUILTIN_SOURCES = ("few_shot", "pattern", "exemple")
+
+# Paramètres BM25 classiques
+K1 = 1.2
+B = 0.75
+# Bonus d'un terme de la requête présent dans le titre (clé, nom de fichier,
+# prompt d'origine), en multiples de son idf: "cylinder" doit trouver le
+# pattern "cylinder" avant un gros script qui cite souvent "diameter"
+TITLE_BOOST = 2.0
+
+_WORD = re.compile(r"[A-Z]?[a-z]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from in into is it of on or the this that to with
+create make generate build using model shape
+width height length thickness diameter radius angle size wall total
+cq workplane result import cadquery def return self none true false mm
+le la les de des du un une et en pour avec sur dans au aux est par
+""".split())
+
+# Même terme des deux côtés (requête et exemples)
+_SYNONYMS = {"cube": "box", "cuboid": "box", "block": "box", "ball": "sphere", "tube": "pipe",
+             "bolt": "screw", "ring": "torus", "donut": "torus", "helix": "spring", "coil": "spring"}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Mots en minuscules, identifiants coupés (polarArray → polar array,
+    outer_radius → outer radius), pluriels simples ramenés au singulier.
+    """
+    terms = []
+    for word in _WORD.findall(text or ""):
+        w = word.lower()
+        if len(w) < 2 or w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        terms.append(_SYNONYMS.get(w, w))
+    return terms
+
+
+@dataclass
+class Example:
+    source: str  # "few_shot" / "pattern" / "exemple" / "history" / ...
+    title: str
+    code: str
+    tokens: int = 0
+    terms: Dict[str, int] = field(default_factory=dict, repr=False)
+    title_terms: frozenset = frozenset()
+    length: int = 0
+
+
+def _script_excerpt(source: str) -> str:
+    """Script de backend/exemples/ sans argparse, main() ni bloc __main__"""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source
+    drop = []
+    for node in tree.body:
+        text = ast.get_source_segment(source, node) or ""
+        if isinstance(node, ast.If) and "__main__" in text:
+            drop.append(node)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) and "argparse" in text:
+            drop.append(node)
+        elif isinstance(node, ast.FunctionDef) and "ArgumentParser" in text:
+            drop.append(node)
+    lines = source.splitlines()
+    for node in sorted(drop, key=lambda n: n.lineno, reverse=True):
+        start = node.lineno - 1 - len(getattr(node, "decorator_list", []))
+        del lines[start:node.end_lineno]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class ExampleIndex:
+    """Index BM25 (postings précalculés, idf recalculé à la volée: ajout en O(doc))"""
+
+    def __init__(self, history: bool = True):
+        self.history = history
+        self.docs: List[Example] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+        self._hashes = set()
+        self._lock = threading.Lock()
+        # Tenu pendant tout le chargement: un search concurrent attend l'index complet
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    # ----- construction -----
+
+    def add(self, source: str, title: str, code: str, text: str = "") -> bool:
+        """Ajoute un exemple (ignoré si ce code est déjà indexé)"""
+        code = code.strip()
+        digest = hashlib.sha1(code.encode("utf-8")).hexdigest()
+        title_terms = frozenset(tokenize(title))
+        terms: Dict[str, int] = {}
+        for term in list(title_terms) + tokenize(text) + tokenize(code):
+            terms[term] = terms.get(term, 0) + 1
+        with self._lock:
+            if digest in self._hashes or not terms:
+                return False
+            self._hashes.add(digest)
+            doc = Example(source, title, code, count_tokens(code), terms, title_terms, sum(terms.values()))
+            idx = len(self.docs)
+            self.docs.append(doc)
+            self._total_length += doc.length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[idx] = tf
+        return True
+
+    def load(self) -> None:
+        """Exemples intégrés + scripts + historique (une fois)"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for key, code in FEW_SHOT_EXAMPLES.items():
+                self.add("few_shot", key, f"import cadquery as cq\n{code}")
+            for name, code in WORKING_PATTERNS.items():
+                self.add("pattern", name.replace("_", " "), code)
+            for path in sorted(EXAMPLES_DIR.glob("*.py")):
+                try:
+                    excerpt = _script_excerpt(path.read_text(encoding="utf-8-sig"))
+                except (OSError, UnicodeDecodeError) as e:
+                    log.warning(f"⚠️ Could not index {path.name}: {e}")
+                    continue
+                # Certains scripts écrivent le STL à la main: pas des exemples CadQuery
+                if "cq." in excerpt:
+                    self.add("exemple", path.stem.replace("_", " "), excerpt)
+            if self.history:
+                self._load_history()
+            # Marqué chargé seulement une fois tous les documents ajoutés
+            self._loaded = True
+        log.info(f"📚 Example index: {len(self.docs)} examples, {len(self._postings)} terms")
+
+    def _load_history(self) -> None:
+        """Générations CoT réussies enregistrées dans jobs.db"""
+        from artifacts import DB_PATH
+        if not DB_PATH.exists():
+            return
+        try:
+            with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
+                rows = conn.execute(
+                    "SELECT prompt, result FROM jobs WHERE status = 'succeeded' AND result IS NOT NULL "
+                    "ORDER BY updated_at DESC LIMIT ?", (MAX_HISTORY,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            log.warning(f"⚠️ Could not read generation history: {e}")
+            return
+        for prompt, result in reversed(rows):
+            try:
+                data = json.loads(result)
+            except ValueError:
+                continue
+            # Seulement les générations retenues comme exemples (Critic OK, pas de repli heuristique)
+            if (data.get("metadata") or {}).get("few_shot_exemplar") and data.get("code"):
+                self.add("history", prompt, data["code"])
+
+    def add_generation(self, prompt: str, code: str) -> None:
+        """Génération réussie: devient un exemple pour les prompts voisins"""
+        if self.history and self.add("history", prompt, code):
+            log.info(f"📚 Indexed successful generation: {prompt[:60]}")
+
+    # ----- recherche -----
+
+    def search(self, query: str, k: int = FEW_SHOT_K, token_budget: Optional[int] = FEW_SHOT_TOKEN_BUDGET,
+               sources: Optional[Iterable[str]] = None, min_score: float = MIN_SCORE) -> List[Tuple[Example, float]]:
+        """
+        k meilleurs exemples (score BM25 décroissant) dont la somme des tokens
+        tient dans token_budget; un exemple trop gros est sauté, pas tronqué.
+        """
+        self.load()
+        allowed = set(sources) if sources is not None else None
+        n = len(self.docs)
+        if not n:
+            return []
+        avg_length = self._total_length / n
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for idx, tf in postings.items():
+                doc = self.docs[idx]
+                norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc.length / avg_length))
+                boost = TITLE_BOOST if term in doc.title_terms else 0.0
+                scores[idx] = scores.get(idx, 0.0) + idf * (norm + boost)
+
+        hits, used = [], 0
+        for idx, score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+            doc = self.docs[idx]
+            if score < min_score or len(hits) >= k:
+                break
+            if allowed is not None and doc.source not in allowed:
+                continue
+            if token_budget is not None and used + doc.tokens > token_budget:
+                continue
+            hits.append((doc, round(score, 3)))
+            used += doc.tokens
+        return hits
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for doc in self.docs:
+            counts[doc.source] = counts.get(doc.source, 0) + 1
+        return counts
+
+
+# Instance partagée par le process (chargée au premier search)
+examples = ExampleIndex()
+
+
+__all__ = [
+    "FEW_SHOT_K", "FEW_SHOT_TOKEN_BUDGET", "BUILTIN_SOURCES", "tokenize", "Example", "ExampleIndex", "examples",
+]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+export_stage.py — Export STL des modèles BRep (CadQuery / OCC)
+Tessellation BRepMesh en mode parallèle, déflexions linéaire/angulaire
+dérivées de la boîte englobante et du niveau de qualité demandé:
+- preview: maillage grossier, rapide (aperçu dans le viewer)
+- production: maillage fin pour l'impression / la fabrication
+
+Le niveau de qualité est porté par un ContextVar: le ValidatorAgent le fixe
+autour de l'exécution du code généré, les templates appellent simplement
+export_stl(shape, path).
+"""
+
+import contextvars
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("cadamx.export")
+
+DEFAULT_QUALITY = "production"
+
+# Déflexion linéaire = diagonale de la bbox × rel (bornée par min_linear, en mm),
+# déflexion angulaire en radians
+QUALITY_PRESETS: Dict[str, Dict[str, float]] = {
+    "preview": {"rel": 2e-3, "min_linear": 0.05, "angular": 0.5},
+    "production": {"rel": 2e-4, "min_linear": 0.01, "angular": 0.15},
+}
+
+_quality: contextvars.ContextVar = contextvars.ContextVar("export_quality", default=DEFAULT_QUALITY)
+# Formes passées à export_stl() pendant un capture_shapes() (stockage BRep du job)
+_captured: contextvars.ContextVar = contextvars.ContextVar("captured_shapes", default=None)
+
+
+def normalize_quality(quality: Optional[str]) -> str:
+    """Niveau de qualité connu, sinon le défaut (production)"""
+    q = (quality or DEFAULT_QUALITY).strip().lower()
+    if q not in QUALITY_PRESETS:
+        log.warning(f"⚠️ Unknown export quality '{quality}', using '{DEFAULT_QUALITY}'")
+        return DEFAULT_QUALITY
+    return q
+
+
+def get_quality() -> str:
+    return _quality.get()
+
+
+@contextmanager
+def quality_scope(quality: Optional[str]):
+    """Fixe le niveau de qualité pour tous les export_stl() du bloc"""
+    token = _quality.set(normalize_quality(quality))
+    try:
+        yield
+    finally:
+        _quality.reset(token)
+
+
+@contextmanager
+def capture_shapes():
+    """Collecte les formes exportées dans le bloc (la dernière est la forme finale)"""
+    shapes = []
+    token = _captured.set(shapes)
+    try:
+        yield shapes
+    finally:
+        _captured.reset(token)
+
+
+def as_shape(shape: Any):
+    """cq.Workplane / cq.Shape / TopoDS_Shape → cq.Shape"""
+    import cadquery as cq
+
+    if isinstance(shape, cq.Workplane):
+        vals = [v for v in shape.vals() if isinstance(v, cq.Shape)]
+        if not vals:
+            raise ValueError("Workplane has no shape to export")
+        return vals[0] if len(vals) == 1 else cq.Compound.makeCompound(vals)
+    if isinstance(shape, cq.Shape):
+        return shape
+    return cq.Shape.cast(shape)
+
+
+def deflection_for(shape: Any, quality: Optional[str] = None) -> Tuple[float, float]:
+    """(déflexion linéaire mm, déflexion angulaire rad) pour une forme et un niveau de qualité"""
+    preset = QUALITY_PRESETS[normalize_quality(quality or get_quality())]
+    bb = as_shape(shape).BoundingBox()
+    diag = math.sqrt(bb.xlen ** 2 + bb.ylen ** 2 + bb.zlen ** 2)
+    return max(diag * preset["rel"], preset["min_linear"]), preset["angular"]
+
+
+def tessellate(shape: Any, quality: Optional[str] = None, workers: Optional[int] = None,
+               tolerance: Optional[float] = None, angular_tolerance: Optional[float] = None) -> int:
+    """
+    Maille la forme en place (triangulations attachées aux faces).
+    Un compound de plusieurs solides est maillé solide par solide sur un pool,
+    chaque solide avec la déflexion de sa propre bbox (bornée par celle du
+    compound) pour que les petits éléments restent précis.
+    tolerance / angular_tolerance (mm / rad) remplacent le preset s'ils sont donnés.
+    Retourne le nombre de solides maillés.
+    """
+    from OCP.BRepMesh import BRepMesh_IncrementalMesh
+
+    shape = as_shape(shape)
+    quality = normalize_quality(quality or get_quality())
+    linear, angular = deflection_for(shape, quality)
+    if tolerance:
+        linear = tolerance
+    if angular_tolerance:
+        angular = angular_tolerance
+    solids = shape.Solids() if shape.ShapeType() == "Compound" else []
+    # Copies placées d'une même primitive (shape_cache) partagent leur TShape et donc
+    # leur triangulation: une seule tâche par TShape (jamais deux threads sur la même)
+    unique = list({s.wrapped.TShape(): s for s in solids}.values())
+
+    if len(solids) <= 1:
+        BRepMesh_IncrementalMesh(shape.wrapped, linear, False, angular, True)
+        log.info(f"🔺 Tessellated shape ({quality}: linear={linear:.4f}mm, angular={angular:.2f}rad)")
+        return 1
+
+    def mesh_solid(solid):
+        lin = linear if tolerance else deflection_for(solid, quality)[0]
+        BRepMesh_IncrementalMesh(solid.wrapped, min(lin, linear), False, angular, True)
+
+    workers = workers or min(len(unique), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(mesh_solid, unique))
+    # Faces hors solides (coques, faces libres) éventuellement présentes dans le compound
+    BRepMesh_IncrementalMesh(shape.wrapped, linear, False, angular, True)
+
+    log.info(f"🔺 Tessellated {len(solids)} solids, {len(unique)} distinct ({quality}: linear≤{linear:.4f}mm, "
+             f"angular={angular:.2f}rad, workers={workers})")
+    return len(solids)
+
+
+def export_stl(shape: Any, path: str, quality: Optional[str] = None, ascii: bool = False,
+               tolerance: Optional[float] = None, angular_tolerance: Optional[float] = None) -> str:
+    """Tessellation contrôlée puis écriture STL (les triangulations existantes sont réutilisées)"""
+    from OCP.StlAPI import StlAPI_Writer
+
+    shape = as_shape(shape)
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(shape)
+    tessellate(shape, quality, tolerance=tolerance, angular_tolerance=angular_tolerance)
+
+    writer = StlAPI_Writer()
+    writer.ASCIIMode = ascii
+    if not writer.Write(shape.wrapped, str(path)):
+        raise RuntimeError(f"STL export failed: {path}")
+    return str(path)
+
+
+__all__ = [
+    "DEFAULT_QUALITY", "QUALITY_PRESETS", "normalize_quality", "get_quality", "quality_scope",
+    "capture_shapes", "as_shape", "deflection_for", "tessellate", "export_stl",
+]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+heal_patch.py — Correction LLM localisée (hunk) au lieu du programme complet
+Le healing "full" envoie les 1500 premiers caractères du code et redemande
+tout le programme (max_tokens=2048): lent, et le code après la coupure est
+perdu. Ici on part de la ligne en erreur (SyntaxError.lineno ou "line N" des
+messages d'erreur), on isole la région qui l'entoure:
+  - la fonction englobante si elle est courte,
+  - sinon l'instruction fautive et ses voisines du même bloc,
+  - sinon (code non parsable) une fenêtre de lignes sans couper une expression
+    multi-lignes,
+on ne demande au modèle que le remplacement de cette région, puis on le
+recolle dans le programme avec l'indentation d'origine.
+
+Configuration:
+  - HEAL_MODE=patch (défaut: hunk puis programme complet si échec) | full
+  - HEAL_CONTEXT_LINES : lignes de contexte autour de la région (3)
+  - HEAL_MAX_REGION_LINES : taille maximale de la région éditable (40)
+"""
+
+import ast
+import os
+import re
+import textwrap
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+HEAL_MODE = os.getenv("HEAL_MODE", "patch").strip().lower()
+HEAL_CONTEXT_LINES = int(os.getenv("HEAL_CONTEXT_LINES", "3"))
+HEAL_MAX_REGION_LINES = int(os.getenv("HEAL_MAX_REGION_LINES", "40"))
+
+_LINE_REF = re.compile(r"\bline (\d+)\b")
+# Ligne qui continue la précédente / ligne qui attend une suite
+_CONTINUES = (".", ")", "]", "}")
+_OPENS = ("(", "[", "{", ",", "\\", "+", "-", "*", "/")
+
+
+@dataclass
+class Hunk:
+    """Région éditable [start, end] (1-based, inclus) et son contexte en lecture seule"""
+    start: int
+    end: int
+    text: str
+    before: str
+    after: str
+    indent: str
+    kind: str  # "function" / "statements" / "window"
+
+    @property
+    def lines(self) -> int:
+        return self.end - self.start + 1
+
+
+def error_line(code: str, errors: List[str]) -> Optional[int]:
+    """
+    Ligne fautive: SyntaxError du code lui-même, sinon première mention
+    "line N" dans les erreurs (SyntaxValidator, exécution <cad>)
+    """
+    n = code.count("\n") + 1
+    try:
+        compile(code, "<heal>", "exec")
+    except SyntaxError as e:
+        if e.lineno and 1 <= e.lineno <= n:
+            return e.lineno
+    for error in errors:
+        m = _LINE_REF.search(error)
+        if m and 1 <= int(m.group(1)) <= n:
+            return int(m.group(1))
+    return None
+
+
+def _start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", None) or []
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def _ast_region(tree: ast.AST, lineno: int) -> Optional[Tuple[int, int, str]]:
+    """Fonction courte englobante, sinon instruction la plus interne + voisines du même bloc"""
+    function, innermost = None, None
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _start(node) <= lineno <= node.end_lineno:
+            if function is None or node.end_lineno - _start(node) <= function.end_lineno - _start(function):
+                function = node
+        for field in ("body", "orelse", "finalbody"):
+            body = getattr(node, field, None)
+            if not isinstance(body, list):
+                continue
+            for i, stmt in enumerate(body):
+                if isinstance(stmt, ast.stmt) and _start(stmt) <= lineno <= stmt.end_lineno:
+                    # ast.walk va du plus externe au plus interne: <= garde le plus profond
+                    span = stmt.end_lineno - _start(stmt)
+                    if innermost is None or span <= innermost[0]:
+                        innermost = (span, body, i)
+
+    if function is not None and function.end_lineno - _start(function) + 1 <= HEAL_MAX_REGION_LINES:
+        return _start(function), function.end_lineno, "function"
+    if innermost is None:
+        return None
+
+    _, body, i = innermost
+    lo = hi = i
+    while lo > 0 and _start(body[lo - 1]) >= lineno - HEAL_CONTEXT_LINES \
+            and body[i].end_lineno - _start(body[lo - 1]) < HEAL_MAX_REGION_LINES:
+        lo -= 1
+    while hi + 1 < len(body) and body[hi + 1].end_lineno <= lineno + HEAL_CONTEXT_LINES \
+            and body[hi + 1].end_lineno - _start(body[lo]) < HEAL_MAX_REGION_LINES:
+        hi += 1
+    start, end = _start(body[lo]), body[hi].end_lineno
+    if end - start + 1 > HEAL_MAX_REGION_LINES:
+        return None
+    return start, end, "statements"
+
+
+def _window(lines: List[str], lineno: int) -> Tuple[int, int]:
+    """Fenêtre autour de la ligne, élargie pour ne pas couper une expression multi-lignes"""
+    start = max(1, lineno - HEAL_CONTEXT_LINES)
+    end = min(len(lines), lineno + HEAL_CONTEXT_LINES)
+    while start > 1 and end - start + 1 < HEAL_MAX_REGION_LINES and (
+            lines[start - 1].lstrip().startswith(_CONTINUES) or lines[start - 2].rstrip().endswith(_OPENS)):
+        start -= 1
+    while end < len(lines) and end - start + 1 < HEAL_MAX_REGION_LINES and (
+            lines[end].lstrip().startswith(_CONTINUES) or lines[end - 1].rstrip().endswith(_OPENS)):
+        end += 1
+    return start, end
+
+
+def failing_region(code: str, lineno: int) -> Hunk:
+    """Région éditable autour de la ligne fautive + contexte avant/après"""
+    lines = code.split("\n")
+    lineno = max(1, min(lineno, len(lines)))
+    region = None
+    try:
+        region = _ast_region(ast.parse(code), lineno)
+    except SyntaxError:
+        pass
+    if region is None:
+        start, end = _window(lines, lineno)
+        region = (start, end, "window")
+    start, end, kind = region
+
+    body = lines[start - 1:end]
+    indents = [len(l) - len(l.lstrip()) for l in body if l.strip()]
+    first = next((l for l in body if l.strip() and len(l) - len(l.lstrip()) == min(indents)), "") if indents else ""
+    return Hunk(
+        start=start,
+        end=end,
+        text="\n".join(body),
+        before="\n".join(lines[max(0, start - 1 - HEAL_CONTEXT_LINES):start - 1]),
+        after="\n".join(lines[end:end + HEAL_CONTEXT_LINES]),
+        indent=first[:len(first) - len(first.lstrip())],
+        kind=kind,
+    )
+
+
+def extract_hunk(response: str) -> Optional[str]:
+    """Lignes de remplacement du bloc ```python``` (indentation conservée)"""
+    m = re.search(r"```[A-Za-z]*[ \t]*\n(.*?)\n?[ \t]*```", response, re.DOTALL)
+    text = m.group(1) if m else response
+    text = text.strip("\n").rstrip()
+    return text if text.strip() else None
+
+
+def splice(code: str, hunk: Hunk, replacement: str) -> str:
+    """Remplace les lignes [start, end] par le hunk, réindenté au niveau de la région"""
+    body = textwrap.indent(textwrap.dedent(replacement), hunk.indent)
+    lines = code.split("\n")
+    return "\n".join(lines[:hunk.start - 1] + body.split("\n") + lines[hunk.end:])
+
+
+__all__ = [
+    "HEAL_MODE", "HEAL_CONTEXT_LINES", "HEAL_MAX_REGION_LINES", "Hunk",
+    "error_line", "failing_region", "extract_hunk", "splice",
+]
@@ -0,0 +1,1887 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+heal_rules.py — Table de règles de SelfHealingAgent._basic_fixes
+Chaque correction basique est une règle déclarative:
+  - signatures: sous-chaînes de l'erreur qui la déclenchent (nocase: en minuscules)
+  - when: condition supplémentaire (code d'origine, prompt, corrections déjà faites)
+  - group: chaîne if/elif, seule la première règle du groupe qui correspond s'applique
+  - fix: fonction (code en cours, HealInput) → code corrigé
+Les substitutions simples (dont cot_prompts.HEALER_PATTERNS) sont des regex
+compilées à l'import. RuleSet indexe les règles par mot de signature: pour une
+erreur donnée, seules les règles dont un mot apparaît dans le message sont
+évaluées, dans l'ordre de la table. Chaque déclenchement est compté et chronométré
+(stats, exposé sur /api/healing).
+"""
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from cot_prompts import HEALER_PATTERNS
+
+log = logging.getLogger("cadamx.heal_rules")
+
+# Emojis: erreurs d'encodage (charmap) sous Windows
+EMOJI_PATTERN = re.compile("["
+    u"\U0001F600-\U0001F64F"  # emoticons
+    u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+    u"\U0001F680-\U0001F6FF"  # transport & map symbols
+    u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    u"\U00002702-\U000027B0"  # dingbats
+    u"\U000024C2-\U0001F251"
+    u"\u2705"  # ✅ check mark
+    u"\u274C"  # ❌ cross mark
+    "]+", flags=re.UNICODE)
+
+
+def strip_emojis(code: str) -> str:
+    # Code ASCII (cas courant): pas de regex sur tout le programme
+    return code if code.isascii() else EMOJI_PATTERN.sub('', code)
+
+
+@dataclass
+class HealInput:
+    """Ce qu'une règle voit d'une erreur (le code en cours de correction est passé à part)"""
+    error: str
+    error_lower: str
+    code: str  # code d'origine, avant toute correction
+    prompt: str
+    context: Any
+    fixes_applied: Set[str]
+
+
+Fix = Callable[[str, HealInput], str]
+
+
+@dataclass
+class Rule:
+    name: str
+    fix: Fix
+    signatures: Tuple[str, ...] = ()
+    nocase: Tuple[str, ...] = ()
+    when: Optional[Callable[[HealInput], bool]] = None
+    group: Optional[str] = None
+
+    def matches(self, h: HealInput) -> bool:
+        for s in self.signatures:
+            if s in h.error:
+                return self.when is None or self.when(h)
+        for s in self.nocase:
+            if s in h.error_lower:
+                return self.when is None or self.when(h)
+        return False
+
+
+def sub_rule(name: str, signatures: Iterable[str], pattern: str, replacement: Any,
+             description: str, literal: bool = False) -> Rule:
+    """Règle de substitution pure (regex compilée une fois; literal: str.replace)"""
+    compiled = None if literal else re.compile(pattern)
+
+    def fix(fixed_code: str, h: HealInput) -> str:
+        if compiled is None:
+            fixed_code = fixed_code.replace(pattern, replacement)
+        else:
+            fixed_code = compiled.sub(replacement, fixed_code)
+        log.info(f"🩹 Fixed: {description}")
+        return fixed_code
+
+    return Rule(name, fix, signatures=tuple(signatures))
+
+
+def hint_rule(name: str, signatures: Iterable[str], hint: str) -> Rule:
+    """Erreur connue sans correction automatique: seulement l'indication dans les logs"""
+    def fix(fixed_code: str, h: HealInput) -> str:
+        log.warning(f"⚠️ {hint}")
+        return fixed_code
+
+    return Rule(name, fix, signatures=tuple(signatures))
+
+
+def healer_pattern_rules(patterns: Dict[str, Dict[str, Any]] = HEALER_PATTERNS,
+                         extra_signatures: Optional[Dict[str, Tuple[str, ...]]] = None) -> Dict[str, Rule]:
+    """
+    cot_prompts.HEALER_PATTERNS → règles: "fix"/"replacement" = substitution,
+    "suggestion" = indication. Les autres entrées (helix, BRep_API) ont une
+    règle dédiée dans RULES.
+    """
+    extra_signatures = extra_signatures or {}
+    rules = {}
+    for key, p in patterns.items():
+        signatures = (p["error"],) + extra_signatures.get(key, ())
+        if "fix" in p and "replacement" in p:
+            rules[key] = sub_rule(key, signatures, p["fix"], p["replacement"], p.get("description", key))
+        elif "suggestion" in p:
+            hint = p["suggestion"] + (f" ({p['common_fix']})" if p.get("common_fix") else "")
+            rules[key] = hint_rule(key, signatures, hint)
+    return rules
+
+
+_WORD = re.compile(r"\w+")
+
+
+def _whole_words(signature: str) -> List[str]:
+    """
+    Mots de la signature bordés par un séparateur des deux côtés: ils
+    apparaissent comme mots entiers dans toute erreur qui contient la signature
+    ("NameError" seul pourrait être collé à autre chose: aucun mot).
+    """
+    return [m.group(0).lower() for m in _WORD.finditer(signature)
+            if m.start() > 0 and m.end() < len(signature)]
+
+
+class RuleStats:
+    """Déclenchements, modifications effectives et temps par règle; coût total du chemin"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules: Dict[str, Dict[str, Any]] = {}
+        self._runs = {"runs": 0, "errors": 0, "rules_evaluated": 0, "seconds": 0.0}
+
+    def record(self, rule: str, changed: bool, seconds: float) -> None:
+        with self._lock:
+            r = self._rules.setdefault(rule, {"hits": 0, "changed": 0, "seconds": 0.0})
+            r["hits"] += 1
+            r["changed"] += int(changed)
+            r["seconds"] += seconds
+
+    def record_run(self, errors: int, evaluated: int, seconds: float) -> None:
+        with self._lock:
+            self._runs["runs"] += 1
+            self._runs["errors"] += errors
+            self._runs["rules_evaluated"] += evaluated
+            self._runs["seconds"] += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            runs = self._runs["runs"]
+            return {
+                "runs": runs,
+                "errors": self._runs["errors"],
+                "avg_rules_evaluated": round(self._runs["rules_evaluated"] / runs, 1) if runs else 0.0,
+                "avg_ms": round(self._runs["seconds"] * 1000 / runs, 3) if runs else 0.0,
+                "rules": {
+                    name: {"hits": r["hits"], "changed": r["changed"],
+                           "avg_ms": round(r["seconds"] * 1000 / r["hits"], 3)}
+                    for name, r in sorted(self._rules.items(), key=lambda kv: kv[1]["hits"], reverse=True)
+                },
+            }
+
+
+# Instance partagée par le process
+stats = RuleStats()
+
+
+class RuleSet:
+    """Règles ordonnées + index mot de signature → règles"""
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = list(rules)
+        self._index: Dict[str, List[int]] = {}
+        self._always: List[int] = []
+        # Clé d'une signature = son mot le plus rare dans la table ("attribute" est partout, "torus" non)
+        frequency: Dict[str, int] = {}
+        for rule in self.rules:
+            for s in rule.signatures + rule.nocase:
+                for word in set(_whole_words(s)):
+                    frequency[word] = frequency.get(word, 0) + 1
+        for i, rule in enumerate(self.rules):
+            keys = set()
+            for s in rule.signatures + rule.nocase:
+                words = _whole_words(s)
+                keys.add(min(words, key=lambda w: (frequency[w], -len(w))) if words else None)
+            if None in keys:
+                self._always.append(i)
+                continue
+            for key in keys:
+                self._index.setdefault(key, []).append(i)
+
+    def candidates(self, error_lower: str) -> List[int]:
+        """Règles dont un mot-clé apparaît dans l'erreur, dans l'ordre de la table"""
+        found = set(self._always)
+        for word in set(_WORD.findall(error_lower)):
+            found.update(self._index.get(word, ()))
+        return sorted(found)
+
+    def apply(self, code: str, errors: List[str], prompt: str = "", context: Any = None) -> str:
+        start = time.perf_counter()
+        fixed_code = code
+        # Corrections déjà faites (une seule fois par appel, toutes erreurs confondues)
+        fixes_applied: Set[str] = set()
+        evaluated = 0
+        for error in errors:
+            h = HealInput(error, error.lower(), code, prompt, context, fixes_applied)
+            groups_done = set()
+            for i in self.candidates(h.error_lower):
+                rule = self.rules[i]
+                if rule.group in groups_done:
+                    continue
+                evaluated += 1
+                if not rule.matches(h):
+                    continue
+                if rule.group:
+                    groups_done.add(rule.group)
+                t0 = time.perf_counter()
+                before = fixed_code
+                fixed_code = rule.fix(fixed_code, h)
+                stats.record(rule.name, fixed_code != before, time.perf_counter() - t0)
+        stats.record_run(len(errors), evaluated, time.perf_counter() - start)
+        return fixed_code
+
+
+# ========== FIXES ==========
+# Une fonction par correction: (code en cours, HealInput) → code corrigé
+
+# Fix 1: Missing imports
+def _fix_missing_imports(fixed_code: str, h: HealInput) -> str:
+    error = h.error
+    if "np" in error and "import numpy as np" not in fixed_code:
+        fixed_code = "import numpy as np\n" + fixed_code
+
+    if "math" in error and "import math" not in fixed_code:
+        fixed_code = "import math\n" + fixed_code
+
+    if "struct" in error and "import struct" not in fixed_code:
+        fixed_code = "import struct\n" + fixed_code
+
+    return fixed_code
+
+
+# Fix 1b: Hallucinated imports (modules that don't exist)
+def _fix_hallucinated_module(fixed_code: str, h: HealInput) -> str:
+    error = h.error
+    # Remove hallucinated imports
+    hallucinated_modules = ['Helpers', 'cadquery.helpers', 'cq_helpers', 'utils', 'cad_utils']
+
+    for module in hallucinated_modules:
+        if f"No module named '{module}'" in error or f'No module named "{module}"' in error:
+            # Remove the import line
+            lines = fixed_code.split('\n')
+            fixed_lines = []
+            for line in lines:
+                # Skip lines importing the hallucinated module
+                if f'import {module}' in line or f'from {module}' in line:
+                    log.info(f"🩹 Removed hallucinated import: {line.strip()}")
+                    continue
+                fixed_lines.append(line)
+            fixed_code = '\n'.join(fixed_lines)
+
+    return fixed_code
+
+
+# Fix 2: Indentation errors (basique)
+def _fix_indentation(fixed_code: str, h: HealInput) -> str:
+    lines = fixed_code.split("\n")
+    # Normaliser l'indentation
+    fixed_lines = []
+    for line in lines:
+        # Remplacer tabs par spaces
+        fixed_lines.append(line.replace("\t", "    "))
+    fixed_code = "\n".join(fixed_lines)
+
+    return fixed_code
+
+
+# Fix 3: CadQuery-specific error fixes
+# 3a: .torus() doesn't exist - CRITICAL FIX
+def _fix_torus_method(fixed_code: str, h: HealInput) -> str:
+    # Strategy: Replace entire line containing .torus() with proper revolve pattern
+
+    # Find lines with .torus() call
+    lines = fixed_code.split('\n')
+    new_lines = []
+
+    for line in lines:
+        if '.torus(' in line:
+            # Extract variable name if exists (e.g., "result = ...")
+            var_match = re.match(r'(\s*)(\w+)\s*=\s*.*\.torus\s*\(\s*([^,]+)\s*,\s*([^)]+)\s*\)', line)
+            if var_match:
+                indent = var_match.group(1)
+                var_name = var_match.group(2)
+                major_r = var_match.group(3).strip()
+                minor_r = var_match.group(4).strip()
+
+                # Replace with correct pattern
+                new_lines.append(f'{indent}# Torus via revolve (fixed by SelfHealingAgent)')
+                new_lines.append(f'{indent}{var_name} = (cq.Workplane("XY")')
+                new_lines.append(f'{indent}    .moveTo({major_r}, 0).circle({minor_r})')
+                new_lines.append(f'{indent}    .revolve(360, (0, 0, 0), (0, 0, 1)))')
+            else:
+                # No variable assignment, just replace the call
+                indent_match = re.match(r'(\s*)', line)
+                indent = indent_match.group(1) if indent_match else ''
+
+                # Try to extract parameters
+                param_match = re.search(r'\.torus\s*\(\s*([^,]+)\s*,\s*([^)]+)\s*\)', line)
+                if param_match:
+                    major_r = param_match.group(1).strip()
+                    minor_r = param_match.group(2).strip()
+                    new_lines.append(f'{indent}# Torus via revolve (fixed by SelfHealingAgent)')
+                    new_lines.append(f'{indent}result = (cq.Workplane("XY")')
+                    new_lines.append(f'{indent}    .moveTo({major_r}, 0).circle({minor_r})')
+                    new_lines.append(f'{indent}    .revolve(360, (0, 0, 0), (0, 0, 1)))')
+                else:
+                    new_lines.append(line)  # Keep original if can't parse
+        else:
+            new_lines.append(line)
+
+    fixed_code = '\n'.join(new_lines)
+    log.info("🩹 Fixed: Replaced .torus() with revolve pattern")
+
+    return fixed_code
+
+
+# 3c1a: .spline() missing required argument 'listOfXYTuple'
+def _fix_spline_missing_points(fixed_code: str, h: HealInput) -> str:
+    # Strategy: Comment out .spline() - can't auto-fix without knowing points
+    lines = fixed_code.split('\n')
+    fixed_lines = []
+    for line in lines:
+        if '.spline()' in line and 'listOfXYTuple' not in line:
+            indent_match = re.match(r'(\s*)', line)
+            indent = indent_match.group(1) if indent_match else ''
+            fixed_lines.append(f'{indent}# {line.strip()}  # .spline() needs listOfXYTuple argument')
+            log.info(f"🩹 Commented out invalid .spline(): {line.strip()}")
+        else:
+            fixed_lines.append(line)
+    fixed_code = '\n'.join(fixed_lines)
+
+    return fixed_code
+
+
+# 3c1b: .helix() doesn't exist - SPRING fix
+def _fix_helix_method(fixed_code: str, h: HealInput) -> str:
+    # Strategy: Comment out .helix() and suggest manual helix
+    lines = fixed_code.split('\n')
+    fixed_lines = []
+    for line in lines:
+        if '.helix(' in line:
+            indent_match = re.match(r'(\s*)', line)
+            indent = indent_match.group(1) if indent_match else ''
+            fixed_lines.append(f'{indent}# {line.strip()}  # .helix() not available - use manual helix generation')
+            log.info(f"🩹 Commented out .helix(): {line.strip()}")
+        else:
+            fixed_lines.append(line)
+    fixed_code = '\n'.join(fixed_lines)
+
+    return fixed_code
+
+
+# 3c2: Chamfer/fillet on non-existent edges - PIPE fix
+def _fix_no_edges_for_fillet(fixed_code: str, h: HealInput) -> str:
+    # Strategy: Comment out problematic chamfer/fillet calls
+    lines = fixed_code.split('\n')
+    fixed_lines = []
+
+    for line in lines:
+        if '.chamfer(' in line or '.fillet(' in line:
+            # Comment out the line instead of removing it completely
+            indent_match = re.match(r'(\s*)', line)
+            indent = indent_match.group(1) if indent_match else ''
+            fixed_lines.append(f'{indent}# {line.strip()}  # Removed: no suitable edges')
+            log.info(f"🩹 Commented out chamfer/fillet: {line.strip()}")
+        else:
+            fixed_lines.append(line)
+
+    fixed_code = '\n'.join(fixed_lines)
+
+    return fixed_code
+
+
+# 3d3: radiusArc() with invalid keyword arguments (endX, endY)
+def _fix_radius_arc_kwargs(fixed_code: str, h: HealInput) -> str:
+    # radiusArc API: radiusArc((x, y), radius) NOT radiusArc(endX=x, endY=y, radius=r)
+    # Pattern: .radiusArc(endX=30, endY=60, radius=22) → .radiusArc((30, 60), 22)
+    def fix_radiusArc(match):
+        # Extract the full call
+        full_match = match.group(0)
+        # Try to find endX, endY, radius values
+        endX_match = re.search(r'endX\s*=\s*([^,\)]+)', full_match)
+        endY_match = re.search(r'endY\s*=\s*([^,\)]+)', full_match)
+        radius_match = re.search(r'radius\s*=\s*([^,\)]+)', full_match)
+
+        if endX_match and endY_match and radius_match:
+            x = endX_match.group(1).strip()
+            y = endY_match.group(1).strip()
+            r = radius_match.group(1).strip()
+            return f'.radiusArc(({x}, {y}), {r})'
+        return full_match
+
+    fixed_code = re.sub(
+        r'\.radiusArc\s*\([^)]+\)',
+        fix_radiusArc,
+        fixed_code
+    )
+    log.info("🩹 Fixed: Converted radiusArc(endX=, endY=, radius=) to radiusArc((x, y), radius)")
+
+    return fixed_code
+
+
+# 3d4: threePointArc() with invalid keyword arguments
+def _fix_three_point_arc_kwargs(fixed_code: str, h: HealInput) -> str:
+    # threePointArc API: threePointArc((x1, y1), (x2, y2)) NOT threePointArc(x1=, y1=, x2=, y2=)
+    def fix_threePointArc(match):
+        full_match = match.group(0)
+        # Try to find point coordinates
+        x1_match = re.search(r'(?:x1|point1X)\s*=\s*([^,\)]+)', full_match)
+        y1_match = re.search(r'(?:y1|point1Y)\s*=\s*([^,\)]+)', full_match)
+        x2_match = re.search(r'(?:x2|point2X)\s*=\s*([^,\)]+)', full_match)
+        y2_match = re.search(r'(?:y2|point2Y)\s*=\s*([^,\)]+)', full_match)
+
+        if x1_match and y1_match and x2_match and y2_match:
+            x1 = x1_match.group(1).strip()
+            y1 = y1_match.group(1).strip()
+            x2 = x2_match.group(1).strip()
+            y2 = y2_match.group(1).strip()
+            return f'.threePointArc(({x1}, {y1}), ({x2}, {y2}))'
+        return full_match
+
+    fixed_code = re.sub(
+        r'\.threePointArc\s*\([^)]+\)',
+        fix_threePointArc,
+        fixed_code
+    )
+    log.info("🩹 Fixed: Converted threePointArc keyword args to positional tuples")
+
+    return fixed_code
+
+
+# 3f: Cannot find solid in stack (need to extrude first)
+def _fix_no_solid_on_stack(fixed_code: str, h: HealInput) -> str:
+    # This is harder to fix automatically, but we can add a hint
+    log.warning("⚠️ Error: No solid found. Need to extrude/revolve/loft before cut operations")
+    # Try to find .circle() or .rect() without subsequent .extrude()
+    # and add .extrude() if missing
+    lines = fixed_code.split('\n')
+    for i, line in enumerate(lines):
+        if ('.circle(' in line or '.rect(' in line) and '.extrude(' not in line:
+            # Check if next operation is a cut
+            if i + 1 < len(lines) and ('cutThruAll' in lines[i+1] or 'cut(' in lines[i+1]):
+                # Insert extrude before cut
+                # TODO: Implement automatic .extrude() insertion
+                pass
+
+    return fixed_code
+
+
+# 3g: BRep_API command not done - CRITICAL for torus revolve and bad revolve profiles
+# This happens when using wrong workplane OR missing clean=False for 360° revolves
+# OR trying to revolve an invalid/non-closed profile
+def _fix_brep_api(fixed_code: str, h: HealInput) -> str:
+    log.info("🩹 Attempting to fix: BRep_API error (likely missing clean=False or wrong workplane)")
+
+    # Strategy: First copy all lines, then make modifications
+    lines = fixed_code.split('\n')
+    revolve_found = False
+
+    # Find revolve operations and fix them
+    for i, line in enumerate(lines):
+        if '.revolve(' in line:
+            revolve_found = True
+
+            # Fix 1: Add clean=False for 360° revolves
+            if '360' in line and 'clean=False' not in line:
+                # Find the closing parenthesis of revolve() and add clean=False before it
+                # Handle both revolve(360) and revolve(360, ...)
+                if '.revolve(360)' in line:
+                    lines[i] = line.replace('.revolve(360)', '.revolve(360, clean=False)')
+                    log.info("🩹 Fixed: Added clean=False to revolve(360)")
+                elif 'revolve(360,' in line and ')' in line:
+                    # Find last ) before any comment or end of line
+                    parts = line.split('#')[0]  # Remove comments
+                    if parts.rstrip().endswith(')'):
+                        lines[i] = parts.rstrip()[:-1] + ', clean=False)' + ('#' + line.split('#')[1] if '#' in line else '')
+                        log.info("🩹 Fixed: Added clean=False to revolve(360, ...)")
+
+            # Fix 2: Check workplane for Y-axis revolves
+            if '(0, 1, 0)' in line:
+                # Look back to find the Workplane declaration
+                found_fix = False
+                for j in range(i-1, max(-1, i-5), -1):
+                    if j >= 0 and 'Workplane("XY")' in lines[j]:
+                        # FOUND THE BUG: XY plane with Y-axis revolve
+                        lines[j] = lines[j].replace('Workplane("XY")', 'Workplane("XZ")')
+                        log.info("🩹 Fixed: Changed Workplane('XY') to Workplane('XZ') for Y-axis revolve")
+                        found_fix = True
+                        break
+
+                if not found_fix:
+                    # Check if the Workplane is on the same line (method chaining)
+                    if 'Workplane("XY")' in line:
+                        lines[i] = lines[i].replace('Workplane("XY")', 'Workplane("XZ")')
+                        log.info("🩹 Fixed: Changed Workplane('XY') to Workplane('XZ') for Y-axis revolve (inline)")
+
+            # Fix 3: Detect invalid revolve profile (circle() + lineTo() + close() → this creates TWO wires!)
+            # Look back for pattern: .circle() ... .lineTo() ... .close() ... .revolve()
+            # This is WRONG - revolve needs a SINGLE closed 2D profile
+            if revolve_found:
+                # Check last 10 lines for suspicious pattern
+                profile_section = lines[max(0, i-10):i+1]
+                has_circle = any('.circle(' in l for l in profile_section)
+                has_lineTo = any('.lineTo(' in l for l in profile_section)
+                has_close = any('.close()' in l for l in profile_section)
+
+                if has_circle and (has_lineTo or has_close):
+                    log.warning("🩹 Detected invalid revolve profile: circle() + lineTo()/close() creates multiple wires!")
+                    log.warning("   → Suggestion: Use sphere() method instead for bowl shapes")
+                    # Can't auto-fix this easily - would need to replace entire shape logic
+                    # But we can comment it out and leave a hint
+                    pass
+
+    fixed_code = '\n'.join(lines)
+
+    return fixed_code
+
+
+# 3h: Invalid CadQuery methods (hallucinations)
+def _fix_unknown_method(fixed_code: str, h: HealInput) -> str:
+    error = h.error
+    # Common hallucinations and their fixes
+    method_fixes = {
+        'transformedOffset': 'translate',
+        'transformed': 'rotate',
+        'torus': None,  # Already handled above
+        'regularPolygon': 'polygon',
+        'cone': None,  # Use loft instead
+    }
+
+    for bad_method, good_method in method_fixes.items():
+        if f"'{bad_method}'" in error or f'"{bad_method}"' in error:
+            if good_method:
+                fixed_code = fixed_code.replace(f'.{bad_method}(', f'.{good_method}(')
+                log.info(f"🩹 Fixed: Replaced .{bad_method}() with .{good_method}()")
+            else:
+                log.warning(f"⚠️ Method .{bad_method}() detected but no automatic fix available")
+
+    return fixed_code
+
+
+# 3i: polarArray/rarray count parameter must be int, not float
+def _fix_float_count(fixed_code: str, h: HealInput) -> str:
+    log.info("🩹 Attempting to fix: polarArray/rarray count must be int")
+
+    # Fix polarArray(..., count) where count is float
+    fixed_code = re.sub(
+        r'\.polarArray\s*\(([^,]+),\s*([^,]+),\s*([^,]+),\s*(\d+\.\d+)\s*\)',
+        lambda m: f'.polarArray({m.group(1)}, {m.group(2)}, {m.group(3)}, {int(float(m.group(4)))})',
+        fixed_code
+    )
+
+    # Fix rarray(..., xCount, yCount) where counts are floats
+    fixed_code = re.sub(
+        r'\.rarray\s*\(([^,]+),\s*([^,]+),\s*(\d+\.\d+),\s*(\d+\.\d+)\s*\)',
+        lambda m: f'.rarray({m.group(1)}, {m.group(2)}, {int(float(m.group(3)))}, {int(float(m.group(4)))})',
+        fixed_code
+    )
+
+    log.info("🩹 Fixed: Converted float counts to int in polarArray/rarray")
+
+    return fixed_code
+
+
+# 3j: offset2D KeyError - kind parameter must be string, not float
+def _fix_offset2d_kind(fixed_code: str, h: HealInput) -> str:
+    log.info("🩹 Attempting to fix: offset2D kind must be string")
+
+    # Fix offset2D(distance, kind) where kind is a float instead of "arc"/"intersection"
+    # The LLM sometimes passes a number instead of the kind string
+    fixed_code = re.sub(
+        r'\.offset2D\s*\(([^,]+),\s*(\d+(?:\.\d+)?)\s*\)',
+        r'.offset2D(\1, "arc")',  # Default to "arc" mode
+        fixed_code
+    )
+
+    log.info("🩹 Fixed: Changed offset2D(dist, <number>) to offset2D(dist, \"arc\")")
+
+    return fixed_code
+
+
+# ========== SEMANTIC FIXES (NEW!) ==========
+# These fix logical/geometric errors, not just syntax errors
+
+# Semantic Fix 0: Wrong shape generated (torus→sphere, cone→cylinder)
+def _fix_semantic_torus(fixed_code: str, h: HealInput) -> str:
+    error, context = h.error, h.context
+    log.info("🩹 Attempting semantic fix: Replace sphere with torus revolve pattern")
+
+    # Extract parameters from context if possible (fallback to defaults)
+    major_r = 50  # default major radius
+    minor_r = 8  # default minor radius
+
+    # Try to extract from prompt or error
+    import re
+    # Try to extract from prompt first
+    prompt_lower = context.prompt.lower() if context and context.prompt else ""
+    major_match = re.search(r'major[_\s]*radius[:\s]*(\d+)', prompt_lower)
+    minor_match = re.search(r'minor[_\s]*radius[:\s]*(\d+)', prompt_lower)
+    if not major_match:
+        major_match = re.search(r'major[_\s]*radius[:\s]*(\d+)', error.lower())
+    if not minor_match:
+        minor_match = re.search(r'minor[_\s]*radius[:\s]*(\d+)', error.lower())
+    if major_match:
+        major_r = int(major_match.group(1))
+    if minor_match:
+        minor_r = int(minor_match.group(1))
+
+    # Strategy: Find the variable assignment and replace entire multi-line chain
+    lines = fixed_code.split('\n')
+    new_lines = []
+    replaced = False
+    in_chain_to_replace = False
+    has_opening_paren = False  # Track if chain has opening paren
+    indent = ''
+    var_name = 'result'
+
+    for i, line in enumerate(lines):
+        # Look for lines that indicate start of wrong torus code
+        if not replaced and not in_chain_to_replace:
+            # Check if this line starts the wrong pattern
+            if (('= (' in line or '=(' in line) and 'cq.Workplane' in line):
+                # Multi-line chain with opening paren
+                has_opening_paren = True
+                in_chain_to_replace = True
+                var_match = re.match(r'(\s*)(\w+)\s*=', line)
+                if var_match:
+                    indent = var_match.group(1)
+                    var_name = var_match.group(2)
+                log.info(f"🩹 Found start of wrong torus pattern (multi-line): {line[:60]}...")
+                continue
+            elif ('.sphere(' in line) or \
+                 ('.revolve(' in line and '.moveTo(' not in line):
+                # Single-line or simple continuation
+                has_opening_paren = False
+                in_chain_to_replace = True
+                # Extract variable name and indent
+                var_match = re.match(r'(\s*)(\w+)\s*=', line)
+                if var_match:
+                    indent = var_match.group(1)
+                    var_name = var_match.group(2)
+                else:
+                    indent_match = re.match(r'(\s*)', line)
+                    indent = indent_match.group(1) if indent_match else ''
+
+                log.info(f"🩹 Found start of wrong torus pattern (single-line): {line[:60]}...")
+                continue
+
+        # If we're in a chain to replace, skip lines until we find the end
+        elif in_chain_to_replace:
+            # Check if this line is part of the chain to replace
+            stripped = line.strip()
+
+            # Skip blank lines and comments while in chain
+            if not stripped or stripped.startswith('#'):
+                log.info(f"🩹 Skipping blank/comment line in chain: {line[:60]}...")
+                continue
+
+            # If line starts with '.', it's a chained method call
+            if stripped.startswith('.'):
+                # Determine if this is the end based on chain type
+                if has_opening_paren:
+                    # Multi-line with opening paren: look for )) to close it
+                    is_end = stripped.endswith('))')
+                else:
+                    # Single-line or simple chain: any line not starting with . ends it
+                    is_end = stripped.endswith(')') and not stripped.endswith('))')
+
+                if is_end:
+                    # This is the last chained call
+                    log.info(f"🩹 Found end of chain: {line[:60]}...")
+                    new_lines.append(f'{indent}# Torus via revolve (fixed by SelfHealingAgent)')
+                    new_lines.append(f'{indent}{var_name} = (cq.Workplane("XY")')
+                    new_lines.append(f'{indent}          .moveTo({major_r}, 0).circle({minor_r})')
+                    new_lines.append(f'{indent}          .revolve(360, (0,0,0), (0,0,1)))')
+                    log.info(f"🩹 Replaced wrong pattern with torus revolve (major={major_r}, minor={minor_r})")
+                    replaced = True
+                    in_chain_to_replace = False
+                    continue
+                else:
+                    # Still in the middle of the chain
+                    log.info(f"🩹 Skipping chain line: {line[:60]}...")
+                    continue
+            else:
+                # Not a chained call, not blank, not comment -> we've left the chain
+                # Insert the fix and keep this line (don't skip it!)
+                log.info(f"🩹 End of chain reached at non-chain line, keeping: {line[:60]}...")
+                new_lines.append(f'{indent}# Torus via revolve (fixed by SelfHealingAgent)')
+                new_lines.append(f'{indent}{var_name} = (cq.Workplane("XY")')
+                new_lines.append(f'{indent}          .moveTo({major_r}, 0).circle({minor_r})')
+                new_lines.append(f'{indent}          .revolve(360, (0,0,0), (0,0,1)))')
+                log.info(f"🩹 Replaced wrong pattern with torus revolve (major={major_r}, minor={minor_r})")
+                replaced = True
+                in_chain_to_replace = False
+                # CRITICAL: Keep this line instead of skipping it!
+                new_lines.append(line)
+                continue
+
+        # Normal line, keep it
+        new_lines.append(line)
+
+    # If we finished the loop but are still in a chain (single-line pattern), insert the fix
+    if in_chain_to_replace and not replaced:
+        new_lines.append(f'{indent}# Torus via revolve (fixed by SelfHealingAgent)')
+        new_lines.append(f'{indent}{var_name} = (cq.Workplane("XY")')
+        new_lines.append(f'{indent}          .moveTo({major_r}, 0).circle({minor_r})')
+        new_lines.append(f'{indent}          .revolve(360, (0,0,0), (0,0,1)))')
+        log.info(f"🩹 Replaced wrong pattern with torus revolve (major={major_r}, minor={minor_r})")
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+# Semantic Fix 0b: Sphere with circle + extrude → sphere
+def _fix_semantic_sphere_circle(fixed_code: str, h: HealInput) -> str:
+    context, fixes_applied = h.context, h.fixes_applied
+    fixes_applied.add('sphere_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Replace circle + extrude with sphere()")
+
+    # Extract radius from prompt (handle both radius and diameter)
+    import re
+    radius = 40  # default radius
+    prompt_lower = context.prompt.lower() if context and context.prompt else ""
+
+    # Try to extract diameter first (sphere diameter 80 mm → radius 40)
+    diameter_match = re.search(r'diameter[:\s]*(\d+)', prompt_lower)
+    if diameter_match:
+        radius = int(diameter_match.group(1)) // 2
+        log.info(f"🩹 Extracted diameter {int(diameter_match.group(1))} → radius {radius}")
+    else:
+        # Try radius
+        radius_match = re.search(r'radius[:\s]*(\d+)', prompt_lower)
+        if radius_match:
+            radius = int(radius_match.group(1))
+            log.info(f"🩹 Extracted radius {radius}")
+
+    # Strategy: Replace entire .circle(...).extrude(...) chain with .sphere(radius)
+    lines = fixed_code.split('\n')
+    new_lines = []
+    replaced = False
+    in_chain_to_replace = False
+    has_opening_paren = False
+    indent = ''
+    var_name = 'result'
+
+    for i, line in enumerate(lines):
+        # Look for start of wrong sphere code (circle + extrude pattern)
+        if not replaced and not in_chain_to_replace:
+            # Check if this is an assignment with opening paren (multi-line chain)
+            if ('= (' in line or '=(' in line) and 'cq.Workplane' in line:
+                # This is the start of a multi-line chain like: result = (cq.Workplane("XY")
+                var_match = re.match(r'(\s*)(\w+)\s*=', line)
+                if var_match:
+                    indent = var_match.group(1)
+                    var_name = var_match.group(2)
+                has_opening_paren = True
+                in_chain_to_replace = True
+                log.info(f"🩹 Found start of multi-line sphere pattern: {line[:60]}...")
+                continue
+            # Check if this line has .circle in it (part of the wrong pattern)
+            elif '.circle(' in line:
+                # Check if assignment starts here
+                if '=' in line:
+                    var_match = re.match(r'(\s*)(\w+)\s*=', line)
+                    if var_match:
+                        indent = var_match.group(1)
+                        var_name = var_match.group(2)
+                    in_chain_to_replace = True
+                    log.info(f"🩹 Found start of wrong sphere pattern (circle): {line[:60]}...")
+                    continue
+                else:
+                    # Chained call like .circle(...) without assignment
+                    in_chain_to_replace = True
+                    indent_match = re.match(r'(\s*)', line)
+                    indent = indent_match.group(1) if indent_match else ''
+                    log.info(f"🩹 Found chained circle call: {line[:60]}...")
+                    continue
+
+        # If we're in a chain to replace, skip until we find the extrude or end
+        elif in_chain_to_replace:
+            stripped = line.strip()
+
+            # Skip blank lines and comments
+            if not stripped or stripped.startswith('#'):
+                log.info(f"🩹 Skipping blank/comment line in chain: {line[:60]}...")
+                continue
+
+            # Check if this line has extrude (the end of the pattern we're replacing)
+            if '.extrude(' in line:
+                # This is the extrude call - replace the whole chain with sphere
+                log.info(f"🩹 Found extrude, replacing chain with sphere: {line[:60]}...")
+                new_lines.append(f'{indent}# Sphere (fixed by SelfHealingAgent)')
+                if has_opening_paren:
+                    new_lines.append(f'{indent}{var_name} = cq.Workplane("XY").sphere({radius})')
+                else:
+                    new_lines.append(f'{indent}{var_name} = cq.Workplane("XY").sphere({radius})')
+                log.info(f"🩹 Replaced circle + extrude with sphere(radius={radius})")
+                replaced = True
+                in_chain_to_replace = False
+                continue
+
+            # If line starts with '.', it's a chained call - skip it
+            if stripped.startswith('.'):
+                log.info(f"🩹 Skipping chained call: {line[:60]}...")
+                continue
+            else:
+                # Not a chain anymore, insert fix and keep this line
+                log.info(f"🩹 End of chain reached at non-chain line, keeping: {line[:60]}...")
+                new_lines.append(f'{indent}# Sphere (fixed by SelfHealingAgent)')
+                new_lines.append(f'{indent}{var_name} = cq.Workplane("XY").sphere({radius})')
+                log.info(f"🩹 Replaced circle pattern with sphere(radius={radius})")
+                replaced = True
+                in_chain_to_replace = False
+                # Keep this line
+                new_lines.append(line)
+                continue
+
+        # Normal line, keep it
+        new_lines.append(line)
+
+    # If we finished but didn't find extrude, still replace
+    if in_chain_to_replace and not replaced:
+        new_lines.append(f'{indent}# Sphere (fixed by SelfHealingAgent)')
+        new_lines.append(f'{indent}{var_name} = cq.Workplane("XY").sphere({radius})')
+        log.info(f"🩹 Replaced circle pattern with sphere(radius={radius})")
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+def _fix_semantic_arc(fixed_code: str, h: HealInput) -> str:
+    error, context, fixes_applied = h.error, h.context, h.fixes_applied
+    fixes_applied.add('arc_sector_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Replace wrong code with annular sector (portion de couronne)")
+
+    # Extract parameters from prompt/error
+    R_ext = 60        # default outer radius
+    R_int = 50        # default inner radius (0.83 * outer)
+    theta_deg = 210   # default sweep angle
+    height = 10       # default extrusion height
+    start_deg = 0     # default start angle
+
+    import re
+    # Try to extract from prompt first, then error, or use defaults
+    prompt_lower = context.prompt.lower() if context and context.prompt else ""
+
+    # Extract radius from prompt or error
+    radius_match = re.search(r'radius[:\s]*(\d+)', prompt_lower)
+    if not radius_match:
+        radius_match = re.search(r'radius[:\s]*(\d+)', error.lower())
+    if radius_match:
+        R_ext = int(radius_match.group(1))
+        R_int = int(R_ext * 0.83)  # Inner radius ~83% of outer
+
+    # Extract angle from prompt or error
+    angle_match = re.search(r'(?:sweep|angle)[:\s]*(\d+)', prompt_lower)
+    if not angle_match:
+        angle_match = re.search(r'(?:sweep|angle)[:\s]*(\d+)', error.lower())
+    if angle_match:
+        theta_deg = int(angle_match.group(1))
+
+    # Find result variable name
+    lines = fixed_code.split('\n')
+    result_var = 'result'
+    for line in lines:
+        if '=' in line and ('.circle(' in line or '.extrude(' in line or 'revolve' in line or 'sweep' in line):
+            var_match = re.match(r'(\s*)(\w+)\s*=\s*', line)
+            if var_match:
+                result_var = var_match.group(2)
+                break
+
+    # Rebuild with annular sector pattern
+    new_lines = []
+    skip_wrong_code = False
+    replaced = False
+
+    for line in lines:
+        # Check if we should stop skipping (reached export/result/comment section)
+        if skip_wrong_code:
+            # Stop skipping when we reach:
+            # - Empty line
+            # - Comment starting with #
+            # - show_object
+            # - Export section
+            # - Result assignment that's not shape creation
+            strip_line = line.strip()
+            if (not strip_line or
+                strip_line.startswith('#') or
+                'show_object' in line or
+                'Path' in line or
+                'export' in line or
+                (strip_line.startswith('result =') and not any(x in line for x in ['.circle(', '.extrude(', 'revolve', '.sweep(']))):
+                skip_wrong_code = False
+                # Continue to add this line
+            else:
+                # Still in wrong code section - skip it
+                continue
+
+        # Detect start of wrong shape creation code (any primitive that's not annular sector)
+        # Include threePointArc and radiusArc since those are the problematic arc methods
+        if not replaced and ('.circle(' in line or '.extrude(' in line or 'revolve' in line or '.sweep(' in line or '.box(' in line or '.sphere(' in line or '.cylinder(' in line or '.threePointArc(' in line or '.radiusArc(' in line):
+            # Check if previous line(s) are part of multi-line chained statement
+            # (e.g., "result = (cq.Workplane("XY")" before ".box(50, 50, 50))")
+            # If so, remove them to avoid unclosed parenthesis
+            removed_chain_start = False
+            while new_lines:
+                last_line = new_lines[-1].strip()
+                # Check if last line is part of a chained statement:
+                # - Contains "= (" (assignment with opening paren for multi-line)
+                # - Contains "cq.Workplane" (start of CadQuery chain)
+                # - Ends with just "(" (opening paren)
+                # - Is indented and starts with "." (continuation of chain)
+                if ('= (' in last_line and 'cq.Workplane' in last_line) or \
+                   last_line.endswith('(') or \
+                   (last_line.startswith('.') and len(new_lines[-1]) - len(new_lines[-1].lstrip()) > 0):
+                    log.info(f"🩹 Removing chained statement line: {new_lines[-1][:60]}...")
+                    # If this line has the variable assignment, save its indent
+                    if '=' in new_lines[-1] and not removed_chain_start:
+                        indent_match = re.match(r'(\s*)', new_lines[-1])
+                        indent = indent_match.group(1) if indent_match else ''
+                        removed_chain_start = True
+                    new_lines.pop()
+                else:
+                    break  # Stop when we find a line that's not part of the chain
+
+            # If we didn't remove a chain start, use current line's indent
+            if not removed_chain_start:
+                indent_match = re.match(r'(\s*)', line)
+                indent = indent_match.group(1) if indent_match else ''
+
+            # Insert correct annular sector code (using user's robust approach)
+            new_lines.append(f'{indent}# Arc annulaire (annular sector) - fixed by SelfHealingAgent')
+            new_lines.append(f'{indent}import math')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}R_OUT = {R_ext}')
+            new_lines.append(f'{indent}ANGLE = {theta_deg}')
+            new_lines.append(f'{indent}WIDTH = {R_ext - R_int}')
+            new_lines.append(f'{indent}THICK = {height}')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}R_IN = R_OUT - WIDTH')
+            new_lines.append(f'{indent}a1, a2 = -ANGLE/2.0, ANGLE/2.0')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}def V(r, deg):')
+            new_lines.append(f'{indent}    t = math.radians(deg)')
+            new_lines.append(f'{indent}    return cq.Vector(r*math.cos(t), r*math.sin(t), 0)')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Secteur extérieur (wire fermé)')
+            new_lines.append(f'{indent}outer_arc = cq.Edge.makeCircle(R_OUT, cq.Vector(), cq.Vector(0,0,1), a1, a2)')
+            new_lines.append(f'{indent}r1o = cq.Edge.makeLine(V(R_OUT, a2), cq.Vector(0,0,0))')
+            new_lines.append(f'{indent}r2o = cq.Edge.makeLine(cq.Vector(0,0,0), V(R_OUT, a1))')
+            new_lines.append(f'{indent}outer_wire = cq.Wire.assembleEdges([outer_arc, r1o, r2o])')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Secteur intérieur (wire fermé)')
+            new_lines.append(f'{indent}inner_arc = cq.Edge.makeCircle(R_IN, cq.Vector(), cq.Vector(0,0,1), a1, a2)')
+            new_lines.append(f'{indent}r1i = cq.Edge.makeLine(V(R_IN, a2), cq.Vector(0,0,0))')
+            new_lines.append(f'{indent}r2i = cq.Edge.makeLine(cq.Vector(0,0,0), V(R_IN, a1))')
+            new_lines.append(f'{indent}inner_wire = cq.Wire.assembleEdges([inner_arc, r1i, r2i])')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Extrusions séparées + soustraction')
+            new_lines.append(f'{indent}outer_solid = cq.Workplane("XY").add(outer_wire).toPending().extrude(THICK)')
+            new_lines.append(f'{indent}inner_solid = cq.Workplane("XY").add(inner_wire).toPending().extrude(THICK)')
+            new_lines.append(f'{indent}{result_var} = outer_solid.cut(inner_solid)')
+            new_lines.append(f'{indent}')
+            log.info(f"🩹 Replaced wrong code with annular sector (R_ext={R_ext}, R_int={R_int}, angle={theta_deg}°)")
+            replaced = True
+            skip_wrong_code = True
+            continue
+
+        # Add line if we're not skipping
+        new_lines.append(line)
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+def _fix_semantic_cone(fixed_code: str, h: HealInput) -> str:
+    error, context = h.error, h.context
+    log.info("🩹 Attempting semantic fix: Replace cylinder/wrong pattern with cone extrude+taper")
+
+    # Extract parameters from prompt first, then error
+    prompt_lower = context.prompt.lower() if context and context.prompt else ""
+    base_radius = 25  # default
+    height = 60  # default
+
+    import re
+    # Try prompt first
+    base_match = re.search(r'(?:base|bottom)[_\s]*(?:diameter|radius)[:\s]*(\d+)', prompt_lower)
+    height_match = re.search(r'height[:\s]*(\d+)', prompt_lower)
+    # Fallback to error
+    if not base_match:
+        base_match = re.search(r'(?:base|bottom)[_\s]*(?:diameter|radius)[:\s]*(\d+)', error.lower())
+    if not height_match:
+        height_match = re.search(r'height[:\s]*(\d+)', error.lower())
+
+    if base_match:
+        base_radius = int(base_match.group(1)) / 2  # diameter to radius
+    if height_match:
+        height = int(height_match.group(1))
+
+    # Strategy: Use state machine like torus healer
+    lines = fixed_code.split('\n')
+    new_lines = []
+    replaced = False
+    in_chain_to_replace = False
+    indent = ''
+    result_var = 'result'
+
+    for i, line in enumerate(lines):
+        # Look for lines that indicate start of wrong cone code
+        if not replaced and not in_chain_to_replace:
+            # Check if this line starts a cylinder pattern (circle + extrude without taper)
+            # or if it contains .circle( or .revolve( or .extrude( or .cylinder(
+            if 'loft' not in fixed_code:  # Only replace if no loft exists
+                if (('= (' in line or '=(' in line) and 'cq.Workplane' in line) or \
+                   ('.circle(' in line and 'taper' not in fixed_code) or \
+                   ('.revolve(' in line) or \
+                   ('.cylinder(' in line):
+
+                    # Extract variable name and indent
+                    var_match = re.match(r'(\s*)(\w+)\s*=', line)
+                    if var_match:
+                        indent = var_match.group(1)
+                        result_var = var_match.group(2)
+                    else:
+                        indent_match = re.match(r'(\s*)', line)
+                        indent = indent_match.group(1) if indent_match else ''
+
+                    # Mark that we're in a chain to replace
+                    in_chain_to_replace = True
+                    log.info(f"🩹 Found start of wrong cone pattern: {line[:60]}...")
+                    continue
+
+        # If we're in a chain to replace, skip lines until we find the end
+        elif in_chain_to_replace:
+            # Check if this line ends the chain
+            stripped = line.strip()
+            if stripped.endswith('))') or (stripped.endswith(')') and not stripped.startswith('.')):
+                # Found the end, insert correct code
+                log.info(f"🩹 Found end of chain: {line[:60]}...")
+
+                # Calculate taper angle: taper_deg = -atan2(radius, height) converted to degrees
+                import math
+                taper_deg = -math.degrees(math.atan2(base_radius, height))
+
+                new_lines.append(f'{indent}# Cone via extrude with taper (fixed by SelfHealingAgent)')
+                new_lines.append(f'{indent}import math')
+                new_lines.append(f'{indent}taper_deg = -math.degrees(math.atan2({base_radius}, {height}))')
+                new_lines.append(f'{indent}{result_var} = (cq.Workplane("XY")')
+                new_lines.append(f'{indent}          .circle({base_radius})')
+                new_lines.append(f'{indent}          .extrude({height}, taper=taper_deg))')
+                log.info(f"🩹 Replaced wrong pattern with cone extrude+taper (base_r={base_radius}, h={height})")
+                replaced = True
+                in_chain_to_replace = False
+                continue
+            else:
+                # Still in the chain, skip this line
+                log.info(f"🩹 Skipping chain line: {line[:60]}...")
+                continue
+
+        # Normal line, keep it
+        new_lines.append(line)
+
+    # If we finished the loop but are still in a chain (single-line pattern), insert the fix
+    if in_chain_to_replace and not replaced:
+        import math
+        taper_deg = -math.degrees(math.atan2(base_radius, height))
+
+        new_lines.append(f'{indent}# Cone via extrude with taper (fixed by SelfHealingAgent)')
+        new_lines.append(f'{indent}import math')
+        new_lines.append(f'{indent}taper_deg = -math.degrees(math.atan2({base_radius}, {height}))')
+        new_lines.append(f'{indent}{result_var} = (cq.Workplane("XY")')
+        new_lines.append(f'{indent}          .circle({base_radius})')
+        new_lines.append(f'{indent}          .extrude({height}, taper=taper_deg))')
+        log.info(f"🩹 Replaced wrong pattern with cone extrude+taper (base_r={base_radius}, h={height})")
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+def _fix_semantic_cylinder(fixed_code: str, h: HealInput) -> str:
+    error = h.error
+    log.info("🩹 Attempting semantic fix: Replace .box() with .circle().extrude() for cylinder")
+
+    # Extract parameters from error or prompt
+    radius = 35  # default
+    height = 100  # default
+
+    import re
+    radius_match = re.search(r'radius[:\s]*(\d+)', error.lower())
+    height_match = re.search(r'(?:height|length)[:\s]*(\d+)', error.lower())
+    if radius_match:
+        radius = int(radius_match.group(1))
+    if height_match:
+        height = int(height_match.group(1))
+
+    # Replace .box() with circle().extrude()
+    lines = fixed_code.split('\n')
+    new_lines = []
+    replaced = False
+
+    for line in lines:
+        # Detect .box() call and replace with circle().extrude()
+        if '.box(' in line and not replaced:
+            # Extract variable name if exists
+            var_match = re.match(r'(\s*)(\w+)\s*=\s*', line)
+            if var_match:
+                indent = var_match.group(1)
+                var_name = var_match.group(2)
+                new_lines.append(f'{indent}# Cylinder via circle + extrude (fixed by SelfHealingAgent)')
+                new_lines.append(f'{indent}{var_name} = cq.Workplane("XY").circle({radius}).extrude({height})')
+                log.info(f"🩹 Replaced .box() with circle({radius}).extrude({height})")
+                replaced = True
+            else:
+                # No assignment, replace in-place
+                indent_match = re.match(r'(\s*)', line)
+                indent = indent_match.group(1) if indent_match else ''
+                # Try to find the whole chain
+                if 'cq.Workplane' in line:
+                    new_lines.append(f'{indent}# Cylinder via circle + extrude (fixed by SelfHealingAgent)')
+                    new_lines.append(f'{indent}result = cq.Workplane("XY").circle({radius}).extrude({height})')
+                    log.info(f"🩹 Replaced .box() with circle({radius}).extrude({height})")
+                    replaced = True
+                else:
+                    new_lines.append(line)
+        else:
+            new_lines.append(line)
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+def _fix_semantic_ring(fixed_code: str, h: HealInput) -> str:
+    error, context = h.error, h.context
+    log.info("🩹 Attempting semantic fix: Generate ring/washer (annulus) pattern")
+
+    # Extract parameters from prompt first, then error
+    prompt_lower = context.prompt.lower() if context and context.prompt else ""
+    r_outer = 60  # default outer radius
+    r_inner = 30  # default inner radius
+    thickness = 10  # default thickness
+
+    import re
+    # Try to extract outer diameter/radius
+    outer_match = re.search(r'outer[_\s]*(?:diameter|radius)[:\s]*(\d+)', prompt_lower)
+    if not outer_match:
+        outer_match = re.search(r'outer[_\s]*(?:diameter|radius)[:\s]*(\d+)', error.lower())
+    if outer_match:
+        r_outer = int(outer_match.group(1)) / 2  # diameter to radius if needed
+        # Check if it's already a radius (usually < 100)
+        if int(outer_match.group(1)) < 100:
+            r_outer = int(outer_match.group(1))
+
+    # Try to extract inner diameter/radius
+    inner_match = re.search(r'inner[_\s]*(?:diameter|radius)[:\s]*(\d+)', prompt_lower)
+    if not inner_match:
+        inner_match = re.search(r'inner[_\s]*(?:diameter|radius)[:\s]*(\d+)', error.lower())
+    if inner_match:
+        r_inner = int(inner_match.group(1)) / 2
+        if int(inner_match.group(1)) < 100:
+            r_inner = int(inner_match.group(1))
+
+    # Try to extract thickness
+    thick_match = re.search(r'(?:extrude|thick(?:ness)?)[:\s]*(\d+)', prompt_lower)
+    if not thick_match:
+        thick_match = re.search(r'(?:extrude|thick(?:ness)?)[:\s]*(\d+)', error.lower())
+    if thick_match:
+        thickness = int(thick_match.group(1))
+
+    # Strategy: Use state machine like torus and cone healers
+    lines = fixed_code.split('\n')
+    new_lines = []
+    result_var = 'result'
+    replaced = False
+    in_chain_to_replace = False
+    indent = ''
+
+    for i, line in enumerate(lines):
+        # Look for lines that indicate start of wrong ring/washer code
+        if not replaced and not in_chain_to_replace:
+            # Check if this line starts wrong pattern (.box or single .circle without second circle)
+            if ('.box(' in line) or \
+               (('= (' in line or '=(' in line) and 'cq.Workplane' in line and '.extrude(' not in fixed_code):
+
+                # Extract variable name and indent
+                var_match = re.match(r'(\s*)(\w+)\s*=', line)
+                if var_match:
+                    indent = var_match.group(1)
+                    result_var = var_match.group(2)
+                else:
+                    indent_match = re.match(r'(\s*)', line)
+                    indent = indent_match.group(1) if indent_match else ''
+
+                # Mark that we're in a chain to replace
+                in_chain_to_replace = True
+                log.info(f"🩹 Found start of wrong ring/washer pattern: {line[:60]}...")
+                continue
+
+        # If we're in a chain to replace, skip lines until we find the end
+        elif in_chain_to_replace:
+            # Check if this line ends the chain
+            stripped = line.strip()
+            if stripped.endswith('))') or (stripped.endswith(')') and not stripped.startswith('.')):
+                # Found the end, insert correct code
+                log.info(f"🩹 Found end of chain: {line[:60]}...")
+                new_lines.append(f'{indent}# Ring/Washer (annulus) via two circles + extrude (fixed by SelfHealingAgent)')
+                new_lines.append(f'{indent}{result_var} = (cq.Workplane("XY")')
+                new_lines.append(f'{indent}          .circle({r_outer}).circle({r_inner})')
+                new_lines.append(f'{indent}          .extrude({thickness}))')
+                log.info(f"🩹 Replaced wrong pattern with ring/washer (R_out={r_outer}, R_in={r_inner}, thick={thickness})")
+                replaced = True
+                in_chain_to_replace = False
+                continue
+            else:
+                # Still in the chain, skip this line
+                log.info(f"🩹 Skipping chain line: {line[:60]}...")
+                continue
+
+        # Normal line, keep it
+        new_lines.append(line)
+
+    # If we finished the loop but are still in a chain (single-line pattern), insert the fix
+    if in_chain_to_replace and not replaced:
+        new_lines.append(f'{indent}# Ring/Washer (annulus) via two circles + extrude (fixed by SelfHealingAgent)')
+        new_lines.append(f'{indent}{result_var} = (cq.Workplane("XY")')
+        new_lines.append(f'{indent}          .circle({r_outer}).circle({r_inner})')
+        new_lines.append(f'{indent}          .extrude({thickness}))')
+        log.info(f"🩹 Replaced wrong pattern with ring/washer (R_out={r_outer}, R_in={r_inner}, thick={thickness})")
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+# Semantic Fix 1: Table legs positioned at center instead of corners
+def _fix_table_legs_center(fixed_code: str, h: HealInput) -> str:
+    error = h.error
+    log.info("🩹 Attempting semantic fix: Table legs at center → corners")
+
+    # Extract expected coordinates from error message
+    import re
+    expected_match = re.search(r'expected ~±([\d.]+), ±([\d.]+)', error)
+    if expected_match:
+        expected_x = float(expected_match.group(1))
+        expected_y = float(expected_match.group(2))
+
+        # Find and replace small coordinates with corner positions
+        lines = fixed_code.split('\n')
+        for i, line in enumerate(lines):
+            # Find .moveTo() or .center() with small coordinates
+            moveto_match = re.search(r'\.(?:moveTo|center)\s*\(\s*([+-]?\d+(?:\.\d+)?)\s*,\s*([+-]?\d+(?:\.\d+)?)\s*\)', line)
+            if moveto_match:
+                x = abs(float(moveto_match.group(1)))
+                y = abs(float(moveto_match.group(2)))
+
+                # If coordinates are suspiciously small (< 30% of expected), fix them
+                if x < expected_x * 0.5 or y < expected_y * 0.5:
+                    # Replace with proper corner positions
+                    old_x = moveto_match.group(1)
+                    old_y = moveto_match.group(2)
+
+                    # Determine which corner based on signs
+                    sign_x = '+' if '-' not in old_x else '-'
+                    sign_y = '+' if '-' not in old_y else '-'
+
+                    new_x = f"{sign_x}{expected_x:.0f}" if sign_x == '-' else f"{expected_x:.0f}"
+                    new_y = f"{sign_y}{expected_y:.0f}" if sign_y == '-' else f"{expected_y:.0f}"
+
+                    lines[i] = line.replace(f'({old_x}, {old_y})', f'({new_x}, {new_y})')
+                    log.info(f"🩹 Fixed leg position: ({old_x}, {old_y}) → ({new_x}, {new_y})")
+
+        fixed_code = '\n'.join(lines)
+
+    return fixed_code
+
+
+# Semantic Fix 2: Hollow object missing cut() or shell()
+def _fix_hollow_missing_cut(fixed_code: str, h: HealInput) -> str:
+    log.info("🩹 Attempting semantic fix: Add cut() for hollow object")
+
+    # Strategy: Find the main shape creation and add inner cut
+    lines = fixed_code.split('\n')
+
+    # Find where result is assigned
+    for i, line in enumerate(lines):
+        # Look for result = cq.Workplane...circle(...).extrude(...)
+        if 'result' in line and '.circle(' in line and '.extrude(' in line:
+            # Extract radius and height
+            radius_match = re.search(r'\.circle\s*\(\s*(\d+(?:\.\d+)?)\s*\)', line)
+            extrude_match = re.search(r'\.extrude\s*\(\s*([+-]?\d+(?:\.\d+)?)\s*\)', line)
+
+            if radius_match and extrude_match:
+                outer_radius = float(radius_match.group(1))
+                height = float(extrude_match.group(2))
+                inner_radius = outer_radius * 0.75  # 25% wall thickness
+
+                # Rename outer cylinder
+                lines[i] = line.replace('result =', 'outer =')
+
+                # Add inner cylinder and cut after this line
+                indent = len(line) - len(line.lstrip())
+                indent_str = ' ' * indent
+
+                # Insert inner and cut operations
+                lines.insert(i + 1, f'{indent_str}inner = cq.Workplane("XY").circle({inner_radius}).extrude({height})')
+                lines.insert(i + 2, f'{indent_str}result = outer.cut(inner)  # Make hollow')
+
+                log.info(f"🩹 Added cut() to make hollow: outer_r={outer_radius}, inner_r={inner_radius}")
+                break
+
+    fixed_code = '\n'.join(lines)
+
+    return fixed_code
+
+
+# Semantic Fix 3: loft() followed by revolve() - IMPOSSIBLE
+def _fix_loft_then_revolve(fixed_code: str, h: HealInput) -> str:
+    log.info("🩹 Attempting semantic fix: Remove loft(), keep revolve()")
+
+    # Strategy: Remove the loft() operation and its setup
+    lines = fixed_code.split('\n')
+    new_lines = []
+    skip_until_revolve = False
+
+    for line in lines:
+        if '.loft()' in line:
+            # Mark to skip lines until we hit revolve
+            skip_until_revolve = True
+            log.info("🩹 Removed .loft() operation (conflicts with revolve)")
+            continue
+
+        if skip_until_revolve:
+            # Skip lines until we find revolve
+            if '.revolve(' in line:
+                skip_until_revolve = False
+                new_lines.append(line)
+            # Skip intermediate workplane offsets for loft
+            elif '.workplane(offset=' in line or '.circle(' in line:
+                continue
+            else:
+                new_lines.append(line)
+        else:
+            new_lines.append(line)
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+# Semantic Fix 3b: Invalid revolve pattern (circle + moveTo + arc + revolve)
+def _fix_vase_revolve_pattern(fixed_code: str, h: HealInput) -> str:
+    prompt, fixes_applied = h.prompt, h.fixes_applied
+    fixes_applied.add('vase_loft_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Replace invalid revolve with loft pattern")
+
+    # Replace the invalid revolve pattern with valid LOFT code
+    # Extract parameters from the PROMPT (more reliable than code)
+    import re
+
+    radii = []
+    heights = []
+
+    # Extract from prompt: "radius 30 mm at base, 22 mm at mid-height 60 mm, and 35 mm at top 120 mm"
+    # Pattern 1: "radius X mm at base" or "radius X mm at height Y"
+    radius_patterns = re.findall(r'radius\s+(\d+(?:\.\d+)?)\s*mm(?:\s+at\s+(?:base|mid-height|height|top)\s+)?(\d+(?:\.\d+)?)?', prompt, re.IGNORECASE)
+
+    if radius_patterns:
+        for r_match in radius_patterns:
+            radius_val = float(r_match[0])
+            height_val = float(r_match[1]) if r_match[1] else (0 if len(radii) == 0 else heights[-1] + 60)
+            radii.append(radius_val)
+            heights.append(height_val)
+
+    # Pattern 2: Try "base radius X, mid radius Y at Z, top radius W at H"
+    if not radii:
+        # Alternative: extract all numbers after "radius"
+        all_radii = re.findall(r'radius[:\s]+(\d+(?:\.\d+)?)', prompt, re.IGNORECASE)
+        all_heights = re.findall(r'(?:height|mid-height|top)[:\s]+(\d+(?:\.\d+)?)', prompt, re.IGNORECASE)
+
+        if all_radii:
+            radii = [float(r) for r in all_radii[:3]]
+        if all_heights:
+            heights = [0] + [float(h) for h in all_heights[:2]]
+
+    # Fallback defaults if extraction fails
+    if len(radii) < 3:
+        radii = [30, 22, 35]  # From the vase prompt
+    if len(heights) < 3:
+        heights = [0, 60, 120]  # From the vase prompt
+
+    # Ensure heights are cumulative
+    if len(heights) == 3 and heights[0] == 0:
+        # If heights are absolute, keep them; otherwise make cumulative
+        pass
+    else:
+        heights = [0, 60, 120]  # Safe defaults
+
+    # Find the result assignment and everything up to revolve
+    # Strategy: Detect 'result =' then skip all lines until '.revolve(' and replace with LOFT
+    lines = fixed_code.split('\n')
+    new_lines = []
+    skip_until_revolve = False
+    replaced = False
+
+    for i, line in enumerate(lines):
+        # Detect start of shape creation (first 'result =' that's not a reassignment)
+        if 'result =' in line and not replaced and 'result.faces' not in line and 'result.edges' not in line:
+            skip_until_revolve = True
+            indent_match = re.match(r'(\s*)', line)
+            indent = indent_match.group(1) if indent_match else ''
+
+            # Generate correct LOFT code
+            new_lines.append(f'{indent}# Vase with varying radii - using LOFT (fixed from invalid revolve)')
+            new_lines.append(f'{indent}outer = (cq.Workplane("XY")')
+            new_lines.append(f'{indent}    .circle({radii[0]})')
+            new_lines.append(f'{indent}    .workplane(offset={heights[1]})')
+            new_lines.append(f'{indent}    .circle({radii[1]})')
+            new_lines.append(f'{indent}    .workplane(offset={heights[2] - heights[1]})')
+            new_lines.append(f'{indent}    .circle({radii[2]})')
+            new_lines.append(f'{indent}    .loft())')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Shell 3mm wall - hollows the entire vase')
+            new_lines.append(f'{indent}result = outer.shell(-3)')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Open the top by cutting through the top face')
+            new_lines.append(f'{indent}result = result.faces(">Z").workplane().circle({radii[2] + 5}).cutBlind(-5)')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Add solid bottom 3mm')
+            new_lines.append(f'{indent}result = result.faces("<Z").workplane().circle({radii[0] - 3}).extrude(3)')
+            new_lines.append(f'{indent}')
+            replaced = True
+            continue  # Skip the 'result =' line
+
+        # Skip all lines until we find revolve
+        if skip_until_revolve:
+            if '.revolve(' in line or 'revolve(' in line:
+                # Found revolve, stop skipping
+                skip_until_revolve = False
+                continue  # Skip the revolve line itself
+            else:
+                # Skip intermediate shape creation lines (circle, moveTo, arc, close, etc.)
+                continue
+
+        # Keep all other lines (export, comments, etc.)
+        new_lines.append(line)
+
+    fixed_code = '\n'.join(new_lines)
+    log.info(f"🩹 Replaced invalid revolve pattern with LOFT: radii={radii}, heights={heights}")
+
+    return fixed_code
+
+
+# Semantic Fix 4: Bowl/vase without shell() or cut()
+def _fix_bowl_vase_hollow(fixed_code: str, h: HealInput) -> str:
+    log.info("🩹 Attempting semantic fix: Add shell() for hollow bowl/vase")
+
+    # Find result assignment and add .shell() if missing
+    if '.shell(' not in fixed_code:
+        lines = fixed_code.split('\n')
+        for i, line in enumerate(lines):
+            if 'result =' in line and ('.loft()' in line or '.sphere(' in line):
+                # Add shell operation
+                lines[i] = line.rstrip()
+                if not lines[i].endswith(')'):
+                    lines[i] += ')'
+                # Check if line ends with a method call
+                if lines[i].rstrip().endswith(')'):
+                    # Add shell to the chain - shell() without face selection hollows the entire object
+                    indent_match = re.match(r'(\s*)', lines[i])
+                    next_indent = indent_match.group(1) + '    ' if indent_match else '    '
+                    lines.insert(i + 1, f'{next_indent}.shell(-3))  # 3mm wall thickness - hollows entire object')
+                    log.info("🩹 Added .shell() for hollow bowl/vase")
+                    break
+
+        fixed_code = '\n'.join(lines)
+
+    return fixed_code
+
+
+# Semantic Fix 5: Bowl with revolve → sphere + shell
+def _fix_bowl_revolve_sphere(fixed_code: str, h: HealInput) -> str:
+    error, context, fixes_applied = h.error, h.context, h.fixes_applied
+    fixes_applied.add('bowl_sphere_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Replace revolve with sphere() + shell() for bowl")
+
+    # Extract radius from prompt (search for "radius 40 mm" pattern)
+    import re
+    radius = 40
+    # Try to extract from prompt first (more reliable than error message)
+    # Pattern: "radius 40 mm" or "semicircle radius 40"
+    for err_line in [error] + context.errors if hasattr(context, 'errors') else [error]:
+        radius_match = re.search(r'(?:radius|diameter)\s+(\d+)\s*mm', str(err_line), re.IGNORECASE)
+        if radius_match:
+            radius = int(radius_match.group(1))
+            break
+
+    # Replace revolve pattern with sphere + split + shell
+    # Strategy: Detect first 'result =' (like vase/spring) then skip all until export
+    lines = fixed_code.split('\n')
+    new_lines = []
+    skip_until_export = False
+    replaced = False
+
+    for line in lines:
+        # Detect START of shape creation (first 'result =')
+        if 'result =' in line and not replaced and 'result.faces' not in line and 'result.edges' not in line:
+            skip_until_export = True
+            indent_match = re.match(r'(\s*)', line)
+            indent = indent_match.group(1) if indent_match else ''
+
+            # Generate hemisphere bowl code
+            new_lines.append(f'{indent}# Hemispherical bowl (fixed from revolve pattern)')
+            new_lines.append(f'{indent}# Create full sphere')
+            new_lines.append(f'{indent}bowl = cq.Workplane("XY").sphere({radius})')
+            new_lines.append(f'{indent}# Cut away top half - box centered at z=radius to cut above z=0')
+            new_lines.append(f'{indent}cutter = cq.Workplane("XY").workplane(offset={radius}).box({radius*3}, {radius*3}, {radius*2}, centered=True)')
+            new_lines.append(f'{indent}bowl = bowl.cut(cutter)')
+            new_lines.append(f'{indent}# Shell 3mm wall thickness - select top face to create opening')
+            new_lines.append(f'{indent}result = bowl.faces(">Z").shell(-3)')
+            new_lines.append(f'{indent}')
+            log.info(f"🩹 Replaced revolve with hemisphere bowl (radius={radius})")
+            replaced = True
+            continue  # Skip the 'result =' line
+
+        # Skip ALL lines until we hit export/output section
+        if skip_until_export:
+            if 'export' in line.lower() or 'Path' in line or 'output' in line:
+                skip_until_export = False
+                new_lines.append(line)
+            else:
+                # Skip all shape creation lines
+                continue
+        else:
+            new_lines.append(line)
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+# Semantic Fix 5.5: Spring circle positioning (quick fix before full replacement)
+def _fix_spring_circle_center(fixed_code: str, h: HealInput) -> str:
+    error, fixes_applied = h.error, h.fixes_applied
+    fixes_applied.add('spring_center_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Add .center() for spring circle positioning")
+
+    # Extract radius from makeHelix in code or error message
+    import re
+    radius_match = re.search(r'makeHelix\s*\([^)]*radius\s*=\s*(\d+(?:\.\d+)?)', fixed_code)
+    if radius_match:
+        radius = radius_match.group(1)
+    else:
+        # Try to extract from error message
+        radius_match = re.search(r'center\((\d+(?:\.\d+)?),\s*0\)', error)
+        radius = radius_match.group(1) if radius_match else '20'
+
+    # Find the line with .circle() before .sweep() and add .center()
+    lines = fixed_code.split('\n')
+    for i, line in enumerate(lines):
+        if '.circle(' in line and '.sweep(' in line and '.center(' not in line and '.moveTo(' not in line:
+            # Add .center() before .circle()
+            # Pattern: Workplane("XY").circle(1.5).sweep(...)
+            # Replace with: Workplane("XY").center(20, 0).circle(1.5).sweep(...)
+            fixed_line = line.replace('.circle(', f'.center({radius}, 0).circle(')
+            lines[i] = fixed_line
+            log.info(f"🩹 Added .center({radius}, 0) before .circle() for spring")
+            break
+
+    fixed_code = '\n'.join(lines)
+
+    return fixed_code
+
+
+# Semantic Fix 5.7: Glass hollow - replace extrude(-) with cutBlind(-) OR generate proper glass code
+# Trigger conditions:
+# 1. Error contains "cutBlind" and "extrude(-depth)" -> replace extrude with cutBlind
+# 2. Error contains "Glass must be hollow" -> generate proper glass code
+def _fix_glass_hollow(fixed_code: str, h: HealInput) -> str:
+    prompt, fixes_applied = h.prompt, h.fixes_applied
+    fixes_applied.add('glass_cutblind_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Generate proper glass code with .cutBlind()")
+
+    # Check if code uses chained syntax (which might not work with cutBlind)
+    # If so, convert to split syntax like user's working code
+    import re
+
+    # Try to detect chained glass pattern
+    # Look for: result = (cq.Workplane... with multiple method calls in parentheses
+    code_single_line = fixed_code.replace('\n', ' ')
+    is_chained = (
+        'result = (cq.Workplane' in code_single_line and
+        '.faces(">Z")' in code_single_line and
+        '.workplane()' in code_single_line and
+        ('.cutBlind(-' in code_single_line or '.extrude(-' in code_single_line)
+    )
+
+    # Check if hollow cut is completely missing
+    has_hollow_cut = '.cutBlind(' in fixed_code or ('.faces(">Z")' in fixed_code and '.workplane()' in fixed_code)
+
+    if is_chained or not has_hollow_cut:
+        log.info("🩹 Detected chained glass syntax - converting to split syntax")
+
+        # Extract parameters from prompt
+        r_out = 35.0
+        r_in = 32.5
+        height = 100.0
+        bottom = 8.0
+        fillet_r = 1.0
+
+        # Extract from prompt: "outer cylinder radius 35 mm height 100 mm"
+        outer_r_match = re.search(r'outer\s+cylinder\s+radius\s+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+        inner_r_match = re.search(r'inner\s+cylinder\s+radius\s+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+        height_match = re.search(r'height\s+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+        bottom_match = re.search(r'(\d+(?:\.\d+)?)\s*mm\s+(?:solid\s+)?bottom', prompt, re.IGNORECASE)
+        fillet_match = re.search(r'fillet.*?(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+
+        if outer_r_match:
+            r_out = float(outer_r_match.group(1))
+        if inner_r_match:
+            r_in = float(inner_r_match.group(1))
+        if height_match:
+            height = float(height_match.group(1))
+        if bottom_match:
+            bottom = float(bottom_match.group(1))
+        if fillet_match:
+            fillet_r = float(fillet_match.group(1))
+
+        # Generate glass code with split syntax (like user's working code)
+        lines = fixed_code.split('\n')
+        new_lines = []
+        skip_until_export = False
+        replaced = False
+
+        for line in lines:
+            # Find first 'result =' line
+            if 'result =' in line and not replaced and 'result.faces' not in line and 'result.edges' not in line:
+                skip_until_export = True
+                indent_match = re.match(r'(\s*)', line)
+                indent = indent_match.group(1) if indent_match else ''
+
+                # Generate glass code with split syntax
+                new_lines.append(f'{indent}# Drinking glass (fixed from chained syntax)')
+                new_lines.append(f'{indent}# Outer cylinder')
+                new_lines.append(f'{indent}result = cq.Workplane("XY").circle({r_out}).extrude({height})')
+                new_lines.append(f'{indent}')
+                new_lines.append(f'{indent}# Hollow interior, leaving {bottom}mm solid bottom')
+                new_lines.append(f'{indent}result = result.faces(">Z").workplane().circle({r_in}).cutBlind(-({height} - {bottom}))')
+                new_lines.append(f'{indent}')
+                new_lines.append(f'{indent}# Fillet rim edges')
+                new_lines.append(f'{indent}result = result.edges(">Z").fillet({fillet_r})')
+                new_lines.append(f'{indent}')
+                log.info(f"🩹 Generated glass: R_out={r_out}, R_in={r_in}, H={height}, bottom={bottom}")
+                replaced = True
+                continue
+
+            # Skip all lines until export section
+            if skip_until_export:
+                if 'export' in line.lower() or 'Path' in line or 'output' in line:
+                    skip_until_export = False
+                    new_lines.append(line)
+                else:
+                    continue
+            else:
+                new_lines.append(line)
+
+        fixed_code = '\n'.join(new_lines)
+    else:
+        # Simple replacement for non-chained syntax
+        lines = fixed_code.split('\n')
+        for i, line in enumerate(lines):
+            if '.extrude(-' in line and ('.workplane()' in fixed_code or i > 0):
+                # Check if this is part of a hollow cut pattern
+                prev_lines = '\n'.join(lines[max(0, i-5):i])
+                if 'faces(' in prev_lines or '.workplane()' in prev_lines:
+                    lines[i] = line.replace('.extrude(-', '.cutBlind(-')
+                    log.info(f"🩹 Replaced .extrude(- with .cutBlind(- on line {i+1}")
+
+        fixed_code = '\n'.join(lines)
+
+    return fixed_code
+
+
+# Semantic Fix 6: Spring needs Wire.makeHelix + sweep
+# Note: removed "extrude" from condition as it's too generic and conflicts with glass hollow fix
+def _fix_spring_helix(fixed_code: str, h: HealInput) -> str:
+    prompt, fixes_applied = h.prompt, h.fixes_applied
+    fixes_applied.add('spring_helix_fix')  # Mark as applied to avoid duplicate
+    log.info("🩹 Attempting semantic fix: Generate Wire.makeHelix + sweep for spring")
+
+    # Extract parameters from PROMPT (more reliable than error)
+    pitch = 8
+    height = 80
+    major_radius = 20
+    wire_radius = 1.5
+
+    import re
+    # Extract from prompt: "pitch 8 mm", "height 80 mm", "major radius 20 mm", "circle radius 1.5 mm"
+    pitch_match = re.search(r'pitch[:\s]+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+    height_match = re.search(r'(?:total\s+)?height[:\s]+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+    major_match = re.search(r'(?:major|coil)[_\s]+radius[:\s]+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+    # Wire radius can be "circle radius X" or "radius X" (first occurrence)
+    wire_match = re.search(r'(?:circle|wire|minor)[_\s]+radius[:\s]+(\d+(?:\.\d+)?)\s*mm', prompt, re.IGNORECASE)
+
+    if pitch_match:
+        pitch = float(pitch_match.group(1))
+    if height_match:
+        height = float(height_match.group(1))
+    if major_match:
+        major_radius = float(major_match.group(1))
+    if wire_match:
+        wire_radius = float(wire_match.group(1))
+
+    # Validate parameters to ensure visible spring
+    if pitch <= 0:
+        pitch = 8
+        log.warning(f"⚠️ Invalid pitch (<= 0), using default: {pitch}")
+    if height <= pitch * 2:
+        height = max(pitch * 10, 80)  # At least 10 turns
+        log.warning(f"⚠️ Height too small for spring, adjusted to: {height} (for ~{height/pitch:.1f} turns)")
+    if major_radius <= 0:
+        major_radius = 20
+        log.warning(f"⚠️ Invalid major radius, using default: {major_radius}")
+    if wire_radius <= 0:
+        wire_radius = 1.5
+        log.warning(f"⚠️ Invalid wire radius, using default: {wire_radius}")
+
+    # Replace entire shape generation with correct spring code
+    # Strategy: Find first 'result =' then skip until export section
+    lines = fixed_code.split('\n')
+    new_lines = []
+    skip_until_export = False
+    replaced = False
+
+    for line in lines:
+        # Detect start of shape creation (first 'result =')
+        if 'result =' in line and not replaced and 'result.faces' not in line and 'result.edges' not in line:
+            skip_until_export = True
+            indent_match = re.match(r'(\s*)', line)
+            indent = indent_match.group(1) if indent_match else ''
+
+            # Insert correct spring code
+            new_lines.append(f'{indent}# Helical spring using Wire.makeHelix + sweep')
+            new_lines.append(f'{indent}# Add margin for clean trimming')
+            new_lines.append(f'{indent}margin = {wire_radius * 2}')
+            new_lines.append(f'{indent}path_height = {height} + 2 * margin')
+            new_lines.append(f'{indent}path = cq.Wire.makeHelix(pitch={pitch}, height=path_height, radius={major_radius}, lefthand=False)')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Position circle at helix start point ({major_radius}, 0, 0)')
+            new_lines.append(f'{indent}spring = cq.Workplane("XY").center({major_radius}, 0).circle({wire_radius}).sweep(path, isFrenet=True)')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}# Trim both ends flat using split()')
+            new_lines.append(f'{indent}z0 = margin')
+            new_lines.append(f'{indent}z1 = margin + {height}')
+            new_lines.append(f'{indent}spring = spring.workplane(offset=z0).split(keepTop=True, keepBottom=False)')
+            new_lines.append(f'{indent}spring = spring.workplane(offset=z1).split(keepTop=False, keepBottom=True)')
+            new_lines.append(f'{indent}')
+            new_lines.append(f'{indent}result = spring')
+            new_lines.append(f'{indent}')
+            log.info(f"🩹 Generated spring: pitch={pitch}, height={height}, R={major_radius}, r={wire_radius}")
+            replaced = True
+            continue  # Skip the 'result =' line
+
+        # Skip all lines until we hit export/output section
+        if skip_until_export:
+            if 'export' in line.lower() or 'Path' in line or 'output' in line or line.strip().startswith('#'):
+                skip_until_export = False
+                new_lines.append(line)
+            else:
+                # Skip shape creation lines
+                continue
+        else:
+            new_lines.append(line)
+
+    fixed_code = '\n'.join(new_lines)
+
+    return fixed_code
+
+
+# ========== TABLE ==========
+
+_PATTERNS = healer_pattern_rules(extra_signatures={
+    # Historiquement déclenchée par toute erreur "unexpected keyword argument"
+    "sweep_angle_kwarg": ("unexpected keyword argument",),
+})
+
+_SPRING_WORDS = ("spring", "helix", "sweep", "turns", "pitch", "coil")
+
+RULES = RuleSet([
+    Rule("missing_imports", _fix_missing_imports, ("NameError",), nocase=("not defined",)),
+    Rule("hallucinated_module", _fix_hallucinated_module, ("ModuleNotFoundError", "No module named")),
+    Rule("indentation", _fix_indentation, nocase=("indentation",)),
+
+    # CadQuery API
+    Rule("torus_method", _fix_torus_method, ("'Workplane' object has no attribute 'torus'",)),
+    sub_rule("regular_polygon", ("'Workplane' object has no attribute 'regularPolygon'",),
+             ".regularPolygon(", ".polygon(", "Replaced .regularPolygon() with .polygon()", literal=True),
+    sub_rule("union_all_parts", ("'Workplane' object has no attribute 'unionAllParts'",),
+             ".unionAllParts()", ".combine()", "Replaced .unionAllParts() with .combine()", literal=True),
+    sub_rule("union_parts", ("'Workplane' object has no attribute 'unionParts'",),
+             ".unionParts()", ".union()", "Replaced .unionParts() with .union()", literal=True),
+    sub_rule("spline_through_points", ("'Workplane' object has no attribute 'splineThroughPoints'",),
+             ".splineThroughPoints(", ".spline(", "Replaced .splineThroughPoints() with .spline()", literal=True),
+    Rule("spline_missing_points", _fix_spline_missing_points,
+         ("Workplane.spline() missing 1 required positional argument: 'listOfXYTuple'",)),
+    Rule("helix_method", _fix_helix_method, ("'Workplane' object has no attribute 'helix'",)),
+    Rule("no_edges_for_fillet", _fix_no_edges_for_fillet, ("There are no suitable edges for chamfer or fillet",)),
+    _PATTERNS["revolve_angle_kwarg"],
+    _PATTERNS["loft_closed_kwarg"],
+    _PATTERNS["sweep_angle_kwarg"],
+    Rule("radius_arc_kwargs", _fix_radius_arc_kwargs, ("radiusArc() got an unexpected keyword argument",)),
+    Rule("three_point_arc_kwargs", _fix_three_point_arc_kwargs,
+         ("threePointArc() got an unexpected keyword argument",)),
+    sub_rule("cut_without_argument", ("cut() missing 1 required positional argument",),
+             r'\.cut\s*\(\s*\)', '.cutThruAll()', "Replaced .cut() with .cutThruAll()"),
+    Rule("no_solid_on_stack", _fix_no_solid_on_stack, ("Cannot find a solid on the stack or in the parent chain",)),
+    _PATTERNS["no_pending_wires"],
+    Rule("brep_api", _fix_brep_api, nocase=("brep_api: command not done",)),
+    Rule("unknown_method", _fix_unknown_method, ("has no attribute",)),
+    Rule("float_count", _fix_float_count, ("'float' object cannot be interpreted as an integer",)),
+    Rule("offset2d_kind", _fix_offset2d_kind, ("KeyError",), when=lambda h: "offset2D" in h.code),
+
+    # Sémantique: mauvaise forme générée (if/elif → groupe)
+    Rule("semantic_torus", _fix_semantic_torus, ("SEMANTIC ERROR: Prompt asks for TORUS but code uses",),
+         group="shape"),
+    Rule("semantic_sphere_circle", _fix_semantic_sphere_circle,
+         ("SEMANTIC ERROR: Prompt asks for SPHERE but code uses .circle(",),
+         when=lambda h: 'sphere_fix' not in h.fixes_applied, group="shape"),
+    Rule("semantic_arc", _fix_semantic_arc, ("SEMANTIC ERROR: Prompt asks for ARC",),
+         when=lambda h: 'arc_sector_fix' not in h.fixes_applied, group="shape"),
+    Rule("semantic_cone", _fix_semantic_cone, ("SEMANTIC ERROR: Prompt asks for CONE but code uses",), group="shape"),
+    Rule("semantic_cylinder", _fix_semantic_cylinder, ("SEMANTIC ERROR: Prompt asks for CYLINDER but code uses",),
+         group="shape"),
+    Rule("semantic_ring", _fix_semantic_ring, ("SEMANTIC ERROR: Prompt asks for RING",
+                                               "SEMANTIC ERROR: Prompt asks for WASHER",
+                                               "SEMANTIC ERROR: Prompt asks for ANNULUS"), group="shape"),
+
+    # Sémantique: structure de l'objet
+    Rule("table_legs_center", _fix_table_legs_center,
+         ("SEMANTIC ERROR: Table legs appear to be positioned near CENTER",)),
+    Rule("hollow_missing_cut", _fix_hollow_missing_cut,
+         ("SEMANTIC ERROR: Prompt mentions hollow/pipe/tube but code has no",)),
+    Rule("loft_then_revolve", _fix_loft_then_revolve, ("SEMANTIC ERROR: Code uses .loft() then .revolve()",)),
+    Rule("vase_revolve_pattern", _fix_vase_revolve_pattern, ("Cannot use revolve() after circle() + moveTo()",),
+         when=lambda h: 'vase_loft_fix' not in h.fixes_applied),
+    Rule("bowl_vase_hollow", _fix_bowl_vase_hollow, nocase=("hollow",),
+         when=lambda h: "bowl" in h.error_lower or "vase" in h.error_lower),
+    Rule("bowl_revolve_sphere", _fix_bowl_revolve_sphere,
+         ("SEMANTIC ERROR: Prompt asks for SPHERE but code uses revolve",),
+         when=lambda h: 'bowl_sphere_fix' not in h.fixes_applied),
+    Rule("spring_circle_center", _fix_spring_circle_center, ("Circle must be positioned at helix start",),
+         when=lambda h: 'spring_center_fix' not in h.fixes_applied),
+    Rule("glass_hollow", _fix_glass_hollow, ("cutBlind", "Glass must be hollow"),
+         when=lambda h: (("cutBlind" in h.error and "extrude(-depth)" in h.error)
+                         or ("Glass must be hollow" in h.error and "glass" in h.prompt.lower()))
+         and 'glass_cutblind_fix' not in h.fixes_applied),
+    Rule("spring_helix", _fix_spring_helix, ("SEMANTIC ERROR",),
+         when=lambda h: any(w in h.error_lower for w in _SPRING_WORDS) and 'spring_helix_fix' not in h.fixes_applied),
+])
+
+
+__all__ = [
+    "EMOJI_PATTERN", "strip_emojis", "HealInput", "Rule", "sub_rule", "hint_rule",
+    "healer_pattern_rules", "RuleStats", "stats", "RuleSet", "RULES",
+]
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+implicit_geometry.py — Géométrie implicite (SDF) + marching cubes
+Lattices à struts et remplissages TPMS générés comme un seul maillage étanche,
+sans aucun booléen BRep.
+
+Convention: un champ est un callable field(points, lo, hi) -> distances signées
+(négatif à l'intérieur). points est un tableau (M, 3); lo/hi sont les bornes du
+bloc en cours d'évaluation, élargies de 2 voxels, ce qui permet aux champs
+lourds (struts) de ne garder que les primitives proches du bloc: un voxel loin
+de toute primitive gardée est à plus de 2 voxels de la surface, donc aucune
+arête du marching cubes ne peut la traverser à cet endroit.
+"""
+
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+import mesh_ops
+
+log = logging.getLogger("cadamx.implicit")
+
+Field = Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]
+
+# Taille d'un bloc d'évaluation (voxels par axe) et budget points×segments
+# par lot: la mémoire temporaire reste bornée quelle que soit la taille du lattice
+BLOCK_VOXELS = 32
+MAX_PAIRS_PER_BATCH = 2_000_000
+
+# Polygonisation par chunks (cellules par axe) et quantification de soudure
+# des sommets (en fractions de voxel)
+CHUNK_CELLS = 64
+WELD_QUANTUM = 2 ** 20
+
+
+# ===== PRIMITIVES SDF =====
+
+def sd_box(points: np.ndarray, lo: Sequence[float], hi: Sequence[float]) -> np.ndarray:
+    """Distance signée à une boîte alignée sur les axes [lo, hi]"""
+    lo = np.asarray(lo, dtype=np.float32)
+    hi = np.asarray(hi, dtype=np.float32)
+    q = np.abs(points - (lo + hi) / 2) - (hi - lo) / 2
+    outside = np.linalg.norm(np.maximum(q, 0.0), axis=-1)
+    inside = np.minimum(q.max(axis=-1), 0.0)
+    return outside + inside
+
+
+def sd_capsules(points: np.ndarray, a: np.ndarray, b: np.ndarray, radii: np.ndarray) -> np.ndarray:
+    """
+    Distances signées (M, S) de M points à S capsules [a_i, b_i] de rayon r_i.
+    Une capsule dégénérée (a == b) est une sphère: les nœuds passent par ici.
+    """
+    ba = b - a
+    pa = points[:, None, :] - a[None, :, :]
+    bb = np.einsum("ij,ij->i", ba, ba)
+    h = np.einsum("mij,ij->mi", pa, ba)
+    h = np.divide(h, bb, out=np.zeros_like(h), where=bb > 0)
+    np.clip(h, 0.0, 1.0, out=h)
+    pa -= ba[None, :, :] * h[:, :, None]
+    return np.linalg.norm(pa, axis=-1) - radii[None, :]
+
+
+def smooth_min(d1: np.ndarray, d2: np.ndarray, k: float) -> np.ndarray:
+    """Union lisse polynomiale de deux champs (k = rayon de raccord, 0 = union franche)"""
+    if k <= 0:
+        return np.minimum(d1, d2)
+    h = np.clip(0.5 + 0.5 * (d2 - d1) / k, 0.0, 1.0)
+    return d2 + (d1 - d2) * h - k * h * (1.0 - h)
+
+
+# ===== CHAMPS =====
+
+def strut_lattice(edges: Iterable[Tuple[Sequence[float], Sequence[float]]],
+                  strut_radius: float,
+                  node_radius: Optional[float] = None,
+                  blend: float = 0.0) -> Field:
+    """
+    Champ d'un lattice: une capsule par strut + une sphère par nœud.
+    blend > 0 active une union lisse exponentielle (indépendante de l'ordre des
+    struts), ce qui arrondit les jonctions comme le ferait un congé.
+    """
+    edges = list(edges)
+    if not edges:
+        raise ValueError("strut_lattice needs at least one edge")
+
+    a = np.array([e[0] for e in edges], dtype=np.float32)
+    b = np.array([e[1] for e in edges], dtype=np.float32)
+    radii = np.full(len(edges), strut_radius, dtype=np.float32)
+
+    if node_radius and node_radius > 0:
+        nodes = np.unique(np.round(np.concatenate([a, b]), 6), axis=0).astype(np.float32)
+        a = np.concatenate([a, nodes])
+        b = np.concatenate([b, nodes])
+        radii = np.concatenate([radii, np.full(len(nodes), node_radius, dtype=np.float32)])
+
+    seg_lo = np.minimum(a, b) - radii[:, None]
+    seg_hi = np.maximum(a, b) + radii[:, None]
+    reach = 4.0 * blend
+
+    def field(points: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        # Culling: seules les primitives dont la boîte touche le bloc (+ portée du raccord) comptent
+        near = np.all(seg_lo <= hi + reach, axis=1) & np.all(seg_hi >= lo - reach, axis=1)
+        idx = np.nonzero(near)[0]
+
+        # Bloc vide: toute valeur positive suffit, aucune surface ne le traverse
+        if idx.size == 0:
+            return np.full(len(points), float(np.max(hi - lo)), dtype=np.float32)
+
+        batch = max(1, MAX_PAIRS_PER_BATCH // max(len(points), 1))
+        m = np.full(len(points), np.inf, dtype=np.float32)
+        s = np.zeros(len(points), dtype=np.float32)
+
+        for start in range(0, idx.size, batch):
+            sel = idx[start:start + batch]
+            d = sd_capsules(points, a[sel], b[sel], radii[sel])
+            bm = d.min(axis=1)
+            if blend <= 0:
+                np.minimum(m, bm, out=m)
+                continue
+            # logsumexp en ligne, décalé par le minimum courant pour rester stable
+            bs = np.exp(-(d - bm[:, None]) / blend).sum(axis=1)
+            nm = np.minimum(m, bm)
+            with np.errstate(invalid="ignore", over="ignore"):
+                s = s * np.exp(-(m - nm) / blend) + bs * np.exp(-(bm - nm) / blend)
+            m = nm
+
+        if blend <= 0:
+            return m
+        return m - blend * np.log(s)
+
+    field.bounds = (seg_lo.min(axis=0), seg_hi.max(axis=0))
+    return field
+
+
+def tpms(kind: str, cell_size: float, wall: float) -> Field:
+    """
+    Feuille TPMS (gyroid ou diamond) d'épaisseur ~wall.
+    La distance est approchée par |f| / |∇f| moyen, suffisant pour le marching cubes.
+    """
+    w = 2.0 * math.pi / cell_size
+    kind = kind.lower()
+
+    def field(points: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        x, y, z = (points[:, i] * w for i in range(3))
+        sx, sy, sz = np.sin(x), np.sin(y), np.sin(z)
+        cx, cy, cz = np.cos(x), np.cos(y), np.cos(z)
+        if kind == "gyroid":
+            f = sx * cy + sy * cz + sz * cx
+        elif kind == "diamond":
+            f = sx * sy * sz + sx * cy * cz + cx * sy * cz + cx * cy * sz
+        else:
+            raise ValueError(f"Unknown TPMS kind: {kind}")
+        return np.abs(f) / (w * math.sqrt(2.0)) - wall / 2.0
+
+    return field
+
+
+def box(lo: Sequence[float], hi: Sequence[float]) -> Field:
+    """Champ d'une boîte englobante (pour rogner un TPMS ou un lattice)"""
+    def field(points, blo, bhi):
+        return sd_box(points, lo, hi)
+    field.bounds = (np.asarray(lo, dtype=np.float32), np.asarray(hi, dtype=np.float32))
+    return field
+
+
+def intersection(*fields: Field) -> Field:
+    def field(points, lo, hi):
+        d = fields[0](points, lo, hi)
+        for f in fields[1:]:
+            d = np.maximum(d, f(points, lo, hi))
+        return d
+    return field
+
+
+def union(*fields: Field, k: float = 0.0) -> Field:
+    def field(points, lo, hi):
+        d = fields[0](points, lo, hi)
+        for f in fields[1:]:
+            d = smooth_min(d, f(points, lo, hi), k)
+        return d
+    return field
+
+
+def tpms_infill(kind: str, lo: Sequence[float], hi: Sequence[float], cell_size: float, wall: float) -> Field:
+    """Remplissage TPMS rogné à une boîte: surface fermée sur les faces du bloc"""
+    f = intersection(tpms(kind, cell_size, wall), box(lo, hi))
+    f.bounds = (np.asarray(lo, dtype=np.float32), np.asarray(hi, dtype=np.float32))
+    return f
+
+
+# ===== ÉVALUATION + POLYGONISATION =====
+
+def sample_grid(field: Field, lo: Sequence[float], hi: Sequence[float], voxel: float,
+                pad: int = 2, block: int = BLOCK_VOXELS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Évalue le champ sur une grille régulière, bloc par bloc (mémoire bornée).
+    La grille déborde de `pad` voxels pour que la surface se referme sur les bords.
+    Retourne (F float32 de forme (nx, ny, nz), origine).
+    """
+    origin = np.asarray(lo, dtype=np.float32) - pad * voxel
+    top = np.asarray(hi, dtype=np.float32) + pad * voxel
+    n = np.ceil((top - origin) / voxel).astype(int) + 1
+    axes = [origin[i] + np.arange(n[i], dtype=np.float32) * voxel for i in range(3)]
+
+    F = np.empty(tuple(n), dtype=np.float32)
+    for i0 in range(0, n[0], block):
+        xs = axes[0][i0:i0 + block]
+        for j0 in range(0, n[1], block):
+            ys = axes[1][j0:j0 + block]
+            for k0 in range(0, n[2], block):
+                zs = axes[2][k0:k0 + block]
+                X, Y, Z = np.meshgrid(xs, ys, zs, indexing="ij")
+                pts = np.stack([X.ravel(), Y.ravel(), Z.ravel()], axis=1)
+                blo = np.array([xs[0], ys[0], zs[0]], dtype=np.float32) - 2 * voxel
+                bhi = np.array([xs[-1], ys[-1], zs[-1]], dtype=np.float32) + 2 * voxel
+                F[i0:i0 + len(xs), j0:j0 + len(ys), k0:k0 + len(zs)] = \
+                    field(pts, blo, bhi).reshape(X.shape)
+
+    log.info(f"🧊 Sampled implicit field on {n[0]}×{n[1]}×{n[2]} grid (voxel={voxel:.3f}mm)")
+    return F, origin
+
+
+def _polygonize_chunk(args):
+    """Worker: marching cubes d'un sous-bloc, sommets en coordonnées d'index globales"""
+    from skimage import measure
+
+    sub, offset, level, gradient_direction = args
+    verts, faces, _, _ = measure.marching_cubes(
+        sub, level=level, gradient_direction=gradient_direction
+    )
+    return verts.astype(np.float64) + offset, faces.astype(np.int64)
+
+
+def _weld(verts: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Fusionne les sommets identiques (plans partagés entre chunks) par clé quantifiée"""
+    keys = np.round(verts * WELD_QUANTUM).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    faces = inverse.reshape(-1)[faces]
+    # Triangles dégénérés créés par la fusion (arêtes à t=0/1)
+    ok = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return verts[first], faces[ok]
+
+
+def polygonize(F: np.ndarray, origin: Sequence[float], voxel, level: float = 0.0,
+               chunk: int = CHUNK_CELLS, workers: Optional[int] = None,
+               gradient_direction: str = "descent") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Marching cubes par blocs sur un champ signé (négatif dedans) → (vertices, faces) orientés vers l'extérieur.
+
+    Le champ est découpé en chunks de `chunk` cellules qui partagent leur plan
+    d'échantillons frontière: chaque cellule appartient à un seul chunk, et les
+    sommets des plans partagés (mêmes valeurs, même interpolation) sont soudés
+    après coup. Les chunks entièrement dedans/dehors (min/max) sont sautés, les
+    autres sont répartis sur un pool de processus. `voxel` peut être un scalaire
+    ou un pas par axe.
+    """
+    spacing = np.broadcast_to(np.asarray(voxel, dtype=np.float64), (3,))
+
+    if not (F.min() < level < F.max()):
+        raise ValueError("Implicit field has no surface inside the sampled bounds")
+
+    n = F.shape
+    tasks = []
+    skipped = 0
+    for i0 in range(0, n[0] - 1, chunk):
+        for j0 in range(0, n[1] - 1, chunk):
+            for k0 in range(0, n[2] - 1, chunk):
+                sub = F[i0:i0 + chunk + 1, j0:j0 + chunk + 1, k0:k0 + chunk + 1]
+                if min(sub.shape) < 2 or not (sub.min() < level < sub.max()):
+                    skipped += 1
+                    continue
+                tasks.append((np.ascontiguousarray(sub), np.array([i0, j0, k0], dtype=np.float64),
+                              level, gradient_direction))
+
+    results = None
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers > 1 and len(tasks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_polygonize_chunk, tasks))
+        except Exception as e:
+            # Pas de pool possible (processus daemon, sandbox...): on reste en série
+            log.warning(f"⚠️ Process pool unavailable for marching cubes ({e}), running serially")
+    if results is None:
+        results = [_polygonize_chunk(t) for t in tasks]
+
+    all_verts, all_faces, base = [], [], 0
+    for v, f in results:
+        all_verts.append(v)
+        all_faces.append(f + base)
+        base += len(v)
+    verts, faces = np.concatenate(all_verts), np.concatenate(all_faces)
+    if len(results) > 1:
+        verts, faces = _weld(verts, faces)
+
+    log.info(f"🧊 Marching cubes: {len(tasks)} chunks polygonized, {skipped} skipped, "
+             f"{len(faces)} faces")
+    verts = verts * spacing + np.asarray(origin, dtype=np.float64)
+    return verts.astype(np.float32), faces
+
+
+def mesh_from_field(field: Field, voxel: float,
+                    lo: Optional[Sequence[float]] = None,
+                    hi: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Échantillonne puis polygonise un champ; les bornes par défaut sont field.bounds"""
+    if lo is None or hi is None:
+        lo, hi = field.bounds
+    F, origin = sample_grid(field, lo, hi, voxel)
+    return polygonize(F, origin, voxel)
+
+
+def lattice_mesh(edges, strut_radius: float, node_radius: Optional[float] = None,
+                 voxel: Optional[float] = None, blend: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Lattice à struts → un seul maillage étanche (voxel par défaut: rayon/3)"""
+    voxel = voxel or strut_radius / 3.0
+    field = strut_lattice(edges, strut_radius, node_radius, blend)
+    return mesh_from_field(field, voxel)
+
+
+def write_stl(path: str, verts: np.ndarray, faces: np.ndarray, header: bytes = b"Implicit mesh") -> int:
+    """STL binaire en une seule écriture (voir mesh_ops.write_stl_indexed)"""
+    return mesh_ops.write_stl_indexed(path, verts, faces, header)
+
+
+__all__ = [
+    "sd_box", "sd_capsules", "smooth_min",
+    "strut_lattice", "tpms", "box", "intersection", "union", "tpms_infill",
+    "sample_grid", "polygonize", "mesh_from_field", "lattice_mesh", "write_stl",
+]
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jobs.py — File de jobs durable (SQLite + workspace par job)
+Un job de génération n'est plus lié à la connexion HTTP qui l'a lancé: il
+tourne dans une tâche asyncio, chaque événement de progression est journalisé
+dans SQLite (output/jobs/jobs.db) avec un numéro de séquence, et le résultat
+final y sont persistés; les artefacts (STL/STEP écrits dans output/jobs/<job_id>/)
+sont indexés par le registre d'artefacts (artifacts.py).
+
+Un client peut donc se (re)connecter au flux d'événements à partir d'un offset
+(replay puis suivi en direct), ou simplement interroger l'état du job.
+
+Chaque job en vol appartient à un worker (owner) qui renouvelle son bail
+(lease_until) tant qu'il l'exécute. Seuls les jobs "queued"/"running" dont le
+bail a expiré (worker arrêté ou planté) sont repris, au démarrage puis
+périodiquement: un job qu'un autre worker vivant exécute n'est jamais relancé.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import shape_store
+from artifacts import DB_PATH, ArtifactRegistry
+
+log = logging.getLogger("cadamx.jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL = (SUCCEEDED, FAILED)
+# Événements qui clôturent le flux d'un job
+TERMINAL_EVENTS = ("complete", "error")
+
+# Fusion des requêtes identiques en vol (même prompt normalisé + options)
+COALESCE = os.getenv("JOB_COALESCE", "1") != "0"
+
+# Options d'ordonnancement ignorées par la fusion: même requête, autre client/classe
+DEDUP_IGNORED = ("priority", "client")
+
+# Intervalle de relecture de la base quand aucun signal local n'arrive
+# (job exécuté par un autre worker uvicorn)
+POLL_INTERVAL = 0.5
+
+# Bail d'exécution: renouvelé toutes les LEASE_SECONDS / 3 par le worker propriétaire (thread),
+# un job dont le bail a expiré est repris par un autre worker (ou au redémarrage)
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+
+# Identité de ce process (un par worker uvicorn)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    prompt      TEXT NOT NULL,
+    options     TEXT NOT NULL DEFAULT '{}',
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    artifacts   TEXT NOT NULL DEFAULT '{}',
+    error       TEXT,
+    dedup_key   TEXT,
+    owner       TEXT,
+    lease_until REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    job_id      TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    type        TEXT NOT NULL,
+    data        TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+# runner(job_id, prompt, options, emit) → payload de l'événement final
+Runner = Callable[[str, str, Dict[str, Any], Callable[[str, dict], Awaitable[None]]],
+                  Awaitable[Dict[str, Any]]]
+
+
+class JobStore:
+    """Accès SQLite (WAL) aux jobs et à leur journal d'événements"""
+
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        cols = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+        for col, decl in (("dedup_key", "TEXT"), ("owner", "TEXT"), ("lease_until", "REAL")):
+            if col not in cols:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {col} {decl}")
+        # Un seul job en vol par clé, y compris entre workers: l'INSERT concurrent échoue
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_inflight ON jobs (dedup_key) "
+            f"WHERE status IN ('{QUEUED}', '{RUNNING}')"
+        )
+
+    def create(self, job_id: str, prompt: str, options: Dict[str, Any],
+               dedup_key: Optional[str] = None, owner: str = WORKER_ID) -> Optional[str]:
+        """
+        Crée le job (bail pris par owner); si un job en vol porte déjà dedup_key,
+        rien n'est créé et l'id de ce job (le leader) est renvoyé.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, prompt, options, created_at, updated_at, dedup_key, "
+                    "owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, prompt, json.dumps(options), now, now, dedup_key,
+                     owner, now + LEASE_SECONDS),
+                )
+                return None
+            except sqlite3.IntegrityError:
+                if dedup_key is None:
+                    raise
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE dedup_key = ? AND status IN (?, ?)",
+                    (dedup_key, QUEUED, RUNNING),
+                ).fetchone()
+        if row is None:
+            # Le leader vient de se terminer: nouvelle tentative
+            return self.create(job_id, prompt, options, dedup_key, owner)
+        return row["id"]
+
+    def update(self, job_id: str, **fields) -> None:
+        """Met à jour status / attempts / result / artifacts / error (dict → JSON)"""
+        cols, vals = [], []
+        for k, v in fields.items():
+            if k in ("result", "artifacts") and v is not None:
+                v = json.dumps(v)
+            cols.append(f"{k} = ?")
+            vals.append(v)
+        cols.append("updated_at = ?")
+        vals.extend([time.time(), job_id])
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(cols)} WHERE id = ?", vals)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            n = self._conn.execute("SELECT COUNT(*) FROM events WHERE job_id = ?",
+                                   (job_id,)).fetchone()[0]
+        job = dict(row)
+        job["options"] = json.loads(job["options"] or "{}")
+        job["artifacts"] = json.loads(job["artifacts"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["event_count"] = n
+        return job
+
+    def inflight(self, dedup_key: str) -> Optional[str]:
+        """Id du job queued/running portant cette clé de fusion"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status IN (?, ?)",
+                (dedup_key, QUEUED, RUNNING),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def claim(self, job_id: str, owner: str = WORKER_ID) -> bool:
+        """
+        Reprise atomique d'un job interrompu dont le bail a expiré: seul le
+        worker dont l'UPDATE aboutit le relance (plusieurs workers peuvent
+        démarrer en même temps)
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND status IN (?, ?) AND (lease_until IS NULL OR lease_until < ?)",
+                (QUEUED, owner, now + LEASE_SECONDS, now, job_id, QUEUED, RUNNING, now),
+            )
+        return cur.rowcount == 1
+
+    def renew(self, job_id: str, owner: str = WORKER_ID) -> bool:
+        """Prolonge le bail du job; False si owner ne le détient plus (repris ailleurs)"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status IN (?, ?)",
+                (time.time() + LEASE_SECONDS, job_id, owner, QUEUED, RUNNING),
+            )
+        return cur.rowcount == 1
+
+    def expired(self) -> List[Dict[str, Any]]:
+        """Jobs queued/running dont le bail a expiré (worker disparu)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND (lease_until IS NULL OR lease_until < ?) "
+                "ORDER BY created_at",
+                (QUEUED, RUNNING, time.time()),
+            ).fetchall()
+        return [self.get(r["id"]) for r in rows]
+
+    def append_event(self, job_id: str, event_type: str, data: Dict[str, Any]) -> int:
+        """Ajoute un événement au journal; renvoie son numéro de séquence (offset)"""
+        payload = json.dumps(data)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq) + 1, 0) FROM events WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO events (job_id, seq, type, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, seq, event_type, payload, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def events(self, job_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, type, data FROM events WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                (job_id, offset),
+            ).fetchall()
+        return [{"seq": r["seq"], "type": r["type"], "data": json.loads(r["data"])} for r in rows]
+
+
+class JobManager:
+    """
+    Lance les jobs (tâches asyncio), journalise leurs événements et sert les
+    abonnements: replay depuis un offset puis suivi en direct.
+    """
+
+    def __init__(self, runner: Runner, store: Optional[JobStore] = None,
+                 artifacts: Optional[ArtifactRegistry] = None, owner: str = WORKER_ID):
+        self.runner = runner
+        self.owner = owner
+        self.store = store or JobStore()
+        self.artifacts = artifacts or ArtifactRegistry(self.store.db_path)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Signal "nouvel événement" par job (remplacé à chaque événement)
+        self._signals: Dict[str, asyncio.Event] = {}
+        # Abonnés actifs par job (fan-out; le signal est libéré au dernier départ)
+        self._subscribers: Dict[str, int] = {}
+        self._recovery: Optional[asyncio.Task] = None
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    # ----- soumission / exécution -----
+
+    @staticmethod
+    def dedup_key(prompt: str, options: Dict[str, Any]) -> str:
+        """Prompt normalisé (casse, espaces) + options triées → clé de fusion"""
+        norm = " ".join(prompt.lower().split()).rstrip(".!?")
+        opts = {k: v for k, v in options.items() if k not in DEDUP_IGNORED}
+        raw = json.dumps({"prompt": norm, "options": opts}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def submit(self, prompt: str, options: Optional[Dict[str, Any]] = None,
+               admit: Optional[Callable[[], None]] = None,
+               release: Optional[Callable[[], None]] = None) -> Tuple[str, bool]:
+        """
+        Crée et lance un job. Une requête identique à un job encore en vol ne
+        relance rien: elle reçoit l'id du leader (coalesced=True) et suit son flux.
+        admit(): contrôle d'admission appelé seulement si un nouveau job est créé
+        (peut lever une exception pour refuser). release(): rend la réservation
+        d'admit() si le job n'est finalement pas lancé. Renvoie (job_id, coalesced).
+        """
+        job_id = shape_store.new_job_id()
+        options = dict(options or {})
+        key = self.dedup_key(prompt, options) if COALESCE else None
+        leader = self.store.inflight(key) if key else None
+        if leader is not None:
+            log.info(f"🔗 Request coalesced into in-flight job {leader}: {prompt[:80]}")
+            return leader, True
+        if admit is not None:
+            admit()
+        try:
+            leader = self.store.create(job_id, prompt, options, key, self.owner)
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+        if leader is not None:
+            # Un autre worker a créé le même job entre inflight() et create()
+            if release is not None:
+                release()
+            log.info(f"🔗 Request coalesced into in-flight job {leader}: {prompt[:80]}")
+            return leader, True
+        self._emit_sync(job_id, "queued", {"message": "🕒 Job queued", "progress": 0, "job_id": job_id})
+        self._start(job_id, prompt, options)
+        log.info(f"📥 Job {job_id} submitted: {prompt[:80]}")
+        return job_id, False
+
+    def _start(self, job_id: str, prompt: str, options: Dict[str, Any]) -> None:
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(self._run(job_id, prompt, options))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat, args=(loop,),
+                                                      name="job-lease", daemon=True)
+            self._heartbeat_thread.start()
+
+    async def _run(self, job_id: str, prompt: str, options: Dict[str, Any]) -> None:
+        job = self.store.get(job_id) or {}
+        self.store.update(job_id, status=RUNNING, attempts=job.get("attempts", 0) + 1)
+
+        async def emit(event_type: str, data: dict):
+            self._emit_sync(job_id, event_type, data)
+
+        try:
+            final = await self.runner(job_id, prompt, options, emit)
+        except asyncio.CancelledError:
+            # Arrêt du serveur (ou bail perdu): le job reste "running", repris à l'expiration du bail
+            raise
+        except Exception as e:
+            log.error(f"❌ Job {job_id} crashed: {e}", exc_info=True)
+            final = {"success": False, "errors": [str(e)], "progress": 0}
+
+        if final.get("success"):
+            artifacts = self._persist_artifacts(job_id, final)
+            final["job_id"] = job_id
+            self.store.update(job_id, status=SUCCEEDED, artifacts=artifacts,
+                              result={k: v for k, v in final.items() if k != "mesh"})
+            self._emit_sync(job_id, "complete", final)
+            log.info(f"✅ Job {job_id} succeeded")
+        else:
+            errors = final.get("errors") or ["Unknown error"]
+            self.store.update(job_id, status=FAILED, result=final, error="; ".join(map(str, errors)))
+            self._emit_sync(job_id, "error", final)
+            log.info(f"❌ Job {job_id} failed: {errors}")
+
+    def _heartbeat(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Thread: renouvelle le bail des jobs de ce worker. Hors boucle asyncio, pour
+        qu'un exec géométrique long (bloquant) ne laisse pas expirer le bail.
+        Un job repris par un autre worker est arrêté ici.
+        """
+        while not self._stopping.wait(LEASE_SECONDS / 3):
+            for job_id, task in list(self._tasks.items()):
+                try:
+                    if not self.store.renew(job_id, self.owner):
+                        log.warning(f"⚠️ Job {job_id}: lease lost to another worker, stopping this run")
+                        loop.call_soon_threadsafe(task.cancel)
+                except Exception as e:
+                    log.warning(f"⚠️ Lease renewal failed for job {job_id}: {e}")
+
+    def _persist_artifacts(self, job_id: str, final: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Range STL/STEP (écrits dans le répertoire d'exécution privé du job,
+        shape_store.run_dir) en result.{fmt} dans le workspace et les indexe dans
+        le registre d'artefacts. Les chemins serveur sont remplacés par les URLs
+        /api/artifacts/{job_id}.{fmt}.
+        """
+        ws = shape_store.workspace(job_id)
+        ws.mkdir(parents=True, exist_ok=True)
+        runs = ws / "runs"
+        for fmt, key in (("stl", "stl_path"), ("step", "step_path")):
+            src = final.pop(key, None)
+            if not src or not Path(src).exists():
+                continue
+            dst = ws / f"result.{fmt}"
+            try:
+                if runs in Path(src).resolve().parents:
+                    os.replace(src, dst)
+                elif Path(src).resolve() != dst.resolve():
+                    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+                    shutil.copyfile(src, tmp)
+                    os.replace(tmp, dst)
+                self.artifacts.register(job_id, fmt, str(dst))
+            except OSError as e:
+                log.warning(f"⚠️ Could not store {fmt.upper()} artifact for job {job_id}: {e}")
+        # Tentatives (healing, repli exec) du job: plus utiles une fois les artefacts rangés
+        shutil.rmtree(runs, ignore_errors=True)
+        artifacts = self.artifacts.list(job_id)
+        final["artifacts"] = artifacts
+        return artifacts
+
+    def _emit_sync(self, job_id: str, event_type: str, data: Dict[str, Any]) -> int:
+        seq = self.store.append_event(job_id, event_type, data)
+        signal = self._signals.pop(job_id, None)
+        if signal is not None:
+            signal.set()
+        return seq
+
+    # ----- lecture -----
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is not None:
+            # Inclut les exports produits à la demande après la fin du job
+            job["artifacts"] = {**job["artifacts"], **self.artifacts.list(job_id)}
+        return job
+
+    async def subscribe(self, job_id: str, offset: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Événements du job à partir de offset (replay), puis en direct jusqu'à
+        l'événement final. Chaque élément: {"seq", "type", "data"}.
+        """
+        self._subscribers[job_id] = self._subscribers.get(job_id, 0) + 1
+        try:
+            while True:
+                # Signal pris AVANT la lecture: un événement arrivé entre-temps le déclenche
+                signal = self._signals.setdefault(job_id, asyncio.Event())
+                for ev in self.store.events(job_id, offset):
+                    offset = ev["seq"] + 1
+                    yield ev
+                    if ev["type"] in TERMINAL_EVENTS:
+                        return
+
+                job = self.store.get(job_id)
+                if job is None or (job["status"] in TERMINAL and offset >= job["event_count"]):
+                    return
+                try:
+                    await asyncio.wait_for(signal.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Déconnexion ou fin du flux: le job continue, seul l'état d'abonnement est libéré
+            left = self._subscribers.get(job_id, 1) - 1
+            if left > 0:
+                self._subscribers[job_id] = left
+            else:
+                self._subscribers.pop(job_id, None)
+                self._signals.pop(job_id, None)
+
+    def subscriber_count(self, job_id: str) -> int:
+        return self._subscribers.get(job_id, 0)
+
+    # ----- redémarrage -----
+
+    def recover(self) -> int:
+        """Relance les jobs dont le bail a expiré (worker arrêté ou planté)"""
+        jobs = [job for job in self.store.expired() if job["id"] not in self._tasks and self.store.claim(job["id"], self.owner)]
+        for job in jobs:
+            self._emit_sync(job["id"], "status", {
+                "message": "🔁 Worker stopped, resuming job...", "progress": 0,
+            })
+            self._start(job["id"], job["prompt"], job["options"])
+        if jobs:
+            log.info(f"🔁 Resumed {len(jobs)} interrupted job(s)")
+        return len(jobs)
+
+    def start(self) -> None:
+        """Reprise immédiate puis périodique des jobs abandonnés (à appeler au démarrage)"""
+        self.recover()
+        self._recovery = asyncio.get_running_loop().create_task(self._recover_loop())
+
+    async def _recover_loop(self) -> None:
+        while True:
+            await asyncio.sleep(LEASE_SECONDS)
+            try:
+                self.recover()
+            except Exception as e:
+                log.warning(f"⚠️ Job recovery failed: {e}")
+
+    async def shutdown(self) -> None:
+        self._stopping.set()
+        if self._recovery is not None:
+            self._recovery.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+__all__ = [
+    "DB_PATH", "COALESCE", "LEASE_SECONDS", "WORKER_ID", "QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "TERMINAL",
+    "JobStore", "JobManager",
+]
@@ -1,4 +1,5 @@
 ﻿import os
+import asyncio
 import json
 import logging
 import time
@@ -6,13 +7,24 @@ from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+import hashlib
+
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, FileResponse, Response
 from pydantic import BaseModel
 
 from agents import AnalystAgent, GeneratorAgent, ValidatorAgent
 from multi_agent_system import OrchestratorAgent
+from cot_agents import normalize_cot_mode
+import artifacts
+import heal_rules
+from model_manager import canonical, model_manager, request_models
+import model_router
+import prompt_assembly
+import shape_store
+from jobs import JobManager
+from scheduler import QueueFull, normalize_priority, scheduler
 
 # ========== CONFIGURATION ==========
 # Load environment variables from .env
@@ -40,15 +52,19 @@ validator = ValidatorAgent()
 # Orchestrator (coordinates 9 agents: 3 existing + 6 new)
 orchestrator = OrchestratorAgent(analyst, generator, validator)
 
-# Temporary storage of last generated files
-_last_stl_path: Optional[str] = None
-_last_step_path: Optional[str] = None
-_last_app_type: Optional[str] = None
-
-
 # ========== MODELS ==========
 class GenerateRequest(BaseModel):
     prompt: str
+    # Qualité de tessellation des exports BRep: "preview" (rapide) ou "production" (fin)
+    quality: str = "production"
+    # Classe d'ordonnancement: "interactive" (UI) ou "batch" (benchmarks, balayages)
+    priority: str = "interactive"
+    # Mode CoT pour les formes inconnues: "staged" (3 agents) ou "fused" (1 appel); défaut: COT_MODE
+    cot_mode: Optional[str] = None
+    # Modèle Ollama du mode fused (benchmarks par modèle); défaut: COT_FUSED_MODEL
+    cot_model: Optional[str] = None
+    # False: pas d'exemples few-shot tirés des générations passées, résultat non indexé (benchmarks)
+    example_history: bool = True
 
 
 # ========== HELPERS ==========
@@ -69,179 +85,198 @@ def escape_for_json(text: str) -> str:
     )
 
 
-async def send_sse_event(event_type: str, data: dict) -> str:
+async def send_sse_event(event_type: str, data: dict, event_id: Optional[int] = None) -> str:
     """
     Formats an SSE event.
     Returns a string ready to be sent.
+    event_id: job event offset (sent as SSE "id:" so clients can resume)
     """
     data['type'] = event_type
     json_str = json.dumps(data, ensure_ascii=False)
+    if event_id is not None:
+        return f"id: {event_id}\ndata: {json_str}\n\n"
     return f"data: {json_str}\n\n"
 
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Disable nginx buffering
+    "Access-Control-Allow-Origin": "*",
+}
+
+
+async def run_generation(job_id: str, prompt: str, options: dict, emit) -> dict:
+    """
+    Runs the multi-agent workflow for a job (jobs.JobManager runner).
+    Waits for a scheduler slot of the job's priority class first (queue
+    position / ETA sent as "queue" events). Progress events go through emit();
+    returns the payload of the final "complete" / "error" event.
+    """
+    async def progress_callback(event_type: str, data: dict):
+        if event_type == "code":
+            # Escape code for JSON
+            data["code"] = escape_for_json(data.get("code", ""))
+        await emit(event_type, data)
+
+    priority = options.get("priority", "interactive")
+    async with scheduler.admitted(priority, options.get("client", "local"), notify=emit):
+        start_time = time.time()
+        log.info(f"🚀 Starting multi-agent workflow for job {job_id} ({priority}): {prompt[:100]}...")
+
+        # Execute orchestrated workflow with 9 agents
+        result = await orchestrator.execute_workflow(
+            prompt,
+            progress_callback=progress_callback,
+            quality=options.get("quality", "production"),
+            job_id=job_id,
+            cot_mode=options.get("cot_mode"),
+            cot_model=options.get("cot_model"),
+            example_history=options.get("example_history", True)
+        )
+
+    # Calculate execution time
+    execution_time = time.time() - start_time
+
+    if not result["success"]:
+        # Error - agents handled the error
+        errors = result.get("errors", ["Unknown error"])
+        log.error(f"❌ Multi-agent workflow failed: {errors} (⏱️  {execution_time:.2f}s)")
+        return {
+            "success": False,
+            "errors": errors,
+            "progress": 0,
+            "metadata": result.get("metadata", {}),
+            "execution_time": round(execution_time, 2)
+        }
+
+    log.info(f"✅ Multi-agent generation successful! (⏱️  {execution_time:.2f}s)")
+
+    response_data = {
+        "success": True,
+        "mesh": result.get("mesh"),
+        "analysis": result.get("analysis"),
+        "code": result.get("code"),  # Unescaped code for final result
+        "app_type": result.get("app_type"),
+        "progress": 100,
+        "execution_time": round(execution_time, 2)  # Add execution time in seconds
+    }
+
+    # Files produced by the run: the job manager moves them into the job
+    # workspace and replaces the paths by /api/artifacts/{job_id}.{fmt} URLs
+    if result.get("stl_path"):
+        response_data["stl_path"] = result["stl_path"]
+    if result.get("step_path"):
+        response_data["step_path"] = result["step_path"]
+    # BRep stocké → exports STEP/STL/3MF à la demande (/api/artifacts, /api/export/{job_id}/{fmt})
+    response_data["export_formats"] = result.get("export_formats", []) if result.get("job_id") else []
+
+    # Add multi-agent system metadata
+    if "metadata" in result:
+        response_data["metadata"] = result["metadata"]
+
+    return response_data
+
+
+# Durable job queue (SQLite + per-job workspace), opened by the startup hook
+job_manager: Optional[JobManager] = None
+
+
+def client_id(http_request: Request) -> str:
+    """Fairness key: API key (hashed) if provided, else client IP"""
+    key = http_request.headers.get("x-api-key")
+    auth = http_request.headers.get("authorization", "")
+    if not key and auth.lower().startswith("bearer "):
+        key = auth[7:].strip()
+    if key:
+        return "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (http_request.client.host if http_request.client else "unknown")
+
+
+def submit_generation(request: GenerateRequest, http_request: Request):
+    """
+    Submits (or joins) a generation job after admission control.
+    Raises 400 on an unknown priority class, CoT mode or CoT model (only configured
+    models and COT_EXTRA_MODELS are accepted), 429 + Retry-After when its queue is full.
+    """
+    try:
+        priority = normalize_priority(http_request.headers.get("x-priority") or request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    options = {"quality": request.quality, "priority": priority, "client": client_id(http_request)}
+    if not request.example_history:
+        options["example_history"] = False
+    if request.cot_mode:
+        try:
+            options["cot_mode"] = normalize_cot_mode(request.cot_mode)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if request.cot_model:
+        if canonical(request.cot_model) not in request_models():
+            raise HTTPException(status_code=400, detail=(
+                f"Unknown cot_model '{request.cot_model}'; expected one of: {', '.join(sorted(request_models()))}"
+            ))
+        options["cot_model"] = request.cot_model.strip()
+    try:
+        return job_manager.submit(request.prompt, options,
+                                  admit=lambda: scheduler.admit(priority),
+                                  release=lambda: scheduler.release_pending(priority))
+    except QueueFull as e:
+        log.warning(f"🚦 Rejected {priority} request: {e}")
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+
+
 # ========== ENDPOINTS ==========
 
+@app.on_event("startup")
+async def start_jobs():
+    """Open the job store, then resume jobs whose worker lease expired (now and periodically)"""
+    global job_manager
+    job_manager = JobManager(run_generation)
+    job_manager.start()
+
+
+@app.on_event("startup")
+async def preload_models():
+    """Load the configured Ollama models in the background (first request skips the load time)"""
+    asyncio.create_task(model_manager.preload())
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    if job_manager is not None:
+        await job_manager.shutdown()
+
+
 @app.get("/")
 async def root():
     """Health check"""
     return {"status": "ok", "service": "CadaMx API"}
 
-@app.get("/api/export/grasshopper")
-async def export_grasshopper():
-    """Export as Grasshopper-compatible format with sections"""
-    from pathlib import Path
-    import json
-    
-    if not _last_stl_path or not os.path.exists(_last_stl_path):
-        raise HTTPException(status_code=404, detail="No model available")
-    
-    # Read STL and convert to sectioned format
-    import struct
-    sections = []
-
-    with open(_last_stl_path, 'rb') as f:
-        f.read(80)  # header
-        num_triangles = struct.unpack('<I', f.read(4))[0]
-
-        # Group triangles by Z height (sections)
-        z_sections = {}
-        for i in range(num_triangles):
-            # STL binary format: normal (12 bytes), then 3 vertices (36 bytes), then attribute (2 bytes)
-            normal = struct.unpack('<3f', f.read(12))
-            v1 = struct.unpack('<3f', f.read(12))
-            v2 = struct.unpack('<3f', f.read(12))
-            v3 = struct.unpack('<3f', f.read(12))
-            f.read(2)  # attribute bytes
-
-            avg_z = (v1[2] + v2[2] + v3[2]) / 3
-            section_key = int(avg_z / 10) * 10  # 10mm sections
-
-            if section_key not in z_sections:
-                z_sections[section_key] = []
-
-            z_sections[section_key].append({
-                "vertices": [list(v1), list(v2), list(v3)],
-                "normal": list(normal)
-            })
-    
-    # Convert to Grasshopper format
-    gh_data = {
-        "type": _last_app_type or "model",
-        "sections": [],
-        "metadata": {
-            "total_triangles": num_triangles,
-            "section_height": 10.0
-        }
-    }
-    
-    for z_height, triangles in sorted(z_sections.items()):
-        gh_data["sections"].append({
-            "z_position": z_height,
-            "triangles": triangles[:1000]  # Limit for performance
-        })
-    
-    response = json.dumps(gh_data, indent=2)
-    
-    return Response(
-        content=response,
-        media_type="application/json",
-        headers={
-            "Content-Disposition": f'attachment; filename="{_last_app_type or "model"}_grasshopper.json"'
-        }
-    )
-
-
 @app.post("/api/generate")
-async def generate_endpoint(request: GenerateRequest):
+async def generate_endpoint(request: GenerateRequest, http_request: Request):
     """
     Main generation endpoint with SSE streaming.
+    Submits a job (see /api/jobs) and relays its events: the workflow keeps
+    running if the connection drops and can be followed again via
+    /api/jobs/{job_id}/events.
 
     Event flow:
-    1. type: "status" - Progress updates
-    2. type: "code" - Generated Python code (may be escaped)
-    3. type: "complete" - Final result with mesh, analysis, etc.
-    4. type: "error" - In case of error
+    1. type: "queued" - Job accepted (carries job_id)
+    2. type: "queue" - Waiting for a scheduler slot (position, eta_s)
+    3. type: "status" - Progress updates
+    4. type: "code" - Generated Python code (may be escaped)
+    5. type: "complete" - Final result with mesh, analysis, artifact URLs, etc.
+    6. type: "error" - In case of error
     """
-    
-    global _last_stl_path, _last_step_path, _last_app_type
-    
+    # Identical in-flight request → follow the leader's stream instead of a new run
+    job_id, _ = submit_generation(request, http_request)
+
     async def event_stream():
-        global _last_stl_path, _last_step_path, _last_app_type
         try:
-            start_time = time.time()
-            log.info(f"🚀 Starting multi-agent workflow for prompt: {request.prompt[:100]}...")
-
-            # List to collect progress events
-            progress_events = []
-
-            # Callback to send progress events
-            async def progress_callback(event_type: str, data: dict):
-                if event_type == "code":
-                    # Escape code for JSON
-                    data["code"] = escape_for_json(data.get("code", ""))
-                event = await send_sse_event(event_type, data)
-                progress_events.append(event)
-
-            # Execute orchestrated workflow with 9 agents
-            result = await orchestrator.execute_workflow(
-                request.prompt,
-                progress_callback=progress_callback
-            )
-
-            # Calculate execution time
-            execution_time = time.time() - start_time
-
-            # Send all progress events
-            for event in progress_events:
-                yield event
-
-            if result["success"]:
-                # Success - store paths
-                _last_stl_path = result.get("stl_path")
-                _last_step_path = result.get("step_path")
-                _last_app_type = result.get("app_type", "model")
-
-                log.info(f"✅ Multi-agent generation successful! (⏱️  {execution_time:.2f}s)")
-                if _last_stl_path:
-                    log.info(f"  STL: {_last_stl_path}")
-                if _last_step_path:
-                    log.info(f"  STEP: {_last_step_path}")
-
-                # Send final result
-                response_data = {
-                    "success": True,
-                    "mesh": result.get("mesh"),
-                    "analysis": result.get("analysis"),
-                    "code": result.get("code"),  # Unescaped code for final result
-                    "app_type": result.get("app_type"),
-                    "progress": 100,
-                    "execution_time": round(execution_time, 2)  # Add execution time in seconds
-                }
-
-                # Add paths if available
-                if _last_stl_path:
-                    response_data["stl_path"] = _last_stl_path
-                if _last_step_path:
-                    response_data["step_path"] = _last_step_path
-
-                # Add multi-agent system metadata
-                if "metadata" in result:
-                    response_data["metadata"] = result["metadata"]
-
-                yield await send_sse_event("complete", response_data)
-
-            else:
-                # Error - agents handled the error
-                errors = result.get("errors", ["Unknown error"])
-                log.error(f"❌ Multi-agent workflow failed: {errors} (⏱️  {execution_time:.2f}s)")
-
-                yield await send_sse_event("error", {
-                    "success": False,
-                    "errors": errors,
-                    "progress": 0,
-                    "metadata": result.get("metadata", {}),
-                    "execution_time": round(execution_time, 2)
-                })
+            async for ev in job_manager.subscribe(job_id):
+                yield await send_sse_event(ev["type"], ev["data"], ev["seq"])
 
         except Exception as e:
             # General uncaught error
@@ -251,63 +286,185 @@ async def generate_endpoint(request: GenerateRequest):
                 "errors": [str(e)],
                 "progress": 0
             })
-    
+
     return StreamingResponse(
         event_stream(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # Disable nginx buffering
-            "Access-Control-Allow-Origin": "*",
-        }
+        headers=SSE_HEADERS
     )
 
 
-@app.get("/api/export/stl")
-async def export_stl():
-    """Download the last generated STL file"""
-    from pathlib import Path
-
-    # Use the path of the last generated file
-    if _last_stl_path and os.path.exists(_last_stl_path):
-        stl_file = Path(_last_stl_path)
-    else:
-        # Fallback: search for most recent file
-        output_dir = Path(__file__).parent / "output"
-        stl_files = sorted(
-            output_dir.glob("generated_*.stl"),
-            key=lambda p: p.stat().st_mtime,
-            reverse=True
-        )
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: GenerateRequest, http_request: Request):
+    """Submit a generation job; returns immediately with its id (429 if the queue is full)"""
+    job_id, coalesced = submit_generation(request, http_request)
+    return {
+        "job_id": job_id,
+        "status": job_manager.get(job_id)["status"],
+        # True: identical request already in flight, this id is the shared job
+        "coalesced": coalesced,
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+    }
 
-        if stl_files:
-            stl_file = stl_files[0]
-        else:
-            raise HTTPException(status_code=404, detail="No STL file available")
 
-    # Determine filename based on type
-    filename = f"{_last_app_type or 'model'}_generated.stl"
-    
-    return FileResponse(
-        str(stl_file),
-        media_type="application/octet-stream",
-        filename=filename
+@app.get("/api/scheduler")
+async def scheduler_stats():
+    """Slots in use / waiting per priority class and pool"""
+    return scheduler.stats()
+
+
+@app.get("/api/models")
+async def models_status():
+    """Configured Ollama models, residency (ollama ps), traffic and keep_alive"""
+    return await model_manager.status()
+
+
+@app.get("/api/prompts")
+async def prompt_stats():
+    """Prompt tokens per agent and section, Ollama prompt evaluation and KV prefix reuse"""
+    return {"budget": prompt_assembly.PROMPT_TOKEN_BUDGET, "agents": prompt_assembly.metrics.snapshot()}
+
+
+@app.get("/api/healing")
+async def healing_stats():
+    """Basic-fix rules: hits, effective changes and time per rule, cost of the healing path"""
+    return heal_rules.stats.snapshot()
+
+
+@app.get("/api/routing")
+async def routing_stats():
+    """CoT model per agent / complexity tier, escalations and timings per tier"""
+    return {"routes": model_router.ROUTES, "stats": model_router.stats.snapshot()}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job state, final result (without mesh) and persisted artifacts"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, offset: int = 0,
+                     last_event_id: Optional[str] = Header(None)):
+    """
+    SSE stream of a job: replays stored events from `offset` then follows
+    live ones until "complete" / "error". Each event carries its offset as
+    SSE id; a reconnecting EventSource resumes after Last-Event-ID.
+    """
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if last_event_id is not None and last_event_id.isdigit():
+        offset = max(offset, int(last_event_id) + 1)
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset must be >= 0")
+
+    async def event_stream():
+        async for ev in job_manager.subscribe(job_id, offset):
+            yield await send_sse_event(ev["type"], ev["data"], ev["seq"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
     )
 
 
-@app.get("/api/export/step")
-async def export_step():
-    """Download the last generated STEP file"""
-    if not _last_step_path or not os.path.exists(_last_step_path):
-        raise HTTPException(status_code=404, detail="No STEP file available")
+@app.api_route("/api/artifacts/{artifact_id}.{fmt}", methods=["GET", "HEAD"])
+async def get_artifact(artifact_id: str, fmt: str,
+                       range_header: Optional[str] = Header(None, alias="Range"),
+                       if_none_match: Optional[str] = Header(None)):
+    """
+    Download a job artifact (stl | step | 3mf | grasshopper).
+    artifact_id: job id, or SHA-256 of the content (immutable URL).
+    Missing STEP/STL/3MF/Grasshopper files are produced on demand from the job.
+    The content hash is the ETag; single byte ranges are supported.
+    """
+    fmt = fmt.lower()
+    if fmt not in artifacts.ARTIFACT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+
+    by_hash = len(artifact_id) == 64
+    job = None if by_hash else job_manager.get(artifact_id)
+    if not by_hash and job is None:
+        raise HTTPException(status_code=404, detail="Unknown artifact")
+    app_type = ((job or {}).get("result") or {}).get("app_type") or "model"
+
+    try:
+        entry = await job_manager.artifacts.resolve(artifact_id, fmt, app_type)
+    except Exception as e:
+        log.error(f"❌ Artifact {artifact_id}.{fmt} failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Export failed: {e}")
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No {fmt.upper()} artifact for this id")
+
+    spec = artifacts.ARTIFACT_FORMATS[fmt]
+    etag = f'"{entry["sha256"]}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Hash URLs never change; job URLs are revalidated with the ETag
+        "Cache-Control": "public, max-age=31536000, immutable" if by_hash else "no-cache",
+        "Content-Disposition": f'attachment; filename="{app_type}_{entry["job_id"][:8]}.{spec["ext"]}"',
+    }
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    size = entry["size"]
+    try:
+        byte_range = artifacts.parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", **headers})
+    if byte_range is None:
+        return FileResponse(entry["path"], media_type=spec["media_type"], headers=headers)
+
+    start, end = byte_range
+
+    def chunks():
+        with open(entry["path"], "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(1 << 16, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(end - start + 1)})
+    return StreamingResponse(chunks(), status_code=206, media_type=spec["media_type"], headers=headers)
+
+
+@app.get("/api/export/{job_id}/{fmt}")
+async def export_job(job_id: str, fmt: str, tolerance: Optional[float] = None,
+                     angular_tolerance: Optional[float] = None):
+    """
+    Re-export from the stored BRep of a job (no code re-execution).
+    fmt: step | stl | 3mf; tolerance (mm) / angular_tolerance (rad) for meshes.
+    Results are cached per format/tolerance in the job workspace.
+    """
+    fmt = fmt.lower()
+    if fmt not in shape_store.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    if (tolerance is not None and tolerance <= 0) or (angular_tolerance is not None and angular_tolerance <= 0):
+        raise HTTPException(status_code=400, detail="Tolerances must be positive")
+    if not shape_store.has_shape(job_id):
+        raise HTTPException(status_code=404, detail="No stored shape for this job")
+
+    try:
+        path = await shape_store.export(job_id, fmt, tolerance, angular_tolerance)
+    except Exception as e:
+        log.error(f"❌ Export {fmt} failed for job {job_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Export failed: {e}")
 
-    filename = f"{_last_app_type or 'model'}_generated.step"
-    
     return FileResponse(
-        _last_step_path,
-        media_type="application/octet-stream",
-        filename=filename
+        path,
+        media_type=shape_store.EXPORT_FORMATS[fmt]["media_type"],
+        filename=f"model_{job_id[:8]}.{shape_store.EXPORT_FORMATS[fmt]['ext']}"
     )
 
 
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mesh_ops.py — Opérations maillage partagées par les templates "mesh" (sans CadQuery)
+Primitives générées par lots, transformations rigides par lots, normales
+vectorisées et écriture STL binaire en une seule passe (dtype structuré).
+
+Convention: une "soupe" de triangles est un tableau (N, 3, 3) float32; un
+maillage indexé est un couple (verts (V, 3), faces (F, 3) int).
+Toutes les primitives fermées sont orientées normales vers l'extérieur.
+"""
+
+import logging
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+log = logging.getLogger("cadamx.mesh_ops")
+
+# Enregistrement STL binaire: normale, 3 sommets, attribut (50 octets)
+STL_DTYPE = np.dtype([("n", "<f4", (3,)), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+
+# Boîte unité: sommet k = (bit2, bit1, bit0) de k sur (x, y, z)
+BOX_CORNERS = np.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)])
+BOX_FACES = np.array([
+    [0, 1, 3], [0, 3, 2],   # -x
+    [4, 6, 7], [4, 7, 5],   # +x
+    [0, 4, 5], [0, 5, 1],   # -y
+    [2, 3, 7], [2, 7, 6],   # +y
+    [0, 2, 6], [0, 6, 4],   # -z
+    [1, 5, 7], [1, 7, 3],   # +z
+])
+
+
+# ===== NORMALES + STL =====
+
+def compute_normals(tris: np.ndarray) -> np.ndarray:
+    """Normales unitaires (N, 3) d'une soupe (N, 3, 3); 0 pour les triangles dégénérés"""
+    tris = np.asarray(tris, dtype=np.float32)
+    n = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    lens = np.linalg.norm(n, axis=1)
+    lens[lens == 0] = 1.0
+    return (n / lens[:, None]).astype(np.float32)
+
+
+def write_stl(path: str, tris: np.ndarray, header: bytes = b"Generated mesh") -> int:
+    """STL binaire: un seul tableau structuré écrit avec tofile. Retourne le nombre de triangles"""
+    tris = np.asarray(tris, dtype=np.float32).reshape(-1, 3, 3)
+    rec = np.empty(len(tris), dtype=STL_DTYPE)
+    rec["n"] = compute_normals(tris)
+    rec["v"] = tris
+    rec["attr"] = 0
+    with open(path, "wb") as f:
+        f.write(header[:80].ljust(80, b" "))
+        f.write(np.uint32(len(tris)).tobytes())
+        rec.tofile(f)
+    return len(tris)
+
+
+def write_stl_ascii(path: str, tris: np.ndarray, name: str = "mesh", chunk: int = 100_000) -> int:
+    """STL ASCII (pour les outils qui l'exigent): formatage par lots de `chunk` facettes"""
+    tris = np.asarray(tris, dtype=np.float32).reshape(-1, 3, 3)
+    data = np.concatenate([compute_normals(tris), tris.reshape(-1, 9)], axis=1).astype(np.float64)
+    facet = ("  facet normal %e %e %e\n    outer loop\n"
+             "      vertex %e %e %e\n      vertex %e %e %e\n      vertex %e %e %e\n"
+             "    endloop\n  endfacet\n")
+    with open(path, "w") as f:
+        f.write(f"solid {name}\n")
+        for i in range(0, len(data), chunk):
+            block = data[i:i + chunk]
+            f.write((facet * len(block)) % tuple(block.ravel()))
+        f.write(f"endsolid {name}\n")
+    return len(tris)
+
+
+def write_stl_indexed(path: str, verts: np.ndarray, faces: np.ndarray,
+                      header: bytes = b"Generated mesh") -> int:
+    """STL binaire depuis un maillage indexé"""
+    return write_stl(path, np.asarray(verts, dtype=np.float32)[faces], header)
+
+
+def concat(*parts: np.ndarray) -> np.ndarray:
+    """Concatène des soupes de triangles (ignore les vides)"""
+    parts = [np.asarray(p, dtype=np.float32).reshape(-1, 3, 3) for p in parts if len(p)]
+    if not parts:
+        return np.zeros((0, 3, 3), dtype=np.float32)
+    return np.concatenate(parts)
+
+
+# ===== TOPOLOGIE =====
+
+def quad_faces(a, b, c, d) -> np.ndarray:
+    """Quads (a, b, c, d) → triangles (a,b,c) + (a,c,d), entrelacés quad par quad"""
+    a, b, c, d = np.broadcast_arrays(a, b, c, d)
+    return np.stack([np.stack([a, b, c], -1), np.stack([a, c, d], -1)], axis=-2).reshape(-1, 3)
+
+
+def grid_faces(nv: int, nu: int, offset: int = 0) -> np.ndarray:
+    """Faces d'une grille de (nv+1) × (nu+1) sommets rangés ligne par ligne"""
+    g = np.arange((nv + 1) * (nu + 1)).reshape(nv + 1, nu + 1) + offset
+    return quad_faces(g[:-1, :-1], g[:-1, 1:], g[1:, 1:], g[1:, :-1])
+
+
+def grid_surface(points: np.ndarray) -> np.ndarray:
+    """Surface paramétrique (nv+1, nu+1, 3) → soupe de triangles"""
+    nv, nu = points.shape[0] - 1, points.shape[1] - 1
+    return np.asarray(points, dtype=np.float32).reshape(-1, 3)[grid_faces(nv, nu)]
+
+
+# ===== PRIMITIVES PAR LOTS =====
+
+def boxes(centers, sizes) -> np.ndarray:
+    """K boîtes alignées (centres (K,3), tailles (K,3) ou (3,)) → (12K, 3, 3)"""
+    centers = np.atleast_2d(np.asarray(centers, dtype=np.float64))
+    sizes = np.broadcast_to(np.asarray(sizes, dtype=np.float64), centers.shape)
+    corners = centers[:, None, :] + BOX_CORNERS[None, :, :] * sizes[:, None, :]
+    return corners[:, BOX_FACES].reshape(-1, 3, 3).astype(np.float32)
+
+
+def oriented_boxes(centers, axes, half_sizes) -> np.ndarray:
+    """
+    K boîtes orientées: centres (K,3), repères (K,3,3) dont les lignes sont les
+    axes locaux, demi-tailles (K,3) ou (3,) → (12K, 3, 3)
+    """
+    centers = np.atleast_2d(np.asarray(centers, dtype=np.float64))
+    axes = np.asarray(axes, dtype=np.float64).reshape(-1, 3, 3)
+    half = np.broadcast_to(np.asarray(half_sizes, dtype=np.float64), centers.shape)
+    local = 2.0 * BOX_CORNERS[None, :, :] * half[:, None, :]
+    corners = centers[:, None, :] + np.einsum("kcj,kjd->kcd", local, axes)
+    tris = corners[:, BOX_FACES]
+    # Repère indirect: on inverse l'ordre des sommets pour garder les normales sortantes
+    flip = np.linalg.det(axes) < 0
+    tris[flip] = tris[flip][:, :, [0, 2, 1]]
+    return tris.reshape(-1, 3, 3).astype(np.float32)
+
+
+def extrude(profile, vector, caps: bool = True) -> np.ndarray:
+    """
+    Extrude un polygone plan (P, 3) le long de `vector` → soupe fermée.
+    Profil convexe et orienté CCW vu depuis `vector` pour des normales sortantes;
+    les bouchons sont triangulés en éventail.
+    """
+    bottom = np.asarray(profile, dtype=np.float64)
+    top = bottom + np.asarray(vector, dtype=np.float64)
+    p = len(bottom)
+    verts = np.concatenate([bottom, top])
+    i = np.arange(p)
+    j = (i + 1) % p
+    faces = [quad_faces(i, j, j + p, i + p)]
+    if caps and p >= 3:
+        k = np.arange(1, p - 1)
+        faces.append(np.stack([np.zeros_like(k), k + 1, k], -1))          # bas (vers -vector)
+        faces.append(np.stack([np.full_like(k, p), k + p, k + 1 + p], -1))  # haut
+    return verts[np.concatenate(faces)].astype(np.float32)
+
+
+def extrude_polygon(points, height: float, z0: float = 0.0, caps: bool = True) -> np.ndarray:
+    """Polygone 2D (P, 2) dans le plan z=z0 extrudé de `height` selon +z"""
+    pts = np.asarray(points, dtype=np.float64)
+    profile = np.column_stack([pts[:, 0], pts[:, 1], np.full(len(pts), z0)])
+    return extrude(profile, (0.0, 0.0, height), caps=caps)
+
+
+def regular_polygon(radius: float, n: int, phase: float = 0.0) -> np.ndarray:
+    """Sommets (n, 2) d'un polygone régulier CCW"""
+    a = phase + 2.0 * np.pi * np.arange(n) / n
+    return np.column_stack([radius * np.cos(a), radius * np.sin(a)])
+
+
+def cylinders(bases, radii, heights, segments: int = 16, caps: bool = True) -> np.ndarray:
+    """K cylindres d'axe +z (bases (K,3), rayons (K,), hauteurs (K,)) → soupe"""
+    bases = np.atleast_2d(np.asarray(bases, dtype=np.float64))
+    k = len(bases)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (k,))
+    heights = np.broadcast_to(np.asarray(heights, dtype=np.float64), (k,))
+    unit = extrude_polygon(regular_polygon(1.0, segments), 1.0, caps=caps).astype(np.float64)
+    scale = np.stack([radii, radii, heights], -1)
+    tris = unit[None] * scale[:, None, None, :] + bases[:, None, None, :]
+    return tris.reshape(-1, 3, 3).astype(np.float32)
+
+
+# ===== TRANSFORMATIONS RIGIDES =====
+
+def rotation_matrix(axis: Sequence[float], angle_deg: float) -> np.ndarray:
+    """Matrice de rotation 3×3 (Rodrigues) autour de `axis`"""
+    axis = np.asarray(axis, dtype=np.float64)
+    axis = axis / (np.linalg.norm(axis) or 1.0)
+    a = math.radians(angle_deg)
+    x, y, z = axis
+    K = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+    return np.eye(3) + math.sin(a) * K + (1.0 - math.cos(a)) * (K @ K)
+
+
+def rotation_z(angles_deg) -> np.ndarray:
+    """Rotation(s) autour de z: scalaire → (3,3), tableau (K,) → (K,3,3)"""
+    a = np.radians(np.asarray(angles_deg, dtype=np.float64))
+    c, s = np.cos(a), np.sin(a)
+    zero, one = np.zeros_like(a), np.ones_like(a)
+    R = np.stack([np.stack([c, -s, zero], -1),
+                  np.stack([s, c, zero], -1),
+                  np.stack([zero, zero, one], -1)], -2)
+    return R
+
+
+def transform(points: np.ndarray, R: Optional[np.ndarray] = None,
+              t: Optional[Sequence[float]] = None) -> np.ndarray:
+    """Applique p' = R p + t à un tableau (..., 3) (sommets ou soupe de triangles)"""
+    out = np.asarray(points, dtype=np.float64)
+    if R is not None:
+        out = out @ np.asarray(R, dtype=np.float64).T
+    if t is not None:
+        out = out + np.asarray(t, dtype=np.float64)
+    return out.astype(np.float32)
+
+
+def instances(tris: np.ndarray, rotations: np.ndarray,
+              translations: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Copie une soupe (N,3,3) sous K poses en un seul einsum:
+    rotations (K,3,3) ou (1,3,3), translations (K,3) → (K·N, 3, 3)
+    """
+    tris = np.asarray(tris, dtype=np.float64)
+    R = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+    out = np.einsum("kij,ntj->knti", R, tris)
+    if translations is not None:
+        out = out + np.asarray(translations, dtype=np.float64).reshape(-1, 1, 1, 3)
+    return out.reshape(-1, 3, 3).astype(np.float32)
+
+
+def bounds(tris: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Boîte englobante (min, max) d'une soupe ou d'un nuage de points"""
+    pts = np.asarray(tris).reshape(-1, 3)
+    return pts.min(axis=0), pts.max(axis=0)
+
+
+__all__ = [
+    "STL_DTYPE", "compute_normals", "write_stl", "write_stl_ascii", "write_stl_indexed", "concat",
+    "quad_faces", "grid_faces", "grid_surface",
+    "boxes", "oriented_boxes", "extrude", "extrude_polygon", "regular_polygon", "cylinders",
+    "rotation_matrix", "rotation_z", "transform", "instances", "bounds",
+]
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+model_manager.py — Cycle de vie des modèles Ollama (préchargement, keep_alive, résidence)
+Jusqu'à cinq modèles servent une génération (DESIGN_EXPERT_MODEL, CODE_LLM_MODEL,
+COT_ARCHITECT / PLANNER / SYNTHESIZER, plus les niveaux de model_router): sans
+keep_alive, Ollama les décharge après 5 min et la première requête après une
+pause paie plusieurs secondes de chargement par modèle.
+
+  - preload(): charge les modèles configurés au démarrage de FastAPI (tâche de fond)
+  - acquire(model): avant chaque appel LLM, enregistre le trafic et renvoie le
+    keep_alive de l'appel (≈ KEEP_ALIVE_FACTOR × intervalle moyen entre appels)
+  - expect(models): une génération annonce la suite de modèles qu'elle va appeler.
+    Quand Ollama est plein (MODEL_MAX_RESIDENT), le manager décharge lui-même un
+    modèle qui n'est attendu par aucune génération en cours, au lieu de laisser
+    l'éviction LRU d'Ollama sortir le Synthesizer dont on a besoin juste après.
+  - status(): modèles résidents (ollama ps), trafic et keep_alive par modèle
+
+Configuration:
+  - MODEL_MANAGER=0 : désactivé (appels sans keep_alive, comme avant)
+  - MODEL_PRELOAD : "auto" (défaut), "0" / "none", ou liste "modèle1,modèle2"
+  - MODEL_MAX_RESIDENT : modèles chargés simultanément (défaut: OLLAMA_MAX_LOADED_MODELS ou 3)
+  - MODEL_KEEP_ALIVE_MIN / MAX / DEFAULT (s), MODEL_KEEP_ALIVE_FACTOR
+  - COT_EXTRA_MODELS : "modèle1,modèle2" qu'une requête peut imposer (cot_model)
+    en plus des modèles configurés, sans préchargement (benchmarks par modèle)
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import model_router
+
+log = logging.getLogger("cadamx.model_manager")
+
+
+def _env_int(name: str, default: int) -> int:
+    return max(0, int(os.getenv(name, str(default))))
+
+
+MANAGER_ENABLED = os.getenv("MODEL_MANAGER", "1") != "0"
+MAX_RESIDENT = max(1, _env_int("MODEL_MAX_RESIDENT", _env_int("OLLAMA_MAX_LOADED_MODELS", 3) or 3))
+KEEP_ALIVE_MIN = _env_int("MODEL_KEEP_ALIVE_MIN", 300)
+KEEP_ALIVE_MAX = _env_int("MODEL_KEEP_ALIVE_MAX", 3600)
+KEEP_ALIVE_DEFAULT = _env_int("MODEL_KEEP_ALIVE_DEFAULT", 1800)
+KEEP_ALIVE_FACTOR = float(os.getenv("MODEL_KEEP_ALIVE_FACTOR", "3"))
+PRELOAD = os.getenv("MODEL_PRELOAD", "auto").strip()
+EXTRA_MODELS = [m.strip() for m in os.getenv("COT_EXTRA_MODELS", "").split(",") if m.strip()]
+
+# Cache de `ollama ps` (s) et durée de vie d'une annonce expect() (s)
+PS_TTL = 5.0
+PLAN_TTL = 600.0
+EWMA_ALPHA = 0.3
+BURST_GAP = 30.0
+
+
+def canonical(model: str) -> str:
+    """Nom tel que rapporté par Ollama ("deepseek-coder" → "deepseek-coder:latest")"""
+    model = model.strip()
+    return model if ":" in model else f"{model}:latest"
+
+
+def configured_models() -> Dict[str, List[str]]:
+    """
+    Modèle → rôles, dans l'ordre d'utilisation d'une génération
+    (= ordre de préchargement): design expert, architect, niveaux CoT, healing.
+    """
+    roles: Dict[str, List[str]] = {}
+
+    def add(role: str, model: str) -> None:
+        roles.setdefault(canonical(model), []).append(role)
+
+    add("design_expert", os.getenv("DESIGN_EXPERT_MODEL", "qwen2.5-coder:7b"))
+    add("cot_architect", os.getenv("COT_ARCHITECT_MODEL", "qwen2.5:14b"))
+    for tier in model_router.TIERS:
+        for agent, table in model_router.ROUTES.items():
+            add(f"cot_{agent}:{tier}", table[tier])
+    add("code_llm", os.getenv("CODE_LLM_MODEL", "deepseek-coder:6.7b"))
+    return roles
+
+
+def request_models() -> Set[str]:
+    """Modèles acceptés pour cot_model dans une requête: configurés + COT_EXTRA_MODELS"""
+    return set(configured_models()) | {canonical(m) for m in EXTRA_MODELS}
+
+
+def preload_list() -> List[str]:
+    """Modèles à précharger selon MODEL_PRELOAD (plafonné à MODEL_MAX_RESIDENT en mode auto)"""
+    if PRELOAD.lower() in ("0", "none", "off", ""):
+        return []
+    if PRELOAD.lower() != "auto":
+        return [canonical(m) for m in PRELOAD.split(",") if m.strip()]
+    return list(configured_models())[:MAX_RESIDENT]
+
+
+def _field(obj: Any, key: str) -> Any:
+    """Réponses ollama: dict (anciens clients) ou objets pydantic"""
+    return obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+
+
+class ModelPlan:
+    """Suite des modèles qu'une génération va encore appeler"""
+
+    def __init__(self, models: Iterable[str]):
+        self.pending = [canonical(m) for m in models if m]
+        self.created = time.time()
+
+    def consume(self, model: str) -> None:
+        if model in self.pending:
+            self.pending.remove(model)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.pending) and time.time() - self.created < PLAN_TTL
+
+
+# Annonce de la génération courante (même principe que la classe de priorité du scheduler)
+_plan: contextvars.ContextVar[Optional[ModelPlan]] = contextvars.ContextVar("cadamx_model_plan", default=None)
+
+
+class _Traffic:
+    __slots__ = ("calls", "last_used", "gap")
+
+    def __init__(self):
+        self.calls = 0
+        self.last_used = 0.0
+        # Intervalle moyen entre deux appels (EWMA, s)
+        self.gap: Optional[float] = None
+
+
+class ModelManager:
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.enabled = MANAGER_ENABLED
+        self.client = None
+        if self.enabled:
+            try:
+                import ollama
+                self.client = ollama.AsyncClient(host=self.base_url)
+            except ImportError:
+                log.warning("⚠️ Ollama package not installed, model manager disabled")
+                self.enabled = False
+        self._traffic: Dict[str, _Traffic] = {}
+        self._plans: "weakref.WeakSet[ModelPlan]" = weakref.WeakSet()
+        self._resident: Optional[Dict[str, Dict[str, Any]]] = None
+        self._ps_at = 0.0
+        self._lock = asyncio.Lock()
+        self.preload_state: Dict[str, Any] = {"status": "idle", "models": []}
+
+    # ----- trafic / keep_alive -----
+
+    def expect(self, models: Iterable[str]) -> ModelPlan:
+        """Annonce (ou remplace) la suite de modèles de la génération courante"""
+        plan = ModelPlan(models)
+        _plan.set(plan)
+        self._plans.add(plan)
+        return plan
+
+    def pinned(self) -> set:
+        """Modèles encore attendus par une génération en cours"""
+        return {m for plan in list(self._plans) if plan.active for m in plan.pending}
+
+    def keep_alive(self, model: str) -> str:
+        model = canonical(model)
+        if model in self.pinned():
+            seconds = KEEP_ALIVE_MAX
+        else:
+            traffic = self._traffic.get(model)
+            if traffic is None or traffic.gap is None:
+                seconds = KEEP_ALIVE_DEFAULT
+            else:
+                seconds = min(KEEP_ALIVE_MAX, max(KEEP_ALIVE_MIN, KEEP_ALIVE_FACTOR * traffic.gap))
+        return f"{int(seconds)}s"
+
+    def _record(self, model: str) -> None:
+        now = time.time()
+        traffic = self._traffic.setdefault(model, _Traffic())
+        gap = now - traffic.last_used
+        # Appels rapprochés d'une même génération: pas un intervalle d'inactivité
+        if traffic.last_used and gap >= BURST_GAP:
+            traffic.gap = gap if traffic.gap is None else traffic.gap + EWMA_ALPHA * (gap - traffic.gap)
+        traffic.calls += 1
+        traffic.last_used = now
+
+    async def acquire(self, model: str) -> Optional[str]:
+        """
+        Avant un appel LLM: trafic, place en mémoire, keep_alive de l'appel.
+        Renvoie None si le manager est inactif (appel sans keep_alive).
+        """
+        if not self.enabled:
+            return None
+        model = canonical(model)
+        self._record(model)
+        plan = _plan.get()
+        if plan is not None:
+            plan.consume(model)
+        await self._make_room(model)
+        return self.keep_alive(model)
+
+    # ----- résidence -----
+
+    async def resident(self, refresh: bool = False) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Modèles chargés (ollama ps), None si Ollama ne répond pas"""
+        if not self.enabled:
+            return None
+        if not refresh and self._resident is not None and time.time() - self._ps_at < PS_TTL:
+            return self._resident
+        try:
+            response = await self.client.ps()
+        except Exception as e:
+            log.debug(f"ollama ps failed: {e}")
+            self._resident = None
+            return None
+        self._resident = {}
+        for m in _field(response, "models") or []:
+            name = canonical(_field(m, "model") or _field(m, "name") or "")
+            expires = _field(m, "expires_at")
+            self._resident[name] = {
+                "size_mb": round((_field(m, "size") or 0) / 1e6),
+                "vram_mb": round((_field(m, "size_vram") or 0) / 1e6),
+                "expires_at": expires.isoformat() if hasattr(expires, "isoformat") else expires,
+            }
+        self._ps_at = time.time()
+        return self._resident
+
+    async def _make_room(self, model: str) -> None:
+        """Ollama plein et modèle absent: décharger le moins utile plutôt que laisser faire le LRU"""
+        async with self._lock:
+            resident = await self.resident()
+            if resident is None or model in resident:
+                return
+            pinned = self.pinned()
+            candidates = [m for m in resident if m not in pinned and m != model]
+            if len(resident) >= MAX_RESIDENT and candidates:
+                victim = min(candidates, key=lambda m: self._traffic[m].last_used if m in self._traffic else 0.0)
+                log.info(f"♻️ Unloading {victim} to load {model} (not expected by running generations)")
+                await self.unload(victim)
+            # Sinon tout est attendu: rien de mieux à faire que l'éviction d'Ollama.
+            # L'appel va charger le modèle: le cache de `ps` le compte dès maintenant
+            resident[model] = {}
+
+    async def unload(self, model: str) -> None:
+        try:
+            await self.client.generate(model=model, prompt="", keep_alive=0)
+        except Exception as e:
+            log.warning(f"⚠️ Could not unload {model}: {e}")
+        if self._resident is not None:
+            self._resident.pop(model, None)
+
+    async def preload(self, models: Optional[List[str]] = None) -> None:
+        """Charge les modèles (prompt vide) avec leur keep_alive; séquentiel pour ne pas saturer la VRAM"""
+        if not self.enabled:
+            self.preload_state = {"status": "disabled", "models": []}
+            return
+        models = preload_list() if models is None else [canonical(m) for m in models]
+        self.preload_state = {"status": "running", "models": []}
+        for model in models:
+            start = time.time()
+            try:
+                await self.client.generate(model=model, prompt="", keep_alive=self.keep_alive(model))
+                ok, error = True, None
+                log.info(f"🔥 Preloaded {model} in {time.time() - start:.1f}s")
+            except Exception as e:
+                ok, error = False, str(e)
+                log.warning(f"⚠️ Preload of {model} failed: {e}")
+            self.preload_state["models"].append(
+                {"model": model, "seconds": round(time.time() - start, 2), "ok": ok, "error": error}
+            )
+        self.preload_state["status"] = "done"
+        self._resident = None
+
+    async def status(self) -> Dict[str, Any]:
+        resident = await self.resident(refresh=True)
+        pinned = self.pinned()
+        now = time.time()
+        models = []
+        for model, roles in configured_models().items():
+            traffic = self._traffic.get(model)
+            models.append({
+                "model": model,
+                "roles": roles,
+                "resident": None if resident is None else model in resident,
+                "expected": model in pinned,
+                "calls": traffic.calls if traffic else 0,
+                "idle_s": round(now - traffic.last_used, 1) if traffic else None,
+                "avg_gap_s": round(traffic.gap, 1) if traffic and traffic.gap is not None else None,
+                "keep_alive": self.keep_alive(model),
+            })
+        return {
+            "enabled": self.enabled,
+            "ollama": self.base_url,
+            "max_resident": MAX_RESIDENT,
+            "preload": self.preload_state,
+            "resident": resident,
+            "models": models,
+        }
+
+
+# Instance partagée par le process
+model_manager = ModelManager()
+
+
+__all__ = [
+    "MANAGER_ENABLED", "MAX_RESIDENT", "EXTRA_MODELS", "canonical", "configured_models", "request_models",
+    "preload_list",
+    "ModelPlan", "ModelManager", "model_manager",
+]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+model_router.py — Choix du modèle Ollama par agent CoT et niveau de complexité
+DesignAnalysis.complexity ("simple" / "medium" / "complex") sélectionne le
+modèle du Planner et du Synthesizer: un cône "simple" n'a pas besoin de
+deepseek-coder:33b. Le mode fused, qui n'a pas encore d'analyse, estime le
+niveau depuis le prompt (prompt_tier).
+
+Si le code d'un petit modèle échoue à la compilation ou au CriticAgent,
+l'orchestrateur remonte l'échelle (ladder) vers le modèle suivant.
+
+Configuration:
+  - COT_ROUTING=0 : routage désactivé (modèle historique pour tout)
+  - COT_<AGENT>_MODEL_<TIER> : modèle d'un niveau (ex: COT_SYNTHESIZER_MODEL_SIMPLE)
+  - COT_<AGENT>_MODEL : modèle du niveau "complex" (variables existantes), et
+    de tous les niveaux non configurés: un hôte n'a pas forcément tiré d'autres
+    modèles que ceux qu'il utilisait déjà (ex: COT_SYNTHESIZER_MODEL_SIMPLE=qwen2.5-coder:7b)
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger("cadamx.model_router")
+
+# Ordre = taille croissante
+TIERS = ("simple", "medium", "complex")
+
+ROUTING_ENABLED = os.getenv("COT_ROUTING", "1") != "0"
+
+# Modèle "complex" de chaque agent = modèle historique (variables existantes)
+_BASE_MODELS = {
+    "planner": os.getenv("COT_PLANNER_MODEL", "qwen2.5-coder:14b"),
+    "synthesizer": os.getenv("COT_SYNTHESIZER_MODEL", "deepseek-coder:33b"),
+    "fused": os.getenv("COT_FUSED_MODEL", os.getenv("COT_SYNTHESIZER_MODEL", "deepseek-coder:33b")),
+}
+
+
+def _build_routes() -> Dict[str, Dict[str, str]]:
+    """Niveaux non configurés (ou routage désactivé) = modèle historique de l'agent"""
+    routes = {}
+    for agent, base in _BASE_MODELS.items():
+        table = {}
+        for tier in TIERS:
+            configured = os.getenv(f"COT_{agent.upper()}_MODEL_{tier.upper()}") if ROUTING_ENABLED else None
+            table[tier] = configured or base
+        routes[agent] = table
+    return routes
+
+
+# agent → niveau → modèle
+ROUTES: Dict[str, Dict[str, str]] = _build_routes()
+
+
+def normalize_tier(complexity: Optional[str]) -> str:
+    """Complexité de l'Architect → niveau connu (inconnu = "medium")"""
+    c = (complexity or "").strip().lower()
+    return c if c in TIERS else "medium"
+
+
+def route(agent: str, complexity: Optional[str]) -> str:
+    return ROUTES[agent][normalize_tier(complexity)]
+
+
+def ladder(agent: str, complexity: Optional[str]) -> List[str]:
+    """Modèles à essayer dans l'ordre: celui du niveau, puis les plus gros (sans doublon)"""
+    tier = normalize_tier(complexity)
+    models: List[str] = []
+    for t in TIERS[TIERS.index(tier):]:
+        if ROUTES[agent][t] not in models:
+            models.append(ROUTES[agent][t])
+    return models
+
+
+def prompt_tier(prompt: str) -> str:
+    """
+    Niveau estimé sans LLM: cahier des charges multi-lignes → complex,
+    nombreuses cotes → medium, sinon simple (calé sur les catégories de prompts.json)
+    """
+    if prompt.strip().count("\n") >= 3:
+        return "complex"
+    numbers = re.findall(r"\d+(?:\.\d+)?", prompt)
+    return "medium" if len(numbers) >= 4 else "simple"
+
+
+class RoutingStats:
+    """Compteurs par niveau: générations, escalades, appels et temps par modèle"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, Any]] = {
+            t: {"generations": 0, "escalations": 0, "accepted_first_try": 0, "models": {}} for t in TIERS
+        }
+
+    def record(self, tier: str, attempts: List[Dict[str, Any]]) -> None:
+        """attempts: [{"model", "seconds", "ok"}] dans l'ordre de l'échelle"""
+        tier = normalize_tier(tier)
+        with self._lock:
+            s = self._tiers[tier]
+            s["generations"] += 1
+            s["escalations"] += max(0, len(attempts) - 1)
+            if attempts and attempts[0]["ok"]:
+                s["accepted_first_try"] += 1
+            for a in attempts:
+                m = s["models"].setdefault(a["model"], {"calls": 0, "accepted": 0, "seconds": 0.0})
+                m["calls"] += 1
+                m["accepted"] += int(bool(a["ok"]))
+                m["seconds"] = round(m["seconds"] + a["seconds"], 2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for tier, s in self._tiers.items():
+                models = {
+                    name: dict(m, avg_seconds=round(m["seconds"] / m["calls"], 2) if m["calls"] else 0.0)
+                    for name, m in s["models"].items()
+                }
+                out[tier] = dict(s, models=models)
+            return out
+
+
+# Instance partagée par le process
+stats = RoutingStats()
+
+
+__all__ = [
+    "TIERS", "ROUTING_ENABLED", "ROUTES", "normalize_tier", "route", "ladder",
+    "prompt_tier", "RoutingStats", "stats",
+]
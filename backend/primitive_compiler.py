@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+primitive_compiler.py — Compilateur déterministe des formes simples
+Pour les prompts du type "a cylinder diameter 40 mm height 60 mm", le chemin
+CoT (Architect + Planner + Synthesizer, trois appels LLM) est inutile: la forme
+et ses cotes se lisent directement dans le texte. Ce module reconnaît les
+primitives (box/cube, cylinder, sphere, cone, torus) et quelques objets
+composés courants (pipe, glass, screw, table), extrait les dimensions,
+vérifie leur cohérence et émet un code CadQuery éprouvé, en quelques ms.
+
+Chaque compilation porte une confiance: cotes requises absentes (valeur par
+défaut), nombres du prompt non utilisés, ou caractéristiques non modélisées
+(trous, motifs, fillets...) la font baisser. Sous MIN_CONFIDENCE, l'orchestrateur
+repasse par la chaîne CoT.
+"""
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+log = logging.getLogger("cadamx.primitive_compiler")
+
+# Seuil sous lequel on laisse la main aux LLMs
+MIN_CONFIDENCE = float(os.getenv("PRIMITIVE_MIN_CONFIDENCE", "0.7"))
+
+# Pénalités de confiance
+PENALTY_DEFAULTED = 0.35     # cote requise absente → valeur par défaut
+PENALTY_UNUSED_NUMBER = 0.2  # nombre du prompt que le compilateur n'explique pas
+PENALTY_UNSUPPORTED = 0.5    # caractéristique non modélisée (trous, motif, ...)
+PENALTY_LONG_PROMPT = 0.3    # cahier des charges multi-lignes
+
+_NUM = r"(\d+(?:\.\d+)?)"
+_UNIT = r"(?:\s*(mm|cm|m|millimet(?:er|re)s?|centimet(?:er|re)s?)\b)?"
+_GAP = r"\s*(?:[:=]|of|is|about|approximately|approx\.?)?\s*"
+_TIMES = r"\s*[x×*]\s*"
+
+_UNIT_SCALE = {"mm": 1.0, "cm": 10.0, "m": 1000.0}
+
+# Ordre = priorité: les objets composés avant les primitives qu'ils contiennent
+KIND_PATTERNS: List[Tuple[str, str]] = [
+    ("table", r"\b(?:table|desk)\b"),
+    ("screw", r"\b(?:screw|bolt)\b"),
+    ("glass", r"\b(?:drinking glass|glass|cup|mug|tumbler)\b"),
+    ("pipe", r"\b(?:pipe|tube|hollow cylinder)\b"),
+    ("torus", r"\b(?:torus|donut|doughnut)\b"),
+    ("cone", r"\b(?:cone|conical)\b"),
+    ("sphere", r"\b(?:sphere|ball)\b"),
+    ("cylinder", r"\b(?:cylinder|rod|disc|disk)\b"),
+    ("box", r"\b(?:cube|box|block|cuboid)\b"),
+]
+PRIMITIVES = ("torus", "cone", "sphere", "cylinder", "box")
+
+# Caractéristiques que le compilateur ne sait pas produire (par défaut pour tous)
+UNSUPPORTED_FEATURES = {
+    "hole": r"\bholes?\b|\bbores?\b|\bperforat",
+    "slot": r"\bslots?\b|\bgrooves?\b|\bnotch",
+    "pattern": r"\bpattern\b|\barray\b|\bgrid\b|\blattice\b|\bvoronoi\b",
+    "thread": r"\bthread(?:ed|s)?\b|\bknurl",
+    "fillet": r"\bfillet(?:ed|s)?\b|\brounded\b",
+    "chamfer": r"\bchamfer(?:ed|s)?\b|\bbevel",
+    "shell": r"\bshell\b|\bhollow\b",
+    "sweep": r"\bsweep\b|\bhelix\b|\bhelical\b|\bspiral\b",
+    "text": r"\btext\b|\bengrav|\bemboss|\blogo\b",
+    "boolean": r"\bsubtract\b|\bintersect\b|\bcut[- ]?out\b",
+}
+# Caractéristiques prises en charge par objet
+SUPPORTED_FEATURES: Dict[str, Set[str]] = {
+    "pipe": {"chamfer", "fillet", "shell"},
+    "glass": {"fillet", "shell"},
+    "screw": {"chamfer"},
+    "table": set(),
+}
+
+
+@dataclass
+class CompiledShape:
+    """Résultat du compilateur: code CadQuery + cotes + confiance"""
+    kind: str
+    params: Dict[str, float]
+    code: str
+    confidence: float
+    defaulted: List[str] = field(default_factory=list)
+    unused_numbers: List[float] = field(default_factory=list)
+    unsupported: List[str] = field(default_factory=list)
+
+    @property
+    def accepted(self) -> bool:
+        return self.confidence >= MIN_CONFIDENCE
+
+    def to_metadata(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "params": self.params,
+            "confidence": round(self.confidence, 2),
+            "defaulted": self.defaulted,
+            "unused_numbers": self.unused_numbers,
+            "unsupported": self.unsupported,
+        }
+
+
+class CompileError(ValueError):
+    """Cotes incohérentes (rayon intérieur > extérieur, ...): pas de code émis"""
+
+
+# ========== EXTRACTION ==========
+
+def _to_mm(value: str, unit: Optional[str]) -> float:
+    v = float(value)
+    if not unit:
+        return v
+    unit = unit.lower()
+    if unit.startswith("millimet"):
+        unit = "mm"
+    elif unit.startswith("centimet"):
+        unit = "cm"
+    return v * _UNIT_SCALE.get(unit, 1.0)
+
+
+class _Scanner:
+    """
+    Lecture des cotes d'un prompt normalisé. Chaque nombre n'est consommé
+    qu'une fois; ceux qui restent à la fin font baisser la confiance.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.numbers = {m.start(1): float(m.group(1))
+                        for m in re.finditer(r"(?<![\w.])" + _NUM + r"(?![\w.])", text)}
+        self.used: Set[int] = set()
+
+    def _free(self, pos: int) -> bool:
+        return pos in self.numbers and pos not in self.used
+
+    def value(self, labels: str, scope: Tuple[int, int] = None) -> Optional[float]:
+        """Premier "label <nombre>" ou "<nombre> label" libre dans le scope"""
+        lo, hi = scope or (0, len(self.text))
+        for pattern in (rf"\b(?:{labels}){_GAP}{_NUM}{_UNIT}",
+                        rf"{_NUM}{_UNIT}\s*(?:of\s+)?(?:{labels})\b"):
+            for m in re.finditer(pattern, self.text):
+                if m.start(1) < lo or m.start(1) >= hi or not self._free(m.start(1)):
+                    continue
+                self.used.add(m.start(1))
+                return _to_mm(m.group(1), m.group(2))
+        return None
+
+    def triple(self, scope: Tuple[int, int] = None) -> Optional[Tuple[float, float, float]]:
+        """"a × b × c" (unité sur chaque nombre ou seulement le dernier)"""
+        lo, hi = scope or (0, len(self.text))
+        pattern = _NUM + _UNIT + _TIMES + _NUM + _UNIT + _TIMES + _NUM + _UNIT
+        for m in re.finditer(pattern, self.text):
+            starts = [m.start(1), m.start(3), m.start(5)]
+            if starts[0] < lo or starts[0] >= hi or not all(self._free(s) for s in starts):
+                continue
+            unit = m.group(6)
+            dims = tuple(_to_mm(m.group(2 * i + 1), m.group(2 * i + 2) or unit) for i in range(3))
+            self.used.update(starts)
+            return dims
+        return None
+
+    def bare(self, scope: Tuple[int, int] = None) -> Optional[float]:
+        """Premier nombre libre suivi d'une unité (ex: "a 50 mm cube")"""
+        lo, hi = scope or (0, len(self.text))
+        for m in re.finditer(_NUM + r"\s*(mm|cm|m)\b", self.text):
+            if lo <= m.start(1) < hi and self._free(m.start(1)):
+                self.used.add(m.start(1))
+                return _to_mm(m.group(1), m.group(2))
+        return None
+
+    def unused(self) -> List[float]:
+        return [v for pos, v in sorted(self.numbers.items()) if pos not in self.used]
+
+
+def _scopes(text: str, anchors: Dict[str, str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Découpe le texte en zones par mot-clé (ex: "shaft" / "head"): chaque zone va
+    du mot-clé au mot-clé suivant; le début du texte rejoint la première zone.
+    Mot-clé absent → zone = texte entier.
+    """
+    found = []
+    for name, pattern in anchors.items():
+        m = re.search(pattern, text)
+        if m:
+            found.append((m.start(), name))
+    found.sort()
+    scopes = {name: (0, len(text)) for name in anchors}
+    for i, (start, name) in enumerate(found):
+        end = found[i + 1][0] if i + 1 < len(found) else len(text)
+        scopes[name] = (0 if i == 0 else start, end)
+    return scopes
+
+
+def _radius(sc: _Scanner, prefix: str, scope=None) -> Optional[float]:
+    """Rayon depuis "<prefix>radius" ou "<prefix>diameter" (÷2)"""
+    r = sc.value(rf"{prefix}radius|{prefix}r", scope)
+    if r is not None:
+        return r
+    d = sc.value(rf"{prefix}diameter|{prefix}dia\.?|{prefix}ø|{prefix}d", scope)
+    return d / 2 if d is not None else None
+
+
+def normalize(prompt: str) -> str:
+    text = prompt.lower().replace("×", " x ").replace("⌀", " diameter ").replace("ø", " diameter ")
+    text = re.sub(r"(?<=\d),(?=\d)", ".", text)
+    return re.sub(r"[ \t]+", " ", text)
+
+
+# ========== RÈGLES PAR FORME ==========
+# Chaque règle lit ses cotes et renvoie (params, cotes par défaut)
+
+_HEIGHT = r"height|tall|high|length|long|h"
+
+
+def _rule_box(sc: _Scanner, text: str):
+    dims = sc.triple()
+    defaulted = []
+    if dims is None:
+        side = sc.value(r"side|edge|size")
+        w = sc.value(r"width|wide|w")
+        l = sc.value(r"length|long|l")
+        h = sc.value(r"height|tall|high|thickness|thick|h|depth|deep")
+        if re.search(r"\bcube\b", text) and w is None and l is None and h is None:
+            side = side if side is not None else sc.bare()
+            if side is None:
+                defaulted.append("side")
+                side = 50.0
+            dims = (side, side, side)
+        else:
+            vals = []
+            for name, v in (("length", l), ("width", w), ("height", h)):
+                if v is None:
+                    v = side if side is not None else sc.bare()
+                if v is None:
+                    defaulted.append(name)
+                    v = 50.0
+                vals.append(v)
+            dims = tuple(vals)
+    return {"length": dims[0], "width": dims[1], "height": dims[2]}, defaulted
+
+
+def _rule_cylinder(sc: _Scanner, text: str):
+    defaulted = []
+    r = _radius(sc, "")
+    h = sc.value(_HEIGHT + r"|thickness|thick")
+    if r is None:
+        defaulted.append("radius")
+        r = 25.0
+    if h is None:
+        defaulted.append("height")
+        h = 50.0
+    return {"radius": r, "height": h}, defaulted
+
+
+def _rule_sphere(sc: _Scanner, text: str):
+    r = _radius(sc, "")
+    if r is None:
+        # "a 50 mm sphere": la cote nue d'une sphère est son diamètre
+        d = sc.bare()
+        r = d / 2 if d is not None else None
+    if r is None:
+        return {"radius": 25.0}, ["radius"]
+    return {"radius": r}, []
+
+
+def _rule_cone(sc: _Scanner, text: str):
+    defaulted = []
+    r1 = _radius(sc, r"(?:base|bottom|lower) ")
+    r2 = _radius(sc, r"(?:top|upper|tip) ")
+    if r1 is None:
+        r1 = _radius(sc, "")
+    h = sc.value(_HEIGHT)
+    if r1 is None:
+        defaulted.append("base_radius")
+        r1 = 30.0
+    if h is None:
+        defaulted.append("height")
+        h = 50.0
+    # Sommet pointu si aucun rayon supérieur n'est donné (pas une cote manquante)
+    return {"base_radius": r1, "top_radius": r2 or 0.0, "height": h}, defaulted
+
+
+def _rule_torus(sc: _Scanner, text: str):
+    defaulted = []
+    major = _radius(sc, r"(?:major|ring|mean|centerline|centreline) ")
+    minor = _radius(sc, r"(?:minor|tube|section|cross[- ]section) ")
+    if major is None:
+        defaulted.append("major_radius")
+        major = 40.0
+    if minor is None:
+        defaulted.append("minor_radius")
+        minor = 10.0
+    return {"major_radius": major, "minor_radius": minor}, defaulted
+
+
+def _rule_pipe(sc: _Scanner, text: str):
+    defaulted = []
+    outer = _radius(sc, r"(?:outer|outside|external) ")
+    if outer is None:
+        od = sc.value(r"od")
+        outer = od / 2 if od is not None else None
+    inner = _radius(sc, r"(?:inner|inside|internal|bore) ")
+    if inner is None:
+        idd = sc.value(r"id")
+        inner = idd / 2 if idd is not None else None
+    wall = sc.value(r"wall thickness|wall|thickness|thick")
+    if outer is None:
+        outer = _radius(sc, "")
+    length = sc.value(_HEIGHT)
+    chamfer = sc.value(r"chamfer(?:ed|s)?") if re.search(r"\bchamfer", text) else None
+    fillet = sc.value(r"fillet(?:ed|s)?") if re.search(r"\bfillet", text) else None
+
+    if outer is None and inner is not None and wall is not None:
+        outer = inner + wall
+    if inner is None and outer is not None and wall is not None:
+        inner = outer - wall
+    if outer is None:
+        defaulted.append("outer_radius")
+        outer = 20.0
+    if inner is None:
+        defaulted.append("inner_radius")
+        inner = outer * 0.8
+    if length is None:
+        defaulted.append("length")
+        length = 100.0
+    params = {"outer_radius": outer, "inner_radius": inner, "length": length}
+    if chamfer is not None or re.search(r"\bchamfer", text):
+        params["chamfer"] = chamfer if chamfer is not None else 1.0
+    if fillet is not None or re.search(r"\bfillet", text):
+        params["fillet"] = fillet if fillet is not None else 1.0
+    return params, defaulted
+
+
+def _rule_glass(sc: _Scanner, text: str):
+    defaulted = []
+    r = _radius(sc, r"(?:outer|outside|top|rim) ")
+    if r is None:
+        r = _radius(sc, "")
+    h = sc.value(_HEIGHT)
+    wall = sc.value(r"wall thickness|wall|thickness|thick")
+    bottom = sc.value(r"bottom thickness|base thickness|bottom|base")
+    fillet = sc.value(r"fillet(?:ed|s)?|rim radius") if re.search(r"\bfillet|\brim radius", text) else None
+    if r is None:
+        defaulted.append("radius")
+        r = 35.0
+    if h is None:
+        defaulted.append("height")
+        h = 100.0
+    params = {"radius": r, "height": h,
+              "wall": wall if wall is not None else 2.5,
+              "bottom": bottom if bottom is not None else 8.0}
+    if fillet is not None or re.search(r"\bfillet", text):
+        params["rim_fillet"] = fillet if fillet is not None else 1.0
+    return params, defaulted
+
+
+def _rule_screw(sc: _Scanner, text: str):
+    defaulted = []
+    zones = _scopes(text, {"shaft": r"\b(?:shaft|shank|body)\b", "head": r"\bhead\b"})
+    shaft_r = _radius(sc, "", zones["shaft"])
+    shaft_l = sc.value(_HEIGHT, zones["shaft"])
+    head_d = sc.value(r"diameter|across corners|size|width|dia\.?", zones["head"])
+    if head_d is None:
+        head_r = sc.value(r"radius", zones["head"])
+        head_d = head_r * 2 if head_r is not None else None
+    head_h = sc.value(r"height|thickness|thick|tall|h", zones["head"])
+    chamfer = sc.value(r"chamfer(?:ed|s)?") if re.search(r"\bchamfer", text) else None
+
+    if shaft_r is None:
+        defaulted.append("shaft_radius")
+        shaft_r = 4.0
+    if shaft_l is None:
+        defaulted.append("shaft_length")
+        shaft_l = 40.0
+    if head_d is None:
+        defaulted.append("head_diameter")
+        head_d = shaft_r * 3
+    if head_h is None:
+        defaulted.append("head_height")
+        head_h = shaft_r * 1.25
+    params = {"shaft_radius": shaft_r, "shaft_length": shaft_l,
+              "head_diameter": head_d, "head_height": head_h,
+              "hex_head": 0.0 if re.search(r"\b(?:round|cylindrical|cheese|pan) head\b", text) else 1.0}
+    if chamfer is not None:
+        params["chamfer"] = chamfer
+    return params, defaulted
+
+
+def _rule_table(sc: _Scanner, text: str):
+    defaulted = []
+    zones = _scopes(text, {"top": r"\b(?:top|tabletop|table top|plate)\b", "legs": r"\blegs?\b"})
+    dims = sc.triple(zones["top"]) or sc.triple()
+    if dims is None:
+        l = sc.value(r"length|long", zones["top"])
+        w = sc.value(r"width|wide|depth|deep", zones["top"])
+        t = sc.value(r"thickness|thick", zones["top"])
+        dims = []
+        for name, v, dflt in (("top_length", l, 120.0), ("top_width", w, 80.0), ("top_thickness", t, 15.0)):
+            if v is None:
+                defaulted.append(name)
+                v = dflt
+            dims.append(v)
+    leg_r = _radius(sc, "", zones["legs"])
+    leg_h = sc.value(r"height|tall|high|length|long", zones["legs"])
+    inset = sc.value(r"inset|offset|from (?:the |each )?(?:corner|edge)s?")
+    if leg_r is None:
+        defaulted.append("leg_radius")
+        leg_r = 6.0
+    if leg_h is None:
+        defaulted.append("leg_height")
+        leg_h = 100.0
+    length, width, thickness = sorted(dims[:2], reverse=True) + [dims[2]]
+    if inset is None:
+        inset = max(leg_r * 1.5, 10.0)
+    return {"top_length": length, "top_width": width, "top_thickness": thickness,
+            "leg_radius": leg_r, "leg_height": leg_h, "leg_inset": inset}, defaulted
+
+
+RULES: Dict[str, Callable[[_Scanner, str], Tuple[Dict[str, float], List[str]]]] = {
+    "box": _rule_box,
+    "cylinder": _rule_cylinder,
+    "sphere": _rule_sphere,
+    "cone": _rule_cone,
+    "torus": _rule_torus,
+    "pipe": _rule_pipe,
+    "glass": _rule_glass,
+    "screw": _rule_screw,
+    "table": _rule_table,
+}
+
+
+# ========== VÉRIFICATION ==========
+
+def check_params(kind: str, p: Dict[str, float]) -> None:
+    """Cohérence géométrique des cotes (lève CompileError)"""
+    for k, v in p.items():
+        if k not in ("top_radius", "hex_head") and v <= 0:
+            raise CompileError(f"{kind}: {k} must be positive (got {v:g})")
+    if kind == "torus" and p["minor_radius"] >= p["major_radius"]:
+        raise CompileError("torus: minor radius must be smaller than major radius")
+    if kind == "cone" and p["top_radius"] < 0:
+        raise CompileError("cone: top radius must be >= 0")
+    if kind == "pipe":
+        wall = p["outer_radius"] - p["inner_radius"]
+        if wall <= 0:
+            raise CompileError("pipe: inner radius must be smaller than outer radius")
+        for k in ("chamfer", "fillet"):
+            if k in p and p[k] >= wall:
+                raise CompileError(f"pipe: {k} {p[k]:g} mm exceeds wall thickness {wall:g} mm")
+    if kind == "glass":
+        if p["wall"] >= p["radius"] or p["bottom"] >= p["height"]:
+            raise CompileError("glass: wall/bottom thickness too large for its size")
+        if "rim_fillet" in p and p["rim_fillet"] >= p["wall"] / 2:
+            raise CompileError("glass: rim fillet must be smaller than half the wall")
+    if kind == "screw":
+        apothem = p["head_diameter"] / 2 * (math.cos(math.pi / 6) if p["hex_head"] else 1.0)
+        if apothem <= p["shaft_radius"]:
+            raise CompileError("screw: head must be wider than the shaft")
+        if "chamfer" in p and p["chamfer"] >= min(p["head_height"], p["shaft_radius"]):
+            raise CompileError("screw: chamfer too large")
+    if kind == "table":
+        if p["leg_inset"] < p["leg_radius"]:
+            raise CompileError("table: legs would stick out of the top (inset < leg radius)")
+        if 2 * p["leg_inset"] >= min(p["top_length"], p["top_width"]):
+            raise CompileError("table: leg inset too large for the top")
+
+
+# ========== GÉNÉRATION DE CODE ==========
+
+def _f(v: float) -> str:
+    return f"{round(v, 4):g}"
+
+
+def _shape_code(kind: str, p: Dict[str, float]) -> str:
+    if kind == "box":
+        return f'result = cq.Workplane("XY").box({_f(p["length"])}, {_f(p["width"])}, {_f(p["height"])})'
+    if kind == "cylinder":
+        return f'result = cq.Workplane("XY").circle({_f(p["radius"])}).extrude({_f(p["height"])})'
+    if kind == "sphere":
+        return f'result = cq.Workplane("XY").sphere({_f(p["radius"])})'
+    if kind == "cone":
+        r1, r2, h = _f(p["base_radius"]), _f(p["top_radius"]), _f(p["height"])
+        if p["top_radius"] > 0:
+            return (f'result = (cq.Workplane("XY")\n'
+                    f'    .circle({r1})\n'
+                    f'    .workplane(offset={h})\n'
+                    f'    .circle({r2})\n'
+                    f'    .loft())')
+        # Cône pointu: dépouille jusqu'au sommet (un loft vers un cercle nul échoue)
+        return (f'taper_angle = math.degrees(math.atan2({r1}, {h}))\n'
+                f'result = cq.Workplane("XY").circle({r1}).extrude({h}, taper=taper_angle)')
+    if kind == "torus":
+        return (f'# Circular profile on XZ, revolved around the global Z axis\n'
+                f'result = (cq.Workplane("XZ")\n'
+                f'    .moveTo({_f(p["major_radius"])}, 0)\n'
+                f'    .circle({_f(p["minor_radius"])})\n'
+                f'    .revolve(360, (0, 0, 0), (0, 1, 0)))')
+    if kind == "pipe":
+        R, r, L = _f(p["outer_radius"]), _f(p["inner_radius"]), _f(p["length"])
+        lines = [f'outer = cq.Workplane("XY").circle({R}).extrude({L})',
+                 f'bore = cq.Workplane("XY").circle({r}).extrude({L})',
+                 'result = outer.cut(bore)']
+        if "chamfer" in p:
+            lines.append(f'result = result.edges("%CIRCLE").chamfer({_f(p["chamfer"])})')
+        elif "fillet" in p:
+            lines.append(f'result = result.edges("%CIRCLE").fillet({_f(p["fillet"])})')
+        return "\n".join(lines)
+    if kind == "glass":
+        R, H = p["radius"], p["height"]
+        lines = [f'result = cq.Workplane("XY").circle({_f(R)}).extrude({_f(H)})',
+                 f'result = result.faces(">Z").workplane().circle({_f(R - p["wall"])})'
+                 f'.cutBlind(-{_f(H - p["bottom"])})']
+        if "rim_fillet" in p:
+            lines.append(f'result = result.faces(">Z").edges().fillet({_f(p["rim_fillet"])})')
+        return "\n".join(lines)
+    if kind == "screw":
+        r, L = _f(p["shaft_radius"]), _f(p["shaft_length"])
+        D, Hh = _f(p["head_diameter"]), _f(p["head_height"])
+        head = f'.polygon(6, {D})' if p["hex_head"] else f'.circle({_f(p["head_diameter"] / 2)})'
+        lines = [f'shaft = cq.Workplane("XY").circle({r}).extrude({L})',
+                 f'head = cq.Workplane("XY"){head}.extrude({Hh}).translate((0, 0, {L}))',
+                 'result = shaft.union(head)']
+        if "chamfer" in p:
+            lines.append(f'result = result.faces(">Z").edges().chamfer({_f(p["chamfer"])})')
+        return "\n".join(lines)
+    if kind == "table":
+        L, W, T = p["top_length"], p["top_width"], p["top_thickness"]
+        Hl = p["leg_height"]
+        x, y = L / 2 - p["leg_inset"], W / 2 - p["leg_inset"]
+        pts = ", ".join(f"({_f(sx * x)}, {_f(sy * y)})" for sx, sy in ((1, 1), (-1, 1), (1, -1), (-1, -1)))
+        return (f'top = cq.Workplane("XY").box({_f(L)}, {_f(W)}, {_f(T)}).translate((0, 0, {_f(Hl + T / 2)}))\n'
+                f'legs = (cq.Workplane("XY")\n'
+                f'    .pushPoints([{pts}])\n'
+                f'    .circle({_f(p["leg_radius"])})\n'
+                f'    .extrude({_f(Hl)}))\n'
+                f'result = top.union(legs)')
+    raise KeyError(kind)
+
+
+def emit_code(kind: str, params: Dict[str, float]) -> str:
+    """Script complet (même forme que les templates: export_stl dans output/)"""
+    summary = ", ".join(f"{k}={_f(v)}" for k, v in params.items() if k != "hex_head")
+    return f"""#!/usr/bin/env python3
+import math
+import cadquery as cq
+from export_stage import export_stl
+from pathlib import Path
+
+# {kind}: {summary}
+{_shape_code(kind, params)}
+
+output_dir = Path(__file__).parent / "output"
+output_dir.mkdir(exist_ok=True)
+export_stl(result.val(), str(output_dir / "generated_{kind}.stl"))
+print("STL: generated_{kind}.stl")
+"""
+
+
+# ========== POINT D'ENTRÉE ==========
+
+def detect_kind(text: str) -> Tuple[Optional[str], List[str]]:
+    """Forme reconnue + toutes les formes mentionnées"""
+    found = [kind for kind, pattern in KIND_PATTERNS if re.search(pattern, text)]
+    return (found[0] if found else None), found
+
+
+def compile_prompt(prompt: str) -> Optional[CompiledShape]:
+    """
+    Compile un prompt de forme simple en code CadQuery. None si aucune forme
+    prise en charge n'est reconnue, si plusieurs primitives sont mélangées,
+    ou si les cotes sont incohérentes.
+    """
+    text = normalize(prompt)
+    kind, mentioned = detect_kind(text)
+    if kind is None:
+        return None
+    if kind in PRIMITIVES and len([k for k in mentioned if k in PRIMITIVES]) > 1:
+        log.info(f"📐 Primitive compiler: several shapes mentioned {mentioned}, leaving it to CoT")
+        return None
+
+    sc = _Scanner(text)
+    params, defaulted = RULES[kind](sc, text)
+    try:
+        check_params(kind, params)
+    except CompileError as e:
+        log.info(f"📐 Primitive compiler rejected {kind}: {e}")
+        return None
+
+    allowed = SUPPORTED_FEATURES.get(kind, set())
+    unsupported = [name for name, pattern in UNSUPPORTED_FEATURES.items()
+                   if name not in allowed and re.search(pattern, text)]
+    unused = sc.unused()
+
+    confidence = 1.0
+    confidence -= PENALTY_DEFAULTED * len(defaulted)
+    confidence -= PENALTY_UNUSED_NUMBER * len(unused)
+    confidence -= PENALTY_UNSUPPORTED * len(unsupported)
+    if prompt.strip().count("\n") >= 3:
+        confidence -= PENALTY_LONG_PROMPT
+    confidence = max(0.0, min(1.0, confidence))
+
+    code = emit_code(kind, params)
+    compile(code, f"<primitive:{kind}>", "exec")
+
+    compiled = CompiledShape(kind=kind, params={k: round(v, 4) for k, v in params.items()},
+                             code=code, confidence=confidence, defaulted=defaulted,
+                             unused_numbers=unused, unsupported=unsupported)
+    log.info(f"📐 Primitive compiler: {kind} {compiled.params} (confidence {confidence:.2f})")
+    return compiled
+
+
+__all__ = [
+    "MIN_CONFIDENCE", "CompiledShape", "CompileError", "KIND_PATTERNS", "RULES",
+    "normalize", "detect_kind", "check_params", "emit_code", "compile_prompt",
+]
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+prompt_assembly.py — Assemblage des prompts LLM sous budget de tokens
+Sur un hôte Ollama CPU, le temps avant le premier token est dominé par
+l'évaluation du prompt. Ollama réutilise le cache KV du préfixe commun avec
+l'appel précédent du même modèle: il faut donc que le message système soit
+identique octet pour octet d'un appel à l'autre.
+
+  - PromptAssembler: message système statique (jamais modifié) + message
+    utilisateur fait de sections (requises / optionnelles par priorité)
+    ajoutées tant que le budget PROMPT_TOKEN_BUDGET le permet.
+    Les exemples few-shot et la référence API vont dans le message utilisateur.
+  - reference_for(): extrait de cadquery_reference limité aux méthodes que le
+    plan utilise réellement (au lieu de la référence complète).
+  - PromptMetrics: tokens estimés par section, prompt_eval_count /
+    prompt_eval_duration renvoyés par Ollama et part du prompt servie par le
+    cache (estimé - évalué), exposés sur /api/prompts.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+from cadquery_reference import CADQUERY_VALID_METHODS
+
+log = logging.getLogger("cadamx.prompt_assembly")
+
+# Budget total d'un prompt (système + utilisateur), en tokens estimés
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Part maximale de la référence API dans le message utilisateur
+REFERENCE_TOKEN_BUDGET = int(os.getenv("REFERENCE_TOKEN_BUDGET", "400"))
+
+_PIECES = re.compile(r"\w+|([^\w\s])\1*")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimation sans tokenizer (les modèles Ollama n'exposent pas le leur):
+    ~4 caractères par token pour les mots, 1 token par suite de ponctuation.
+    Les vrais comptes arrivent après coup via prompt_eval_count.
+    """
+    total = 0
+    for m in _PIECES.finditer(text):
+        piece = m.group(0)
+        total += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+    return total
+
+
+@dataclass
+class Section:
+    """Morceau du message utilisateur; les optionnels sont retirés si le budget est dépassé"""
+    name: str
+    text: str
+    required: bool = True
+    # Plus petit = ajouté en premier parmi les sections optionnelles
+    priority: int = 0
+
+
+class PromptAssembler:
+    """Préfixe système statique par agent + sections utilisateur sous budget"""
+
+    def __init__(self, agent: str, system: str, budget: int = PROMPT_TOKEN_BUDGET):
+        self.agent = agent
+        self.system = system
+        self.system_tokens = count_tokens(system)
+        self.budget = budget
+
+    def messages(self, sections: List[Section]) -> List[Dict[str, str]]:
+        room = self.budget - self.system_tokens
+        tokens = {s.name: count_tokens(s.text) for s in sections if s.text}
+        keep = {s.name for s in sections if s.text and s.required}
+        room -= sum(tokens[name] for name in keep)
+        for s in sorted((s for s in sections if s.text and not s.required), key=lambda s: s.priority):
+            if tokens[s.name] <= room:
+                keep.add(s.name)
+                room -= tokens[s.name]
+            else:
+                log.info(f"✂️ {self.agent}: dropped '{s.name}' section ({tokens[s.name]} tokens over budget)")
+
+        user = "\n\n".join(s.text.strip() for s in sections if s.name in keep)
+        metrics.record_sections(self.agent, dict(
+            {"system": self.system_tokens}, **{name: tokens[name] for name in keep}
+        ))
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": user},
+        ]
+
+
+def few_shot_section(examples: Iterable[Tuple[str, str]], priority: int = 1) -> Section:
+    """Exemples de référence (titre, code), optionnels — dans le message utilisateur, pas le système"""
+    text = "\n\n".join(
+        f"REFERENCE PATTERN FOR {title.upper()}:\n```python\n{code}\n```" for title, code in examples
+    )
+    return Section("few_shot", text, required=False, priority=priority)
+
+
+_WORD = re.compile(r"[A-Za-z_]\w*")
+
+
+def reference_for(texts: Iterable[str], budget: int = REFERENCE_TOKEN_BUDGET) -> str:
+    """
+    Lignes de cadquery_reference pour les méthodes citées dans le plan
+    (noms d'opérations, primitives), dans l'ordre de la référence, sous budget.
+    """
+    words = {w.lower() for text in texts for w in _WORD.findall(text or "")}
+    lines, used = [], 0
+    for name, info in CADQUERY_VALID_METHODS.items():
+        if name.lower() not in words:
+            continue
+        example = "; ".join(info["example"].splitlines())
+        line = f"- {info['signature']}: {info['description']}  e.g. {example}"
+        cost = count_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "CADQUERY API FOR THIS PLAN:\n" + "\n".join(lines) if lines else ""
+
+
+class PromptMetrics:
+    """Tokens par section et par agent, évaluation réelle côté Ollama"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: Dict[str, Dict[str, Any]] = {}
+
+    def _agent(self, agent: str) -> Dict[str, Any]:
+        return self._agents.setdefault(agent, {
+            "assembled": 0, "sections": {}, "calls": 0,
+            "prompt_tokens": 0, "evaluated_tokens": 0, "eval_ms": 0.0,
+        })
+
+    def record_sections(self, agent: str, tokens: Dict[str, int]) -> None:
+        with self._lock:
+            a = self._agent(agent)
+            a["assembled"] += 1
+            for name, n in tokens.items():
+                a["sections"][name] = a["sections"].get(name, 0) + n
+
+    def record_eval(self, agent: str, prompt_tokens: int, response: Any) -> None:
+        """
+        prompt_tokens: taille estimée du prompt envoyé; response: réponse Ollama
+        (prompt_eval_count = tokens réellement évalués, hors préfixe en cache)
+        """
+        get = response.get if isinstance(response, dict) else lambda k: getattr(response, k, None)
+        evaluated = get("prompt_eval_count")
+        if evaluated is None:
+            return
+        with self._lock:
+            a = self._agent(agent)
+            a["calls"] += 1
+            a["prompt_tokens"] += prompt_tokens
+            a["evaluated_tokens"] += evaluated
+            a["eval_ms"] += (get("prompt_eval_duration") or 0) / 1e6
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for agent, a in self._agents.items():
+                n, calls = max(1, a["assembled"]), max(1, a["calls"])
+                out[agent] = {
+                    "assembled": a["assembled"],
+                    "avg_section_tokens": {k: round(v / n) for k, v in a["sections"].items()},
+                    "calls": a["calls"],
+                    "avg_prompt_tokens": round(a["prompt_tokens"] / calls),
+                    "avg_evaluated_tokens": round(a["evaluated_tokens"] / calls),
+                    "avg_prompt_eval_ms": round(a["eval_ms"] / calls, 1),
+                    # Part du prompt non réévaluée (préfixe servi par le cache KV)
+                    "prefix_reuse": round(max(0.0, 1 - a["evaluated_tokens"] / a["prompt_tokens"]), 3)
+                    if a["prompt_tokens"] else None,
+                }
+            return out
+
+
+# Instance partagée par le process
+metrics = PromptMetrics()
+
+
+__all__ = [
+    "PROMPT_TOKEN_BUDGET", "REFERENCE_TOKEN_BUDGET", "count_tokens", "Section", "PromptAssembler",
+    "few_shot_section", "reference_for", "PromptMetrics", "metrics",
+]
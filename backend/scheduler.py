@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scheduler.py — Admission et ordonnancement des générations (interactive / batch)
+Trois ressources limitées, chacune un pool de slots à deux classes de priorité:
+  - "jobs":     workflows en cours d'exécution (admission)
+  - "llm":      appels Ollama simultanés
+  - "geometry": exécutions CadQuery / builders simultanées
+Chaque pool a une capacité globale et un plafond par classe (le batch ne peut
+jamais occuper tous les slots). Un slot libéré va d'abord à la classe
+interactive, puis au batch; dans une classe, les clients (clé API ou IP) sont
+servis à tour de rôle pour qu'un client bavard n'affame pas les autres.
+
+La classe et le client du job courant voyagent dans un ContextVar: les appels
+LLM et géométrie profonds (agents, orchestrateur) prennent leur slot sans que
+les signatures changent. L'état est propre au process (par worker uvicorn).
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger("cadamx.scheduler")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Ordre = priorité
+CLASSES = (INTERACTIVE, BATCH)
+
+
+def _env_int(name: str, default: int) -> int:
+    return max(1, int(os.getenv(name, str(default))))
+
+
+# Capacité globale et plafond par classe de chaque pool
+POOLS: Dict[str, Dict[str, int]] = {
+    "jobs": {
+        "capacity": _env_int("SCHED_JOB_SLOTS", 4),
+        INTERACTIVE: _env_int("SCHED_INTERACTIVE_JOBS", 4),
+        BATCH: _env_int("SCHED_BATCH_JOBS", 1),
+    },
+    "llm": {
+        "capacity": _env_int("SCHED_LLM_SLOTS", 2),
+        INTERACTIVE: _env_int("SCHED_INTERACTIVE_LLM", 2),
+        BATCH: _env_int("SCHED_BATCH_LLM", 1),
+    },
+    "geometry": {
+        "capacity": _env_int("SCHED_GEOMETRY_SLOTS", 2),
+        INTERACTIVE: _env_int("SCHED_INTERACTIVE_GEOMETRY", 2),
+        BATCH: _env_int("SCHED_BATCH_GEOMETRY", 1),
+    },
+}
+
+# Profondeur max de la file d'admission par classe (au-delà: 429 + Retry-After)
+MAX_QUEUE = {
+    INTERACTIVE: _env_int("SCHED_MAX_QUEUE_INTERACTIVE", 32),
+    BATCH: _env_int("SCHED_MAX_QUEUE_BATCH", 256),
+}
+
+# Durée moyenne initiale d'un job (s), affinée par moyenne glissante
+DEFAULT_JOB_SECONDS = float(os.getenv("SCHED_DEFAULT_JOB_SECONDS", "30"))
+EWMA_ALPHA = 0.2
+
+# (classe, client) du job courant
+_current: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "cadamx_sched", default=(INTERACTIVE, "local")
+)
+
+
+class QueueFull(Exception):
+    """File d'admission pleine pour la classe: à traduire en 429 + Retry-After"""
+
+    def __init__(self, priority: str, depth: int, retry_after: int):
+        super().__init__(f"{priority} queue full ({depth} waiting), retry in {retry_after}s")
+        self.priority = priority
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    p = (priority or INTERACTIVE).strip().lower()
+    if p not in CLASSES:
+        raise ValueError(f"Unknown priority class: {priority!r} (expected one of {', '.join(CLASSES)})")
+    return p
+
+
+class SlotPool:
+    """
+    Slots à priorité stricte entre classes et tour de rôle entre clients.
+    Les attentes sont des futures réveillées une à une par release().
+    """
+
+    def __init__(self, name: str, capacity: int, caps: Dict[str, int]):
+        self.name = name
+        self.capacity = capacity
+        self.caps = caps
+        self.in_use: Dict[str, int] = {c: 0 for c in CLASSES}
+        # classe → client → file des futures en attente (OrderedDict = ordre de rotation)
+        self._waiting: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            c: OrderedDict() for c in CLASSES
+        }
+
+    def _eligible(self, cls: str) -> bool:
+        return sum(self.in_use.values()) < self.capacity and self.in_use[cls] < self.caps[cls]
+
+    def waiting(self, cls: Optional[str] = None) -> int:
+        classes = [cls] if cls else CLASSES
+        return sum(len(q) for c in classes for q in self._waiting[c].values())
+
+    def order(self) -> List[asyncio.Future]:
+        """Ordre prévu d'attribution: classes par priorité, clients à tour de rôle"""
+        out: List[asyncio.Future] = []
+        for cls in CLASSES:
+            queues = [list(q) for q in self._waiting[cls].values()]
+            depth = max((len(q) for q in queues), default=0)
+            for i in range(depth):
+                out.extend(q[i] for q in queues if i < len(q))
+        return out
+
+    def try_acquire(self, cls: str) -> bool:
+        # Une classe plus prioritaire en attente passe devant
+        higher = CLASSES[:CLASSES.index(cls)]
+        if self._eligible(cls) and not any(self.waiting(c) for c in higher) and not self.waiting(cls):
+            self.in_use[cls] += 1
+            return True
+        return False
+
+    def enqueue(self, cls: str, client: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting[cls].setdefault(client, deque()).append(fut)
+        return fut
+
+    def cancel(self, cls: str, client: str, fut: asyncio.Future) -> None:
+        queue = self._waiting[cls].get(client)
+        if queue and fut in queue:
+            queue.remove(fut)
+            if not queue:
+                del self._waiting[cls][client]
+        elif fut.done() and not fut.cancelled():
+            # Slot attribué pendant l'annulation: le rendre
+            self.release(cls)
+
+    def release(self, cls: str) -> None:
+        self.in_use[cls] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for cls in CLASSES:
+            clients = self._waiting[cls]
+            while clients and self._eligible(cls):
+                client, queue = next(iter(clients.items()))
+                fut = queue.popleft()
+                # Client servi → fin de la rotation
+                del clients[client]
+                if queue:
+                    clients[client] = queue
+                if fut.done():
+                    continue
+                self.in_use[cls] += 1
+                fut.set_result(True)
+            if self.waiting(cls):
+                # Classe prioritaire encore en attente: pas de slot pour les suivantes
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "caps": dict(self.caps),
+            "in_use": dict(self.in_use),
+            "waiting": {c: self.waiting(c) for c in CLASSES},
+        }
+
+
+class Scheduler:
+    """Pools jobs / llm / geometry + estimation des délais d'attente"""
+
+    def __init__(self, pools: Dict[str, Dict[str, int]] = POOLS):
+        self.pools = {
+            name: SlotPool(name, cfg["capacity"], {c: min(cfg[c], cfg["capacity"]) for c in CLASSES})
+            for name, cfg in pools.items()
+        }
+        self._job_seconds = {c: DEFAULT_JOB_SECONDS for c in CLASSES}
+        # Jobs admis mais pas encore arrivés dans la file (tâche pas encore démarrée)
+        self._pending = {c: 0 for c in CLASSES}
+
+    # ----- admission -----
+
+    def eta(self, cls: str, position: int) -> float:
+        """Attente estimée (s) pour le position-ième job en file de la classe"""
+        pool = self.pools["jobs"]
+        slots = max(1, pool.caps[cls])
+        return round(math.ceil((position + 1) / slots) * self._job_seconds[cls], 1)
+
+    def depth(self, priority: str) -> int:
+        return self.pools["jobs"].waiting(priority) + self._pending[priority]
+
+    def admit(self, priority: str) -> None:
+        """
+        Contrôle d'admission (synchrone, à la soumission): lève QueueFull si la
+        file de la classe est pleine (Retry-After ~ temps de vidange de la
+        moitié de la file), sinon réserve une place jusqu'à admitted().
+        """
+        depth = self.depth(priority)
+        if depth >= MAX_QUEUE[priority]:
+            retry_after = max(1, int(self.eta(priority, depth - MAX_QUEUE[priority] // 2)))
+            raise QueueFull(priority, depth, retry_after)
+        self._pending[priority] += 1
+
+    def release_pending(self, priority: str) -> None:
+        """Rend la place réservée par admit() pour un job finalement pas lancé (fusionné, erreur)"""
+        self._pending[priority] = max(0, self._pending[priority] - 1)
+
+    @asynccontextmanager
+    async def admitted(self, priority: str, client: str,
+                       notify: Optional[Callable[[str, dict], Awaitable[None]]] = None):
+        """
+        Attend un slot "jobs" (position et ETA envoyées via notify("queue", ...)),
+        puis fixe la classe/client du contexte pour les slots llm/geometry.
+        """
+        pool = self.pools["jobs"]
+        self._pending[priority] = max(0, self._pending[priority] - 1)
+        if not pool.try_acquire(priority):
+            fut = pool.enqueue(priority, client)
+            last = None
+            try:
+                while not fut.done():
+                    position = pool.order().index(fut)
+                    if position != last and notify:
+                        eta = self.eta(priority, position)
+                        await notify("queue", {
+                            "message": f"⏳ Queued ({priority}): position {position + 1}, ~{eta:.0f}s",
+                            "position": position + 1,
+                            "eta_s": eta,
+                            "priority": priority,
+                            "progress": 0,
+                        })
+                    last = position
+                    try:
+                        await asyncio.wait_for(asyncio.shield(fut), timeout=2.0)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                pool.cancel(priority, client, fut)
+                raise
+
+        token = _current.set((priority, client))
+        start = time.time()
+        try:
+            yield
+        finally:
+            _current.reset(token)
+            pool.release(priority)
+            elapsed = time.time() - start
+            self._job_seconds[priority] += EWMA_ALPHA * (elapsed - self._job_seconds[priority])
+
+    # ----- slots internes -----
+
+    @asynccontextmanager
+    async def slot(self, resource: str):
+        """Slot llm / geometry pour la classe du job courant (ContextVar)"""
+        pool = self.pools[resource]
+        cls, client = _current.get()
+        if not pool.try_acquire(cls):
+            fut = pool.enqueue(cls, client)
+            try:
+                await fut
+            except BaseException:
+                pool.cancel(cls, client, fut)
+                raise
+        try:
+            yield
+        finally:
+            pool.release(cls)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pools": {name: pool.stats() for name, pool in self.pools.items()},
+            "avg_job_seconds": {c: round(s, 1) for c, s in self._job_seconds.items()},
+            "max_queue": dict(MAX_QUEUE),
+            "queue_depth": {c: self.depth(c) for c in CLASSES},
+        }
+
+
+# Instance partagée par le process
+scheduler = Scheduler()
+
+
+def slot(resource: str):
+    """Raccourci: async with scheduler.slot("llm"): ..."""
+    return scheduler.slot(resource)
+
+
+__all__ = [
+    "INTERACTIVE", "BATCH", "CLASSES", "POOLS", "MAX_QUEUE", "QueueFull",
+    "normalize_priority", "SlotPool", "Scheduler", "scheduler", "slot",
+]
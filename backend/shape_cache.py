@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+shape_cache.py — Mémoïsation des sous-formes OCC répétées (process-local)
+Les builders reconstruisent sans cesse les mêmes primitives: cylindres de strut
+et sphères de nœud d'un rayon donné, anneau hexagonal du honeycomb, profil de
+lame du louvre, barres effilées du heatsink, struts du stent...
+Ce cache LRU borné les garde, construites une fois dans une pose canonique,
+sous une clé (type de primitive, paramètres arrondis). Un hit renvoie une copie
+placée (shape.moved(loc)): la TShape est partagée, seule la Location change —
+pas de copie de géométrie, et la triangulation n'est calculée qu'une fois.
+
+Le cache vit dans le process: les workers persistants de builders.py le
+gardent chaud d'une requête à l'autre.
+"""
+
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Sequence, Tuple
+
+log = logging.getLogger("cadamx.shape_cache")
+
+MAX_ENTRIES = int(os.getenv("SHAPE_CACHE_SIZE", "512"))
+# Arrondi des paramètres flottants dans la clé (1e-6 mm)
+KEY_DIGITS = 6
+
+_cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def make_key(kind: str, params: Iterable[Any]) -> Tuple:
+    """Clé hashable: flottants arrondis, séquences aplaties en tuples"""
+    def norm(v):
+        if isinstance(v, bool) or v is None or isinstance(v, str):
+            return v
+        if isinstance(v, (int, float)):
+            return round(float(v), KEY_DIGITS)
+        if isinstance(v, (list, tuple)):
+            return tuple(norm(x) for x in v)
+        return v
+    return (kind,) + tuple(norm(p) for p in params)
+
+
+def get(kind: str, params: Sequence[Any], build: Callable[[], Any]):
+    """
+    Forme canonique pour (kind, params), construite par build() au premier appel.
+    La forme renvoyée est partagée: ne pas la modifier, utiliser placed().
+    """
+    key = make_key(kind, params)
+    with _lock:
+        shape = _cache.get(key)
+        if shape is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return shape
+        _stats["misses"] += 1
+
+    # Construction hors verrou (peut être longue); un doublon concurrent est sans effet
+    shape = build()
+    with _lock:
+        _cache[key] = shape
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+    return shape
+
+
+def placed(kind: str, params: Sequence[Any], build: Callable[[], Any], loc=None):
+    """Copie placée de la forme en cache (identité si loc est None)"""
+    import cadquery as cq
+
+    shape = get(kind, params, build)
+    return shape.moved(loc if loc is not None else cq.Location())
+
+
+def location(translate: Sequence[float] = (0.0, 0.0, 0.0),
+             rotations: Iterable[Tuple[Sequence[float], float]] = ()):
+    """cq.Location: rotations (axe passant par l'origine, degrés) appliquées dans l'ordre, puis translation"""
+    import cadquery as cq
+    from OCP.gp import gp_Ax1, gp_Dir, gp_Pnt, gp_Trsf, gp_Vec
+
+    T = gp_Trsf()
+    for axis, deg in rotations:
+        R = gp_Trsf()
+        R.SetRotation(gp_Ax1(gp_Pnt(), gp_Dir(*axis)), math.radians(deg))
+        T = R.Multiplied(T)
+    tr = gp_Trsf()
+    tr.SetTranslation(gp_Vec(*translate))
+    return cq.Location(tr.Multiplied(T))
+
+
+def frame(origin: Sequence[float], direction: Sequence[float]):
+    """cq.Location qui envoie l'origine sur origin et +Z sur direction"""
+    import cadquery as cq
+    from OCP.gp import gp_Ax3, gp_Dir, gp_Pnt, gp_Trsf
+
+    T = gp_Trsf()
+    T.SetTransformation(gp_Ax3(gp_Pnt(*origin), gp_Dir(*direction)))
+    T.Invert()
+    return cq.Location(T)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return dict(_stats, entries=len(_cache), max_entries=MAX_ENTRIES,
+                    hit_rate=round(_stats["hits"] / total, 3) if total else 0.0)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        for k in _stats:
+            _stats[k] = 0
+
+
+__all__ = ["MAX_ENTRIES", "make_key", "get", "placed", "location", "frame", "stats", "clear"]
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+shape_store.py — Stockage BRep persistant par job + exports à la demande
+Le ValidatorAgent sérialise la forme finale (BRep natif OCC) dans
+output/jobs/<job_id>/model.brep. Les exports STEP / STL (tolérance au choix) /
+3MF sont ensuite produits depuis ce BRep dans un process worker, sans
+ré-exécuter le code généré, et mis en cache dans le workspace du job.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+log = logging.getLogger("cadamx.shapes")
+
+STORE_ROOT = Path(__file__).parent / "output" / "jobs"
+BREP_NAME = "model.brep"
+
+# Formats exportables depuis le BRep: extension + media type
+EXPORT_FORMATS: Dict[str, Dict[str, str]] = {
+    "step": {"ext": "step", "media_type": "application/step"},
+    "stl": {"ext": "stl", "media_type": "model/stl"},
+    "3mf": {"ext": "3mf", "media_type": "model/3mf"},
+}
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Exports en cours (chemin cible → future) partagés entre requêtes concurrentes
+_inflight: Dict[str, Any] = {}
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def workspace(job_id: str) -> Path:
+    """Répertoire du job (l'id est validé: pas de traversée de chemin)"""
+    if not _JOB_ID_RE.match(job_id or ""):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return STORE_ROOT / job_id
+
+
+def run_dir(job_id: Optional[str] = None) -> Path:
+    """
+    Répertoire privé d'une exécution (code généré ou builder): STL/STEP y sont
+    écrits directement, jamais dans un fichier de output/ partagé entre jobs.
+    output/jobs/<job_id>/runs/<id>/ (dossier temporaire hors file de jobs)
+    """
+    if not job_id:
+        return Path(tempfile.mkdtemp(prefix="cadamx_run_"))
+    root = workspace(job_id) / "runs"
+    root.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=root))
+
+
+def brep_path(job_id: str) -> Path:
+    return workspace(job_id) / BREP_NAME
+
+
+def has_shape(job_id: str) -> bool:
+    try:
+        return brep_path(job_id).exists()
+    except ValueError:
+        return False
+
+
+def save_shape(job_id: str, shape: Any) -> str:
+    """Sérialise la forme (cq.Workplane / cq.Shape) en BRep natif dans le workspace du job"""
+    from export_stage import as_shape
+
+    path = brep_path(job_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    as_shape(shape).exportBrep(str(path))
+    log.info(f"💾 BRep stored for job {job_id}: {path}")
+    return str(path)
+
+
+def load_shape(job_id: str):
+    import cadquery as cq
+
+    path = brep_path(job_id)
+    if not path.exists():
+        raise FileNotFoundError(f"No BRep stored for job {job_id}")
+    return cq.Shape.importBrep(str(path))
+
+
+def export_path(job_id: str, fmt: str, tolerance: Optional[float] = None,
+                angular_tolerance: Optional[float] = None) -> Path:
+    """Chemin de cache d'un export (la tolérance fait partie de la clé pour STL/3MF)"""
+    ext = EXPORT_FORMATS[fmt]["ext"]
+    if fmt == "step":
+        return workspace(job_id) / f"model.{ext}"
+    tol = "auto" if tolerance is None else f"{tolerance:g}"
+    ang = "auto" if angular_tolerance is None else f"{angular_tolerance:g}"
+    return workspace(job_id) / f"model_t{tol}_a{ang}.{ext}"
+
+
+def _export_worker(job_id: str, fmt: str, tolerance: Optional[float],
+                   angular_tolerance: Optional[float]) -> str:
+    """Exécuté dans un process worker: BRep → format demandé (écriture atomique)"""
+    import cadquery as cq
+    from OCP.BRepTools import BRepTools
+    from export_stage import export_stl
+
+    shape = load_shape(job_id)
+    target = export_path(job_id, fmt, tolerance, angular_tolerance)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+
+    if fmt == "step":
+        cq.exporters.export(shape, str(tmp), exportType="STEP")
+    else:
+        # Le BRep peut contenir une triangulation: on repart d'une forme nue
+        BRepTools.Clean_s(shape.wrapped)
+        if fmt == "stl":
+            export_stl(shape, str(tmp), tolerance=tolerance, angular_tolerance=angular_tolerance)
+        else:
+            from export_stage import deflection_for
+            lin, ang = deflection_for(shape)
+            cq.exporters.export(shape, str(tmp), exportType="3MF",
+                                tolerance=tolerance or lin, angularTolerance=angular_tolerance or ang)
+
+    os.replace(tmp, target)
+    return str(target)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv("EXPORT_WORKERS", "2"))
+            _executor = ProcessPoolExecutor(max_workers=max(1, workers))
+            log.info(f"🏭 Export worker pool started ({workers} workers)")
+        return _executor
+
+
+async def export(job_id: str, fmt: str, tolerance: Optional[float] = None,
+                 angular_tolerance: Optional[float] = None) -> str:
+    """
+    Export à la demande depuis le BRep stocké; un export déjà présent dans le
+    cache du workspace est renvoyé directement, sinon il est produit par le pool.
+    """
+    import asyncio
+
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not has_shape(job_id):
+        raise FileNotFoundError(f"No BRep stored for job {job_id}")
+
+    target = export_path(job_id, fmt, tolerance, angular_tolerance)
+    if target.exists():
+        log.info(f"♻️ Export cache hit: {target.name} (job {job_id})")
+        return str(target)
+
+    key = str(target)
+    fut = _inflight.get(key)
+    if fut is None:
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(
+            _get_executor(), _export_worker, job_id, fmt, tolerance, angular_tolerance
+        )
+        _inflight[key] = fut
+        fut.add_done_callback(lambda _: _inflight.pop(key, None))
+        log.info(f"📦 Exporting job {job_id} → {target.name}")
+    return await asyncio.shield(fut)
+
+
+__all__ = [
+    "STORE_ROOT", "EXPORT_FORMATS", "new_job_id", "workspace", "run_dir", "brep_path", "has_shape",
+    "save_shape", "load_shape", "export_path", "export",
+]
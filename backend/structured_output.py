@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+structured_output.py — Sorties JSON contraintes pour les agents LLM
+Deux pièces:
+  - dataclass_schema(): JSON schema dérivé d'une dataclass (DesignAnalysis,
+    ConstructionPlan...), passé à Ollama via l'option `format` (sortie
+    structurée): le modèle ne peut produire que du JSON conforme.
+  - parse_json(): un seul parseur tolérant à la place des chaînes de réparations
+    regex: texte autour / blocs markdown, commentaires, virgules finales, clés
+    non quotées, "y:60", expressions arithmétiques, tuples, et sortie tronquée
+    (num_predict atteint, flux coupé) dont les structures ouvertes sont refermées.
+"""
+
+import ast
+import dataclasses
+import json
+import logging
+import math
+import operator
+import re
+import typing
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("cadamx.structured_output")
+
+
+# ========== SCHEMA ==========
+
+_SCALARS = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def type_schema(tp: Any) -> Dict[str, Any]:
+    """Annotation Python → fragment de JSON schema"""
+    if tp in _SCALARS:
+        return {"type": _SCALARS[tp]}
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if origin is typing.Union:
+        inner = [a for a in args if a is not type(None)]
+        return type_schema(inner[0]) if len(inner) == 1 else {}
+    if origin in (list, tuple):
+        return {"type": "array", "items": type_schema(args[0]) if args else {}}
+    if origin is dict or tp is dict:
+        return {"type": "object"}
+    return {}
+
+
+def dataclass_schema(cls: type, overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    JSON schema d'une dataclass: un champ = une propriété requise.
+    overrides précise certains champs (enum, structure des éléments d'une liste...).
+    """
+    hints = typing.get_type_hints(cls)
+    props = {}
+    for f in dataclasses.fields(cls):
+        props[f.name] = dict(type_schema(hints[f.name]), **(overrides or {}).get(f.name, {}))
+    return {"type": "object", "properties": props, "required": list(props)}
+
+
+def conform(data: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ajuste les types de premier niveau au schema (nombre en texte → float,
+    scalaire → liste...). Les champs absents restent absents (défauts de l'appelant).
+    """
+    out = dict(data)
+    for name, prop in schema.get("properties", {}).items():
+        if name not in out or out[name] is None:
+            continue
+        value, kind = out[name], prop.get("type")
+        try:
+            if kind in ("number", "integer") and not isinstance(value, (int, float)):
+                value = float(str(value).strip().split()[0])
+                if kind == "integer":
+                    value = int(round(value))
+            elif kind == "string" and not isinstance(value, str):
+                value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+            elif kind == "array" and not isinstance(value, list):
+                value = [value]
+            elif kind == "object" and not isinstance(value, dict):
+                value = {}
+            if "enum" in prop and value not in prop["enum"]:
+                value = str(value).strip().lower()
+                if value not in prop["enum"]:
+                    del out[name]
+                    continue
+        except (ValueError, IndexError):
+            del out[name]
+            continue
+        out[name] = value
+    return out
+
+
+# ========== PARSEUR TOLÉRANT ==========
+
+# Puissance bornée: "9**9**9" sortie par le modèle ne doit pas bloquer la boucle asyncio
+_MAX_BASE = 1e6
+_MAX_EXPONENT = 16
+
+
+def _bounded_pow(base, exponent):
+    if abs(base) > _MAX_BASE or abs(exponent) > _MAX_EXPONENT:
+        raise ValueError(f"{base} ** {exponent}")
+    return operator.pow(base, exponent)
+
+
+_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.Pow: _bounded_pow, ast.USub: operator.neg, ast.UAdd: operator.pos,
+}
+_NUMERIC = set("0123456789.eE+-*/() \t")
+_LITERALS = {"true": True, "false": False, "null": None, "none": None}
+# Clé quotée qui a avalé la suite: "y:60},  (guillemet oublié après la valeur)
+_BROKEN_KEY = re.compile(r'^(\w+):\s*([-+]?\d+(?:\.\d+)?)\s*([,}\]].*)$', re.DOTALL)
+
+
+def _eval_number(expr: str) -> Optional[float]:
+    """Expression arithmétique littérale ("45 * 30", "(10+2)/2") → nombre, sinon None"""
+
+    def ev(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPS:
+            return _OPS[type(node.op)](ev(node.left), ev(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _OPS:
+            return _OPS[type(node.op)](ev(node.operand))
+        raise ValueError(expr)
+
+    try:
+        value = ev(ast.parse(expr.strip(), mode="eval").body)
+    except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError, RecursionError):
+        return None
+    # (-8) ** 0.5 → complexe, 1e300 * 1e300 → inf: pas une valeur utilisable
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        return None
+    return value
+
+
+class _Truncated(Exception):
+    """Fin du texte au milieu d'une valeur"""
+
+    def __init__(self, partial: Any = None):
+        super().__init__("truncated")
+        self.partial = partial
+
+
+class _LenientParser:
+    def __init__(self, text: str):
+        self.s = text
+        self.i = 0
+        self.truncated = False
+
+    def _ws(self) -> None:
+        s, n = self.s, len(self.s)
+        while self.i < n:
+            c = s[self.i]
+            if c.isspace():
+                self.i += 1
+            elif s.startswith("//", self.i) or c == "#":
+                end = s.find("\n", self.i)
+                self.i = n if end < 0 else end + 1
+            elif s.startswith("/*", self.i):
+                end = s.find("*/", self.i + 2)
+                self.i = n if end < 0 else end + 2
+            else:
+                return
+
+    def _eof(self) -> bool:
+        self._ws()
+        return self.i >= len(self.s)
+
+    def value(self) -> Any:
+        if self._eof():
+            raise _Truncated()
+        c = self.s[self.i]
+        if c == "{":
+            return self._object()
+        if c == "[":
+            return self._array()
+        if c in "\"'":
+            return self._string(c)
+        if c == "(":
+            return self._paren()
+        if c in "0123456789.-+":
+            return self._number()
+        return self._bare()
+
+    def _object(self) -> Dict[str, Any]:
+        self.i += 1
+        out: Dict[str, Any] = {}
+        while True:
+            if self._eof():
+                self.truncated = True
+                return out
+            c = self.s[self.i]
+            if c == "}":
+                self.i += 1
+                return out
+            if c in ",;":
+                self.i += 1
+                continue
+            if c in "]":
+                # accolade manquante: on laisse le tableau parent se fermer
+                return out
+            key_start = self.i
+            try:
+                key = self._string(c) if c in "\"'" else self._bare(stop=":,}\n", literal=False)
+            except _Truncated as t:
+                key = t.partial
+                if not (c in "\"'" and key and _BROKEN_KEY.match(key)):
+                    self.truncated = True
+                    return out
+            key = str(key)
+            m = _BROKEN_KEY.match(key) if c in "\"'" else None
+            if m:
+                # {"x":0,"y:60},"p2":... → guillemet fermant oublié: "y": 60 puis on reprend à "}"
+                key = f"{m.group(1)}:{m.group(2)}"
+                self.i = key_start + 1 + m.start(3)
+            if self._eof():
+                self.truncated = True
+                return out
+            if self.s[self.i] == ":":
+                self.i += 1
+            elif ":" in key:
+                # "y:60" → "y": 60
+                key, raw = key.split(":", 1)
+                out[key.strip()] = _LenientParser(raw).value() if raw.strip() else None
+                continue
+            else:
+                out[key] = None
+                continue
+            try:
+                out[key] = self.value()
+            except _Truncated as t:
+                self.truncated = True
+                if t.partial is not None:
+                    out[key] = t.partial
+                return out
+
+    def _array(self) -> list:
+        self.i += 1
+        out: list = []
+        while True:
+            if self._eof():
+                self.truncated = True
+                return out
+            c = self.s[self.i]
+            if c == "]":
+                self.i += 1
+                return out
+            if c in ",;":
+                self.i += 1
+                continue
+            if c == "}":
+                return out
+            try:
+                out.append(self.value())
+            except _Truncated as t:
+                self.truncated = True
+                if t.partial is not None:
+                    out.append(t.partial)
+                return out
+
+    def _string(self, quote: str) -> str:
+        s, n = self.s, len(self.s)
+        start = self.i + 1
+        j = start
+        while j < n:
+            if s[j] == "\\":
+                j += 2
+                continue
+            if s[j] == quote:
+                break
+            j += 1
+        raw = s[start:min(j, n)]
+        try:
+            text = json.loads(f'"{raw}"') if quote == '"' else raw
+        except json.JSONDecodeError:
+            text = raw
+        if j >= n:
+            self.i = n
+            raise _Truncated(text)
+        self.i = j + 1
+        return text
+
+    def _number(self) -> Any:
+        s, n = self.s, len(self.s)
+        j = self.i
+        depth = 0
+        while j < n and s[j] in _NUMERIC:
+            if s[j] == "(":
+                depth += 1
+            elif s[j] == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            j += 1
+        expr = s[self.i:j]
+        self.i = j
+        value = _eval_number(expr)
+        if value is None:
+            if j >= n:
+                raise _Truncated()
+            return (expr + self._bare()).strip()
+        if j < n and s[j].isalpha():
+            # "5mm", "12 deg": garder le texte brut (conform() le convertit si besoin)
+            return (expr + self._bare()).strip()
+        if isinstance(value, float) and value.is_integer() and not any(ch in expr for ch in ".eE/"):
+            value = int(value)
+        return value
+
+    def _paren(self) -> Any:
+        """(a + b) * c → nombre; (x, y) → liste"""
+        start = self.i
+        value = self._number()
+        if isinstance(value, (int, float)):
+            return value
+        self.i = start + 1
+        out = []
+        while True:
+            if self._eof():
+                self.truncated = True
+                return out
+            c = self.s[self.i]
+            if c == ")":
+                self.i += 1
+                return out
+            if c == ",":
+                self.i += 1
+                continue
+            out.append(self.value())
+
+    def _bare(self, stop: str = ",}]\n", literal: bool = True) -> Any:
+        s, n = self.s, len(self.s)
+        j = self.i
+        while j < n and s[j] not in stop:
+            j += 1
+        word = s[self.i:j].strip()
+        self.i = j
+        if not word and j >= n:
+            raise _Truncated()
+        return _LITERALS.get(word.lower(), word) if literal else word
+
+
+def _strip_fences(text: str) -> str:
+    if "```" not in text:
+        return text
+    parts = text.split("```")
+    # Premier bloc de code (```json ... ``` ou ``` ... ```), même non refermé
+    block = parts[1]
+    if block[:4].lower() == "json":
+        block = block[4:]
+    return block
+
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """
+    JSON (éventuellement abîmé ou tronqué) → (valeur, complet).
+    Lève ValueError si aucun objet/tableau n'est trouvé.
+    """
+    if not text:
+        raise ValueError("empty LLM response")
+    try:
+        return json.loads(text), True
+    except json.JSONDecodeError:
+        pass
+
+    body = _strip_fences(text)
+    starts = [p for p in (body.find("{"), body.find("[")) if p >= 0]
+    if not starts:
+        raise ValueError(f"no JSON object in response: {text[:120]!r}")
+    parser = _LenientParser(body[min(starts):])
+    try:
+        value = parser.value()
+    except _Truncated as t:
+        value, parser.truncated = t.partial, True
+    if value is None:
+        raise ValueError(f"no JSON object in response: {text[:120]!r}")
+    if parser.truncated:
+        log.warning("⚠️ LLM JSON output was truncated, open structures closed")
+    return value, not parser.truncated
+
+
+def parse_object(text: str, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """parse_json + contrôle "c'est un objet" + ajustement au schema"""
+    value, _ = parse_json(text)
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a JSON object, got {type(value).__name__}")
+    return conform(value, schema) if schema else value
+
+
+__all__ = ["type_schema", "dataclass_schema", "conform", "parse_json", "parse_object"]
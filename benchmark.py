@@ -5,14 +5,18 @@ Tests multiple LLM models and prompting strategies for CAD code generation.
 """
 
 import json
+import sys
 import time
 import subprocess
 import requests
 from pathlib import Path
 from typing import Dict, Any, List, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import re
 
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+from example_index import ExampleIndex
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -20,8 +24,10 @@ import re
 # Backend configuration
 BACKEND_URL = 'http://localhost:8000'
 BACKEND_TIMEOUT = 180  # 3 minutes timeout
+BACKEND_MAX_RETRIES = 5  # retries on 429 (scheduler queue full)
 
-# Models to test (local Ollama models)
+# Models to test (local Ollama models); the backend fused runs only accept them
+# if they are configured or listed in the backend's COT_EXTRA_MODELS
 MODELS = [
     'codellama:7b',
     'deepseek-coder:6.7b',
@@ -37,9 +43,18 @@ APPROACHES = [
     'few-shot-2',
     'few-shot-3',
     'cot',
-    'multi-agent'  # Uses your existing backend
+    'multi-agent',  # Uses your existing backend
+    'cot-staged',   # Backend CoT: Architect -> Planner -> Synthesizer (3 calls)
+    'cot-fused'     # Backend CoT: analysis + plan + code in one call with the tested model
 ]
 
+# Approaches served by the backend, with the CoT mode they force (None = server default)
+BACKEND_APPROACHES = {
+    'multi-agent': None,
+    'cot-staged': 'staged',
+    'cot-fused': 'fused',
+}
+
 # Test suite selection
 TEST_SUITE = 'simple_medium'  # Options: quick_test, simple_only, medium_only, complex_only, simple_medium, full_benchmark
 
@@ -118,6 +133,31 @@ head = (
 result = shaft.union(head.translate((0, 0, shaft_length)))
 """
 
+# Few-shot examples are retrieved per test prompt (BM25 over the backend example
+# index + the examples above). No generation history: past backend outputs for
+# the same test prompts would leak the answers into the prompt.
+EXAMPLE_INDEX = ExampleIndex(history=False)
+FIXED_EXAMPLES = [('pipe', EXAMPLE_PIPE), ('glass', EXAMPLE_GLASS), ('screw', EXAMPLE_SCREW)]
+for _name, _code in FIXED_EXAMPLES:
+    EXAMPLE_INDEX.add('benchmark', _name, _code)
+
+
+def select_examples(prompt: str, num_examples: int) -> List[str]:
+    """Most relevant examples for the prompt, padded with the fixed ones to keep the count"""
+    examples, chosen = [], set()
+    # Same object from two sources (e.g. 'screw'): keep the best-ranked one
+    for doc, _ in EXAMPLE_INDEX.search(prompt, k=2 * num_examples):
+        if doc.title not in chosen and len(examples) < num_examples:
+            chosen.add(doc.title)
+            examples.append(doc.code if doc.code.startswith('#') else f"# Example: {doc.title}\n{doc.code}")
+    for name, code in FIXED_EXAMPLES:
+        if len(examples) >= num_examples:
+            break
+        if name not in chosen:
+            examples.append(code.strip())
+    return examples
+
+
 # ============================================================================
 # PROMPT BUILDERS
 # ============================================================================
@@ -136,10 +176,11 @@ Requirements:
 
 
 def build_one_shot_prompt(prompt: str) -> str:
-    """Prompt with one example"""
+    """Prompt with the most relevant example"""
+    example = select_examples(prompt, 1)[0]
     return f"""Generate CadQuery Python code for this CAD model.
 
-{EXAMPLE_PIPE}
+{example}
 
 Now generate code for this prompt:
 {prompt}
@@ -151,10 +192,8 @@ Requirements:
 
 
 def build_few_shot_prompt(prompt: str, num_examples: int = 2) -> str:
-    """Prompt with 2 or 3 examples"""
-    examples = [EXAMPLE_PIPE, EXAMPLE_GLASS]
-    if num_examples >= 3:
-        examples.append(EXAMPLE_SCREW)
+    """Prompt with the 2 or 3 most relevant examples"""
+    examples = select_examples(prompt, num_examples)
     
     examples_text = "\n\n".join(examples)
     
@@ -191,21 +230,37 @@ Then generate the complete CadQuery code with 'result' variable."""
 # BACKEND INTERFACE
 # ============================================================================
 
-def call_backend_sse(prompt: str, timeout: int = BACKEND_TIMEOUT) -> Dict[str, Any]:
+def call_backend_sse(prompt: str, timeout: int = BACKEND_TIMEOUT,
+                     cot_mode: str = None, cot_model: str = None) -> Dict[str, Any]:
     """
     Call the CADAM-X backend via SSE endpoint.
     Parses the streaming response to get final code and metadata.
+    cot_mode / cot_model: force the backend CoT mode ("staged" / "fused") and the fused model
     """
     try:
         url = f"{BACKEND_URL}/api/generate"
-        
-        response = requests.post(
-            url,
-            json={"prompt": prompt},
-            headers={"Content-Type": "application/json"},
-            stream=True,
-            timeout=timeout
-        )
+        # No few-shot examples from past generations: a run must not retrieve its own earlier answers
+        payload = {"prompt": prompt, "priority": "batch", "example_history": False}
+        if cot_mode:
+            payload["cot_mode"] = cot_mode
+        if cot_model:
+            payload["cot_model"] = cot_model
+        
+        # Batch class: the scheduler serves interactive UI users first
+        for _ in range(BACKEND_MAX_RETRIES):
+            response = requests.post(
+                url,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                stream=True,
+                timeout=timeout
+            )
+            if response.status_code != 429:
+                break
+            # Queue full: wait as advised by the server
+            wait = int(response.headers.get("Retry-After", "30"))
+            print(f"   ⏳ Backend queue full, retrying in {wait}s...")
+            time.sleep(wait)
         
         if response.status_code != 200:
             return {
@@ -222,6 +277,7 @@ def call_backend_sse(prompt: str, timeout: int = BACKEND_TIMEOUT) -> Dict[str, A
         execution_time = 0
         success = False
         errors = []
+        routing = None
         
         start_time = time.time()
         buffer = ''
@@ -249,6 +305,7 @@ def call_backend_sse(prompt: str, timeout: int = BACKEND_TIMEOUT) -> Dict[str, A
                             if data.get('code'):
                                 code = data.get('code')
                             execution_time = data.get('execution_time', 0)
+                            routing = (data.get('metadata') or {}).get('routing')
                             if not success:
                                 errors = data.get('errors', [])
                         
@@ -269,6 +326,7 @@ def call_backend_sse(prompt: str, timeout: int = BACKEND_TIMEOUT) -> Dict[str, A
             'tokens_input': 0,  # Backend doesn't expose this
             'tokens_output': 0,
             'execution_time': execution_time,
+            'routing': routing,
             'error': ', '.join(errors) if errors else None
         }
     
@@ -524,6 +582,18 @@ class TestResult:
     code_path: str
     stl_size_kb: float
     error: str = None
+    # Backend CoT routing: complexity tier and models tried (first = routed model)
+    routed_tier: str = None
+    routed_models: List[str] = field(default_factory=list)
+
+
+def routing_fields(gen_result: Dict[str, Any]) -> Dict[str, Any]:
+    """TestResult routing fields from the backend 'complete' metadata"""
+    routing = gen_result.get('routing') or {}
+    return {
+        'routed_tier': routing.get('tier'),
+        'routed_models': [a['model'] for a in routing.get('attempts', [])],
+    }
 
 
 class BenchmarkRunner:
@@ -550,7 +620,7 @@ class BenchmarkRunner:
         print(f"  → {approach} | {model} | {test_name}")
         
         # Build prompt based on approach
-        if approach == 'multi-agent':
+        if approach in BACKEND_APPROACHES:
             # Use backend directly (it implements multi-agent)
             final_prompt = prompt_text
         elif approach == 'zero-shot':
@@ -567,9 +637,11 @@ class BenchmarkRunner:
             final_prompt = prompt_text
         
         # Generate code
-        if approach == 'multi-agent':
-            # Use backend (multi-agent system)
-            gen_result = call_backend_sse(final_prompt)
+        if approach in BACKEND_APPROACHES:
+            # Use backend (multi-agent system); fused CoT runs the tested model
+            cot_mode = BACKEND_APPROACHES[approach]
+            gen_result = call_backend_sse(final_prompt, cot_mode=cot_mode,
+                                          cot_model=model if cot_mode == 'fused' else None)
         else:
             # Use Ollama with specific prompting strategy
             gen_result = call_ollama(model, final_prompt)
@@ -596,7 +668,8 @@ class BenchmarkRunner:
                 stl_path='',
                 code_path='',
                 stl_size_kb=0,
-                error=gen_result.get('error', 'Code generation failed')
+                error=gen_result.get('error', 'Code generation failed'),
+                **routing_fields(gen_result)
             )
         
         code = gen_result['code']
@@ -639,7 +712,8 @@ class BenchmarkRunner:
             stl_path=str(stl_path) if exec_result['success'] else '',
             code_path=str(code_path),
             stl_size_kb=exec_result['stl_size_kb'],
-            error=exec_result.get('error')
+            error=exec_result.get('error'),
+            **routing_fields(gen_result)
         )
     
     def run_benchmark(self):
@@ -694,8 +768,8 @@ class BenchmarkRunner:
         for approach in APPROACHES:
             print(f"\n📊 Approach: {approach}")
             
-            # Skip multi-agent if not using backend
-            if approach == 'multi-agent':
+            # Skip backend approaches if not using backend
+            if approach in BACKEND_APPROACHES:
                 try:
                     requests.get(f"{BACKEND_URL}/", timeout=2)
                 except:
@@ -753,12 +827,13 @@ class BenchmarkRunner:
         csv_path = RESULTS_DIR / f"benchmark_summary_{timestamp}.csv"
         
         with open(csv_path, 'w') as f:
-            f.write("approach,model,test,complexity,success,first_try,gen_time,exec_time,total_time,tokens_in,tokens_out,loc,halluc,geo_correct\n")
+            f.write("approach,model,test,complexity,success,first_try,gen_time,exec_time,total_time,tokens_in,tokens_out,loc,halluc,geo_correct,routed_tier,routed_models\n")
             for r in self.results:
                 f.write(f"{r.approach},{r.model},{r.test},{r.complexity},{r.success},{r.first_try_success},"
                        f"{r.generation_time:.2f},{r.execution_time:.2f},{r.total_time:.2f},"
                        f"{r.tokens_input},{r.tokens_output},{r.lines_of_code},"
-                       f"{r.hallucination_count},{r.geometric_correct}\n")
+                       f"{r.hallucination_count},{r.geometric_correct},"
+                       f"{r.routed_tier or ''},{'>'.join(r.routed_models)}\n")
         
         print(f"📊 CSV summary: {csv_path}")
         
@@ -828,6 +903,31 @@ class BenchmarkRunner:
             avg_time = stats['time'] / stats['total']
             print(f"{comp:<15} {success_rate:>14.1f}% {avg_time:>15.1f}")
         
+        # CoT routing: routed tier vs prompts.json category, escalations
+        routed = [r for r in self.results if r.routed_models]
+        if routed:
+            print("\n" + "="*80)
+            print("🧭 COT MODEL ROUTING BY COMPLEXITY")
+            print("="*80)
+            
+            routing_stats = {}
+            for r in routed:
+                s = routing_stats.setdefault(r.complexity, {'total': 0, 'tier_match': 0, 'escalated': 0,
+                                                            'success': 0, 'time': 0})
+                s['total'] += 1
+                s['tier_match'] += 1 if r.routed_tier == r.complexity else 0
+                s['escalated'] += 1 if len(r.routed_models) > 1 else 0
+                s['success'] += 1 if r.success else 0
+                s['time'] += r.total_time
+            
+            print(f"{'Complexity':<15} {'Tier match':>11} {'Escalated':>10} {'Success':>8} {'Avg Time(s)':>12}")
+            print("-" * 60)
+            
+            for comp, stats in sorted(routing_stats.items()):
+                n = stats['total']
+                print(f"{comp:<15} {stats['tier_match'] / n * 100:>10.1f}% {stats['escalated'] / n * 100:>9.1f}% "
+                      f"{stats['success'] / n * 100:>7.1f}% {stats['time'] / n:>12.1f}")
+        
         # Best performers
         print("\n" + "="*80)
         print("🏆 TOP PERFORMERS")
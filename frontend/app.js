@@ -2,6 +2,7 @@
 let scene, camera, renderer, axesHelper = null, model = null;
 let wireframeMode = false;
 let currentCode = '';
+let currentJobId = null;  // job of the displayed model (artifact downloads)
 
 // ===== ContrÃ´les manuels =====
 let isDragging = false;
@@ -873,6 +874,7 @@ async function generateCAD() {
     loadingIndicator.classList.remove('hidden');
 
     currentCode = '';
+    currentJobId = null;
     updateProgress(0, 'Starting...');
 
     try {
@@ -916,10 +918,22 @@ async function generateCAD() {
                     const data = JSON.parse(dataStr);
                     console.log('SSE event:', data.type || 'unknown');
 
-                    if (data.type === 'status') {
+                    if (data.type === 'queued') {
+                        currentJobId = data.job_id;
+                    }
+                    else if (data.type === 'queue') {
+                        // En attente d'un slot du scheduler: position + ETA
+                        updateProgress(0, data.message);
+                    }
+                    else if (data.type === 'status') {
                         updateProgress(lastProgress + 10, data.message);
                         lastProgress = Math.min(lastProgress + 10, 90);
                     }
+                    else if (data.type === 'estimate') {
+                        // ETA / moteur choisi par l'estimateur de coût (avant exécution)
+                        updateProgress(lastProgress, data.message);
+                        console.log('Cost estimate:', data);
+                    }
                     else if (data.type === 'code') {
                         const code = decodeEscapedString(data.code);
                         currentCode = code;
@@ -930,6 +944,7 @@ async function generateCAD() {
                             const timeMsg = data.execution_time ? ` (⏱️ ${data.execution_time}s)` : '';
                             updateProgress(100, `Complete!${timeMsg}`);
 
+                            if (data.job_id) currentJobId = data.job_id;
                             if (data.code) currentCode = data.code;
                             if (data.mesh) loadMesh(data.mesh);
                             if (data.analysis) displayAnalysis(data.analysis);
@@ -965,14 +980,19 @@ async function generateCAD() {
     }
 }
 
+// Artifacts are addressed by job id (no server-side "last model" state)
+function artifactUrl(fmt) {
+    return `${BACKEND_URL}/api/artifacts/${currentJobId}.${fmt}`;
+}
+
 async function exportGrasshopper() {
-    if (!model) {
+    if (!model || !currentJobId) {
         showError('Please generate a model first');
         return;
     }
 
     try {
-        const r = await fetch(`${BACKEND_URL}/api/export/grasshopper`);
+        const r = await fetch(artifactUrl('grasshopper'));
         if (!r.ok) {
             showError('Failed to export Grasshopper format');
             return;
@@ -991,13 +1011,13 @@ async function exportGrasshopper() {
 
 // ==== Export Functions ====
 async function exportSTL() {
-    if (!model) {
+    if (!model || !currentJobId) {
         showError('Please generate a model first before exporting');
         return;
     }
 
     try {
-        const r = await fetch(`${BACKEND_URL}/api/export/stl`);
+        const r = await fetch(artifactUrl('stl'));
         if (!r.ok) {
             showError('No STL file available. Please generate a model first.');
             return;
@@ -1015,13 +1035,13 @@ async function exportSTL() {
 }
 
 async function exportSTEP() {
-    if (!model) {
+    if (!model || !currentJobId) {
         showError('Please generate a model first before exporting');
         return;
     }
 
     try {
-        const r = await fetch(`${BACKEND_URL}/api/export/step`);
+        const r = await fetch(artifactUrl('step'));
         if (!r.ok) {
             showError('No STEP file available. Please generate a model first.');
             return;